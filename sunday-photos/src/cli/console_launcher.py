@@ -78,6 +78,7 @@ if str(PROJECT_ROOT) not in sys.path:
 from src.core.config import LOG_FORMAT, UNKNOWN_PHOTOS_DIR
 from src.core.platform_paths import get_default_work_root_dir, get_program_dir
 from src.core.utils import is_supported_nonempty_image_path
+from src.core.incremental_state import scan_class_photos
 
 
 def _try_get_teacher_helper():
@@ -107,6 +108,9 @@ class ConsolePhotoOrganizer:
         # Teacher-friendly: print the "notices" (formerly scattered TIP lines) only once.
         self._notices_printed = False
 
+        # check_photos() 的课堂照扫描结果，交给本次整理复用（避免重复遍历目录树）
+        self._class_photos_scan = None
+
         # Teacher-friendly pacing: optionally add a tiny pause after *critical* lines
         # so they are easier to perceive when the console scrolls quickly.
         self._ui_pause_ms = self._get_env_int("SUNDAY_PHOTOS_UI_PAUSE_MS", default=0)
@@ -1167,14 +1171,12 @@ Supported formats: .jpg / .jpeg / .png
                 if is_supported_nonempty_image_path(p)
             ]
 
-            # Classroom photos (allow directly under class_photos or under date subfolders)
-            class_photos = [
-                p
-                for p in class_photos_dir.rglob("*")
-                if is_supported_nonempty_image_path(p)
-            ]
+            # Classroom photos (directly under class_photos or under date subfolders).
+            # Single scandir pass; the result is handed to the organizer so the run does not rescan.
+            self._class_photos_scan = scan_class_photos(class_photos_dir)
+            class_photo_count = self._class_photos_scan.photo_count
         
-        self._print_hud("STAT", f"students={len(student_photos)} / classroom={len(class_photos)}", color="36")
+        self._print_hud("STAT", f"students={len(student_photos)} / classroom={class_photo_count}", color="36")
         
         if len(student_photos) == 0:
             self._print_warn("还没有找到学生参考照。")
@@ -1183,7 +1185,7 @@ Supported formats: .jpg / .jpeg / .png
             self._print_rule()
             return False
         
-        if len(class_photos) == 0:
+        if class_photo_count == 0:
             self._print_warn("还没有找到课堂照片。")
             self._print_next("把需要整理的课堂照片放进下面这个文件夹")
             self._print_hud("PATH", f"CLASSROOM={self._rel_path(class_photos_dir)}", color="32")
@@ -1203,6 +1205,12 @@ Supported formats: .jpg / .jpeg / .png
             # 与 src/core/config_loader.py 读取口径保持一致（顶层字段）。
             "tolerance": 0.6,
             "min_face_size": 50,
+            "resize_long_edge": 0,
+            "output_mode": "copy",
+            "copy_workers": 8,
+            "stream_sort": True,
+            "trace": True,
+            "content_cache_keys": True,
             "face_backend": {
                 # 默认后端：InsightFace。打包版默认只保证 InsightFace 可用；dlib/face_recognition 属于可选后端。
                 "engine": "insightface"
@@ -1213,10 +1221,27 @@ Supported formats: .jpg / .jpeg / .png
                 "chunk_size": 12,
                 "min_photos": 30
             },
+            "bounded_memory": {
+                "enabled": False,
+                "window": 256
+            },
+            "decode_ahead": {
+                "enabled": True,
+                "decode_workers": 0,
+                "queue_depth": 0
+            },
+            "prefetch": {
+                "enabled": True,
+                "budget_mb": 64,
+                "readers": 4
+            },
             "unknown_face_clustering": {
                 "enabled": True,
                 "threshold": 0.45,
-                "min_cluster_size": 2
+                "min_cluster_size": 2,
+                "algorithm": "greedy",
+                "knn_k": 10,
+                "persistent": True
             }
         }
         
@@ -1275,6 +1300,11 @@ Supported formats: .jpg / .jpeg / .png
                 if not organizer.initialize():
                     raise RuntimeError("系统初始化失败，请检查日志文件")
 
+                class_photos_scan = getattr(self, "_class_photos_scan", None)
+                if class_photos_scan is not None and hasattr(organizer, "use_class_photos_scan"):
+                    organizer.use_class_photos_scan(class_photos_scan)
+                self._class_photos_scan = None
+
             self._print_ok("AI 识别引擎已就绪")
             
             tolerance = config_loader.get_tolerance()
@@ -1284,6 +1314,10 @@ Supported formats: .jpg / .jpeg / .png
             min_face_size = config_loader.get_min_face_size()
             if hasattr(organizer, 'face_recognizer') and organizer.face_recognizer:
                 organizer.face_recognizer.min_face_size = min_face_size
+
+            get_resize_long_edge = getattr(config_loader, 'get_resize_long_edge', None)
+            if callable(get_resize_long_edge) and hasattr(organizer, 'face_recognizer') and organizer.face_recognizer:
+                organizer.face_recognizer.resize_long_edge = get_resize_long_edge()
             
             self._print_hud("STEP", "1/4 载入参考照：建立识别资料库", color="36")
             self._emit_line(self._hud_rule())
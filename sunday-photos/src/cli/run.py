@@ -11,6 +11,7 @@ import warnings
 import importlib
 import importlib.util
 from pathlib import Path
+from typing import Optional
 
 # Ensure project root (containing the src/ package) is importable.
 # This avoids importing duplicate modules via top-level "core".
@@ -50,7 +51,7 @@ def _sanitize_sys_path_for_app_runtime() -> None:
 
 _sanitize_sys_path_for_app_runtime()
 
-from src.core.config import DEFAULT_INPUT_DIR, DEFAULT_OUTPUT_DIR, DEFAULT_TOLERANCE
+from src.core.config import DEFAULT_INPUT_DIR, DEFAULT_LOG_DIR, DEFAULT_OUTPUT_DIR, DEFAULT_TOLERANCE
 
 
 def _cy_rule(width: int = 60) -> str:
@@ -218,6 +219,11 @@ def show_help():
     --output-dir     输出目录 (默认: {DEFAULT_OUTPUT_DIR})
     --tolerance      人脸识别阈值 (0-1, 默认: {DEFAULT_TOLERANCE})
     --no-parallel    强制禁用并行识别（排障用）
+    --daemon         以常驻进程运行（保持模型与参考照编码常驻，之后的 run.py 自动复用）
+    --stop-daemon    停止常驻进程
+    --no-daemon      本次不使用常驻进程，直接在当前进程运行
+    --check-output   检查输出目录与输出清单是否一致（缺失/损坏/多余文件）
+    --repair         与 --check-output 一起使用：自动修复发现的问题
     # 人脸识别后端切换（技术同工/维护者）：
     #   - 环境变量优先：SUNDAY_PHOTOS_FACE_BACKEND=insightface|dlib
     #   - 或在 config.json 中设置 face_backend.engine
@@ -234,6 +240,76 @@ def show_help():
 """
     print(help_text)
 
+def _check_output(args) -> bool:
+    """对账输出清单与 output/ 磁盘内容；返回 True 表示无问题（或已修复）。"""
+    from src.core.config import DEFAULT_CONFIG
+    from src.core.output_manifest import OutputManifest
+
+    output_dir = Path(args.output_dir)
+    photos_dir = Path(args.input_dir) / DEFAULT_CONFIG["class_photos_dir"]
+    manifest = OutputManifest(output_dir)
+    result = manifest.check(photos_dir=photos_dir, repair=bool(args.repair))
+
+    _cy_print("SCAN", f"输出清单：{len(manifest)} 张源照片 / {result.checked} 个输出副本")
+    for label, items in (("MISS", result.missing), ("DIFF", result.mismatched), ("EXTRA", result.orphans)):
+        for rel in items[:20]:
+            _cy_print(label, rel)
+        if len(items) > 20:
+            _cy_print(label, f"... 另有 {len(items) - 20} 个")
+    if result.ok:
+        _cy_print("OK", "输出目录与清单一致")
+        return True
+    _cy_print(
+        "STAT",
+        f"缺失 {len(result.missing)} / 大小不符 {len(result.mismatched)} / 清单外文件 {len(result.orphans)}",
+    )
+    if args.repair:
+        _cy_print("OK", f"已修复 {result.repaired} 项")
+        return True
+    _cy_print("HINT", "加上 --repair 可自动修复（重新复制损坏副本、删除清单外文件）")
+    return False
+
+
+def _run_via_daemon(args) -> Optional[bool]:
+    """若有常驻进程则把任务交给它执行；返回 True/False 表示常驻进程执行成功/失败，None 表示无常驻进程、需本进程运行。"""
+    try:
+        from src.core.daemon import DaemonClient
+
+        client = DaemonClient.connect()
+    except Exception:
+        return None
+    if client is None:
+        return None
+
+    print(_cy_rule())
+    _cy_print("MODE", f"使用常驻进程（pid={client.endpoint.pid}）")
+    print(_cy_rule())
+
+    def _on_event(event: dict) -> None:
+        if event.get("event") == "log":
+            _cy_print(str(event.get("level", "INFO"))[:5], str(event.get("text", "")))
+
+    # 守护进程的工作目录与本进程不同：日志目录/课堂目录按本进程解析为绝对路径（run_job 内 resolve）
+    outcome = client.run_job(
+        args.input_dir,
+        args.output_dir,
+        log_dir=DEFAULT_LOG_DIR,
+        classroom_dir=getattr(args, "classroom_dir", None),
+        tolerance=args.tolerance,
+        no_parallel=bool(getattr(args, "no_parallel", False)),
+        on_event=_on_event,
+    )
+    if outcome.get("event") == "result" and outcome.get("ok"):
+        print(_cy_rule())
+        _cy_print("OK", f"整理完成：照片已分类写入输出目录（用时 {outcome.get('elapsed', 0)}s）")
+        _cy_print("DONE", "任务结束")
+        return True
+
+    print("\n" + _cy_rule())
+    _cy_print("FAIL", f"常驻进程执行失败：{outcome.get('message', '请查看日志了解详情')}")
+    return False
+
+
 def main():
     """主入口函数"""
     parser = argparse.ArgumentParser(
@@ -274,6 +350,24 @@ def main():
         help="强制禁用并行识别（排障用）",
     )
     
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="以常驻进程运行，供后续 run.py 复用",
+    )
+
+    parser.add_argument(
+        "--stop-daemon",
+        action="store_true",
+        help="停止常驻进程",
+    )
+
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="不使用常驻进程",
+    )
+
     parser.add_argument(
         "--help",
         action="store_true",
@@ -285,6 +379,18 @@ def main():
         action="store_true",
         help="检查运行环境"
     )
+
+    parser.add_argument(
+        "--check-output",
+        action="store_true",
+        help="检查输出目录与输出清单是否一致",
+    )
+
+    parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="与 --check-output 一起使用：自动修复",
+    )
     
     args = parser.parse_args()
     input_dir = args.input_dir
@@ -303,6 +409,36 @@ def main():
         check_environment()
         return
     
+    if args.check_output:
+        if not _check_output(args):
+            sys.exit(1)
+        return
+
+    if args.stop_daemon:
+        from src.core.daemon import DaemonClient
+
+        client = DaemonClient.connect()
+        if client is not None and client.shutdown():
+            _cy_print("OK", "常驻进程已停止")
+        else:
+            _cy_print("INFO", "未发现运行中的常驻进程")
+        return
+
+    if args.daemon:
+        if not check_environment():
+            sys.exit(1)
+        from src.core.daemon import serve
+
+        sys.exit(serve())
+
+    # 常驻进程可用时直接复用（省去依赖导入、模型加载与参考照编码重载）
+    if not args.no_daemon and not os.environ.get("SUNDAY_PHOTOS_NO_DAEMON", "").strip():
+        handled = _run_via_daemon(args)
+        if handled is not None:
+            if not handled:
+                sys.exit(1)
+            return
+
     # 启动画面（赛博/HUD 风格）
     print(_cy_rule())
     _cy_print("SYS", "SUNDAY PHOTO ORGANIZER / 主日学照片整理")
@@ -3,13 +3,14 @@
 
 功能：
 - 接收所有未识别的人脸编码
-- 使用贪婪策略进行聚类
+- 使用贪婪策略进行聚类（UnknownClustering），或先建 kNN 图再聚类（KnnGraphClustering）
 - 生成 "Unknown_Person_X" 的分组建议
 """
 
+import heapq
 import numpy as np
 import logging
-from typing import List, Dict, Tuple
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,11 @@ class UnknownClustering:
         # clusters: cluster_id -> list of (file_path, encoding)
         self.clusters: Dict[int, List[Tuple[str, np.ndarray]]] = {}
         self.next_cluster_id = 1
+        # 与 clusters 插入顺序一一对应的簇行：归一化编码之和、成员数（按需倍增容量）
+        self._cluster_ids: List[int] = []
+        self._sums = np.zeros((0, 0), dtype=np.float64)
+        self._sizes = np.zeros(0, dtype=np.float64)
+        self._dim: Optional[int] = None
 
     def add_faces(self, path: str, encodings: List[np.ndarray]) -> None:
         """
@@ -49,55 +55,228 @@ class UnknownClustering:
         return float(1.0 - (np.dot(a, b) / (an * bn)))
 
     def _add_one(self, path: str, encoding: np.ndarray) -> None:
-        """将单个人脸编码添加到最合适的聚类簇或创建新簇。"""
-        best_cluster_id = -1
-        min_dist = 1.0
-
-        # 简单的贪婪聚类：与现有簇的中心（或所有点）比较
-        # 这里采用与簇内所有点的平均距离作为判定标准
-        for cluster_id, items in self.clusters.items():
-            cluster_encodings = [item[1] for item in items]
-            
-            # 计算与簇内所有点的距离
-            distances = [self._cosine_distance(e, encoding) for e in cluster_encodings]
-            avg_dist = np.mean(distances)
-            
-            if avg_dist < min_dist:
-                min_dist = avg_dist
-                best_cluster_id = cluster_id
-
-        # 如果找到了足够近的簇，加入该簇
-        if best_cluster_id != -1 and min_dist < self.tolerance:
-            self.clusters[best_cluster_id].append((path, encoding))
-        else:
-            # 否则创建新簇
-            self.clusters[self.next_cluster_id] = [(path, encoding)]
-            self.next_cluster_id += 1
+        """将单个人脸编码添加到最合适的聚类簇或创建新簇。
+
+        判定标准是与簇内所有点的平均余弦距离（平均链接）。各簇维护归一化编码之和 S 与成员数 n，
+        则 mean(1 - u·e_i) = 1 - (u·S)/n，一次矩阵-向量乘即可得到与所有簇的平均距离。
+        """
+        encoding = np.asarray(encoding)
+        unit = np.asarray(encoding, dtype=np.float64).ravel()
+        if self._dim is None:
+            self._dim = unit.shape[0]
+        elif unit.shape[0] != self._dim:
+            logger.debug(f"跳过维度不一致的人脸编码: {unit.shape[0]} != {self._dim} ({path})")
+            return
+        unit = unit / (np.linalg.norm(unit) + 1e-12)
+
+        count = len(self._cluster_ids)
+        best_index = -1
+        if count:
+            sums = self._sums[:count]
+            avg_dist = 1.0 - (sums @ unit) / self._sizes[:count]
+            best_index = int(np.argmin(avg_dist))
+            # 与原逐簇比较一致：平均距离需 < 1.0 且 < tolerance（并列时取最早建立的簇）
+            if not avg_dist[best_index] < min(1.0, self.tolerance):
+                best_index = -1
+
+        if best_index != -1:
+            self.clusters[self._cluster_ids[best_index]].append((path, encoding))
+            self._sums[best_index] += unit
+            self._sizes[best_index] += 1
+            return
+
+        # 否则创建新簇
+        if count == self._sums.shape[0]:
+            capacity = max(16, count * 2)
+            sums = np.zeros((capacity, self._dim), dtype=np.float64)
+            sizes = np.zeros(capacity, dtype=np.float64)
+            if count:
+                sums[:count] = self._sums[:count]
+                sizes[:count] = self._sizes[:count]
+            self._sums, self._sizes = sums, sizes
+        self._sums[count] = unit
+        self._sizes[count] = 1
+        self._cluster_ids.append(self.next_cluster_id)
+        self.clusters[self.next_cluster_id] = [(path, encoding)]
+        self.next_cluster_id += 1
+
+    def get_face_clusters(self) -> List[List[Tuple[str, np.ndarray]]]:
+        """按人脸给出聚类结果：[[(path, encoding), ...], ...]，簇按大小降序，只含 >= min_cluster_size 的簇。"""
+        # 按簇大小排序，大的在前（稳定排序：同样大小按建簇先后）
+        sorted_clusters = sorted(self.clusters.values(), key=len, reverse=True)
+        # 只有 1 张的“簇”没必要单独建文件夹，小于 min_cluster_size 的仍留在 unknown_photos/<date>
+        return [list(items) for items in sorted_clusters if len(items) >= self.min_cluster_size]
 
     def get_results(self) -> Dict[str, List[str]]:
         """
         获取聚类结果
-        :return: {"Unknown_Person_1": [path1, path2], ...}
+        :return: {"Unknown_Person_1": [path1, path2], ...}，Unknown_Person_1 是照片最多的
+            （不足 min_cluster_size 的簇按大小排在最后，去掉它们不改变其余簇的编号）
         """
-        results = {}
-        # 按簇大小排序，大的在前
-        sorted_clusters = sorted(self.clusters.items(), key=lambda x: len(x[1]), reverse=True)
-        
-        # 重新编号，确保 Unknown_Person_1 是照片最多的
-        for new_id, (old_id, items) in enumerate(sorted_clusters, 1):
-            # 只有当簇内照片数量 >= 2 时才认为是有效聚类？
-            # 或者全部输出？为了方便老师筛选，全部输出比较好，或者只输出 >= 2 的。
-            # 考虑到 "Unknown" 文件夹可能很乱，如果只有 1 张，其实没必要建文件夹。
-            # 但为了完整性，还是全部输出，或者加个参数控制。
-            # 这里策略：如果只有1张，归类为 "Unknown_Singles" 或者直接不归类（保持在根目录）？
-            # 现在的需求是 "Unknown_Person_X"，通常暗示有多张。
-            # 让我们只返回 >= 2 张的聚类，剩下的归为 "Others" 或不返回（由调用者处理剩余的）。
-            
-            if len(items) < self.min_cluster_size:
+        return {
+            f"Unknown_Person_{new_id}": [item[0] for item in items]
+            for new_id, items in enumerate(self.get_face_clusters(), 1)
+        }
+
+
+class KnnGraphClustering:
+    """基于 kNN 图的未知人脸聚类：结果与添加顺序无关，可扩展到整季数万张人脸。
+
+    流程：
+    1. 按 (照片路径, 人脸序号) 排序并单位化所有编码，保证同样的输入得到同样的编号；
+    2. 分块矩阵乘（每块 block_size 行 × 全部编码）找每张人脸余弦距离 < tolerance 的近邻，
+       每张最多保留 k 个最近的，边数 ≤ N*k，内存只与块大小和 N*k 有关；
+    3. 在这张图上聚类：
+       - components：阈值连通分量（图上的单链接），最快；
+       - hac：平均链接层次聚类，簇间距离 = 两簇之间图上已知点对的平均余弦距离
+         （近邻候选放宽到 2 倍阈值，较远的点对也参与平均，抑制单链接式的“串链”）；
+         每次合并当前距离最小的两簇，直到最小距离 ≥ tolerance。
+    4. 按簇大小降序（同样大小按最早的成员）编号 Unknown_Person_1..N。
+    """
+
+    LINKAGES = ("components", "hac")
+
+    def __init__(
+        self,
+        tolerance: float = 0.45,
+        min_cluster_size: int = 2,
+        linkage: str = "hac",
+        k: int = 10,
+        block_size: int = 256,
+    ):
+        if linkage not in self.LINKAGES:
+            raise ValueError(f"不支持的聚类方式: {linkage}")
+        self.tolerance = tolerance
+        self.min_cluster_size = max(1, int(min_cluster_size))
+        self.linkage = linkage
+        self.k = max(1, int(k))
+        self.block_size = max(1, int(block_size))
+        # faces: (file_path, 该照片内的人脸序号, encoding)
+        self._faces: List[Tuple[str, int, np.ndarray]] = []
+        self._face_counts: Dict[str, int] = {}
+
+    def add_faces(self, path: str, encodings: List[np.ndarray]) -> None:
+        """添加一张照片中的未知人脸编码（与 UnknownClustering.add_faces 相同）。"""
+        for encoding in encodings:
+            try:
+                encoding = np.asarray(encoding, dtype=np.float32).ravel()
+            except Exception:
+                continue
+            if self._faces and encoding.shape != self._faces[0][2].shape:
+                logger.debug(f"跳过维度不一致的人脸编码: {encoding.shape[0]} ({path})")
                 continue
-                
-            name = f"Unknown_Person_{new_id}"
-            paths = [item[0] for item in items]
-            results[name] = paths
-            
-        return results
+            index = self._face_counts.get(path, 0)
+            self._face_counts[path] = index + 1
+            self._faces.append((path, index, encoding))
+
+    def _knn_edges(self, units: np.ndarray, max_distance: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """分块求每个点距离 < max_distance 的至多 k 个近邻；返回去重后的无向边 (i, j, 相似度)，i < j。"""
+        n = units.shape[0]
+        min_sim = np.float32(1.0 - max_distance)
+        rows: List[np.ndarray] = []
+        cols: List[np.ndarray] = []
+        for start in range(0, n, self.block_size):
+            stop = min(n, start + self.block_size)
+            sims = units[start:stop] @ units.T
+            sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf  # 排除自身
+            flat = np.flatnonzero(sims > min_sim)
+            if flat.size > 4 * self.k * (stop - start):
+                # 候选很多：直接对整块求每行 top-k，再按阈值过滤
+                k = min(self.k, n)
+                c = np.argpartition(-sims, k - 1, axis=1)[:, :k].ravel()
+                r = np.repeat(np.arange(stop - start), k)
+                keep = sims[r, c] > min_sim
+            else:
+                r, c = np.divmod(flat, n)
+                # 每行只保留最相似的 k 个：按 (行, -相似度) 排序后取每行前 k 个
+                order = np.lexsort((-sims.ravel()[flat], r))
+                r, c = r[order], c[order]
+                keep = np.arange(r.size) - np.searchsorted(r, r) < self.k
+            rows.append(r[keep] + start)
+            cols.append(c[keep])
+        i = np.concatenate(rows)
+        j = np.concatenate(cols)
+        pairs = np.unique(np.minimum(i, j).astype(np.int64) * n + np.maximum(i, j))
+        lo, hi = pairs // n, pairs % n
+        sim = np.einsum("ij,ij->i", units[lo].astype(np.float64), units[hi].astype(np.float64))
+        return lo, hi, sim
+
+    @staticmethod
+    def _connected_components(n: int, lo: np.ndarray, hi: np.ndarray) -> List[List[int]]:
+        parent = list(range(n))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in zip(lo.tolist(), hi.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        groups: Dict[int, List[int]] = {}
+        for x in range(n):
+            groups.setdefault(find(x), []).append(x)
+        return list(groups.values())
+
+    def _average_linkage(self, n: int, lo: np.ndarray, hi: np.ndarray, sim: np.ndarray) -> List[List[int]]:
+        members: Dict[int, List[int]] = {x: [x] for x in range(n)}
+        # 簇 -> {相邻簇: [已知点对相似度之和, 已知点对数]}
+        links: Dict[int, Dict[int, List[float]]] = {x: {} for x in range(n)}
+        for a, b, s in zip(lo.tolist(), hi.tolist(), sim.tolist()):
+            links[a][b] = links[b][a] = [s, 1]
+
+        def distance(a: int, b: int) -> float:
+            total, count = links[a][b]
+            return 1.0 - total / count
+
+        heap = [(distance(a, b), a, b) for a, b in zip(lo.tolist(), hi.tolist())]
+        heapq.heapify(heap)
+        while heap:
+            dist, a, b = heapq.heappop(heap)
+            if dist >= self.tolerance:
+                break
+            if b not in links.get(a, {}) or distance(a, b) != dist:  # 簇已合并或边权已变化，条目过期
+                continue
+            # 合并到编号较小的簇（a < b），保证结果确定
+            members[a].extend(members.pop(b))
+            for c, (total, count) in links.pop(b).items():
+                del links[c][b]
+                if c == a:
+                    continue
+                merged = links[a].get(c, [0.0, 0])
+                links[a][c] = links[c][a] = [merged[0] + total, merged[1] + count]
+            for c in links[a]:
+                heapq.heappush(heap, (distance(a, c), min(a, c), max(a, c)))
+        return list(members.values())
+
+    def get_face_clusters(self) -> List[List[Tuple[str, np.ndarray]]]:
+        """按人脸给出聚类结果（格式与 UnknownClustering.get_face_clusters 相同）。"""
+        if not self._faces:
+            return []
+        faces = sorted(self._faces, key=lambda item: (item[0], item[1]))
+        units = np.stack([item[2] for item in faces]).astype(np.float32)
+        units /= np.linalg.norm(units, axis=1, keepdims=True) + 1e-12
+
+        if self.linkage == "components":
+            lo, hi, _sim = self._knn_edges(units, self.tolerance)
+            groups = self._connected_components(len(faces), lo, hi)
+        else:
+            # 平均链接需要“远一些”的点对作为反证，近邻候选放宽到 2 倍阈值
+            lo, hi, sim = self._knn_edges(units, min(1.0, 2 * self.tolerance))
+            groups = self._average_linkage(len(faces), lo, hi, sim)
+
+        groups = sorted((sorted(g) for g in groups), key=lambda g: (-len(g), g[0]))
+        return [
+            [(faces[x][0], faces[x][2]) for x in group]
+            for group in groups
+            if len(group) >= self.min_cluster_size
+        ]
+
+    def get_results(self) -> Dict[str, List[str]]:
+        """获取聚类结果（格式与 UnknownClustering.get_results 相同）。"""
+        return {
+            f"Unknown_Person_{new_id}": [item[0] for item in items]
+            for new_id, items in enumerate(self.get_face_clusters(), 1)
+        }
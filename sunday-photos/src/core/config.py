@@ -29,6 +29,7 @@ SMART_REPORT_FILE = "智能分析报告.txt"
 # 人脸识别配置
 DEFAULT_TOLERANCE = 0.6  # 默认人脸识别阈值
 MIN_FACE_SIZE = 50       # 最小人脸尺寸（像素）
+RESIZE_LONG_EDGE = 0     # 课堂照解码长边上限（像素），0 表示按原图解码
 
 # 支持的图片格式
 SUPPORTED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".webp"}
@@ -41,6 +42,19 @@ LOG_BACKUP_COUNT = 5
 # 文件处理配置
 MAX_FILE_SIZE = None              # 不限制文件大小，按需提示资源占用
 IMAGE_QUALITY = 85                # 默认图像质量（如果需要压缩）
+# 输出落盘方式：copy=完整复制；hardlink/reflink/symlink=不额外占用数据空间；
+# auto=依次尝试 reflink → 硬链接（同一文件系统）→ 复制
+OUTPUT_MODES = ("copy", "hardlink", "reflink", "symlink", "auto")
+DEFAULT_OUTPUT_MODE = "copy"
+# SORT 阶段并发复制的线程数（网络盘上把逐个复制的往返延迟重叠起来；1 表示逐个复制）
+DEFAULT_COPY_WORKERS = 8
+# 边识别边整理：识别出一张照片的分类就开始复制，SORT 与 MATCH 重叠进行（关闭时识别完成后再一次性整理）
+DEFAULT_STREAM_SORT = True
+# 性能追踪：每次运行在日志目录写出 trace_<时间>.json（Chrome trace），报告中附各阶段耗时统计
+DEFAULT_TRACE = True
+TRACE_KEEP_FILES = 10  # 日志目录中最多保留的 trace 文件数
+# 识别缓存内容指纹：路径键未命中时按内容（size + 首尾块，全文件哈希确认）查找，改名/移动/重新拷贝的照片复用缓存
+DEFAULT_CONTENT_CACHE_KEYS = True
 
 # 报告配置
 CONFIDENCE_THRESHOLD = 0.7        # 高置信度阈值
@@ -54,11 +68,47 @@ DEFAULT_PARALLEL_RECOGNITION = {
 	"min_photos": 30,
 }
 
+# 有界内存模式（超大批量，如一次重跑一整年的照片）：
+# - window：同时在途的识别任务数上限；缓存命中后需要重新匹配的照片也按 window 分批
+# - 未知人脸特征写入磁盘上的 float32 文件，聚类时以内存映射读取
+# - 识别缓存按日期推进：日期处理完即剪枝并释放该日期的记录
+DEFAULT_BOUNDED_MEMORY = {
+	"enabled": False,
+	"window": 256,
+}
+
+# 解码/推理分级执行（decode-ahead）：解码线程提前解码后续照片放入有界队列，推理方从队列取用
+# - decode_workers：解码线程数，0=按推理并发自动估算（推理经常空等时运行中追加）
+# - queue_depth：已解码待推理的照片数上限，0=自动（推理并发 + 解码线程数）
+# 作用于主进程内识别（串行）与线程策略的并行识别；进程池不受影响
+DEFAULT_DECODE_AHEAD = {
+	"enabled": True,
+	"decode_workers": 0,
+	"queue_depth": 0,
+}
+
+# 照片字节预读（read-ahead）：输入目录在 NAS / U 盘等慢速存储上时，读取线程按目录顺序提前把后续照片读进内存
+# - budget_mb：已预读未取用的字节上限（MB）
+# - readers：并发读取线程数
+# 各识别路径（串行、线程、进程池）都从预读缓冲取字节解码，未命中时按路径自行读取
+DEFAULT_PREFETCH = {
+	"enabled": True,
+	"budget_mb": 64,
+	"readers": 4,
+}
+
 # 未知人脸聚类默认配置（v0.4.0）
+# algorithm：greedy=按到达顺序贪婪聚类（默认）；
+# components/hac=先用分块矩阵乘建 kNN 图，再做阈值连通分量 / 平均链接层次聚类（与输入顺序无关）
+UNKNOWN_CLUSTERING_ALGORITHMS = ("greedy", "components", "hac")
 DEFAULT_UNKNOWN_FACE_CLUSTERING = {
 	"enabled": True,
 	"threshold": 0.45,
 	"min_cluster_size": 2,
+	"algorithm": "greedy",
+	"knn_k": 10,
+	# persistent：跨次运行沿用未知人物编号（登记表 output/.state/unknown_persons.json）
+	"persistent": True,
 }
 
 # 统一默认配置（覆盖策略：用户配置优先）
@@ -68,7 +118,16 @@ DEFAULT_CONFIG = {
 	"log_dir": DEFAULT_LOG_DIR,
 	"tolerance": DEFAULT_TOLERANCE,
 	"min_face_size": MIN_FACE_SIZE,
+	"resize_long_edge": RESIZE_LONG_EDGE,
+	"output_mode": DEFAULT_OUTPUT_MODE,
+	"copy_workers": DEFAULT_COPY_WORKERS,
+	"stream_sort": DEFAULT_STREAM_SORT,
+	"trace": DEFAULT_TRACE,
+	"content_cache_keys": DEFAULT_CONTENT_CACHE_KEYS,
 	"parallel_recognition": DEFAULT_PARALLEL_RECOGNITION,
+	"bounded_memory": DEFAULT_BOUNDED_MEMORY,
+	"decode_ahead": DEFAULT_DECODE_AHEAD,
+	"prefetch": DEFAULT_PREFETCH,
 	"unknown_face_clustering": DEFAULT_UNKNOWN_FACE_CLUSTERING,
 	"class_photos_dir": CLASS_PHOTOS_DIR,
 	"student_photos_dir": STUDENT_PHOTOS_DIR,
@@ -89,6 +148,10 @@ def resolve_path(path_value: str | Path | None, base_dir: Path = BASE_DIR) -> Pa
 STATE_DIR_NAME = ".state"
 CLASS_PHOTOS_SNAPSHOT_FILENAME = "class_photos_snapshot.json"
 SNAPSHOT_VERSION = 1
+OUTPUT_MANIFEST_FILENAME = "output_manifest.json"
+PHOTO_META_FILENAME = "photo_meta.json"
+UNKNOWN_PERSONS_FILENAME = "unknown_persons.json"
+RUN_JOURNAL_FILENAME = "run_journal.json"
 
 # 日期模式
 DATE_DIR_PATTERN = r"^\d{4}-\d{2}-\d{2}$"
\ No newline at end of file
@@ -17,6 +17,17 @@ from .config import (
     DEFAULT_PARALLEL_RECOGNITION,
     DEFAULT_TOLERANCE,
     MIN_FACE_SIZE,
+    RESIZE_LONG_EDGE,
+    DEFAULT_COPY_WORKERS,
+    DEFAULT_OUTPUT_MODE,
+    DEFAULT_STREAM_SORT,
+    DEFAULT_BOUNDED_MEMORY,
+    DEFAULT_DECODE_AHEAD,
+    DEFAULT_PREFETCH,
+    DEFAULT_TRACE,
+    DEFAULT_CONTENT_CACHE_KEYS,
+    OUTPUT_MODES,
+    UNKNOWN_CLUSTERING_ALGORITHMS,
     resolve_path,
 )
 
@@ -160,6 +171,91 @@ class ConfigLoader:
         except Exception:
             return int(MIN_FACE_SIZE)
 
+    def get_resize_long_edge(self) -> int:
+        """获取课堂照解码时的长边上限（像素），0 表示不缩小。
+
+        环境变量 SUNDAY_PHOTOS_RESIZE_LONG_EDGE 优先级高于 config.json。
+        """
+
+        raw = os.environ.get("SUNDAY_PHOTOS_RESIZE_LONG_EDGE", "").strip() or self.get("resize_long_edge", None)
+        try:
+            return max(0, int(raw if raw is not None else RESIZE_LONG_EDGE))
+        except Exception:
+            return int(RESIZE_LONG_EDGE)
+
+    def get_output_mode(self) -> str:
+        """获取输出落盘方式（copy / hardlink / reflink / symlink / auto）。
+
+        环境变量 SUNDAY_PHOTOS_OUTPUT_MODE 优先级高于 config.json；无法识别的值按 copy 处理。
+        """
+
+        raw = os.environ.get("SUNDAY_PHOTOS_OUTPUT_MODE", "").strip() or self.get("output_mode", None)
+        mode = str(raw or DEFAULT_OUTPUT_MODE).strip().lower()
+        if mode not in OUTPUT_MODES:
+            logger.warning(f"未知的 output_mode={raw!r}，按 {DEFAULT_OUTPUT_MODE} 处理（可选：{' / '.join(OUTPUT_MODES)}）")
+            return DEFAULT_OUTPUT_MODE
+        return mode
+
+    def get_copy_workers(self) -> int:
+        """获取 SORT 阶段并发复制的线程数（至少 1）。
+
+        环境变量 SUNDAY_PHOTOS_COPY_WORKERS 优先级高于 config.json。
+        """
+
+        raw = os.environ.get("SUNDAY_PHOTOS_COPY_WORKERS", "").strip() or self.get("copy_workers", None)
+        try:
+            return max(1, int(raw if raw is not None else DEFAULT_COPY_WORKERS))
+        except Exception:
+            return int(DEFAULT_COPY_WORKERS)
+
+    def get_stream_sort(self) -> bool:
+        """是否边识别边整理（识别出一张照片的分类就开始复制到输出目录）。
+
+        环境变量 SUNDAY_PHOTOS_STREAM_SORT（1/0、true/false）优先级高于 config.json。
+        """
+
+        env = os.environ.get("SUNDAY_PHOTOS_STREAM_SORT", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            return True
+        if env in ("0", "false", "no", "off"):
+            return False
+        raw = self.get("stream_sort", DEFAULT_STREAM_SORT)
+        if isinstance(raw, str):
+            return raw.strip().lower() not in ("0", "false", "no", "off", "")
+        return bool(raw)
+
+    def get_trace_enabled(self) -> bool:
+        """是否写出性能追踪（logs/trace_<时间>.json）并在报告中附各阶段耗时统计。
+
+        环境变量 SUNDAY_PHOTOS_TRACE（1/0、true/false）优先级高于 config.json。
+        """
+
+        env = os.environ.get("SUNDAY_PHOTOS_TRACE", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            return True
+        if env in ("0", "false", "no", "off"):
+            return False
+        raw = self.get("trace", DEFAULT_TRACE)
+        if isinstance(raw, str):
+            return raw.strip().lower() not in ("0", "false", "no", "off", "")
+        return bool(raw)
+
+    def get_content_cache_keys(self) -> bool:
+        """识别缓存是否按内容指纹做二级查找与同批去重（改名/移动/重新拷贝的照片复用缓存）。
+
+        环境变量 SUNDAY_PHOTOS_CONTENT_CACHE_KEYS（1/0、true/false）优先级高于 config.json。
+        """
+
+        env = os.environ.get("SUNDAY_PHOTOS_CONTENT_CACHE_KEYS", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            return True
+        if env in ("0", "false", "no", "off"):
+            return False
+        raw = self.get("content_cache_keys", DEFAULT_CONTENT_CACHE_KEYS)
+        if isinstance(raw, str):
+            return raw.strip().lower() not in ("0", "false", "no", "off", "")
+        return bool(raw)
+
     def get_unknown_face_clustering(self) -> Dict[str, Any]:
         """获取未知人脸聚类配置（unknown_face_clustering）。"""
 
@@ -170,6 +266,13 @@ class ConfigLoader:
             uc["enabled"] = bool(uc.get("enabled", DEFAULT_UNKNOWN_FACE_CLUSTERING["enabled"]))
             uc["threshold"] = float(uc.get("threshold", DEFAULT_UNKNOWN_FACE_CLUSTERING["threshold"]))
             uc["min_cluster_size"] = max(1, int(uc.get("min_cluster_size", DEFAULT_UNKNOWN_FACE_CLUSTERING["min_cluster_size"])))
+            algorithm = str(uc.get("algorithm", DEFAULT_UNKNOWN_FACE_CLUSTERING["algorithm"])).strip().lower()
+            if algorithm not in UNKNOWN_CLUSTERING_ALGORITHMS:
+                logger.warning(f"未知的聚类算法 {algorithm!r}，使用 {DEFAULT_UNKNOWN_FACE_CLUSTERING['algorithm']}")
+                algorithm = DEFAULT_UNKNOWN_FACE_CLUSTERING["algorithm"]
+            uc["algorithm"] = algorithm
+            uc["knn_k"] = max(1, int(uc.get("knn_k", DEFAULT_UNKNOWN_FACE_CLUSTERING["knn_k"])))
+            uc["persistent"] = bool(uc.get("persistent", DEFAULT_UNKNOWN_FACE_CLUSTERING["persistent"]))
         except Exception:
             uc = dict(DEFAULT_UNKNOWN_FACE_CLUSTERING)
 
@@ -226,6 +329,98 @@ class ConfigLoader:
 
         return pr
 
+    def get_bounded_memory(self) -> Dict[str, Any]:
+        """获取有界内存模式配置（bounded_memory）。
+
+        环境变量 SUNDAY_PHOTOS_BOUNDED_MEMORY（1/0）与 SUNDAY_PHOTOS_MEMORY_WINDOW 优先级高于 config.json。
+        """
+
+        bm = dict(DEFAULT_BOUNDED_MEMORY)
+        raw = self.config_data.get("bounded_memory", DEFAULT_BOUNDED_MEMORY)
+        if isinstance(raw, dict):
+            bm.update(raw)
+
+        env = os.environ.get("SUNDAY_PHOTOS_BOUNDED_MEMORY", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            bm["enabled"] = True
+        elif env in ("0", "false", "no", "off"):
+            bm["enabled"] = False
+        env_window = os.environ.get("SUNDAY_PHOTOS_MEMORY_WINDOW", "").strip()
+        if env_window:
+            bm["window"] = env_window
+
+        try:
+            bm["window"] = max(1, int(bm.get("window", DEFAULT_BOUNDED_MEMORY["window"])))
+        except (TypeError, ValueError):
+            bm["window"] = DEFAULT_BOUNDED_MEMORY["window"]
+        enabled = bm.get("enabled", False)
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "true", "yes", "on")
+        bm["enabled"] = bool(enabled)
+        return bm
+
+    def get_decode_ahead(self) -> Dict[str, Any]:
+        """获取解码/推理分级执行配置（decode_ahead）。
+
+        环境变量 SUNDAY_PHOTOS_DECODE_AHEAD（1/0）、SUNDAY_PHOTOS_DECODE_WORKERS、
+        SUNDAY_PHOTOS_DECODE_QUEUE 优先级高于 config.json。
+        """
+
+        da = dict(DEFAULT_DECODE_AHEAD)
+        raw = self.config_data.get("decode_ahead", DEFAULT_DECODE_AHEAD)
+        if isinstance(raw, dict):
+            da.update(raw)
+
+        env = os.environ.get("SUNDAY_PHOTOS_DECODE_AHEAD", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            da["enabled"] = True
+        elif env in ("0", "false", "no", "off"):
+            da["enabled"] = False
+        for key, env_name in (("decode_workers", "SUNDAY_PHOTOS_DECODE_WORKERS"), ("queue_depth", "SUNDAY_PHOTOS_DECODE_QUEUE")):
+            value = os.environ.get(env_name, "").strip()
+            if value:
+                da[key] = value
+            try:
+                da[key] = max(0, int(da.get(key, 0)))
+            except (TypeError, ValueError):
+                da[key] = DEFAULT_DECODE_AHEAD[key]
+        enabled = da.get("enabled", True)
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "true", "yes", "on")
+        da["enabled"] = bool(enabled)
+        return da
+
+    def get_prefetch(self) -> Dict[str, Any]:
+        """获取照片字节预读配置（prefetch）。
+
+        环境变量 SUNDAY_PHOTOS_PREFETCH（1/0）、SUNDAY_PHOTOS_PREFETCH_MB、
+        SUNDAY_PHOTOS_PREFETCH_READERS 优先级高于 config.json。
+        """
+
+        pf = dict(DEFAULT_PREFETCH)
+        raw = self.config_data.get("prefetch", DEFAULT_PREFETCH)
+        if isinstance(raw, dict):
+            pf.update(raw)
+
+        env = os.environ.get("SUNDAY_PHOTOS_PREFETCH", "").strip().lower()
+        if env in ("1", "true", "yes", "on"):
+            pf["enabled"] = True
+        elif env in ("0", "false", "no", "off"):
+            pf["enabled"] = False
+        for key, env_name in (("budget_mb", "SUNDAY_PHOTOS_PREFETCH_MB"), ("readers", "SUNDAY_PHOTOS_PREFETCH_READERS")):
+            value = os.environ.get(env_name, "").strip()
+            if value:
+                pf[key] = value
+            try:
+                pf[key] = max(1, int(pf.get(key, DEFAULT_PREFETCH[key])))
+            except (TypeError, ValueError):
+                pf[key] = DEFAULT_PREFETCH[key]
+        enabled = pf.get("enabled", True)
+        if isinstance(enabled, str):
+            enabled = enabled.strip().lower() in ("1", "true", "yes", "on")
+        pf["enabled"] = bool(enabled)
+        return pf
+
     def get_all_config(self) -> Dict[str, Any]:
         return dict(self.config_data)
 
@@ -26,15 +26,14 @@ class ServiceContainer:
             tolerance = self.config.get('tolerance') if self.config else None
             min_face_size = self.config.get('min_face_size') if self.config else None
             log_dir = self.config.get('log_dir') if self.config else None
+            resize_long_edge = self.config.get('resize_long_edge') if self.config else None
             # Prefer a single explicit interface: FaceRecognizer(..., log_dir=...).
             # Backward-compat: if a stub/older class does not accept log_dir, fall back.
             try:
-                fr = FaceRecognizer(
-                    sm,
-                    tolerance=tolerance,
-                    min_face_size=min_face_size,
-                    log_dir=log_dir,
-                )
+                kwargs = {'tolerance': tolerance, 'min_face_size': min_face_size, 'log_dir': log_dir}
+                if resize_long_edge is not None:
+                    kwargs['resize_long_edge'] = resize_long_edge
+                fr = FaceRecognizer(sm, **kwargs)
             except TypeError:
                 fr = FaceRecognizer(sm, tolerance, min_face_size)
 
@@ -54,5 +53,10 @@ class ServiceContainer:
         if 'file_organizer' not in self._services:
             from .file_organizer import FileOrganizer
             output_dir = self.config.get('output_dir') if self.config else None
-            self._services['file_organizer'] = FileOrganizer(output_dir)
+            kwargs = {}
+            for key in ('output_mode', 'copy_workers'):
+                value = self.config.get(key) if self.config else None
+                if value:
+                    kwargs[key] = value
+            self._services['file_organizer'] = FileOrganizer(output_dir, **kwargs)
         return self._services['file_organizer']
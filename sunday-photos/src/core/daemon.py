@@ -0,0 +1,514 @@
+"""常驻识别进程（warm daemon）与本地客户端。
+
+背景：
+- 每次运行 run.py 都要经历解释器启动、依赖导入、模型加载、参考照编码重载；
+  周末照片陆续到来、需要多次小批量运行时，这部分固定开销远大于识别本身。
+
+设计：
+- 守护进程常驻内存，保留已加载的人脸后端、FaceRecognizer（参考编码）与
+  forkserver 模板进程（并行识别的 worker 直接从已预热的模板 fork）。
+- 通过本地 socket 接收任务：优先 Unix domain socket（目录权限 0700）；
+  无 AF_UNIX 的平台回退为 127.0.0.1 回环 TCP。两种方式都校验 endpoint 文件中的随机 token。
+- 协议：每条消息一行 JSON（UTF-8）。请求 {"token", "op": "ping"|"run"|"shutdown", ...}；
+  run 期间持续回传 {"event": "log", ...}，最后回传 {"event": "result", ...}。
+- 主线程只负责 accept，每个连接交给独立线程处理：ping/shutdown 随时立即应答；
+  整理任务串行执行（一次只跑一个），后到的 run 请求在线程里等待前一个任务结束（并回传排队提示），
+  所以任务运行期间客户端仍能 ping 通，不会误判守护进程不存在而在同一输出目录上并发运行。
+- 客户端找不到/连不上守护进程时，调用方回退为进程内直接运行（与旧行为一致）。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import secrets
+import socket
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+PROTOCOL_VERSION = 1
+ENDPOINT_FILENAME = "daemon.json"
+SOCKET_FILENAME = "daemon.sock"
+DEFAULT_CONNECT_TIMEOUT = 2.0
+REQUEST_READ_TIMEOUT = 10.0  # 连接建立后读取请求的超时（任务执行与回传不限时）
+
+
+def get_daemon_dir() -> Path:
+    """守护进程 endpoint/socket 所在目录（SUNDAY_PHOTOS_DAEMON_DIR 可覆盖）。"""
+    raw = os.environ.get("SUNDAY_PHOTOS_DAEMON_DIR", "").strip()
+    if raw:
+        return Path(raw).expanduser()
+    return Path.home() / ".sunday_photos" / "daemon"
+
+
+@dataclass(frozen=True)
+class DaemonEndpoint:
+    """endpoint 文件内容：客户端据此连接守护进程。"""
+
+    family: str  # "unix" | "tcp"
+    address: str  # unix: socket 路径；tcp: "127.0.0.1:port"
+    token: str
+    pid: int
+    version: int = PROTOCOL_VERSION
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "family": self.family,
+            "address": self.address,
+            "token": self.token,
+            "pid": self.pid,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DaemonEndpoint":
+        return cls(
+            family=str(data["family"]),
+            address=str(data["address"]),
+            token=str(data["token"]),
+            pid=int(data.get("pid", 0)),
+            version=int(data.get("version", 0)),
+        )
+
+
+def read_endpoint(daemon_dir: Optional[Path] = None) -> Optional[DaemonEndpoint]:
+    """读取 endpoint 文件；不存在/损坏/协议版本不符时返回 None。"""
+    path = Path(daemon_dir or get_daemon_dir()) / ENDPOINT_FILENAME
+    try:
+        endpoint = DaemonEndpoint.from_dict(json.loads(path.read_text(encoding="utf-8")))
+    except Exception:
+        return None
+    if endpoint.version != PROTOCOL_VERSION:
+        return None
+    return endpoint
+
+
+def _json_safe(value: Any) -> Any:
+    """把 stats 等结果转换为可 JSON 序列化的结构（set→排序列表，datetime→ISO 字符串）。"""
+    if isinstance(value, dict):
+        return {str(k): _json_safe(v) for k, v in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return sorted(_json_safe(v) for v in value)
+    if isinstance(value, (list, tuple)):
+        return [_json_safe(v) for v in value]
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Path):
+        return str(value)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _send(conn: socket.socket, message: Dict[str, Any]) -> None:
+    conn.sendall((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _iter_messages(conn: socket.socket) -> Iterator[Dict[str, Any]]:
+    """按行读取 JSON 消息，直到对端关闭连接。"""
+    buf = b""
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            return
+        buf += chunk
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            if line.strip():
+                yield json.loads(line.decode("utf-8"))
+
+
+def _connect(endpoint: DaemonEndpoint, timeout: Optional[float]) -> socket.socket:
+    if endpoint.family == "unix":
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(timeout)
+        conn.connect(endpoint.address)
+    else:
+        host, port = endpoint.address.rsplit(":", 1)
+        conn = socket.create_connection((host, int(port)), timeout=timeout)
+    return conn
+
+
+class _EventLogHandler(logging.Handler):
+    """把任务期间的日志记录转发给客户端（发送失败时静默丢弃）。"""
+
+    def __init__(self, emit_event: Callable[[Dict[str, Any]], None]) -> None:
+        super().__init__(level=logging.INFO)
+        self._emit_event = emit_event
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self._emit_event({"event": "log", "level": record.levelname, "text": record.getMessage()})
+        except Exception:
+            pass
+
+
+@dataclass
+class _WarmState:
+    """按 (input_dir, log_dir) 缓存的已加载组件。"""
+
+    student_manager: Any
+    face_recognizer: Any
+
+
+class RecognitionDaemon:
+    """常驻识别进程：并发应答连接，串行执行本地客户端提交的整理任务。"""
+
+    def __init__(self, daemon_dir: Optional[Path] = None, idle_timeout: float = 0.0) -> None:
+        self.daemon_dir = Path(daemon_dir or get_daemon_dir())
+        self.idle_timeout = float(idle_timeout or 0.0)
+        self._token = secrets.token_hex(16)
+        self._server: Optional[socket.socket] = None
+        self._endpoint: Optional[DaemonEndpoint] = None
+        self._warm: Dict[tuple, _WarmState] = {}
+        self._stop = threading.Event()
+        self._job_lock = threading.Lock()  # 整理任务串行执行
+        self._handlers: set = set()  # 正在处理连接的线程
+        self._handlers_lock = threading.Lock()
+        self.jobs_served = 0
+
+    # ---- lifecycle ----
+
+    def start(self) -> DaemonEndpoint:
+        """创建监听 socket 并写入 endpoint 文件；已有存活守护进程时抛 RuntimeError。"""
+        if DaemonClient.connect(self.daemon_dir) is not None:
+            raise RuntimeError(f"已有守护进程在运行（{self.daemon_dir}）")
+
+        self.daemon_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            os.chmod(self.daemon_dir, 0o700)
+        except OSError:
+            pass
+
+        if hasattr(socket, "AF_UNIX"):
+            sock_path = self.daemon_dir / SOCKET_FILENAME
+            try:
+                sock_path.unlink()
+            except FileNotFoundError:
+                pass
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            server.bind(str(sock_path))
+            try:
+                os.chmod(sock_path, 0o600)
+            except OSError:
+                pass
+            endpoint = DaemonEndpoint("unix", str(sock_path), self._token, os.getpid())
+        else:  # pragma: no cover - 仅无 AF_UNIX 的平台
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.bind(("127.0.0.1", 0))
+            port = server.getsockname()[1]
+            endpoint = DaemonEndpoint("tcp", f"127.0.0.1:{port}", self._token, os.getpid())
+        server.listen(8)
+
+        endpoint_path = self.daemon_dir / ENDPOINT_FILENAME
+        tmp = endpoint_path.with_suffix(".tmp")
+        fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(endpoint.to_dict(), f)
+        os.replace(tmp, endpoint_path)
+
+        self._server = server
+        self._endpoint = endpoint
+        logger.info("守护进程已启动: %s %s (pid=%s)", endpoint.family, endpoint.address, endpoint.pid)
+        return endpoint
+
+    def close(self) -> None:
+        """关闭监听并清理 endpoint/socket 文件（仅清理属于本进程的文件）。"""
+        server, self._server = self._server, None
+        if server is not None:
+            try:
+                server.close()
+            except OSError:
+                pass
+        endpoint = self._endpoint
+        if endpoint is None:
+            return
+        current = read_endpoint(self.daemon_dir)
+        if current is not None and current.token == endpoint.token:
+            try:
+                (self.daemon_dir / ENDPOINT_FILENAME).unlink()
+            except FileNotFoundError:
+                pass
+        if endpoint.family == "unix":
+            try:
+                Path(endpoint.address).unlink()
+            except FileNotFoundError:
+                pass
+
+    def serve_forever(self) -> None:
+        """主循环：接受连接并交给处理线程；收到 shutdown 或空闲超时后退出（等正在运行的任务结束）。"""
+        if self._server is None:
+            self.start()
+        assert self._server is not None
+        self._server.settimeout(1.0)
+        last_activity = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    conn, _addr = self._server.accept()
+                except socket.timeout:
+                    with self._handlers_lock:
+                        busy = bool(self._handlers)
+                    if busy:
+                        last_activity = time.monotonic()
+                    elif self.idle_timeout > 0 and (time.monotonic() - last_activity) >= self.idle_timeout:
+                        logger.info("守护进程空闲超过 %.0fs，自动退出", self.idle_timeout)
+                        break
+                    continue
+                last_activity = time.monotonic()
+                thread = threading.Thread(target=self._serve_connection, args=(conn,), name="daemon-conn", daemon=True)
+                with self._handlers_lock:
+                    self._handlers.add(thread)
+                thread.start()
+        finally:
+            self.close()
+            # 不再接受新连接；排队中的任务会收到“正在退出”，正在运行的任务跑完再退出
+            with self._handlers_lock:
+                handlers = list(self._handlers)
+            for thread in handlers:
+                thread.join()
+
+    def _serve_connection(self, conn: socket.socket) -> None:
+        try:
+            with conn:
+                conn.settimeout(REQUEST_READ_TIMEOUT)
+                self._handle_connection(conn)
+        finally:
+            with self._handlers_lock:
+                self._handlers.discard(threading.current_thread())
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    # ---- request handling ----
+
+    def _handle_connection(self, conn: socket.socket) -> None:
+        alive = {"ok": True}
+
+        def emit(message: Dict[str, Any]) -> None:
+            if not alive["ok"]:
+                return
+            try:
+                _send(conn, message)
+            except OSError:
+                # 客户端中途断开：任务继续跑完（结果照常落盘），只是不再回传
+                alive["ok"] = False
+
+        try:
+            request = next(_iter_messages(conn), None)
+        except (OSError, ValueError) as e:
+            logger.warning("守护进程读取请求失败: %s", e)
+            return
+        if not isinstance(request, dict):
+            return
+        conn.settimeout(None)
+        if not secrets.compare_digest(str(request.get("token", "")), self._token):
+            emit({"event": "error", "message": "token 校验失败"})
+            return
+
+        op = request.get("op")
+        if op == "ping":
+            emit({"event": "pong", "pid": os.getpid(), "jobs_served": self.jobs_served})
+        elif op == "shutdown":
+            emit({"event": "bye"})
+            self.stop()
+        elif op == "run":
+            if not self._job_lock.acquire(blocking=False):
+                emit({"event": "log", "level": "INFO", "text": "常驻进程正在执行其他任务，排队等待..."})
+                self._job_lock.acquire()
+            try:
+                if self._stop.is_set():
+                    emit({"event": "error", "message": "守护进程正在退出，未执行该任务"})
+                    return
+                self._execute_job(request, emit)
+            finally:
+                self._job_lock.release()
+        else:
+            emit({"event": "error", "message": f"未知操作: {op}"})
+
+    def _execute_job(self, request: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]) -> None:
+        started = time.monotonic()
+        try:
+            ok, stats = self._run_job(request, emit)
+            outcome = {
+                "event": "result",
+                "ok": bool(ok),
+                "stats": _json_safe(stats),
+                "elapsed": round(time.monotonic() - started, 3),
+            }
+        except Exception as e:
+            logger.exception("守护进程执行任务失败")
+            outcome = {"event": "error", "message": f"{type(e).__name__}: {e}"}
+        # 先计数再回复：客户端收到结果时 jobs_served 已包含本次任务
+        self.jobs_served += 1
+        emit(outcome)
+
+    def _run_job(self, request: Dict[str, Any], emit: Callable[[Dict[str, Any]], None]):
+        """执行一次整理任务，尽量复用已加载的 StudentManager/FaceRecognizer。"""
+        from .config import DEFAULT_CONFIG
+        from .main import SimplePhotoOrganizer
+
+        input_dir = Path(request["input_dir"])
+        output_dir = Path(request["output_dir"])
+        log_dir = Path(request.get("log_dir") or DEFAULT_CONFIG["log_dir"])
+        key = (str(input_dir), str(log_dir))
+
+        env_overrides = {"SUNDAY_PHOTOS_NO_PARALLEL": "1"} if request.get("no_parallel") else {}
+        saved_env = {name: os.environ.get(name) for name in env_overrides}
+        os.environ.update(env_overrides)
+
+        handler = _EventLogHandler(emit)
+        root = logging.getLogger()
+        try:
+            organizer = SimplePhotoOrganizer(
+                input_dir=input_dir,
+                output_dir=output_dir,
+                log_dir=log_dir,
+                classroom_dir=request.get("classroom_dir"),
+                config_file=request.get("config_file"),
+            )
+            # 注意：SimplePhotoOrganizer 会重置 root logger 的 handler，转发 handler 需在其后挂载
+            root.addHandler(handler)
+
+            warm = self._warm.get(key)
+            if warm is not None:
+                # 复用已加载的后端与参考编码：只增量刷新名册与参考照（未变化的参考照直接命中缓存）
+                warm.student_manager.load_students()
+                warm.face_recognizer.load_student_encodings()
+                organizer.student_manager = warm.student_manager
+                organizer.face_recognizer = warm.face_recognizer
+                emit({"event": "log", "level": "INFO", "text": "复用常驻进程中已加载的模型与参考照编码"})
+
+            if not organizer.initialize():
+                self._warm.pop(key, None)
+                return False, {}
+
+            fr = organizer.face_recognizer
+            cfg = organizer._get_config_loader()
+            try:
+                # 复用的识别器会保留上一任务的阈值：每个任务先从配置重新读取，再应用请求覆盖
+                fr.tolerance = float(cfg.get_tolerance())
+                fr.min_face_size = int(cfg.get_min_face_size())
+                fr.resize_long_edge = int(cfg.get_resize_long_edge())
+            except Exception:
+                pass
+            if request.get("tolerance") is not None:
+                fr.tolerance = float(request["tolerance"])
+
+            self._warm[key] = _WarmState(organizer.student_manager, fr)
+            ok = organizer.run()
+            return ok, organizer.stats
+        finally:
+            root.removeHandler(handler)
+            for h in root.handlers:
+                if isinstance(h, logging.FileHandler):
+                    h.close()
+            for name, value in saved_env.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+
+class DaemonClient:
+    """守护进程客户端（供 run.py 使用）。"""
+
+    def __init__(self, endpoint: DaemonEndpoint) -> None:
+        self.endpoint = endpoint
+
+    @classmethod
+    def connect(cls, daemon_dir: Optional[Path] = None, timeout: float = DEFAULT_CONNECT_TIMEOUT) -> Optional["DaemonClient"]:
+        """找到并 ping 通守护进程时返回客户端，否则返回 None（调用方回退为进程内运行）。"""
+        endpoint = read_endpoint(daemon_dir)
+        if endpoint is None:
+            return None
+        client = cls(endpoint)
+        try:
+            reply = client._request({"op": "ping"}, timeout=timeout)
+        except (OSError, ValueError):
+            return None
+        if not reply or reply[-1].get("event") != "pong":
+            return None
+        return client
+
+    def _request(self, payload: Dict[str, Any], timeout: Optional[float] = None, on_event=None) -> list:
+        message = dict(payload)
+        message["token"] = self.endpoint.token
+        events = []
+        with _connect(self.endpoint, timeout) as conn:
+            _send(conn, message)
+            for event in _iter_messages(conn):
+                events.append(event)
+                if on_event is not None:
+                    on_event(event)
+                if event.get("event") in ("pong", "bye", "result", "error"):
+                    break
+        return events
+
+    def run_job(
+        self,
+        input_dir,
+        output_dir,
+        *,
+        log_dir=None,
+        classroom_dir=None,
+        tolerance: Optional[float] = None,
+        no_parallel: bool = False,
+        config_file=None,
+        on_event: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
+        """提交整理任务并阻塞等待结果；返回最后一条 result/error 事件。"""
+        payload: Dict[str, Any] = {
+            "op": "run",
+            # 守护进程的工作目录与客户端不同：路径一律在客户端转为绝对路径
+            "input_dir": str(Path(input_dir).resolve()),
+            "output_dir": str(Path(output_dir).resolve()),
+            "tolerance": tolerance,
+            "no_parallel": bool(no_parallel),
+        }
+        if log_dir is not None:
+            payload["log_dir"] = str(Path(log_dir).resolve())
+        if classroom_dir is not None:
+            payload["classroom_dir"] = str(Path(classroom_dir).resolve())
+        if config_file is not None:
+            payload["config_file"] = str(Path(config_file).resolve())
+        events = self._request(payload, timeout=None, on_event=on_event)
+        if not events or events[-1].get("event") not in ("result", "error"):
+            return {"event": "error", "message": "守护进程连接中断"}
+        return events[-1]
+
+    def shutdown(self) -> bool:
+        try:
+            events = self._request({"op": "shutdown"}, timeout=DEFAULT_CONNECT_TIMEOUT)
+        except OSError:
+            return False
+        return bool(events) and events[-1].get("event") == "bye"
+
+
+def serve(daemon_dir: Optional[Path] = None) -> int:
+    """前台运行守护进程（run.py --daemon 调用）。"""
+    idle_raw = os.environ.get("SUNDAY_PHOTOS_DAEMON_IDLE_TIMEOUT", "").strip()
+    try:
+        idle_timeout = max(0.0, float(idle_raw)) if idle_raw else 0.0
+    except ValueError:
+        idle_timeout = 0.0
+    daemon = RecognitionDaemon(daemon_dir, idle_timeout=idle_timeout)
+    try:
+        endpoint = daemon.start()
+    except RuntimeError as e:
+        print(str(e), file=sys.stderr)
+        return 1
+    print(f"守护进程已就绪: {endpoint.address} (pid={endpoint.pid})，Ctrl+C 退出", flush=True)
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,114 @@
+"""未知人脸特征的磁盘暂存（有界内存模式，见 config.DEFAULT_BOUNDED_MEMORY）。
+
+问题：一次重跑一整年的照片时，每张 unknown 照片的人脸特征（每张脸 512 维）都留在内存里，
+直到识别结束、聚类完成，内存随照片数线性增长。
+
+做法：UnknownEmbeddingSpill 把特征按 float32 逐行追加写入 output/.state/ 下的临时文件，
+内存中只保留“照片 → 行区间”；读取时以 np.memmap 只读映射，聚类按需换页。
+对外是只读 Mapping {photo_path: [encoding, ...]}，可直接替代 unknown_encodings_map。
+
+临时文件在 close() 时删除；进程被强杀留下的旧文件在下次创建时清理。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import tempfile
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SPILL_PREFIX = "unknown_embeddings_"
+SPILL_SUFFIX = ".f32"
+
+
+class UnknownEmbeddingSpill(Mapping):
+    """{photo_path: [encoding, ...]}，特征存放在磁盘上的 float32 文件中。"""
+
+    def __init__(self, directory: Path) -> None:
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        for stale in directory.glob(f"{SPILL_PREFIX}*{SPILL_SUFFIX}"):
+            try:
+                stale.unlink()
+            except OSError:
+                pass
+        fd, name = tempfile.mkstemp(prefix=SPILL_PREFIX, suffix=SPILL_SUFFIX, dir=str(directory))
+        self.path = Path(name)
+        self._file = os.fdopen(fd, "wb")
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._rows = 0
+        self._mmap: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+
+    def __enter__(self) -> "UnknownEmbeddingSpill":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def add(self, photo_path: str, encodings: Iterable[Any]) -> None:
+        """追加一张照片的人脸特征；维度与第一条不一致的特征跳过（与聚类器口径一致）。"""
+        if self._file is None:
+            raise ValueError("UnknownEmbeddingSpill 已关闭")
+        vectors = []
+        for encoding in encodings or ():
+            try:
+                vector = np.asarray(encoding, dtype=np.float32).ravel()
+            except Exception:
+                continue
+            if self.dim is None and vector.size:
+                self.dim = int(vector.shape[0])
+            if not vector.size or vector.shape[0] != self.dim:
+                logger.debug(f"跳过维度不一致的人脸编码: {vector.shape[0]} ({photo_path})")
+                continue
+            vectors.append(vector)
+        if not vectors:
+            return
+        self._file.write(np.stack(vectors).tobytes())
+        self._index[str(photo_path)] = (self._rows, len(vectors))
+        self._rows += len(vectors)
+
+    def _matrix(self) -> np.ndarray:
+        if self._mmap is None or self._mmap.shape[0] != self._rows:
+            if self._file is not None:
+                self._file.flush()
+            self._mmap = None
+            if not self._rows:
+                return np.zeros((0, self.dim or 0), dtype=np.float32)
+            self._mmap = np.memmap(self.path, dtype=np.float32, mode="r", shape=(self._rows, self.dim))
+        return self._mmap
+
+    def __getitem__(self, photo_path: str) -> List[np.ndarray]:
+        start, count = self._index[photo_path]
+        matrix = self._matrix()
+        return [matrix[row] for row in range(start, start + count)]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def face_count(self) -> int:
+        return self._rows
+
+    def close(self) -> None:
+        """删除临时文件（应在聚类完成后调用）。"""
+        self._mmap = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # Windows 上仍有映射时无法删除，下次创建时再清理
+            logger.debug(f"删除未知人脸特征暂存文件失败: {e}")
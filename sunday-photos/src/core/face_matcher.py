@@ -0,0 +1,157 @@
+"""已知学生编码的向量化匹配（矩阵版 compare_faces + face_distance）。
+
+说明：
+- 参考编码在构建时一次性整理成连续的 float32 矩阵（余弦度量下预先单位化），
+  一张照片内所有人脸与全部参考编码的距离由一次矩阵乘法得到；
+- 维度不一致的参考编码（例如旧的 128 维 dlib 缓存混入 512 维 InsightFace）视为最大距离，永不匹配；
+- 语义与逐脸 compare_faces/face_distance 一致：取全局最小距离，且 <= tolerance 才算匹配。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 维度不一致/无可比对参考时使用的距离（余弦距离上界）
+MAX_DISTANCE = 2.0
+
+_METRICS = ("cosine", "euclidean")
+
+
+@dataclass(frozen=True)
+class FaceMatch:
+    """单张人脸的匹配结果：name 为 None 表示未匹配到已知学生。"""
+
+    name: Optional[str]
+    distance: float
+
+
+class KnownFaceMatcher:
+    """把 known_encodings/known_names 预处理为矩阵，批量计算距离与最佳匹配。
+
+    - metric="cosine"：InsightFace（ArcFace embedding）
+    - metric="euclidean"：dlib/face_recognition（与 face_recognition.face_distance 一致）
+    """
+
+    def __init__(self, known_encodings: Sequence[Any], known_names: Sequence[str], metric: str = "cosine") -> None:
+        if metric not in _METRICS:
+            raise ValueError(f"不支持的距离度量: {metric}")
+        self.metric = metric
+        # 保留原始引用：调用方可据此判断 known_* 是否被整体替换、需要重建
+        self.known_encodings = known_encodings
+        self.known_names = known_names
+
+        count = min(len(known_encodings), len(known_names))
+        self._init_names(known_names, count)
+
+        # dim -> (参考编码行号, 矩阵, 平方范数[仅欧氏距离])
+        self._groups: Dict[int, Tuple[np.ndarray, np.ndarray, Optional[np.ndarray]]] = {}
+        rows_by_dim: Dict[int, List[int]] = {}
+        vectors: List[np.ndarray] = []
+        for i in range(count):
+            v = np.asarray(known_encodings[i], dtype=np.float32).reshape(-1)
+            vectors.append(v)
+            rows_by_dim.setdefault(int(v.shape[0]), []).append(i)
+
+        for dim, rows in rows_by_dim.items():
+            mat = np.ascontiguousarray(np.stack([vectors[i] for i in rows]), dtype=np.float32)
+            if metric == "cosine":
+                mat /= np.linalg.norm(mat, axis=1, keepdims=True) + 1e-12
+            self._add_group(dim, np.asarray(rows, dtype=np.intp), mat)
+
+    @classmethod
+    def from_packed(cls, matrix: np.ndarray, known_names: Sequence[str], metric: str = "cosine") -> "KnownFaceMatcher":
+        """用 packed_matrix() 导出的矩阵直接构建，不复制数据（可传入共享内存上的只读视图）。"""
+        if metric not in _METRICS:
+            raise ValueError(f"不支持的距离度量: {metric}")
+        if matrix.ndim != 2 or matrix.shape[0] != len(known_names):
+            raise ValueError(f"参考矩阵与姓名数量不一致: {matrix.shape} vs {len(known_names)}")
+        self = cls.__new__(cls)
+        self.metric = metric
+        self.known_encodings = matrix
+        self.known_names = known_names
+        self._init_names(known_names, int(matrix.shape[0]))
+        self._groups = {}
+        if self.size:
+            self._add_group(int(matrix.shape[1]), np.arange(self.size, dtype=np.intp), matrix)
+        return self
+
+    def packed_matrix(self) -> Optional[np.ndarray]:
+        """返回预处理后的 (参考编码数, 维度) float32 矩阵，行顺序与 known_encodings 一致。
+
+        参考编码维度不一致（无法合成单个矩阵）时返回 None。
+        """
+        if len(self._groups) != 1:
+            return None
+        _rows, mat, _sq_norms = next(iter(self._groups.values()))
+        return mat
+
+    def _init_names(self, known_names: Sequence[str], count: int) -> None:
+        names = [str(n) for n in list(known_names)[:count]]
+        self.student_names: List[str] = sorted(set(names))
+        index_of = {n: i for i, n in enumerate(self.student_names)}
+        self.name_index = np.asarray([index_of[n] for n in names], dtype=np.int32)
+        self.size = count
+
+        # 按学生分段，便于 reduceat 求“每名学生的最小距离”
+        self._student_order = np.argsort(self.name_index, kind="stable")
+        if count:
+            sorted_index = self.name_index[self._student_order]
+            self._student_starts = np.flatnonzero(np.r_[True, sorted_index[1:] != sorted_index[:-1]])
+        else:
+            self._student_starts = np.zeros(0, dtype=np.intp)
+
+    def _add_group(self, dim: int, rows: np.ndarray, mat: np.ndarray) -> None:
+        sq_norms = np.einsum("ij,ij->i", mat, mat) if self.metric == "euclidean" else None
+        self._groups[dim] = (rows, mat, sq_norms)
+
+    def distances(self, face_encodings: Sequence[Any]) -> np.ndarray:
+        """返回 (人脸数, 参考编码数) 的距离矩阵，列顺序与 known_encodings 一致。"""
+        faces = [np.asarray(f, dtype=np.float32).reshape(-1) for f in face_encodings]
+        out = np.full((len(faces), self.size), MAX_DISTANCE, dtype=np.float32)
+        if not faces or not self.size:
+            return out
+
+        face_rows_by_dim: Dict[int, List[int]] = {}
+        for i, f in enumerate(faces):
+            face_rows_by_dim.setdefault(int(f.shape[0]), []).append(i)
+
+        for dim, face_rows in face_rows_by_dim.items():
+            group = self._groups.get(dim)
+            if group is None:
+                continue
+            ref_rows, mat, sq_norms = group
+            q = np.stack([faces[i] for i in face_rows])
+            if self.metric == "cosine":
+                q /= np.linalg.norm(q, axis=1, keepdims=True) + 1e-12
+                d = 1.0 - q @ mat.T
+            else:
+                d2 = np.einsum("ij,ij->i", q, q)[:, None] + sq_norms[None, :] - 2.0 * (q @ mat.T)
+                d = np.sqrt(np.maximum(d2, 0.0))
+            out[np.ix_(face_rows, ref_rows)] = d
+        return out
+
+    def student_distances(self, face_encodings: Sequence[Any]) -> np.ndarray:
+        """返回 (人脸数, 学生数) 的矩阵：每张人脸到每名学生所有参考编码的最小距离。"""
+        d = self.distances(face_encodings)
+        if d.shape[0] == 0 or not self.size:
+            return np.full((d.shape[0], len(self.student_names)), MAX_DISTANCE, dtype=np.float32)
+        return np.minimum.reduceat(d[:, self._student_order], self._student_starts, axis=1)
+
+    def match(self, face_encodings: Sequence[Any], tolerance: float) -> List[FaceMatch]:
+        """逐脸给出最佳匹配（全局最小距离 <= tolerance 才算匹配）。"""
+        d = self.distances(face_encodings)
+        if d.shape[0] == 0:
+            return []
+        if not self.size:
+            return [FaceMatch(name=None, distance=MAX_DISTANCE) for _ in range(d.shape[0])]
+        best = np.argmin(d, axis=1)
+        best_d = d[np.arange(d.shape[0]), best]
+        tol = float(tolerance)
+        out: List[FaceMatch] = []
+        for idx, dist in zip(best.tolist(), best_d.tolist()):
+            name = str(self.known_names[idx]) if dist <= tol else None
+            out.append(FaceMatch(name=name, distance=float(dist)))
+        return out
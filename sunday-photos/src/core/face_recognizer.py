@@ -12,9 +12,12 @@ import io
 import numpy as np
 import hashlib
 import json
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any
-from .config import DEFAULT_TOLERANCE, MIN_FACE_SIZE
+from .config import DEFAULT_TOLERANCE, MIN_FACE_SIZE, RESIZE_LONG_EDGE
+from .face_matcher import FaceMatch, KnownFaceMatcher
+from .utils.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
@@ -92,6 +95,90 @@ def _normalize(v: np.ndarray) -> np.ndarray:
     return v / n
 
 
+@dataclass
+class FaceAnalysisResult:
+    """一次推理得到的人脸分析结果（analyze() 的返回值）。
+
+    - locations/encodings/det_scores/landmarks 按下标对齐，只包含通过 min_face_size 过滤的人脸
+    - detected_count：过滤前检测到的人脸数（用于区分“无人脸”与“人脸过小”）
+    - det_scores/landmarks 在后端不提供时为 None
+    """
+
+    locations: list = field(default_factory=list)
+    encodings: list = field(default_factory=list)
+    det_scores: list = field(default_factory=list)
+    landmarks: list = field(default_factory=list)
+    detected_count: int = 0
+
+
+def _is_sizeable_location(location, min_face_size: int) -> bool:
+    top, right, bottom, left = location
+    return (bottom - top) >= min_face_size and (right - left) >= min_face_size
+
+
+def _scale_location(location, scale: float = 1.0):
+    """把 (top, right, bottom, left) 从缩小图坐标换算回原图坐标。"""
+    if scale == 1.0:
+        return location
+    return tuple(int(round(v * scale)) for v in location)
+
+
+def _bbox_to_location(bbox, scale: float = 1.0):
+    x1, y1, x2, y2 = bbox
+    return (
+        int(round(y1 * scale)),
+        int(round(x2 * scale)),
+        int(round(y2 * scale)),
+        int(round(x1 * scale)),
+    )
+
+
+def _analyze_with_legacy_api(api, image, min_face_size: int = 0, scale: float = 1.0) -> FaceAnalysisResult:
+    """用旧的两段式接口（face_locations + face_encodings）组合出 analyze() 结果。"""
+    locations = list(api.face_locations(image) or [])
+    # 尺寸过滤与返回值都使用原图坐标；传给 face_encodings 的仍是当前图像上的坐标
+    kept = [
+        (loc, _scale_location(loc, scale))
+        for loc in locations
+        if _is_sizeable_location(_scale_location(loc, scale), int(min_face_size))
+    ]
+    encodings = list(api.face_encodings(image, [loc for loc, _ in kept]) or []) if kept else []
+    return FaceAnalysisResult(
+        locations=[orig for _, orig in kept],
+        encodings=encodings,
+        det_scores=[None] * len(kept),
+        landmarks=[None] * len(kept),
+        detected_count=len(locations),
+    )
+
+
+def _load_rgb_image(image_path: str, resize_long_edge: int = 0, data: bytes | None = None) -> tuple[np.ndarray, float]:
+    """读取图片为 RGB ndarray 并按 EXIF 转正；可选在解码阶段把长边缩小到 resize_long_edge。
+
+    返回 (image, scale)：scale = 原图长边 / 返回图长边（未缩小时为 1.0），
+    缩小图上的坐标乘以 scale 即为原图坐标。
+
+    说明：
+    - JPEG 经 draft() 在 DCT 域按 1/2、1/4、1/8 直接缩小解码，不会生成全尺寸中间数组；
+    - EXIF 转正放在缩小之后做，只拷贝小图；
+    - data 为已预读的文件字节（见 prefetch）时从内存解码，不再按路径读文件。
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data) if data is not None else image_path) as im:
+        full_long_edge = max(im.size)
+        limit = int(resize_long_edge or 0)
+        if limit > 0 and full_long_edge > limit:
+            # thumbnail 内部先 draft() 再按 reducing_gap 缩放，保持宽高比且原地修改
+            im.thumbnail((limit, limit))
+        scaled_long_edge = max(im.size)
+        im = ImageOps.exif_transpose(im)
+        im = im.convert("RGB")
+        image = np.asarray(im)
+    scale = float(full_long_edge) / float(scaled_long_edge) if scaled_long_edge else 1.0
+    return image, scale
+
+
 def _is_frozen_runtime() -> bool:
     try:
         return bool(getattr(sys, "frozen", False))
@@ -182,6 +269,23 @@ def _maybe_set_bundled_insightface_home(model_name: str) -> None:
         return
 
 
+def _ort_session_options_from_env():
+    """SUNDAY_PHOTOS_ORT_INTRA_THREADS=N 时返回限制线程数的 SessionOptions，否则 None（使用默认）。"""
+    raw = os.environ.get("SUNDAY_PHOTOS_ORT_INTRA_THREADS", "").strip()
+    if not raw:
+        return None
+    try:
+        threads = max(1, int(raw))
+        import onnxruntime as ort  # type: ignore
+
+        opts = ort.SessionOptions()
+        opts.intra_op_num_threads = threads
+        opts.inter_op_num_threads = 1
+        return opts
+    except Exception:
+        return None
+
+
 class _InsightFaceCompat:
     """A minimal face_recognition-like API backed by InsightFace.
 
@@ -242,11 +346,7 @@ class _InsightFaceCompat:
                 # 重定向底层文件描述符到 /dev/null
                 os.dup2(devnull_fd, 1)
                 os.dup2(devnull_fd, 2)
-                if model_root is None:
-                    app = FaceAnalysis(name=model_name, providers=["CPUExecutionProvider"])
-                else:
-                    app = FaceAnalysis(name=model_name, root=model_root, providers=["CPUExecutionProvider"])
-                app.prepare(ctx_id=-1, det_size=(640, 640))
+                app = self._create_app(model_name, model_root)
             finally:
                 # 恢复原始文件描述符
                 os.dup2(old_stdout_fd, 1)
@@ -258,26 +358,35 @@ class _InsightFaceCompat:
                 sys.stdout.flush()
                 sys.stderr.flush()
         else:
-            if model_root is None:
-                app = FaceAnalysis(name=model_name, providers=["CPUExecutionProvider"])
-            else:
-                app = FaceAnalysis(name=model_name, root=model_root, providers=["CPUExecutionProvider"])
-            app.prepare(ctx_id=-1, det_size=(640, 640))
+            app = self._create_app(model_name, model_root)
         self._app = app
         return app
 
+    @staticmethod
+    def _create_app(model_name: str, model_root: str | None):
+        # 只加载检测 + 识别模型：landmark/genderage 等模型对本项目无用，却会让每张人脸多跑几次推理。
+        kwargs: dict = {"name": model_name, "providers": ["CPUExecutionProvider"]}
+        if model_root is not None:
+            kwargs["root"] = model_root
+        sess_options = _ort_session_options_from_env()
+        if sess_options is not None:
+            kwargs["sess_options"] = sess_options
+        try:
+            app = FaceAnalysis(allowed_modules=["detection", "recognition"], **kwargs)
+        except TypeError:
+            # 兼容不支持 allowed_modules/sess_options 的旧版本
+            kwargs.pop("sess_options", None)
+            app = FaceAnalysis(**kwargs)
+        app.prepare(ctx_id=-1, det_size=(640, 640))
+        return app
+
     def load_image_file(self, image_path: str):
         # Keep behavior consistent: return RGB ndarray
-        try:
-            from PIL import Image, ImageOps
+        return _load_rgb_image(image_path)[0]
 
-            with Image.open(image_path) as im:
-                im = ImageOps.exif_transpose(im)
-                im = im.convert("RGB")
-                return np.asarray(im)
-        except Exception as e:
-            # Mirror previous behavior: bubble up for caller to handle
-            raise
+    def load_image_scaled(self, image_path: str, resize_long_edge: int = 0, data: bytes | None = None):
+        """返回 (image, scale)，见 _load_rgb_image。"""
+        return _load_rgb_image(image_path, resize_long_edge, data)
 
     def _detect(self, image_rgb: np.ndarray):
         app = self._get_app()
@@ -299,6 +408,73 @@ class _InsightFaceCompat:
             raise
         return faces
 
+    def analyze(self, image, min_face_size: int = 0, scale: float = 1.0) -> FaceAnalysisResult:
+        """单次推理完成检测与特征提取。
+
+        与 face_locations + face_encodings 的区别：
+        - 检测只跑一次，不需要再按 bbox 反查人脸；
+        - 先按 min_face_size 过滤，再只对保留的人脸运行识别模型。
+
+        scale：image 相对原图的缩小倍数（见 load_image_scaled）。返回的 locations/landmarks
+        均为原图坐标，min_face_size 也按原图像素判断。
+        """
+        image_rgb = np.asarray(image)
+        app = self._get_app()
+        det_model = getattr(app, "det_model", None)
+        rec_model = (getattr(app, "models", None) or {}).get("recognition")
+        if det_model is None or rec_model is None:
+            # 非标准 FaceAnalysis：退回 app.get()（仍只推理一次）
+            return self._analyze_faces(self._detect(image_rgb), min_face_size, scale)
+
+        from insightface.app.common import Face  # type: ignore
+
+        image_bgr = image_rgb[:, :, ::-1]
+        try:
+            bboxes, kpss = det_model.detect(image_bgr, max_num=0, metric="default")
+        except Exception as e:
+            try:
+                logger.exception(
+                    "[INSIGHTFACE][DETECT] failed: exc=%s image_dtype=%s image_shape=%s",
+                    type(e).__name__,
+                    getattr(image_bgr, "dtype", "?"),
+                    getattr(image_bgr, "shape", "?"),
+                )
+            except Exception:
+                pass
+            raise
+
+        result = FaceAnalysisResult(detected_count=int(bboxes.shape[0]))
+        for i in range(bboxes.shape[0]):
+            loc = _bbox_to_location(bboxes[i, 0:4], scale)
+            if not _is_sizeable_location(loc, int(min_face_size)):
+                continue
+            kps = kpss[i] if kpss is not None else None
+            face = Face(bbox=bboxes[i, 0:4], kps=kps, det_score=bboxes[i, 4])
+            rec_model.get(image_bgr, face)
+            result.locations.append(loc)
+            result.encodings.append(_normalize(face.embedding))
+            result.det_scores.append(float(bboxes[i, 4]))
+            result.landmarks.append(kps * scale if (kps is not None and scale != 1.0) else kps)
+        return result
+
+    @staticmethod
+    def _analyze_faces(faces, min_face_size: int, scale: float = 1.0) -> FaceAnalysisResult:
+        result = FaceAnalysisResult(detected_count=len(faces))
+        for f in faces:
+            try:
+                loc = _bbox_to_location(f.bbox, scale)
+                if not _is_sizeable_location(loc, int(min_face_size)):
+                    continue
+                enc = _normalize(f.embedding)
+            except Exception:
+                continue
+            kps = getattr(f, "kps", None)
+            result.locations.append(loc)
+            result.encodings.append(enc)
+            result.det_scores.append(float(getattr(f, "det_score", 0.0) or 0.0))
+            result.landmarks.append(kps * scale if (kps is not None and scale != 1.0) else kps)
+        return result
+
     def face_locations(self, image, *args, **kwargs):
         faces = self._detect(np.asarray(image))
         locs = []
@@ -352,17 +528,11 @@ class _InsightFaceCompat:
     def face_distance(self, known_encodings, face_encoding):
         if known_encodings is None:
             return np.asarray([], dtype=np.float32)
-        fe = np.asarray(face_encoding, dtype=np.float32).reshape(-1)
-        out = []
-        for ke in known_encodings:
-            ke_arr = np.asarray(ke, dtype=np.float32).reshape(-1)
-            # 兼容旧缓存（dlib/face_recognition 常见为 128 维；InsightFace 常见为 512 维）。
-            # 维度不一致时，返回最大距离，避免崩溃并确保不会误匹配。
-            if ke_arr.shape != fe.shape:
-                out.append(2.0)
-                continue
-            out.append(_cosine_distance(ke_arr, fe))
-        return np.asarray(out, dtype=np.float32)
+        # 兼容旧缓存（dlib/face_recognition 常见为 128 维；InsightFace 常见为 512 维）：
+        # 维度不一致时由 KnownFaceMatcher 返回最大距离，避免崩溃并确保不会误匹配。
+        known = list(known_encodings)
+        matcher = KnownFaceMatcher(known, [""] * len(known), metric="cosine")
+        return matcher.distances([face_encoding])[0]
 
     def compare_faces(self, known_encodings, face_encoding, tolerance=0.6):
         d = self.face_distance(known_encodings, face_encoding)
@@ -384,16 +554,15 @@ class _DlibFaceRecognitionCompat:
 
     def load_image_file(self, image_path: str):
         # 统一行为：返回 RGB ndarray，并处理 EXIF 方向
-        try:
-            from PIL import Image, ImageOps
+        return self.load_image_scaled(image_path)[0]
 
-            with Image.open(image_path) as im:
-                im = ImageOps.exif_transpose(im)
-                im = im.convert("RGB")
-                return np.asarray(im)
+    def load_image_scaled(self, image_path: str, resize_long_edge: int = 0, data: bytes | None = None):
+        """返回 (image, scale)，见 _load_rgb_image。"""
+        try:
+            return _load_rgb_image(image_path, resize_long_edge, data)
         except Exception:
-            # 回退到 face_recognition 自带实现
-            return self._fr.load_image_file(image_path)
+            # 回退到 face_recognition 自带实现（不缩小）
+            return self._fr.load_image_file(io.BytesIO(data) if data is not None else image_path), 1.0
 
     def face_locations(self, image, number_of_times_to_upsample=0, model="hog"):
         try:
@@ -406,6 +575,10 @@ class _DlibFaceRecognitionCompat:
             # 兼容旧签名
             return self._fr.face_locations(image)
 
+    def analyze(self, image, min_face_size: int = 0, scale: float = 1.0) -> FaceAnalysisResult:
+        # dlib 的检测与编码本身就是两个独立模型；这里只统一接口，并保证过小人脸不做编码。
+        return _analyze_with_legacy_api(self, image, min_face_size, scale)
+
     def face_encodings(self, image, face_locations=None, *args, **kwargs):
         try:
             return self._fr.face_encodings(image, known_face_locations=face_locations)
@@ -431,6 +604,11 @@ def _get_backend_embedding_dim(engine: str) -> int:
     return 512 if engine == "insightface" else 128
 
 
+def _get_backend_distance_metric(engine: str) -> str:
+    # InsightFace 使用余弦距离；dlib/face_recognition 使用欧氏距离（与其 face_distance 一致）。
+    return "cosine" if engine == "insightface" else "euclidean"
+
+
 _FACE_BACKEND_INIT_ERROR: Exception | None = None
 _FACE_BACKEND_SINGLETON: Any | None = None
 
@@ -480,10 +658,116 @@ class _LazyFaceBackend:
         backend = self._ensure()
         return getattr(backend, item)
 
+    def load_image_scaled(self, image_path: str, resize_long_edge: int = 0, data: bytes | None = None):
+        """读取图片并可选按长边缩小，返回 (image, scale)；data 为已预读的文件字节（可选）。"""
+        backend = self._ensure()
+        load_scaled = getattr(backend, "load_image_scaled", None)
+        if callable(load_scaled):
+            return load_scaled(image_path, resize_long_edge=resize_long_edge, **({'data': data} if data is not None else {}))
+        return backend.load_image_file(image_path), 1.0
+
+    def analyze(self, image, min_face_size: int = 0, scale: float = 1.0) -> FaceAnalysisResult:
+        """检测 + 编码一次完成（见 _InsightFaceCompat.analyze）；没有 analyze 的后端按旧的两段式接口组合。"""
+        backend = self._ensure()
+        analyze = getattr(backend, "analyze", None)
+        if callable(analyze):
+            return analyze(image, min_face_size=min_face_size, scale=scale)
+        return _analyze_with_legacy_api(backend, image, min_face_size, scale)
+
 
 # Module-level proxy (keeps old import sites working)
 face_recognition = _LazyFaceBackend()  # type: ignore
 
+
+def _detection_from_analysis(analysis: FaceAnalysisResult) -> dict:
+    """把 analyze() 结果整理为人脸级检测记录（bbox/det_score/embedding）。
+
+    检测记录只取决于图片与检测参数，与 tolerance/参考照无关：识别缓存据此在
+    阈值或名单变化时只重新匹配，而不必重新解码与检测。
+    """
+    det_scores = analysis.det_scores or []
+    faces = []
+    for i, (loc, enc) in enumerate(zip(analysis.locations, analysis.encodings)):
+        score = det_scores[i] if i < len(det_scores) else None
+        faces.append(
+            {
+                "location": [int(v) for v in loc],
+                "det_score": float(score) if score is not None else None,
+                "embedding": enc,
+            }
+        )
+    return {"detected_count": int(analysis.detected_count), "faces": faces}
+
+
+def _analysis_from_detection(detection: dict) -> FaceAnalysisResult:
+    """_detection_from_analysis 的逆过程（用于缓存的人脸特征重新匹配）。"""
+    faces = detection.get("faces") or []
+    return FaceAnalysisResult(
+        locations=[tuple(f["location"]) for f in faces],
+        encodings=[np.asarray(f["embedding"]) for f in faces],
+        det_scores=[f.get("det_score") for f in faces],
+        landmarks=[None] * len(faces),
+        detected_count=int(detection.get("detected_count", len(faces))),
+    )
+
+
+def _details_from_analysis(analysis: FaceAnalysisResult, face_matches: list[FaceMatch] | None) -> dict:
+    """由检测结果与匹配结果生成 recognize_faces(return_details=True) 兼容的 dict。
+
+    face_matches 与 analysis.encodings 按下标对齐；None 表示没有可用的学生编码。
+    结果额外带 detection 字段（人脸级检测记录），供识别缓存持久化。
+    """
+    detection = _detection_from_analysis(analysis)
+    if analysis.detected_count <= 0:
+        return {
+            'status': 'no_faces_detected',
+            'message': '图片中未检测到人脸',
+            'recognized_students': [],
+            'total_faces': 0,
+            'detection': detection,
+        }
+
+    if not analysis.locations:
+        return {
+            'status': 'no_faces_detected',
+            'message': '检测到的人脸尺寸过小，无法识别',
+            'recognized_students': [],
+            'total_faces': 0,
+            'detection': detection,
+        }
+
+    face_encodings = analysis.encodings
+    total_faces = len(face_encodings)
+    if face_matches is None:
+        return {
+            'status': 'no_matches_found',
+            'message': '没有找到任何可用的学生面部编码',
+            'recognized_students': [],
+            'total_faces': total_faces,
+            'unknown_faces': total_faces,
+            'detection': detection,
+        }
+
+    recognized_students = []
+    unknown_encodings = []
+    for face_encoding, face_match in zip(face_encodings, face_matches):
+        if face_match.name is not None:
+            if face_match.name not in recognized_students:
+                recognized_students.append(face_match.name)
+        else:
+            unknown_encodings.append(face_encoding)
+
+    return {
+        'status': 'success' if recognized_students else 'no_matches_found',
+        'message': f'检测到{total_faces}张人脸，识别到{len(recognized_students)}名学生',
+        'recognized_students': recognized_students,
+        'total_faces': total_faces,
+        'unknown_faces': len(unknown_encodings),
+        'unknown_encodings': unknown_encodings,
+        'detection': detection,
+    }
+
+
 def _diag_enabled() -> bool:
     return os.environ.get("SUNDAY_PHOTOS_DIAG_ENV", "").strip().lower() in ("1", "true", "yes")
 
@@ -491,22 +775,26 @@ def _diag_enabled() -> bool:
 class FaceRecognizer:
     """人脸识别器"""
     
-    def __init__(self, student_manager, tolerance=None, min_face_size=None, log_dir=None):
+    def __init__(self, student_manager, tolerance=None, min_face_size=None, log_dir=None, resize_long_edge=None):
         """初始化人脸识别器。
 
         参数：
         - student_manager：学生管理器实例，用于加载学生参考照片与学生名册
         - tolerance：人脸识别阈值（越小越严格），默认取配置 DEFAULT_TOLERANCE
+        - resize_long_edge：课堂照解码时的长边上限（像素），0 表示按原图解码；参考照始终按原图处理
         """
 
         if tolerance is None:
             tolerance = DEFAULT_TOLERANCE
         if min_face_size is None:
             min_face_size = MIN_FACE_SIZE
+        if resize_long_edge is None:
+            resize_long_edge = RESIZE_LONG_EDGE
         self.student_manager = student_manager
         self._log_dir = Path(log_dir) if log_dir else None
         self.tolerance = tolerance
         self.min_face_size = int(min_face_size)
+        self.resize_long_edge = max(0, int(resize_long_edge))
         self.students_encodings = {}
         self.known_student_names = []
         self.known_encodings = []
@@ -515,6 +803,7 @@ class FaceRecognizer:
         self._backend_engine = _get_selected_face_backend_engine()
         self._backend_model = _get_backend_model_name(self._backend_engine)
         self._backend_embedding_dim = _get_backend_embedding_dim(self._backend_engine)
+        self._known_matcher = KnownFaceMatcher([], [], metric=_get_backend_distance_metric(self._backend_engine))
 
         # 参考照增量缓存（提升速度 + 支持增删 diff）
         self._ref_cache_dir = self._resolve_ref_cache_dir()
@@ -547,10 +836,21 @@ class FaceRecognizer:
         dlib/face_recognition 的检测是基于像素数组的；如果不先转正，可能会出现“有脸但检测不到”。
         """
 
-        # 为了可测试性：统一委托给 face_recognition.load_image_file。
-        # InsightFace/Dlib 兼容层内部已处理 EXIF 转正与 RGB 输出。
+        image, _scale = self._load_image_scaled(image_path, 0)
+        return image
+
+    def _load_image_scaled(self, image_path: str, resize_long_edge: int, data: bytes | None = None):
+        """加载图片（EXIF 转正），可选在解码阶段按长边缩小；返回 (image, scale)。
+
+        data 为已预读的文件字节（见 prefetch）时从内存解码。
+        """
+
+        # 统一委托给当前后端的 load_image_scaled：先用 _load_rgb_image（PIL，EXIF 转正 + RGB，可缩小）解码；
+        # 仅 dlib 兼容层在 PIL 解码失败时回退到 face_recognition.load_image_file（按原图，scale=1.0）。
         try:
-            image = face_recognition.load_image_file(image_path)
+            image, scale = face_recognition.load_image_scaled(
+                image_path, resize_long_edge=resize_long_edge, **({'data': data} if data is not None else {})
+            )
         except Exception as e:
             # 给出更可操作的上下文（尤其是打包环境里依赖/解码问题）。
             try:
@@ -588,30 +888,32 @@ class FaceRecognizer:
                 shape = getattr(arr, "shape", None)
                 dtype = getattr(arr, "dtype", None)
                 logger.info(
-                    f"[DIAG] 参考照已读取: {image_path} shape={shape} dtype={dtype} "
+                    f"[DIAG] 图片已读取: {image_path} shape={shape} dtype={dtype} scale={scale:.3f} "
                     f"backend={getattr(self, '_backend_engine', '?')} model={getattr(self, '_backend_model', '?')}"
                 )
             except Exception:
                 # 不让诊断信息影响主流程
                 pass
 
-        return image
+        return image, scale
 
-    def _face_locations_for_reference(self, image):
+    def _face_locations_for_reference(self, image, include_default=True):
         """参考照的人脸检测策略：更偏向“尽量找出来”，允许更慢一点。
 
         参考照数量通常较少；提高参考照编码成功率比节省这几秒更重要。
+        include_default=False 时跳过默认检测（调用方已用 analyze() 做过一次）。
         """
 
         # 1) 默认（hog + upsample=0）
-        try:
-            locs = face_recognition.face_locations(image)
-        except TypeError:
-            # 兼容极老版本签名
-            locs = face_recognition.face_locations(image)
+        if include_default:
+            try:
+                locs = face_recognition.face_locations(image)
+            except TypeError:
+                # 兼容极老版本签名
+                locs = face_recognition.face_locations(image)
 
-        if locs:
-            return locs
+            if locs:
+                return locs
 
         # 2) 放大再找（对小脸/远景更有效）
         try:
@@ -718,6 +1020,28 @@ class FaceRecognizer:
                 encs.append(enc)
         self.known_student_names = names
         self.known_encodings = encs
+        self._rebuild_known_matcher()
+
+    def _rebuild_known_matcher(self) -> None:
+        """把 known_encodings 预处理为矩阵匹配器（每次刷新只构建一次）。"""
+        engine = getattr(self, "_backend_engine", _get_selected_face_backend_engine())
+        self._known_matcher = KnownFaceMatcher(
+            self.known_encodings,
+            self.known_student_names,
+            metric=_get_backend_distance_metric(engine),
+        )
+
+    def _get_known_matcher(self) -> KnownFaceMatcher:
+        """返回与当前 known_encodings/known_student_names 对齐的匹配器（被整体替换时自动重建）。"""
+        matcher = getattr(self, "_known_matcher", None)
+        if (
+            matcher is None
+            or matcher.known_encodings is not self.known_encodings
+            or matcher.known_names is not self.known_student_names
+        ):
+            self._rebuild_known_matcher()
+            matcher = self._known_matcher
+        return matcher
     
     def load_student_encodings(self):
         """加载所有学生的面部编码。
@@ -852,7 +1176,14 @@ class FaceRecognizer:
                             f"[DIAG] 开始参考照检测: student={student_name} photo={photo_path} "
                             f"backend={self._backend_engine} model={self._backend_model}"
                         )
-                    face_locations = self._face_locations_for_reference(image)
+                    # 默认策略：检测 + 编码一次推理完成
+                    analysis = face_recognition.analyze(image)
+                    face_locations = analysis.locations
+                    face_encoding = analysis.encodings[0] if analysis.encodings else None
+
+                    if face_encoding is None:
+                        # 回退：放大/cnn 等更慢的检测策略
+                        face_locations = self._face_locations_for_reference(image, include_default=False)
 
                     if _diag_enabled():
                         try:
@@ -873,7 +1204,8 @@ class FaceRecognizer:
                             del face_locations
                         continue
 
-                    face_encoding = face_recognition.face_encodings(image, face_locations)[0]
+                    if face_encoding is None:
+                        face_encoding = face_recognition.face_encodings(image, face_locations)[0]
 
                     if _diag_enabled():
                         try:
@@ -1013,182 +1345,108 @@ class FaceRecognizer:
         - return_details=False：返回识别到的学生姓名列表（去重）
         - return_details=True：返回包含 status/message/recognized_students 等字段的 dict
         """
-        image = None
-        face_locations = None
-        face_encodings = None
-        
         try:
-            # 不对 0 字节文件做“提前返回”，以便测试可用占位文件 + mock。
-            # 若真实文件不可解码，将由下面的异常处理返回友好错误。
-            try:
-                if os.path.getsize(image_path) <= 0:
-                    logger.warning(f"图片文件为空(0字节)，将尝试读取: {image_path}")
-            except Exception:
-                pass
+            image, scale = self.load_for_recognition(image_path)
+        except Exception as e:
+            return self.recognition_error(image_path, e, return_details)
+        return self.recognize_loaded(image_path, image, scale, return_details)
 
-            # 加载图片（修正 EXIF 方向，减少“有脸但检测不到”）
-            image = self._load_image_with_exif_fix(image_path)
-            
-            # 检测人脸位置
-            face_locations = face_recognition.face_locations(image)
-            
-            if not face_locations:
-                logger.debug(f"在图片中未检测到人脸: {image_path}")
-                # 释放内存
-                if image is not None:
-                    del image
-                if face_locations is not None:
-                    del face_locations
-                
-                if return_details:
-                    return {
-                        'status': 'no_faces_detected',
-                        'message': '图片中未检测到人脸',
-                        'recognized_students': [],
-                        'total_faces': 0
-                    }
-                return []
-            
-            sizeable_locations = []
-            for location in face_locations:
-                top, right, bottom, left = location
-                if (bottom - top) >= self.min_face_size and (right - left) >= self.min_face_size:
-                    sizeable_locations.append(location)
-                else:
-                    logger.debug(
-                        "忽略过小的人脸: 宽度=%s 高度=%s", (right - left), (bottom - top)
-                    )
+    def load_for_recognition(self, image_path, data=None):
+        """识别的解码阶段：返回 (image, scale)，失败时抛出异常。
 
-            if not sizeable_locations:
-                if image is not None:
-                    del image
-                if face_locations is not None:
-                    del face_locations
-                if return_details:
-                    return {
-                        'status': 'no_faces_detected',
-                        'message': '检测到的人脸尺寸过小，无法识别',
-                        'recognized_students': [],
-                        'total_faces': 0
-                    }
-                return []
+        与推理阶段（recognize_loaded）分开，便于在线程中提前解码下一张（见 staged_executor）；
+        data 为已预读的文件字节（见 prefetch）时不再按路径读文件。
+        """
+        # 不对 0 字节文件做“提前返回”，以便测试可用占位文件 + mock。
+        # 若真实文件不可解码，将由调用方的异常处理返回友好错误。
+        try:
+            size = len(data) if data is not None else os.path.getsize(image_path)
+            if size <= 0:
+                logger.warning(f"图片文件为空(0字节)，将尝试读取: {image_path}")
+        except Exception:
+            pass
 
-            # 获取所有可用人脸的编码
-            face_encodings = face_recognition.face_encodings(image, sizeable_locations)
-            face_locations = sizeable_locations
-            
-            if not self.known_encodings:
-                warning_msg = "没有找到任何可用的学生面部编码"
-                logger.warning(warning_msg)
-                if return_details:
-                    total_faces_detected = len(face_encodings)
-                    return {
-                        'status': 'no_matches_found',
-                        'message': warning_msg,
-                        'recognized_students': [],
-                        'total_faces': total_faces_detected,
-                        'unknown_faces': total_faces_detected
-                    }
-                return []
-
-            # 识别每张人脸
-            recognized_students = []
-            unknown_faces_count = 0
-            unknown_encodings = []
-            known_encodings = self.known_encodings
-            known_names = self.known_student_names
-            
-            for face_encoding in face_encodings:
-                matches = face_recognition.compare_faces(
-                    known_encodings,
-                    face_encoding,
-                    tolerance=self.tolerance
-                )
-                
-                face_distances = face_recognition.face_distance(
-                    known_encodings,
-                    face_encoding
+        # 加载图片（修正 EXIF 方向，减少“有脸但检测不到”；可选解码时缩小）
+        with trace_span("decode", cat="photo"):
+            if data is not None:
+                return self._load_image_scaled(image_path, self.resize_long_edge, data)
+            return self._load_image_scaled(image_path, self.resize_long_edge)
+
+    def recognize_loaded(self, image_path, image, scale, return_details=False):
+        """识别的推理阶段：对已解码的图片做检测 + 编码 + 匹配，返回值同 recognize_faces。"""
+        try:
+            # 检测 + 编码（单次推理；过小的人脸不做编码；人脸坐标/尺寸按原图计算）
+            with trace_span("detect_embed", cat="photo"):
+                analysis = face_recognition.analyze(image, min_face_size=self.min_face_size, scale=scale)
+            del image
+            face_locations = analysis.locations
+            face_encodings = analysis.encodings
+
+            if analysis.detected_count <= 0:
+                logger.debug(f"在图片中未检测到人脸: {image_path}")
+            elif len(face_locations) < analysis.detected_count:
+                logger.debug(
+                    "忽略过小的人脸: %s 张（min_face_size=%s）",
+                    analysis.detected_count - len(face_locations),
+                    self.min_face_size,
                 )
-                
-                best_match_index = None
-                if len(face_distances) > 0:
-                    best_match_index = int(np.argmin(face_distances))
-                
-                if best_match_index is not None and matches[best_match_index]:
-                    student_name = known_names[best_match_index]
-                    if student_name not in recognized_students:
-                        recognized_students.append(student_name)
+
+            face_matches = None
+            if face_locations:
+                if not self.known_encodings:
+                    logger.warning("没有找到任何可用的学生面部编码")
                 else:
-                    unknown_faces_count += 1
-                    unknown_encodings.append(face_encoding)
-                    logger.debug(f"在图片中识别到未知人脸: {image_path}")
-            
-            # 存储结果，在内存释放前返回
-            result = None
-            if return_details:
-                status = 'success' if recognized_students else 'no_matches_found'
-                total_faces_detected = len(face_encodings)
-                recognized_count = len(recognized_students)
-                result = {
-                    'status': status,
-                    'message': f'检测到{total_faces_detected}张人脸，识别到{recognized_count}名学生',
-                    'recognized_students': recognized_students,
-                    'total_faces': total_faces_detected,
-                    'unknown_faces': unknown_faces_count,
-                    'unknown_encodings': unknown_encodings
-                }
-            else:
-                result = recognized_students
-            
-            # 释放内存
-            if image is not None:
-                del image
-            if face_locations is not None:
-                del face_locations
-            if face_encodings is not None:
-                del face_encodings
-            
-            return result
-            
-        except MemoryError:
-            if image is not None:
-                del image
-            if face_locations is not None:
-                del face_locations
-            if face_encodings is not None:
-                del face_encodings
-            warning_msg = (
-                f"处理图片时内存不足: {image_path}。请关闭其他程序或减少单次处理的照片数量后重试。"
-            )
-            logger.error(warning_msg)
-            if return_details:
-                return {
-                    'status': 'error',
-                    'message': warning_msg,
-                    'recognized_students': [],
-                    'total_faces': 0
-                }
-            return []
+                    # 整张照片的人脸一次性与全部参考编码比对（矩阵运算）
+                    with trace_span("match", cat="photo"):
+                        face_matches = self._get_known_matcher().match(face_encodings, self.tolerance)
+                    if any(m.name is None for m in face_matches):
+                        logger.debug(f"在图片中识别到未知人脸: {image_path}")
+
+            details = _details_from_analysis(analysis, face_matches)
+            return details if return_details else details['recognized_students']
+
         except Exception as e:
-            # 发生异常时也要确保释放内存
-            if image is not None:
-                del image
-            if face_locations is not None:
-                del face_locations
-            if face_encodings is not None:
-                del face_encodings
-                
-            error_msg = f"识别图片 {image_path} 中的人脸失败: {str(e)}"
-            logger.error(error_msg)
-            if return_details:
-                return {
-                    'status': 'error',
-                    'message': error_msg,
-                    'recognized_students': [],
-                    'total_faces': 0
-                }
-            return []
+            return self.recognition_error(image_path, e, return_details)
+
+    def recognition_error(self, image_path, error, return_details=False):
+        """把解码/推理阶段的异常转成识别结果（内存不足单独提示）。"""
+        if isinstance(error, MemoryError):
+            error_msg = f"处理图片时内存不足: {image_path}。请关闭其他程序或减少单次处理的照片数量后重试。"
+        else:
+            error_msg = f"识别图片 {image_path} 中的人脸失败: {str(error)}"
+        logger.error(error_msg)
+        if return_details:
+            return {
+                'status': 'error',
+                'message': error_msg,
+                'recognized_students': [],
+                'total_faces': 0
+            }
+        return []
     
+    def recognize_cached_faces(self, detections):
+        """用缓存的人脸级检测记录重新匹配（不解码、不检测）。
+
+        detections：_detection_from_analysis 格式的记录列表（识别缓存的检测层）。
+        所有照片的人脸合并为一次矩阵匹配；返回与 detections 对齐的 details dict 列表，
+        结构与 recognize_faces(return_details=True) 相同。
+        """
+        analyses = [_analysis_from_detection(d) for d in detections]
+        has_known = bool(self.known_encodings)
+        all_encodings = [enc for a in analyses for enc in a.encodings]
+        all_matches = []
+        if has_known and all_encodings:
+            all_matches = self._get_known_matcher().match(all_encodings, self.tolerance)
+
+        results = []
+        offset = 0
+        for analysis in analyses:
+            count = len(analysis.encodings)
+            face_matches = all_matches[offset:offset + count] if has_known else None
+            offset += count
+            results.append(_details_from_analysis(analysis, face_matches))
+        return results
+
     def verify_student_photo(self, student_name, image_path):
         """
         验证图片中是否包含指定学生
@@ -1226,8 +1484,9 @@ class FaceRecognizer:
             
             # 加载图片并识别人脸
             image = self._load_image_with_exif_fix(image_path)
-            face_locations = face_recognition.face_locations(image)
-            
+            analysis = face_recognition.analyze(image, min_face_size=MIN_FACE_SIZE)
+            face_locations = analysis.locations
+
             if not face_locations:
                 # 释放内存
                 if image is not None:
@@ -1235,22 +1494,8 @@ class FaceRecognizer:
                 if face_locations is not None:
                     del face_locations
                 return 0.0
-            
-            sizeable_locations = []
-            for location in face_locations:
-                top, right, bottom, left = location
-                if (bottom - top) >= MIN_FACE_SIZE and (right - left) >= MIN_FACE_SIZE:
-                    sizeable_locations.append(location)
 
-            if not sizeable_locations:
-                if image is not None:
-                    del image
-                if face_locations is not None:
-                    del face_locations
-                return 0.0
-
-            face_encodings = face_recognition.face_encodings(image, sizeable_locations)
-            face_locations = sizeable_locations
+            face_encodings = analysis.encodings
             
             # 计算每张人脸与目标学生的距离
             if not face_encodings:
@@ -1262,13 +1507,12 @@ class FaceRecognizer:
                 return 0.0
             
             # 对每个参考编码和每个检测到的人脸计算距离，取全局最小值
-            all_distances = []
-            for face_encoding in face_encodings:
-                for student_encoding in student_encodings:
-                    distance = face_recognition.face_distance([student_encoding], face_encoding)[0]
-                    all_distances.append(distance)
-            
-            distances = all_distances
+            matcher = KnownFaceMatcher(
+                student_encodings,
+                [student_name] * len(student_encodings),
+                metric=_get_backend_distance_metric(self._backend_engine),
+            )
+            distances = matcher.student_distances(face_encodings).reshape(-1).tolist()
             
             if len(distances) == 0:
                 if image is not None:
@@ -1343,7 +1587,8 @@ class FaceRecognizer:
             
             # 加载新照片并获取编码
             image = self._load_image_with_exif_fix(new_photo_path)
-            face_locations = face_recognition.face_locations(image)
+            analysis = face_recognition.analyze(image)
+            face_locations = analysis.locations
             
             if not face_locations:
                 logger.error(f"在新照片中未检测到人脸: {new_photo_path}")
@@ -1354,7 +1599,7 @@ class FaceRecognizer:
                     del face_locations
                 return False
             
-            face_encoding = face_recognition.face_encodings(image, face_locations)[0]
+            face_encoding = analysis.encodings[0]
             
             # 更新编码
             if student_name in self.students_encodings:
@@ -5,6 +5,18 @@
 - 将未匹配到学生的照片放入 UNKNOWN 目录（按日期分层）；
 - 生成整理报告（便于教师核对本次整理结果）。
 
+落盘方式（output_mode）：
+- copy：完整复制（默认）；
+- hardlink / reflink / symlink：多人合影放进 N 个学生目录时不再占用 N 份空间；
+- auto：依次尝试 reflink → 硬链接 → 复制（跨设备时自动回退为复制）。
+链接类方式失败时逐个回退为复制，报告中给出各方式的数量与节省的空间。
+
+执行方式（copy_workers）：
+- 先规划：每张照片只取一次日期，每个目标目录只解析/创建一次，目标文件名提前分配；
+- 再执行：目标路径互不相同，复制任务在有界线程池中并发进行，结果按规划顺序登记，
+    统计、进度条与异常回滚的口径与逐个复制时一致；
+- 边识别边整理（stream_sort）：SortSession 随识别结果逐张规划并提交复制，识别结束后只需收尾。
+
 统计口径：
 - 以“复制任务”为单位计数：一张多人合影若识别到 N 名学生，会产生 N 次复制任务。
     这样能避免“成功数 > 总数”的统计歧义。
@@ -12,15 +24,28 @@
 
 import os
 import sys
-import shutil
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Optional
 from datetime import datetime
 from tqdm import tqdm
-from .config import DEFAULT_OUTPUT_DIR, UNKNOWN_PHOTOS_DIR, NO_FACE_PHOTOS_DIR, ERROR_PHOTOS_DIR, REPORT_FILE, SMART_REPORT_FILE
+from .config import DEFAULT_COPY_WORKERS, DEFAULT_OUTPUT_DIR, DEFAULT_OUTPUT_MODE, OUTPUT_MODES, UNKNOWN_PHOTOS_DIR, NO_FACE_PHOTOS_DIR, ERROR_PHOTOS_DIR, REPORT_FILE, SMART_REPORT_FILE
 
-from .utils.fs import ensure_directory_exists, ensure_resolved_under, safe_join_under, UnsafePathError
+from .utils.fs import UniqueNameAllocator, ensure_directory_exists, format_bytes, place_file, safe_join_under
 from .utils.date_parser import get_photo_date
+from .utils.tracing import trace_span
+from .incremental_state import source_date_from_rel
+from .output_manifest import (
+    KIND_ERROR,
+    KIND_NO_FACE,
+    KIND_RECOGNIZED,
+    KIND_UNKNOWN,
+    OutputManifest,
+    delete_output_files,
+)
+from .recognition_cache import quick_content_hash
 
 logger = logging.getLogger(__name__)
 
@@ -53,21 +78,38 @@ def _c(text: str, code: str) -> str:
     return f"\033[{code}m{text}\033[0m"
 
 
+@dataclass(frozen=True)
+class CopyTask:
+    """一个复制任务：把 source 放到 target（文件名已在规划阶段分配；target=None 表示目标目录不可用）。"""
+
+    source: str
+    target: Optional[Path]
+    stats_key: str  # 成功时在 stats['students'] 中计数的键（学生名/聚类名/unknown_photos 等）
+
+
 class FileOrganizer:
     """文件组织器（只负责复制与目录结构，不做识别）。"""
     
-    def __init__(self, output_dir=None):
+    def __init__(self, output_dir=None, output_mode=DEFAULT_OUTPUT_MODE, copy_workers=DEFAULT_COPY_WORKERS):
         if output_dir is None:
             output_dir = DEFAULT_OUTPUT_DIR
         self.output_dir = Path(output_dir)
+        self.output_mode = output_mode if output_mode in OUTPUT_MODES else DEFAULT_OUTPUT_MODE
+        self.copy_workers = max(1, int(copy_workers or 1))
         self.processed_files = 0
         self.copied_files = 0
         self.failed_files = 0
+        # 本次 organize_photos 中每张源照片的输出副本（写入输出清单用）
+        self._outputs_by_source = {}
+        # 本次 organize_photos 的规划缓存：目录片段 -> 已创建的目标目录；各目标目录已占用的文件名
+        self._target_dirs = {}
+        self._name_allocator = UniqueNameAllocator()
+        self._photo_meta = None
         
         # 确保输出目录存在
         ensure_directory_exists(self.output_dir)
     
-    def organize_photos(self, input_dir, recognition_results, unknown_photos, unknown_clusters=None, *, no_face_photos=None, error_photos=None):
+    def organize_photos(self, input_dir, recognition_results, unknown_photos, unknown_clusters=None, *, no_face_photos=None, error_photos=None, photo_meta=None):
         """把识别结果落盘到输出目录，并返回统计信息。
 
         参数：
@@ -77,290 +119,137 @@ class FileOrganizer:
         - no_face_photos：未检测到人脸的照片路径列表（no_faces_detected）
         - error_photos：识别出错的照片路径列表
         - unknown_clusters：{cluster_name: [photo_paths]} 未知人脸聚类结果
+        - photo_meta：扫描阶段建立的 PhotoMetaIndex（可选）；有记录的照片直接用其日期，
+          不再逐张调用 get_photo_date
 
         返回：
         - stats：按“复制任务”统计的字典（total/copied/failed/processed 等）
 
         备注：
         - 为避免同一照片被重复处理，内部会用 processed_photos 集合去重。
+        - 完成后把“源照片 → 输出副本”写入输出清单（output_manifest），供文件级增量清理使用。
+        - 边识别边整理时改用 start_session()：照片随识别结果逐张加入，复制与识别重叠进行。
         """
-        start_time = datetime.now()
-
-        no_face_photos = list(no_face_photos or [])
-        error_photos = list(error_photos or [])
-        
         # 预处理聚类映射：photo_path -> cluster_name
         photo_to_cluster = {}
-        if unknown_clusters:
-            for cluster_name, paths in unknown_clusters.items():
-                for path in paths:
-                    photo_to_cluster[path] = cluster_name
+        for cluster_name, paths in (unknown_clusters or {}).items():
+            for path in paths:
+                photo_to_cluster[path] = cluster_name
 
-        # 统计信息（按“复制任务”计数，避免多人合影时成功数 > 总数的统计偏差）
-        total_copy_tasks = (
-            sum(len(names) for names in recognition_results.values())
-            + len(list(unknown_photos or []))
-            + len(no_face_photos)
-            + len(error_photos)
-        )
-        unique_photos = len(
-            set(recognition_results.keys())
-            | set(unknown_photos or [])
-            | set(no_face_photos)
-            | set(error_photos)
-        )
-        stats = {
-            'total': total_copy_tasks,
-            'unique_photos': unique_photos,
-            'processed': 0,
-            'copied': 0,
-            'failed': 0,
-            'unknown_total': len(list(unknown_photos or [])),
-            'no_face_total': len(no_face_photos),
-            'error_total': len(error_photos),
-            'students': {}
-        }
-        
-        logger.info(f"开始整理照片，共 {stats['total']} 个复制任务")
-        
-        processed_photos = set()  # 用于检测重复照片
-        copied_files = []  # 跟踪已复制的文件，用于错误恢复
-
-        # 使用进度条（老师可感知更强：百分比/剩余时间 + 阶段灯）
-        bar_format = "{desc} {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}] {postfix}"
-        desc_prefix = _c("● SORT", "36")
-        desc_text = f"{desc_prefix} 输出整理"
-
-        # Make sure the progress bar starts on its own clean line.
+        session = self.start_session(input_dir, photo_meta=photo_meta)
         try:
-            tqdm.write(_c("[RUN ] 正在输出整理（SORT）", "36"))
-            tqdm.write(
-                "  ".join(
-                    [
-                        _c("✓ SCAN", "32"),
-                        _c("✓ MATCH", "32"),
-                        _c("● SORT", "36"),
-                        _c("○ REPORT", "90"),
-                    ]
+            for photo_path, student_names in recognition_results.items():
+                session.add(photo_path, KIND_RECOGNIZED, student_names)
+            # 未知照片：属于某个聚类时放入 unknown_photos/Unknown_Person_X/<date>，否则 unknown_photos/<date>
+            for photo_path in (unknown_photos or []):
+                session.add(photo_path, KIND_UNKNOWN, cluster_name=photo_to_cluster.get(photo_path))
+            # 无人脸/出错照片：为保持老师使用习惯与旧版本兼容，仍放入 unknown_photos/<date>/。
+            # 同时在统计与报告中单独区分，避免把“无人脸”误认为“陌生人”。
+            for photo_path in (no_face_photos or []):
+                session.add(photo_path, KIND_NO_FACE)
+            for photo_path in (error_photos or []):
+                session.add(photo_path, KIND_ERROR)
+        except BaseException:
+            session.abort()
+            raise
+        return session.finish()
+
+    def start_session(self, input_dir, *, photo_meta=None, stream=False, defer_unknown=False):
+        """开始一次输出整理（见 SortSession）；同一时间只能有一个进行中的会话。"""
+        return SortSession(self, input_dir, photo_meta=photo_meta, stream=stream, defer_unknown=defer_unknown)
+
+    def _update_manifest(self, input_dir, kinds):
+        """把本次整理的“源照片 → 输出副本”写入输出清单（失败只告警，不影响整理结果）。"""
+        if not kinds or input_dir is None:
+            return
+        try:
+            manifest = OutputManifest(self.output_dir)
+            input_root = Path(input_dir)
+            for photo_path, kind in kinds.items():
+                try:
+                    source = Path(photo_path).relative_to(input_root).as_posix()
+                except ValueError:
+                    continue
+                date = source_date_from_rel(source) or self._photo_date(photo_path)
+                try:
+                    size = os.stat(photo_path).st_size
+                    content_hash = quick_content_hash(photo_path, size)
+                except OSError:
+                    size, content_hash = None, ""
+                manifest.record(
+                    source,
+                    date,
+                    kind,
+                    self._outputs_by_source.get(str(photo_path), []),
+                    size=size,
+                    content_hash=content_hash,
                 )
-            )
+            manifest.save()
         except Exception:
-            pass
+            logger.exception("更新输出清单失败")
 
-        with tqdm(
-            total=stats['total'],
-            desc=desc_text,
-            unit="张",
-            dynamic_ncols=True,
-            mininterval=0.2,
-            smoothing=0.05,
-            bar_format=bar_format,
-            leave=not _teacher_mode_enabled(),
-        ) as pbar:
-            try:
-                pbar.set_postfix_str(_c("复制中", "90"))
-            except Exception:
-                pass
-            try:
-                # 处理识别到的照片
-                for photo_path, student_names in recognition_results.items():
-                    if photo_path in processed_photos:
-                        stats['failed'] += 1  # 跳过重复照片
-                        stats['skipped'] = stats.get('skipped', 0) + 1  # 记录跳过的照片数量
-                        continue
-                    self._process_recognized_photo(photo_path, student_names, stats, copied_files)
-                    processed_photos.add(photo_path)
-                    pbar.update(len(student_names))
-
-                # 处理未知照片
-                for photo_path in (unknown_photos or []):
-                    if photo_path in processed_photos:
-                        stats['failed'] += 1  # 跳过重复照片
-                        stats['skipped'] = stats.get('skipped', 0) + 1  # 记录跳过的照片数量
-                        continue
-                    
-                    cluster_name = photo_to_cluster.get(photo_path)
-                    self._process_unknown_photo(photo_path, stats, copied_files, cluster_name)
-                    processed_photos.add(photo_path)
-                    pbar.update(1)
-
-                # 处理无人脸照片：为保持老师使用习惯与旧版本兼容，仍放入 unknown_photos/<date>/。
-                # 同时在统计与报告中单独区分，避免把“无人脸”误认为“陌生人”。
-                for photo_path in no_face_photos:
-                    if photo_path in processed_photos:
-                        stats['failed'] += 1
-                        stats['skipped'] = stats.get('skipped', 0) + 1
-                        continue
-                    self._process_unknown_variant(photo_path, stats, copied_files, stats_key=NO_FACE_PHOTOS_DIR)
-                    processed_photos.add(photo_path)
-                    pbar.update(1)
-
-                # 处理识别出错照片：同样放入 unknown_photos/<date>/，但报告中分列。
-                for photo_path in error_photos:
-                    if photo_path in processed_photos:
-                        stats['failed'] += 1
-                        stats['skipped'] = stats.get('skipped', 0) + 1
-                        continue
-                    self._process_unknown_variant(photo_path, stats, copied_files, stats_key=ERROR_PHOTOS_DIR)
-                    processed_photos.add(photo_path)
-                    pbar.update(1)
-            except Exception as e:
-                logger.exception("整理过程中发生异常，开始回滚")
-                self._rollback_copied_files(copied_files)
-                raise
-        
-        # 计算耗时
-        elapsed = (datetime.now() - start_time).total_seconds()
-        logger.info(f"照片整理完成，耗时: {elapsed:.2f}秒")
-        logger.info(f"处理统计: 总计 {stats['total']} 个复制任务，成功 {stats['copied']}，失败 {stats['failed']}")
+    def _plan_copies(self, photo_path, placements, tasks):
+        """为一张照片规划复制任务。
 
-        # Teacher-friendly: write one compact completion line (avoid leaving tqdm remnants).
+        placements 为 [(stats_key, 目录片段), ...]，目标目录为 output/<目录片段>/<照片日期>/。
+        目录不安全或无法创建时仍生成任务（target=None），执行阶段按失败计数。
+        """
+        photo_path = str(photo_path)
         try:
-            if _teacher_mode_enabled():
-                tqdm.write(
-                    _c(
-                        f"[DONE] SORT 完成：已分类 {stats.get('copied', 0)}；unknown {stats.get('unknown_total', 0)}；无人脸 {stats.get('no_face_total', 0)}；出错 {stats.get('error_total', 0)}；失败 {stats.get('failed', 0)}",
-                        "32",
-                    )
-                )
+            photo_date = self._photo_date(photo_path)
         except Exception:
-            pass
-        
-        # 输出每个学生的照片数量
-        for student_name, count in stats['students'].items():
-            logger.info(f"  {student_name}: {count} 张")
-        
-        return stats
-    
-    def _process_recognized_photo(self, photo_path, student_names, stats, copied_files=None):
-        """处理识别到的照片"""
-        try:
-            # 获取照片日期（输出目录按学生→日期分层）
-            photo_date = get_photo_date(photo_path)
+            logger.exception(f"获取照片日期失败: {photo_path}")
+            photo_date = None
 
-            # 为每个识别到的学生复制照片（学生/日期/文件）
-            for student_name in student_names:
+        source = Path(photo_path)
+        for stats_key, segments in placements:
+            target = None
+            if photo_date is not None:
                 # 使用 safe_join_under 防止路径遍历攻击
-                student_dir = safe_join_under(self.output_dir, student_name, photo_date)
-                ensure_directory_exists(student_dir)
-
-                # 复制照片
-                success = self._copy_photo(photo_path, student_dir, copied_files)
-
-                if success:
-                    stats['copied'] += 1
-
-                    # 更新学生统计
-                    if student_name not in stats['students']:
-                        stats['students'][student_name] = 0
-                    stats['students'][student_name] += 1
-                else:
-                    stats['failed'] += 1
-                    logger.error(f"复制照片失败: {photo_path} -> {student_dir}")
-        except Exception:
-            logger.exception(f"处理照片 {photo_path} 时发生异常")
-            stats['failed'] += len(student_names)
-
-        # 按复制任务计数（多人合影按学生数累加）
-        stats['processed'] += len(student_names)
-    
-    def _process_unknown_photo(self, photo_path, stats, copied_files=None, cluster_name=None):
-        """处理未知照片"""
+                target_dir = self._prepare_target_dir(*segments, photo_date)
+                if target_dir is not None:
+                    target = self._get_unique_filename(target_dir, source.stem, source.suffix)
+            tasks.append(CopyTask(photo_path, target, stats_key))
+
+    def _photo_date(self, photo_path):
+        """照片日期：优先取扫描阶段的 PhotoMeta，没有记录时回退为 get_photo_date。"""
+        meta = self._photo_meta.get(photo_path) if self._photo_meta is not None else None
+        return meta.date if meta is not None else get_photo_date(photo_path)
+
+    def _prepare_target_dir(self, *segments):
+        """解析并创建目标目录；同一次整理中每个目录只解析/创建一次，失败返回 None。"""
+        if segments in self._target_dirs:
+            return self._target_dirs[segments]
         try:
-            # 获取照片日期（输出目录按学生→日期分层；未知放独立日期目录）
-            photo_date = get_photo_date(photo_path)
-            
-            # 确定目标目录
-            if cluster_name:
-                # 如果属于某个聚类，放入 output/unknown_photos/Unknown_Person_X/2024-01-01
-                unknown_dir = safe_join_under(self.output_dir, UNKNOWN_PHOTOS_DIR, cluster_name, photo_date)
-            else:
-                # 否则放入 output/unknown_photos/2024-01-01
-                unknown_dir = safe_join_under(self.output_dir, UNKNOWN_PHOTOS_DIR, photo_date)
-                
-            ensure_directory_exists(unknown_dir)
-            
-            # 复制照片
-            success = self._copy_photo(photo_path, unknown_dir, copied_files)
-            
-            if success:
-                stats['copied'] += 1
-                
-                # 更新未知人脸统计
-                key = cluster_name if cluster_name else UNKNOWN_PHOTOS_DIR
-                if key not in stats['students']:
-                    stats['students'][key] = 0
-                stats['students'][key] += 1
-            else:
-                stats['failed'] += 1
-                logger.error(f"复制未知照片失败: {photo_path} -> {unknown_dir}")
-        
-        except Exception as e:
-            logger.exception(f"处理未知照片 {photo_path} 时发生异常")
-            stats['failed'] += 1
-        
-        stats['processed'] += 1
-
-    def _process_unknown_variant(self, photo_path, stats, copied_files=None, *, stats_key: str):
-        """把照片放入 unknown_photos/<date>/，但在 stats 中用不同 key 计数。"""
+            target_dir = safe_join_under(self.output_dir, *segments)
+            ensure_directory_exists(target_dir)
+        except Exception:
+            logger.exception(f"准备输出目录失败: {'/'.join(segments)}")
+            target_dir = None
+        self._target_dirs[segments] = target_dir
+        return target_dir
+
+    def _place(self, task):
+        """执行单个复制任务（可在工作线程中调用），返回 (落盘方式, 节省字节数)，失败返回 None。"""
+        if task.target is None:
+            return None
         try:
-            photo_date = get_photo_date(photo_path)
-            unknown_dir = safe_join_under(self.output_dir, UNKNOWN_PHOTOS_DIR, photo_date)
-            ensure_directory_exists(unknown_dir)
-
-            success = self._copy_photo(photo_path, unknown_dir, copied_files)
-            if success:
-                stats['copied'] += 1
-                if stats_key not in stats['students']:
-                    stats['students'][stats_key] = 0
-                stats['students'][stats_key] += 1
-            else:
-                stats['failed'] += 1
-                logger.error(f"复制照片失败: {photo_path} -> {unknown_dir}")
+            with trace_span("copy", cat="photo"):
+                method = place_file(task.source, task.target, self.output_mode)
+            saved = os.stat(task.source).st_size if method != "copy" else 0
+            logger.debug(f"输出照片（{method}）: {task.source} -> {task.target}")
+            return method, saved
         except Exception:
-            logger.exception(f"处理照片 {photo_path} 时发生异常")
-            stats['failed'] += 1
+            logger.exception(f"复制照片失败: {task.source}")
+            return None
 
-        stats['processed'] += 1
-    
-    def _copy_photo(self, source_path, target_dir, copied_files=None):
-        """复制照片到目标目录"""
-        try:
-            # 生成目标文件名（避免重名）
-            source_name = Path(source_path).stem
-            source_ext = Path(source_path).suffix
-            target_path = self._get_unique_filename(target_dir, source_name, source_ext)
-            
-            # 复制文件
-            shutil.copy2(source_path, target_path)
-            
-            if copied_files is not None:
-                copied_files.append(target_path)
-            
-            logger.debug(f"复制照片: {source_path} -> {target_path}")
-            return True
-            
-        except Exception as e:
-            logger.exception(f"复制照片失败: {source_path}")
-            return False
-    
     def _get_unique_filename(self, directory, base_name, extension):
-        """生成唯一的文件名，避免重名"""
-        counter = 1
-        filename = f"{base_name}{extension}"
-        target_path = directory / filename
-        
-        # 如果文件不存在，直接返回
-        if not target_path.exists():
-            return target_path
-        
-        # 添加序号直到找到不存在的文件名
-        while target_path.exists():
-            filename = f"{base_name}_{counter:03d}{extension}"
-            target_path = directory / filename
-            counter += 1
-        
-        return target_path
+        """生成唯一的文件名，避免重名。
+
+        规划阶段文件尚未落盘：由本次整理共用的 UniqueNameAllocator 分配（每个目录只列一次，
+        同时避开磁盘上已有的文件与本次已分配给其他任务的文件名）。
+        """
+        return self._name_allocator.allocate(directory, f"{base_name}{extension}")
     
     def create_summary_report(self, stats):
         """创建整理总结报告"""
@@ -381,6 +270,12 @@ class FileOrganizer:
                 f.write(f"  成功复制任务: {stats['copied']}\n")
                 f.write(f"  失败复制任务: {stats['failed']}\n\n")
 
+                if stats.get('output_methods'):
+                    f.write(f"落盘方式（output_mode={stats.get('output_mode', DEFAULT_OUTPUT_MODE)}）:\n")
+                    for method, count in sorted(stats['output_methods'].items()):
+                        f.write(f"  {method}: {count} 个\n")
+                    f.write(f"  节省空间: {format_bytes(stats.get('bytes_saved', 0))}\n\n")
+
                 # 分类口径（帮助老师理解 unknown 不等于“陌生人”）
                 if 'unknown_total' in stats or 'no_face_total' in stats or 'error_total' in stats:
                     f.write("分类统计（按原始照片张数）:\n")
@@ -425,28 +320,248 @@ class FileOrganizer:
         return structure
     
     def _rollback_copied_files(self, copied_files):
-        """回滚已复制的文件，在异常时清理"""
+        """回滚已复制的文件，在异常时清理。
+
+        本次的输出只有在整理成功后才写入输出清单，回滚后清单仍与磁盘一致；
+        删除走与清单清理相同的安全删除（防越界、删空的日期目录一并移除）。
+        """
         if not copied_files:
             return
         
         logger.warning(f"开始回滚 {len(copied_files)} 个已复制文件")
-        rolled_back = 0
-        
-        for dest_path in copied_files:
+        rolled_back = delete_output_files(self.output_dir, copied_files)
+        logger.info(f"回滚完成，已删除 {rolled_back}/{len(copied_files)} 个文件")
+
+
+# 各分类照片在统计中的计数键（按原始照片张数）
+_KIND_TOTAL_KEYS = {KIND_UNKNOWN: 'unknown_total', KIND_NO_FACE: 'no_face_total', KIND_ERROR: 'error_total'}
+
+
+class SortSession:
+    """一次输出整理：照片逐张加入（add），随即规划目标路径并提交复制；finish() 收尾。
+
+    - 规划（取日期、准备目标目录、分配文件名）都在调用 add() 的线程中进行，复制在有界线程池中执行；
+      copy_workers=1 且不是流式整理（stream）时，在 finish() 中逐个复制（与一次性整理时一致）；
+    - 流式整理：识别阶段每得到一张照片的分类就 add()，复制与识别重叠进行；
+      defer_unknown 时未知照片要等聚类结果决定放进哪个 Unknown_Person_X，先留在会话里，
+      由 finish(unknown_clusters) 再规划；
+    - finish() 按规划顺序登记结果（统计、进度条、回滚列表），写入输出清单并返回统计；
+      登记过程中出错/中断时回滚本次全部副本；
+    - abort()：放弃本次整理（如识别中途被中断），取消未开始的复制并回滚已落盘的副本。
+    """
+
+    def __init__(self, organizer, input_dir, *, photo_meta=None, stream=False, defer_unknown=False):
+        self.organizer = organizer
+        self.input_dir = input_dir
+        self.defer_unknown = bool(defer_unknown)
+        organizer._outputs_by_source = {}
+        organizer._target_dirs = {}
+        organizer._name_allocator = UniqueNameAllocator()
+        organizer._photo_meta = photo_meta
+        self.start_time = datetime.now()
+        # 统计信息（按“复制任务”计数，避免多人合影时成功数 > 总数的统计偏差）
+        self.stats = {
+            'total': 0,
+            'unique_photos': 0,
+            'processed': 0,
+            'copied': 0,
+            'failed': 0,
+            'unknown_total': 0,
+            'no_face_total': 0,
+            'error_total': 0,
+            'output_mode': organizer.output_mode,
+            'output_methods': {},
+            'bytes_saved': 0,
+            'students': {}
+        }
+        self.kinds = {}
+        self.tasks = []
+        self._futures = []
+        self._photos = set()
+        self._deferred_unknown = []
+        self._executor = None
+        self._closed = False
+        if stream or organizer.copy_workers > 1:
+            self._executor = ThreadPoolExecutor(max_workers=organizer.copy_workers, thread_name_prefix="sort-copy")
+
+    @property
+    def pending_unknown(self):
+        """等待聚类结果的未知照片数。"""
+        return len(self._deferred_unknown)
+
+    def add(self, photo_path, kind, student_names=(), cluster_name=None):
+        """加入一张照片：规划它的复制任务并（流式/多线程时）立即提交。
+
+        kind 为 output_manifest 中的分类（KIND_RECOGNIZED 需给出 student_names；KIND_UNKNOWN 可给出 cluster_name）。
+        同一张照片重复加入时按失败计数并跳过。
+        """
+        photo_path = str(photo_path)
+        if kind == KIND_UNKNOWN and self.defer_unknown:
+            self._deferred_unknown.append(photo_path)
+            return
+
+        if kind == KIND_RECOGNIZED:
+            # 为每个识别到的学生复制照片（学生/日期/文件）
+            placements = [(name, (name,)) for name in student_names]
+        elif kind == KIND_UNKNOWN:
+            if cluster_name:
+                placements = [(cluster_name, (UNKNOWN_PHOTOS_DIR, cluster_name))]
+            else:
+                placements = [(UNKNOWN_PHOTOS_DIR, (UNKNOWN_PHOTOS_DIR,))]
+        else:
+            stats_key = NO_FACE_PHOTOS_DIR if kind == KIND_NO_FACE else ERROR_PHOTOS_DIR
+            placements = [(stats_key, (UNKNOWN_PHOTOS_DIR,))]
+
+        stats = self.stats
+        stats['total'] += len(placements)
+        if kind in _KIND_TOTAL_KEYS:
+            stats[_KIND_TOTAL_KEYS[kind]] += 1
+        self._photos.add(photo_path)
+        if photo_path in self.kinds:
+            stats['failed'] += 1  # 跳过重复照片
+            stats['skipped'] = stats.get('skipped', 0) + 1  # 记录跳过的照片数量
+            return
+
+        start = len(self.tasks)
+        self.organizer._plan_copies(photo_path, placements, self.tasks)
+        self.kinds[photo_path] = kind
+        if self._executor is not None:
+            self._futures.extend(self._executor.submit(self.organizer._place, task) for task in self.tasks[start:])
+
+    def _drain(self, recorded):
+        """停止线程池（取消未开始的任务、等待进行中的任务），返回 tasks[recorded:] 中已落盘的目标路径。"""
+        if self._executor is None:
+            return []
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        placed = []
+        for task, future in zip(self.tasks[recorded:], self._futures[recorded:]):
+            if future.done() and not future.cancelled() and future.exception() is None and future.result():
+                placed.append(task.target)
+        return placed
+
+    def abort(self):
+        """放弃本次整理：已落盘的副本全部回滚（输出清单不变）；finish() 开始登记后调用不做任何事。"""
+        if self._closed:
+            return
+        self._closed = True
+        placed = self._drain(0)
+        if placed:
+            self.organizer._rollback_copied_files(placed)
+
+    def finish(self, unknown_clusters=None):
+        """规划等待聚类的未知照片，按规划顺序登记全部复制结果，写入输出清单，返回统计。"""
+        organizer = self.organizer
+        stats = self.stats
+        try:
+            if self._deferred_unknown:
+                photo_to_cluster = {}
+                for cluster_name, paths in (unknown_clusters or {}).items():
+                    for path in paths:
+                        photo_to_cluster[str(path)] = cluster_name
+                deferred, self._deferred_unknown = self._deferred_unknown, []
+                self.defer_unknown = False
+                for photo_path in deferred:
+                    self.add(photo_path, KIND_UNKNOWN, cluster_name=photo_to_cluster.get(photo_path))
+        except BaseException:
+            self.abort()
+            raise
+        self._closed = True  # 此后由 finish() 自己负责出错时的回滚
+        stats['unique_photos'] = len(self._photos)
+
+        logger.info(f"开始整理照片，共 {stats['total']} 个复制任务")
+        copied_files = []  # 跟踪已复制的文件，用于错误恢复
+
+        def _record(task, result):
+            """在当前线程中按规划顺序登记一个复制任务的结果（统计、回滚列表、输出清单）。"""
+            if result is None:
+                stats['failed'] += 1
+                logger.error(f"复制照片失败: {task.source} -> {task.target.parent if task.target else '（目标目录不可用）'}")
+            else:
+                method, saved = result
+                copied_files.append(task.target)
+                organizer._outputs_by_source.setdefault(task.source, []).append(task.target)
+                stats['copied'] += 1
+                stats['students'][task.stats_key] = stats['students'].get(task.stats_key, 0) + 1
+                stats['output_methods'][method] = stats['output_methods'].get(method, 0) + 1
+                stats['bytes_saved'] += saved
+            stats['processed'] += 1
+            pbar.update(1)
+
+        # 使用进度条（老师可感知更强：百分比/剩余时间 + 阶段灯）
+        bar_format = "{desc} {percentage:3.0f}%|{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}] {postfix}"
+        desc_prefix = _c("● SORT", "36")
+        desc_text = f"{desc_prefix} 输出整理"
+
+        # Make sure the progress bar starts on its own clean line.
+        try:
+            tqdm.write(_c("[RUN ] 正在输出整理（SORT）", "36"))
+            tqdm.write(
+                "  ".join(
+                    [
+                        _c("✓ SCAN", "32"),
+                        _c("✓ MATCH", "32"),
+                        _c("● SORT", "36"),
+                        _c("○ REPORT", "90"),
+                    ]
+                )
+            )
+        except Exception:
+            pass
+
+        with tqdm(
+            total=stats['total'],
+            desc=desc_text,
+            unit="张",
+            dynamic_ncols=True,
+            mininterval=0.2,
+            smoothing=0.05,
+            bar_format=bar_format,
+            leave=not _teacher_mode_enabled(),
+        ) as pbar:
             try:
-                try:
-                    ensure_resolved_under(self.output_dir, dest_path)
-                except UnsafePathError as e:
-                    logger.warning(f"跳过不安全回滚路径: {dest_path} ({e})")
-                    continue
+                pbar.set_postfix_str(_c("复制中", "90"))
+            except Exception:
+                pass
+            recorded = 0
+            try:
+                # 有线程池时复制早已提交（流式整理时大多已在识别阶段完成），这里只按规划顺序登记
+                for index, task in enumerate(self.tasks):
+                    if self._executor is not None:
+                        result = self._futures[index].result()
+                    else:
+                        result = organizer._place(task)
+                    _record(task, result)
+                    recorded += 1
+            except BaseException:
+                logger.exception("整理过程中发生异常，开始回滚")
+                copied_files.extend(self._drain(recorded))
+                organizer._rollback_copied_files(copied_files)
+                raise
+            finally:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=True)
 
-                if dest_path.exists():
-                    dest_path.unlink()  # 删除文件
-                    rolled_back += 1
-                    logger.debug(f"已回滚文件: {dest_path}")
-                else:
-                    logger.debug(f"文件不存在，跳过回滚: {dest_path}")
-            except Exception as e:
-                logger.error(f"回滚文件失败 {dest_path}: {e}")
-        
-        logger.info(f"回滚完成，已删除 {rolled_back}/{len(copied_files)} 个文件")
\ No newline at end of file
+        organizer._update_manifest(self.input_dir, self.kinds)
+
+        # 计算耗时
+        elapsed = (datetime.now() - self.start_time).total_seconds()
+        logger.info(f"照片整理完成，耗时: {elapsed:.2f}秒")
+        logger.info(f"处理统计: 总计 {stats['total']} 个复制任务，成功 {stats['copied']}，失败 {stats['failed']}")
+
+        # Teacher-friendly: write one compact completion line (avoid leaving tqdm remnants).
+        try:
+            if _teacher_mode_enabled():
+                tqdm.write(
+                    _c(
+                        f"[DONE] SORT 完成：已分类 {stats.get('copied', 0)}；unknown {stats.get('unknown_total', 0)}；无人脸 {stats.get('no_face_total', 0)}；出错 {stats.get('error_total', 0)}；失败 {stats.get('failed', 0)}",
+                        "32",
+                    )
+                )
+        except Exception:
+            pass
+
+        # 输出每个学生的照片数量
+        for student_name, count in stats['students'].items():
+            logger.info(f"  {student_name}: {count} 张")
+
+        return stats
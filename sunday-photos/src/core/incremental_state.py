@@ -13,27 +13,112 @@
 from __future__ import annotations
 
 import json
+import os
 import re
 import threading
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, Iterable, List, Optional, Set, Tuple
 
 from .config import STATE_DIR_NAME, CLASS_PHOTOS_SNAPSHOT_FILENAME, SNAPSHOT_VERSION, DATE_DIR_PATTERN
-from .utils.fs import is_supported_nonempty_image_path, is_ignored_fs_entry
+from .utils.fs import is_ignored_fs_entry, is_ignored_fs_name, supported_nonempty_image_stat
 from .utils.date_parser import parse_date_from_text
+from .run_journal import clear_run_journal
 
 
 # 全局锁用于并发安全
 _snapshot_lock = threading.Lock()
 
 
+@dataclass(frozen=True)
+class DateFileChanges:
+    """单个日期内的文件级差异；路径均为相对 class_photos 的 posix 路径。"""
+
+    added: Tuple[str, ...] = ()
+    modified: Tuple[str, ...] = ()
+    removed: Tuple[str, ...] = ()
+
+    @property
+    def to_process(self) -> Tuple[str, ...]:
+        """需要（重新）识别与整理的照片。"""
+        return self.added + self.modified
+
+    @property
+    def stale(self) -> Tuple[str, ...]:
+        """旧输出需要删除的照片。"""
+        return self.modified + self.removed
+
+
 @dataclass(frozen=True)
 class IncrementalPlan:
     changed_dates: Set[str]
     deleted_dates: Set[str]
     snapshot: Dict
+    # 文件级增量：日期 -> 该日期内的增/改/删。只包含前后快照都存在的日期；
+    # 不在其中的 changed_dates 按整日期重新处理。
+    file_changes: Dict[str, DateFileChanges] = field(default_factory=dict)
+    # 上次运行中断时正在处理的日期（见 run_journal）：输出可能只整理了一半，按目录清理后整日期重建
+    resumed_dates: Set[str] = field(default_factory=set)
+
+    def source_paths(self, date: str) -> Set[str]:
+        """当前快照中该日期的全部照片（相对 class_photos 的路径）。"""
+        bucket = self.snapshot.get("dates", {}).get(date) or {}
+        return {_entry_source_path(date, bucket, e.get("path", "")) for e in bucket.get("files", [])}
+
+
+def _entry_source_path(date: str, bucket: Dict, path: str) -> str:
+    """快照条目 path -> 相对 class_photos 的路径。
+
+    标准 YYYY-MM-DD 目录的条目不带目录前缀，其他写法（含嵌套 YYYY/MM/DD）带物理目录前缀。
+    """
+    for source_dir in bucket.get("source_dirs", []):
+        if source_dir != date and path.startswith(f"{source_dir}/"):
+            return path
+    return f"{date}/{path}"
+
+
+def source_date_from_rel(rel_path: str) -> Optional[str]:
+    """由相对 class_photos 的路径推断所属日期（与快照的日期目录识别规则一致）。"""
+    parts = rel_path.split("/")
+    if len(parts) < 2:
+        return None
+    normalized = parse_date_from_text(parts[0])
+    if normalized:
+        return normalized
+    if (
+        len(parts) >= 4
+        and re.fullmatch(r"\d{4}", parts[0])
+        and re.fullmatch(r"\d{1,2}", parts[1])
+        and re.fullmatch(r"\d{1,2}", parts[2])
+    ):
+        return parse_date_from_text(f"{parts[0]}/{parts[1]}/{parts[2]}")
+    return None
+
+
+def _bucket_files(date: str, bucket: Dict) -> Dict[str, tuple]:
+    return {
+        _entry_source_path(date, bucket, e.get("path", "")): (e.get("size"), e.get("mtime"))
+        for e in bucket.get("files", [])
+    }
+
+
+def snapshot_files(snapshot: Dict) -> Dict[str, tuple]:
+    """快照中的全部照片：相对 class_photos 的路径 -> (size, mtime)。"""
+    files: Dict[str, tuple] = {}
+    for date, bucket in (snapshot or {}).get("dates", {}).items():
+        files.update(_bucket_files(date, bucket))
+    return files
+
+
+def _diff_date_files(date: str, prev_bucket: Dict, cur_bucket: Dict) -> DateFileChanges:
+    prev_files = _bucket_files(date, prev_bucket)
+    cur_files = _bucket_files(date, cur_bucket)
+    return DateFileChanges(
+        added=tuple(sorted(p for p in cur_files if p not in prev_files)),
+        modified=tuple(sorted(p for p in cur_files if p in prev_files and prev_files[p] != cur_files[p])),
+        removed=tuple(sorted(p for p in prev_files if p not in cur_files)),
+    )
 
 
 def _state_dir(output_dir: Path) -> Path:
@@ -62,96 +147,145 @@ def iter_date_directories(class_photos_dir: Path) -> List[Path]:
     return sorted(date_dirs, key=lambda p: p.name)
 
 
-def _iter_date_directories_multi_format(class_photos_dir: Path) -> List[tuple[str, Path]]:
-    """枚举“可解析为日期”的子目录（多格式），用于构建快照。"""
-    if not class_photos_dir.exists():
+@dataclass
+class ClassPhotosScan:
+    """一次遍历 class_photos 的结果：快照与“各日期的照片列表”同时产出。
+
+    - snapshot：与 build_class_photos_snapshot 返回的结构完全一致
+    - files_by_date：标准日期 -> 该日期下全部照片的绝对路径（按目录名、相对路径排序）
+    - root_photos：直接放在 class_photos 根目录下、尚未按日期归档的照片
+    """
+
+    root: Path
+    snapshot: Dict
+    files_by_date: Dict[str, List[str]]
+    root_photos: List[str]
+
+    @property
+    def photo_count(self) -> int:
+        return len(self.root_photos) + sum(len(v) for v in self.files_by_date.values())
+
+    def photo_path(self, source: str) -> str:
+        """相对 class_photos 的路径 -> 绝对路径（与 files_by_date 中的写法一致）。"""
+        return os.path.join(str(self.root), *source.split("/"))
+
+    def photos_for_dates(self, dates: Iterable[str]) -> List[str]:
+        """按日期顺序返回指定日期下的照片路径（用于生成本次的工作列表）。"""
+        photos: List[str] = []
+        for date in sorted(dates):
+            photos.extend(self.files_by_date.get(date, []))
+        return photos
+
+
+def _scandir_sorted(directory: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as it:
+            return sorted(it, key=lambda e: e.name)
+    except OSError:
         return []
+
+
+def _is_plain_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+def _scan_top_level(class_photos_dir: Path) -> Tuple[List[tuple[str, Path]], List[str]]:
+    """遍历 class_photos 顶层（含嵌套 YYYY/MM/DD），返回 (日期目录列表, 根目录散放照片)。"""
     date_dirs: List[tuple[str, Path]] = []
-    for child in class_photos_dir.iterdir():
-        if is_ignored_fs_entry(child):
+    root_photos: List[str] = []
+    for child in _scandir_sorted(class_photos_dir):
+        if is_ignored_fs_name(child.name):
             continue
-        if not child.is_dir():
+        if not _is_plain_dir(child):
+            if supported_nonempty_image_stat(child) is not None:
+                root_photos.append(child.path)
             continue
+
         normalized = parse_date_from_text(child.name)
-        if not normalized:
-            continue
-        date_dirs.append((normalized, child))
+        if normalized:
+            date_dirs.append((normalized, Path(child.path)))
 
-    # 兼容嵌套目录：class_photos/YYYY/MM/DD/...
-    for year_dir in class_photos_dir.iterdir():
-        if is_ignored_fs_entry(year_dir) or (not year_dir.is_dir()):
-            continue
-        if not re.fullmatch(r"\d{4}", year_dir.name or ""):
+        # 兼容嵌套目录：class_photos/YYYY/MM/DD/...
+        if not re.fullmatch(r"\d{4}", child.name):
             continue
-        for month_dir in year_dir.iterdir():
-            if is_ignored_fs_entry(month_dir) or (not month_dir.is_dir()):
+        for month_dir in _scandir_sorted(Path(child.path)):
+            if is_ignored_fs_name(month_dir.name) or not _is_plain_dir(month_dir):
                 continue
-            if not re.fullmatch(r"\d{1,2}", month_dir.name or ""):
+            if not re.fullmatch(r"\d{1,2}", month_dir.name):
                 continue
-            for day_dir in month_dir.iterdir():
-                if is_ignored_fs_entry(day_dir) or (not day_dir.is_dir()):
+            for day_dir in _scandir_sorted(Path(month_dir.path)):
+                if is_ignored_fs_name(day_dir.name) or not _is_plain_dir(day_dir):
                     continue
-                if not re.fullmatch(r"\d{1,2}", day_dir.name or ""):
+                if not re.fullmatch(r"\d{1,2}", day_dir.name):
                     continue
-                normalized = parse_date_from_text(f"{year_dir.name}/{month_dir.name}/{day_dir.name}")
-                if not normalized:
-                    continue
-                date_dirs.append((normalized, day_dir))
-
-    return sorted(date_dirs, key=lambda it: (it[0], it[1].name))
-
+                normalized = parse_date_from_text(f"{child.name}/{month_dir.name}/{day_dir.name}")
+                if normalized:
+                    date_dirs.append((normalized, Path(day_dir.path)))
+
+    date_dirs.sort(key=lambda it: (it[0], it[1].name))
+    return date_dirs, root_photos
+
+
+def _walk_date_dir(date_dir: Path) -> List[tuple[str, os.stat_result]]:
+    """递归遍历日期目录，返回 [(相对路径, stat)]；每个文件只 stat 一次，不跟随目录符号链接。"""
+    found: List[tuple[str, os.stat_result]] = []
+    pending: List[tuple[str, str]] = [(str(date_dir), "")]
+    while pending:
+        directory, prefix = pending.pop()
+        for entry in _scandir_sorted(Path(directory)):
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if is_dir:
+                pending.append((entry.path, f"{prefix}{entry.name}/"))
+                continue
+            st = supported_nonempty_image_stat(entry)
+            if st is not None:
+                found.append((f"{prefix}{entry.name}", st))
+    found.sort(key=lambda it: it[0])
+    return found
 
-def _file_entry(path: Path) -> Dict:
-    stat = path.stat()
-    # Use integer seconds for stable snapshots across platforms.
-    return {
-        "path": path.as_posix(),
-        "size": int(stat.st_size),
-        "mtime": int(stat.st_mtime),
-    }
 
+def _iter_date_directories_multi_format(class_photos_dir: Path) -> List[tuple[str, Path]]:
+    """枚举“可解析为日期”的子目录（多格式，含嵌套 YYYY/MM/DD），用于构建快照。"""
+    if not class_photos_dir.exists():
+        return []
+    return _scan_top_level(class_photos_dir)[0]
 
-def build_class_photos_snapshot(class_photos_dir: Path) -> Dict:
-    """为 input/class_photos 构建快照。
 
-    快照结构：
-    {
-        version: int,
-        generated_at: str,
-        dates: {
-            "YYYY-MM-DD": {
-                source_dirs: ["2025-12-21", "2025.12.21", ...],
-                files: [ {path,size,mtime}, ... ]
-            },
-            ...
-        }
-    }
+def scan_class_photos(class_photos_dir: Path) -> ClassPhotosScan:
+    """单次遍历 input/class_photos，同时产出快照与各日期的照片列表。
 
-    说明：输入端允许多种日期文件夹写法，但快照 key 一律标准化为 YYYY-MM-DD。
+    基于 os.scandir：目录项自带类型信息，每张照片只 stat 一次，
+    size/mtime 直接写入快照，不再为“建快照”和“列工作清单”分别遍历目录树。
     """
-
+    class_photos_dir = Path(class_photos_dir)
     dates: Dict[str, Dict] = {}
-    for normalized_date, date_dir in _iter_date_directories_multi_format(class_photos_dir):
-        file_entries: List[Dict] = []
-        for file_path in sorted(date_dir.rglob("*")):
-            if is_supported_nonempty_image_path(file_path):
-                rel = file_path.relative_to(date_dir).as_posix()
-                entry = _file_entry(file_path)
-                # 兼容：
-                # - 若目录本身就是标准 YYYY-MM-DD，则沿用历史语义：path=相对日期目录路径（不带日期前缀）
-                # - 若目录是其他写法（如 2025.12.23 / 2025年12月23日），则加上物理目录名前缀避免冲突
-                if date_dir.name == normalized_date and re.match(DATE_DIR_PATTERN, date_dir.name):
-                    entry["path"] = rel
-                else:
-                    physical_rel = date_dir.relative_to(class_photos_dir).as_posix()
-                    entry["path"] = f"{physical_rel}/{rel}"
-                file_entries.append(entry)
+    files_by_date: Dict[str, List[str]] = {}
+    date_dirs, root_photos = _scan_top_level(class_photos_dir)
 
-        bucket = dates.setdefault(normalized_date, {"source_dirs": [], "files": []})
+    for normalized_date, date_dir in date_dirs:
         physical_rel = date_dir.relative_to(class_photos_dir).as_posix()
+        # 兼容：
+        # - 若目录本身就是标准 YYYY-MM-DD，则沿用历史语义：path=相对日期目录路径（不带日期前缀）
+        # - 若目录是其他写法（如 2025.12.23 / 2025年12月23日），则加上物理目录名前缀避免冲突
+        standard = date_dir.name == normalized_date and re.match(DATE_DIR_PATTERN, date_dir.name)
+        bucket = dates.setdefault(normalized_date, {"source_dirs": [], "files": []})
         if physical_rel not in bucket["source_dirs"]:
             bucket["source_dirs"].append(physical_rel)
-        bucket["files"].extend(file_entries)
+        photos = files_by_date.setdefault(normalized_date, [])
+        for rel, st in _walk_date_dir(date_dir):
+            # Use integer seconds for stable snapshots across platforms.
+            bucket["files"].append({
+                "path": rel if standard else f"{physical_rel}/{rel}",
+                "size": int(st.st_size),
+                "mtime": int(st.st_mtime),
+            })
+            photos.append(os.path.join(str(date_dir), *rel.split("/")))
 
     # 保证稳定快照：排序 source_dirs 与 files
     for v in dates.values():
@@ -161,11 +295,38 @@ def build_class_photos_snapshot(class_photos_dir: Path) -> Dict:
             key=lambda e: (e.get("path", ""), e.get("size", 0), e.get("mtime", 0)),
         )
 
-    return {
+    snapshot = {
         "version": SNAPSHOT_VERSION,
         "generated_at": datetime.now().isoformat(timespec="seconds"),
         "dates": dates,
     }
+    return ClassPhotosScan(
+        root=class_photos_dir,
+        snapshot=snapshot,
+        files_by_date=files_by_date,
+        root_photos=root_photos,
+    )
+
+
+def build_class_photos_snapshot(class_photos_dir: Path) -> Dict:
+    """为 input/class_photos 构建快照。
+
+    快照结构：
+    {
+        version: int,
+        generated_at: str,
+        dates: {
+            "YYYY-MM-DD": {
+                source_dirs: ["2025-12-21", "2025.12.21", ...],
+                files: [ {path,size,mtime}, ... ]
+            },
+            ...
+        }
+    }
+
+    说明：输入端允许多种日期文件夹写法，但快照 key 一律标准化为 YYYY-MM-DD。
+    """
+    return scan_class_photos(class_photos_dir).snapshot
 
 
 def load_snapshot(output_dir: Path) -> Optional[Dict]:
@@ -181,12 +342,18 @@ def load_snapshot(output_dir: Path) -> Optional[Dict]:
 
 
 def save_snapshot(output_dir: Path, snapshot: Dict) -> None:
-    """保存快照到输出目录（UTF-8 + pretty json，便于人工排查）。"""
+    """保存快照到输出目录（UTF-8 + pretty json，便于人工排查）。
+
+    原子写入（tmp -> rename），中途被杀不会留下半个快照；保存即表示本次运行已完成，随之删除运行日志。
+    """
     with _snapshot_lock:
         state_dir = _state_dir(output_dir)
         state_dir.mkdir(parents=True, exist_ok=True)
         path = snapshot_file_path(output_dir)
-        path.write_text(json.dumps(snapshot, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(snapshot, ensure_ascii=False, indent=2), encoding="utf-8")
+        tmp.replace(path)
+    clear_run_journal(output_dir)
 
 
 def compute_incremental_plan(previous: Optional[Dict], current: Dict) -> IncrementalPlan:
@@ -194,6 +361,7 @@ def compute_incremental_plan(previous: Optional[Dict], current: Dict) -> Increme
 
     - changed_dates：需要重新处理的日期目录（新增或内容变化）
     - deleted_dates：输入端已删除的日期目录（需要同步清理输出）
+    - file_changes：前后都存在的变化日期内，具体新增/修改/删除了哪些照片
     """
     prev_dates = (previous or {}).get("dates", {})
     cur_dates = current.get("dates", {})
@@ -204,6 +372,7 @@ def compute_incremental_plan(previous: Optional[Dict], current: Dict) -> Increme
     deleted = prev_keys - cur_keys
 
     changed: Set[str] = set()
+    file_changes: Dict[str, DateFileChanges] = {}
     if previous is None:
         # First run: treat all as changed.
         changed = set(cur_keys)
@@ -214,5 +383,11 @@ def compute_incremental_plan(previous: Optional[Dict], current: Dict) -> Increme
                 continue
             if prev_dates.get(date, {}) != cur_dates.get(date, {}):
                 changed.add(date)
-
-    return IncrementalPlan(changed_dates=changed, deleted_dates=deleted, snapshot=current)
+                file_changes[date] = _diff_date_files(date, prev_dates[date], cur_dates[date])
+
+    return IncrementalPlan(
+        changed_dates=changed,
+        deleted_dates=deleted,
+        snapshot=current,
+        file_changes=file_changes,
+    )
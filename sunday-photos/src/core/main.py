@@ -27,9 +27,12 @@ from .config_loader import ConfigLoader
 from .container import ServiceContainer
 from .pipeline import Pipeline
 from .parallel_recognizer import parallel_recognize # Re-export for backward compat if needed
-from .clustering import UnknownClustering # Re-export for backward compat
+from .clustering import KnnGraphClustering, UnknownClustering # Re-export for backward compat
 from .recognition_cache import invalidate_date_cache
+from .unknown_registry import forget_unknown_person_dates
 from .incremental_state import save_snapshot
+from .run_journal import clear_run_journal
+from .utils.tracing import get_tracer, stop_tracing, trace_span
 
 # Re-export ServiceContainer for backward compatibility
 __all__ = ["SimplePhotoOrganizer", "ServiceContainer", "ConfigLoader", "parallel_recognize", "UnknownClustering"]
@@ -124,6 +127,9 @@ class SimplePhotoOrganizer:
                     'log_dir': self.log_dir,
                     'tolerance': float(getattr(cfg, 'get_tolerance')()),
                     'min_face_size': int(getattr(cfg, 'get_min_face_size')()),
+                    'resize_long_edge': int(getattr(cfg, 'get_resize_long_edge', lambda: 0)()),
+                    'output_mode': getattr(cfg, 'get_output_mode', lambda: None)(),
+                    'copy_workers': getattr(cfg, 'get_copy_workers', lambda: None)(),
                 }
                 self.service_container = ServiceContainer(container_config)
                 self.logger.debug(f"Created ServiceContainer: {self.service_container}")
@@ -173,25 +179,39 @@ class SimplePhotoOrganizer:
             self.initialized = False
             return False
 
+    def use_class_photos_scan(self, scan) -> None:
+        """复用调用方（如启动器的照片检查）已做好的课堂照扫描，避免本次运行再遍历一次目录树。"""
+        if self._pipeline and self._pipeline.scanner:
+            self._pipeline.scanner.prescan = scan
+
     def scan_input_directory(self):
         """[Deprecated] Delegate to Pipeline.scanner.scan()"""
         if not self._pipeline:
             self.initialize()
         return self._pipeline.scanner.scan()
 
-    def process_photos(self, photo_files):
+    def process_photos(self, photo_files, sort_session=None):
         """[Deprecated] Delegate to Pipeline.process_photos()"""
         if not self._pipeline:
             self.initialize()
-        res = self._pipeline.process_photos(photo_files)
+        res = self._pipeline.process_photos(photo_files, sort_session=sort_session)
         self.stats = self._pipeline.stats # Sync stats
         return res
 
-    def organize_output(self, recognition_results, unknown_photos, no_face_photos=None, error_photos=None, unknown_clusters=None):
+    def organize_output(self, recognition_results, unknown_photos, no_face_photos=None, error_photos=None, unknown_clusters=None, sort_session=None):
         """[Deprecated] Delegate to Pipeline.organize_output()"""
         if not self._pipeline:
             self.initialize()
-        return self._pipeline.organize_output(recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters)
+        return self._pipeline.organize_output(
+            recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters, sort_session=sort_session
+        )
+
+    def _stages_delegate_to_pipeline(self) -> bool:
+        """process_photos/organize_output 都是默认委托实现（未被子类或测试替换）时才能边识别边整理。"""
+        return all(
+            name not in vars(self) and getattr(type(self), name) is getattr(SimplePhotoOrganizer, name)
+            for name in ("process_photos", "organize_output")
+        )
 
     def _cleanup_output_for_dates(self, dates):
         """[Deprecated] Delegate to Pipeline._cleanup_output_for_dates()"""
@@ -219,13 +239,13 @@ class SimplePhotoOrganizer:
             if self._internal_incremental_plan:
                 self._pipeline.scanner.incremental_plan = self._internal_incremental_plan
 
+        tracer = self._pipeline.begin_trace() if self._pipeline else None
+        sort_session = None
+        unknown_encodings_map = None
         try:
             # 2) Scan (instance method is patchable in tests)
-            photo_files = self.scan_input_directory()
-
-            # Keep pipeline stats consistent with Pipeline.run()
-            if self._pipeline:
-                self._pipeline.stats['total_photos'] = len(photo_files)
+            with trace_span("scan"):
+                photo_files = self.scan_input_directory()
 
             # Prefer explicitly injected incremental plan (tests), else use pipeline scanner plan.
             plan = self._incremental_plan
@@ -234,25 +254,44 @@ class SimplePhotoOrganizer:
 
             changed_dates = getattr(plan, 'changed_dates', set()) if plan else set()
             deleted_dates = getattr(plan, 'deleted_dates', set()) if plan else set()
+            file_changes = getattr(plan, 'file_changes', None) or {}
 
             # 2b) Cleanup for changed/deleted dates (may require pipeline)
+            # 按文件增量的日期只删过期副本；其余变化日期整日期重建
             if self._pipeline:
-                self._cleanup_output_for_dates(sorted(changed_dates | deleted_dates))
+                with trace_span("sync_outputs"):
+                    self._cleanup_output_for_dates(sorted((changed_dates - set(file_changes)) | deleted_dates))
+                    photo_files = list(photo_files) + self._pipeline._sync_partial_dates(plan)
             for date in sorted(deleted_dates):
                 invalidate_date_cache(self.output_dir, date)
+            forget_unknown_person_dates(self.output_dir, deleted_dates)
+
+            # Keep pipeline stats consistent with Pipeline.run()
+            if self._pipeline:
+                self._pipeline.stats['total_photos'] = len(photo_files)
 
             if not photo_files:
-                if deleted_dates and plan is not None and getattr(plan, 'snapshot', None) is not None:
+                if (deleted_dates or file_changes) and plan is not None and getattr(plan, 'snapshot', None) is not None:
                     save_snapshot(self.output_dir, plan.snapshot)
+                else:
+                    clear_run_journal(self.output_dir)
                 if self._pipeline:
                     self._pipeline.stats['end_time'] = datetime.now()
+                    self._pipeline.finish_trace(tracer)
                     self._pipeline.reporter.print_final_statistics(self._pipeline.stats, self.output_dir)
                     self.stats = self._pipeline.stats
                     self.last_run_report = self._pipeline.last_run_report
                 return True
 
             # 3) Process (instance method patchable; default delegates to Pipeline)
-            processed = self.process_photos(photo_files)
+            # stream_sort：识别出一张照片的分类就开始复制（只在两个阶段都走 Pipeline 时启用）
+            stage_kwargs = {}
+            if self._pipeline and self._stages_delegate_to_pipeline():
+                sort_session = self._pipeline.open_sort_session()
+                if sort_session is not None:
+                    stage_kwargs['sort_session'] = sort_session
+            with trace_span("recognize"):
+                processed = self.process_photos(photo_files, **stage_kwargs)
             # Backward compatibility: tests/legacy code may monkeypatch process_photos to return
             # (recognition_results, unknown_photos, unknown_encodings_map)
             if isinstance(processed, tuple) and len(processed) == 3:
@@ -262,7 +301,7 @@ class SimplePhotoOrganizer:
             else:
                 recognition_results, unknown_photos, no_face_photos, error_photos, unknown_encodings_map = processed
 
-            # 3b) Unknown clustering (use main.UnknownClustering so tests patching organizer_module work)
+            # 3b) Unknown clustering（引擎选择与未知人物登记统一由 Pipeline 负责）
             unknown_clusters = None
             if unknown_encodings_map:
                 try:
@@ -270,33 +309,43 @@ class SimplePhotoOrganizer:
                 except Exception:
                     uc = {}
                 if uc.get('enabled'):
-                    clustering = UnknownClustering(
-                        tolerance=float(uc.get('threshold', 0.45)),
-                        min_cluster_size=int(uc.get('min_cluster_size', 2)),
-                    )
-                    for path, encodings in unknown_encodings_map.items():
-                        if path in unknown_photos:
-                            clustering.add_faces(path, encodings)
-                    unknown_clusters = clustering.get_results()
+                    if self._pipeline:
+                        unknown_clusters = self._pipeline.cluster_unknown_photos(
+                            uc, unknown_photos, unknown_encodings_map, photo_files
+                        )
+                    else:
+                        clustering = Pipeline.make_unknown_clusterer(uc)
+                        unknown_set = set(unknown_photos)
+                        with trace_span("cluster"):
+                            for path, encodings in unknown_encodings_map.items():
+                                if path in unknown_set:
+                                    clustering.add_faces(path, encodings)
+                            unknown_clusters = clustering.get_results()
 
             # 4) Organize output (instance method patchable; default delegates to Pipeline)
             organize_stats = None
-            try:
-                organize_stats = self.organize_output(recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters)
-            except TypeError:
-                # Backward compatibility: older override signature organize_output(recognition_results, unknown_photos, unknown_clusters)
-                combined_unknown = list(unknown_photos or []) + list(no_face_photos or []) + list(error_photos or [])
-                organize_stats = self.organize_output(recognition_results, combined_unknown, unknown_clusters)
+            with trace_span("sort"):
+                try:
+                    organize_stats = self.organize_output(
+                        recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters, **stage_kwargs
+                    )
+                except TypeError:
+                    # Backward compatibility: older override signature organize_output(recognition_results, unknown_photos, unknown_clusters)
+                    combined_unknown = list(unknown_photos or []) + list(no_face_photos or []) + list(error_photos or [])
+                    organize_stats = self.organize_output(recognition_results, combined_unknown, unknown_clusters)
 
             if organize_stats is None:
                 organize_stats = {}
 
+            if self._pipeline:
+                self._pipeline.commit_unknown_registry()
             if plan is not None and getattr(plan, 'snapshot', None) is not None:
                 save_snapshot(self.output_dir, plan.snapshot)
 
             # Sync stats/report if pipeline is present
             if self._pipeline:
                 self._pipeline.stats['end_time'] = datetime.now()
+                self._pipeline.finish_trace(tracer)
                 self._pipeline.last_run_report = self._pipeline.reporter.build_run_report(self._pipeline.stats, organize_stats)
                 self._pipeline.reporter.print_final_statistics(self._pipeline.stats, self.output_dir)
                 self.stats = self._pipeline.stats
@@ -306,6 +355,15 @@ class SimplePhotoOrganizer:
         except Exception:
             self.logger.exception("照片整理过程中发生错误")
             return False
+        finally:
+            if self._pipeline:
+                self._pipeline.discard_unknown_registry()
+            if sort_session is not None:
+                sort_session.abort()  # 识别/聚类中途失败或中断：回滚已复制的副本（整理完成后不做任何事）
+            if hasattr(unknown_encodings_map, 'close'):
+                unknown_encodings_map.close()  # 有界内存模式：删除未知人脸特征暂存文件
+            if tracer is not None and get_tracer() is tracer:
+                stop_tracing()
 
 
 def parse_arguments(config_loader=None):
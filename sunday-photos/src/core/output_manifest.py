@@ -0,0 +1,334 @@
+"""输出清单：记录每张课堂照片（源）复制到了 output/ 的哪些位置。
+
+用途：
+- 清理按清单进行：删除某日期/某几张照片的输出时直接按记录删文件，
+  不再遍历每个学生目录、每个 Unknown_Person_* 目录去逐个 stat 日期子目录；
+- 文件级增量：某日期只新增/修改/删除了几张照片时，只删除这些源照片派生出的旧输出；
+- 判断某日期的输出是否“可按清单维护”（旧版本生成的输出没有清单记录，只能按目录清理）；
+- 完整性检查：一次 scandir 遍历对账清单与磁盘（缺失/大小不符/清单外文件），可选修复。
+
+存储：output/.state/output_manifest.json
+{
+    version: int,
+    sources: {
+        "<相对 class_photos 的源路径>": {
+            date: "YYYY-MM-DD",          # 源照片所属日期（与增量快照的日期一致）
+            kind: "recognized" | "unknown" | "no_face" | "error",
+            size: int,                   # 源照片大小（各输出副本与之相同）
+            hash: str,                   # 源照片内容指纹（recognition_cache.quick_content_hash）
+            outputs: ["Alice/2025-12-21/a.jpg", ...]   # 相对 output/ 的路径
+        },
+        ...
+    }
+}
+
+清单损坏或读取失败时按空清单处理：相关日期自动回退为按目录清理，不影响正确性。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from .config import OUTPUT_MANIFEST_FILENAME, STATE_DIR_NAME
+from .recognition_cache import quick_content_hash
+from .utils.date_parser import parse_date_from_text
+from .utils.fs import UnsafePathError, ensure_resolved_under, is_ignored_fs_name
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_VERSION = 2
+# v1 条目没有 size/hash，其余结构相同，可直接读取
+_READABLE_VERSIONS = (1, MANIFEST_VERSION)
+
+KIND_RECOGNIZED = "recognized"
+KIND_UNKNOWN = "unknown"
+KIND_NO_FACE = "no_face"
+KIND_ERROR = "error"
+
+
+def manifest_path(output_dir: Path) -> Path:
+    return Path(output_dir) / STATE_DIR_NAME / OUTPUT_MANIFEST_FILENAME
+
+
+def delete_output_files(output_dir: Path, targets: Iterable[Path]) -> int:
+    """安全删除输出目录中的文件，返回删除数量；删空的父目录（如日期目录）顺带移除。
+
+    每个目标都先确认 resolve 后仍在 output/ 之下（防符号链接越界），不存在的文件直接跳过。
+    output_mode=symlink 生成的符号链接指向 input/ 中的源照片：只校验链接所在目录，
+    删除的是链接本身，绝不触及链接目标；硬链接删除的也只是 output/ 中的那个目录项。
+    """
+    output_dir = Path(output_dir)
+    removed = 0
+    parents: Set[Path] = set()
+    for target in targets:
+        target = Path(target)
+        try:
+            ensure_resolved_under(output_dir, target.parent if target.is_symlink() else target)
+        except UnsafePathError as e:
+            logger.warning(f"跳过不安全清理路径: {target} ({e})")
+            continue
+        try:
+            target.unlink()
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除输出文件失败: {target} ({e})")
+            continue
+        parents.add(target.parent)
+
+    for parent in parents:
+        if parent == output_dir:
+            continue
+        try:
+            os.rmdir(parent)
+        except OSError:
+            pass
+    return removed
+
+
+@dataclass
+class ManifestCheck:
+    """完整性检查结果（路径均相对 output/）。"""
+
+    checked: int = 0
+    missing: List[str] = field(default_factory=list)
+    mismatched: List[str] = field(default_factory=list)
+    orphans: List[str] = field(default_factory=list)
+    repaired: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return not (self.missing or self.mismatched or self.orphans)
+
+
+class OutputManifest:
+    """源照片 → 输出副本 的映射（构造时从磁盘加载，save() 原子写回）。"""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.output_dir = Path(output_dir)
+        self.path = manifest_path(self.output_dir)
+        self._sources: Dict[str, Dict] = self._load()
+        self._by_date: Dict[str, Set[str]] = {}
+        for source, entry in self._sources.items():
+            self._by_date.setdefault(entry.get("date", ""), set()).add(source)
+
+    def _load(self) -> Dict[str, Dict]:
+        if not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except Exception as e:
+            logger.warning(f"输出清单损坏，将按目录清理输出: {e}")
+            return {}
+        if not isinstance(data, dict) or data.get("version") not in _READABLE_VERSIONS:
+            return {}
+        sources = data.get("sources")
+        if not isinstance(sources, dict):
+            return {}
+        return {s: e for s, e in sources.items() if isinstance(e, dict)}
+
+    def save(self) -> None:
+        """原子保存（tmp -> rename）。"""
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            payload = {"version": MANIFEST_VERSION, "sources": self._sources}
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning(f"保存输出清单失败（下次将按目录清理相关输出）: {e}")
+
+    def __len__(self) -> int:
+        return len(self._sources)
+
+    def entry(self, source: str) -> Optional[Dict]:
+        return self._sources.get(source)
+
+    def has_date(self, date: str) -> bool:
+        return bool(self._by_date.get(date))
+
+    def sources_for_date(self, date: str) -> List[str]:
+        return sorted(self._by_date.get(date, ()))
+
+    def record(
+        self,
+        source: str,
+        date: str,
+        kind: str,
+        outputs: Iterable[Path],
+        *,
+        size: Optional[int] = None,
+        content_hash: str = "",
+    ) -> None:
+        """记录一张源照片本次的输出。
+
+        若该源已有记录，旧的输出路径会保留在列表中（不丢失对已有副本的追踪），
+        正常流程中旧副本在重新整理前已按清单删除，这里只是兜底。
+        """
+        rel_outputs: List[str] = []
+        for out in outputs:
+            try:
+                rel_outputs.append(Path(out).relative_to(self.output_dir).as_posix())
+            except ValueError:
+                continue
+        previous = self._forget(source)
+        if previous:
+            rel_outputs = list(dict.fromkeys((previous.get("outputs") or []) + rel_outputs))
+        entry: Dict = {"date": date, "kind": kind, "outputs": rel_outputs}
+        if size is not None:
+            entry["size"] = int(size)
+        if content_hash:
+            entry["hash"] = content_hash
+        self._sources[source] = entry
+        self._by_date.setdefault(date, set()).add(source)
+
+    def _forget(self, source: str) -> Optional[Dict]:
+        entry = self._sources.pop(source, None)
+        if entry is not None:
+            bucket = self._by_date.get(entry.get("date", ""))
+            if bucket is not None:
+                bucket.discard(source)
+        return entry
+
+    def forget_date(self, date: str) -> int:
+        """丢弃某日期的全部记录（不删除文件）。"""
+        sources = self._by_date.pop(date, set())
+        for source in sources:
+            self._sources.pop(source, None)
+        return len(sources)
+
+    def remove_outputs(self, sources: Iterable[str]) -> int:
+        """删除这些源照片的全部输出副本并丢弃记录，返回删除的文件数。"""
+        targets: List[Path] = []
+        for source in sources:
+            entry = self._forget(source)
+            if entry:
+                targets.extend(self.output_dir / rel for rel in entry.get("outputs") or [])
+        return delete_output_files(self.output_dir, targets)
+
+    def remove_dates(self, dates: Iterable[str]) -> int:
+        """按清单删除这些日期的全部输出，返回删除的文件数。"""
+        sources: List[str] = []
+        for date in dates:
+            sources.extend(self.sources_for_date(date))
+        return self.remove_outputs(sources)
+
+    def _scan_output_files(self) -> Dict[str, int]:
+        """一次 scandir 遍历 output/，返回 {相对路径: size}（符号链接按目标大小，失效链接为 -1）。
+
+        跳过 .state 等隐藏/系统条目与 output 根目录下的文件（整理报告等）。
+        """
+        found: Dict[str, int] = {}
+        pending: List[tuple[str, str]] = [(str(self.output_dir), "")]
+        while pending:
+            directory, prefix = pending.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except OSError:
+                continue
+            for entry in entries:
+                if is_ignored_fs_name(entry.name):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append((entry.path, f"{prefix}{entry.name}/"))
+                    elif prefix and entry.is_file(follow_symlinks=False):
+                        found[f"{prefix}{entry.name}"] = entry.stat(follow_symlinks=False).st_size
+                    elif prefix and entry.is_symlink():
+                        # output_mode=symlink 的输出：按链接目标计大小；目标已不存在记为 -1（视为不符）
+                        try:
+                            found[f"{prefix}{entry.name}"] = entry.stat().st_size if entry.is_file() else -1
+                        except OSError:
+                            found[f"{prefix}{entry.name}"] = -1
+                except OSError:
+                    continue
+        return found
+
+    def check(self, *, photos_dir: Optional[Path] = None, repair: bool = False, verify_hash: bool = False) -> ManifestCheck:
+        """对账清单与磁盘。
+
+        - missing：清单中有、磁盘上没有的输出
+        - mismatched：大小（verify_hash=True 时还有内容指纹）与源记录不符的输出
+        - orphans：磁盘上位于日期目录内、但清单中没有记录的文件
+
+        repair=True 时：清单中丢弃 missing；mismatched 在源照片仍与记录一致时从源重新复制
+        （需提供 photos_dir），否则删除该副本；删除 orphans（与整日期清理会删除的范围一致）。
+        修复后自动保存清单。
+        """
+        result = ManifestCheck()
+        on_disk = self._scan_output_files()
+        referenced: Set[str] = set()
+        recopy: List[tuple[str, str]] = []
+
+        for source, entry in self._sources.items():
+            expected_size = entry.get("size")
+            kept: List[str] = []
+            for rel in entry.get("outputs") or []:
+                referenced.add(rel)
+                result.checked += 1
+                size = on_disk.get(rel)
+                if size is None:
+                    result.missing.append(rel)
+                    continue
+                kept.append(rel)
+                bad = size < 0 or (expected_size is not None and size != expected_size)
+                if not bad and verify_hash and entry.get("hash"):
+                    try:
+                        bad = quick_content_hash(self.output_dir / rel, size) != entry["hash"]
+                    except OSError:
+                        bad = True
+                if bad:
+                    result.mismatched.append(rel)
+                    recopy.append((source, rel))
+            if repair:
+                entry["outputs"] = kept
+
+        for rel in sorted(on_disk):
+            if rel in referenced:
+                continue
+            # 只把日期目录内的文件视为“程序生成的输出”，其余（老师自己放的文件等）不动
+            if any(parse_date_from_text(part) for part in rel.split("/")[:-1]):
+                result.orphans.append(rel)
+
+        if repair:
+            result.repaired += len(result.missing)
+            for source, rel in recopy:
+                if self._recopy_from_source(source, rel, photos_dir):
+                    result.repaired += 1
+                else:
+                    result.repaired += delete_output_files(self.output_dir, [self.output_dir / rel])
+                    entry = self._sources.get(source)
+                    if entry is not None:
+                        entry["outputs"] = [r for r in entry.get("outputs", []) if r != rel]
+            result.repaired += delete_output_files(self.output_dir, [self.output_dir / rel for rel in result.orphans])
+            self.save()
+        return result
+
+    def _recopy_from_source(self, source: str, rel: str, photos_dir: Optional[Path]) -> bool:
+        if photos_dir is None:
+            return False
+        entry = self._sources.get(source) or {}
+        src = Path(photos_dir).joinpath(*source.split("/"))
+        dest = self.output_dir / rel
+        try:
+            ensure_resolved_under(self.output_dir, dest.parent if dest.is_symlink() else dest)
+            size = src.stat().st_size
+            if entry.get("size") is not None and size != entry["size"]:
+                return False
+            if entry.get("hash") and quick_content_hash(src, size) != entry["hash"]:
+                return False
+            # 先删掉旧的目录项：dest 可能是指向源照片的硬链接/符号链接，直接覆盖写会改坏源照片
+            if dest.is_symlink() or dest.exists():
+                dest.unlink()
+            shutil.copy2(src, dest)
+            return True
+        except (OSError, UnsafePathError):
+            return False
@@ -3,6 +3,9 @@
 说明：
 - face_recognition/dlib 主要是 CPU 密集型，适合用多进程提升吞吐。
 - 为了降低每个任务的序列化成本，使用 initializer 在子进程中缓存已知编码/姓名等只读数据。
+- 进程池模式下，预处理好的参考编码矩阵只在主进程写入一次共享内存，子进程零拷贝挂载。
+- Linux 下默认用 forkserver 启动 worker：模板进程预加载模型（见 worker_preload），worker 就绪握手
+  完成后才开始派发照片；失败时回退为 spawn（与旧版一致）。
 - 本模块只负责“识别”，分类/统计/落盘由主流程处理。
 """
 
@@ -10,15 +13,23 @@ from __future__ import annotations
 
 import os
 import sys
+import time
+import queue
+import signal
+import threading
 import logging
+import multiprocessing
 import warnings
 import tempfile
 import concurrent.futures
 from pathlib import Path
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
-import numpy as np
+from . import staged_executor
+from .face_matcher import KnownFaceMatcher
+from .prefetch import ReadAheadPrefetcher
+from .utils.tracing import TRACE_KEY, SpanRecorder
 
 
 logger = logging.getLogger(__name__)
@@ -29,6 +40,19 @@ _G_KNOWN_ENCODINGS: List[Any] = []
 _G_KNOWN_NAMES: List[str] = []
 _G_TOLERANCE: float = 0.6
 _G_MIN_FACE_SIZE: int = 50
+_G_RESIZE_LONG_EDGE: int = 0
+_G_MATCHER: KnownFaceMatcher | None = None
+_G_SHARED_REFS: Any = None  # 子进程挂载的 SharedMemory（需保持引用，避免映射被回收）
+
+
+@dataclass(frozen=True)
+class SharedRefsHandle:
+    """共享内存中的参考编码矩阵描述（可 pickle，通过 initargs 传给子进程）。"""
+
+    shm_name: str
+    shape: Tuple[int, int]
+    dtype: str
+    metric: str
 
 
 @dataclass(frozen=True)
@@ -43,10 +67,30 @@ def _truthy_env(name: str, default: str = "0") -> bool:
     return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "y", "on")
 
 
-def init_worker(known_encodings: List[Any], known_names: List[str], tolerance: float, min_face_size: int) -> None:
+def init_worker(
+    known_encodings: List[Any],
+    known_names: List[str],
+    tolerance: float,
+    min_face_size: int,
+    resize_long_edge: int = 0,
+    shared_refs: Optional[SharedRefsHandle] = None,
+    ready_queue: Any = None,
+) -> None:
+    """子进程初始化器。
+
+    shared_refs 不为空时，known_encodings 可为空列表：参考矩阵从共享内存零拷贝挂载。
+    ready_queue 不为空时，先加载人脸识别后端，再回报 (pid, ok, error) 作为就绪握手。
+    """
     # 兼容历史：某些依赖可能产生噪声警告；并行下会被放大。
     warnings.filterwarnings("ignore", message=r"pkg_resources is deprecated as an API\.")
 
+    # Ctrl-C 由主进程统一处理（提交已完成的结果后终止进程池）；子进程忽略，避免各自打印中断堆栈
+    if multiprocessing.parent_process() is not None:
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+        except (ValueError, OSError):
+            pass
+
     # 修复 Matplotlib 在多进程下的竞态条件（构建字体缓存导致死锁/卡顿）
     # 强制每个子进程使用独立的 MPLCONFIGDIR
     try:
@@ -65,110 +109,350 @@ def init_worker(known_encodings: List[Any], known_names: List[str], tolerance: f
     except Exception:
         pass
 
-    global _G_KNOWN_ENCODINGS, _G_KNOWN_NAMES, _G_TOLERANCE, _G_MIN_FACE_SIZE
+    global _G_KNOWN_ENCODINGS, _G_KNOWN_NAMES, _G_TOLERANCE, _G_MIN_FACE_SIZE, _G_RESIZE_LONG_EDGE, _G_MATCHER
     _G_KNOWN_ENCODINGS = known_encodings
     _G_KNOWN_NAMES = known_names
     _G_TOLERANCE = float(tolerance)
     _G_MIN_FACE_SIZE = int(min_face_size)
-
-
-def recognize_one(image_path: str) -> Tuple[str, Dict[str, Any]]:
-    """对子进程中的单张照片执行识别，返回 (path, details_dict)。"""
+    _G_RESIZE_LONG_EDGE = max(0, int(resize_long_edge or 0))
+    _G_MATCHER = None
+    if shared_refs is not None:
+        _attach_shared_refs(shared_refs, known_names)
+    _get_worker_matcher()
+
+    if ready_queue is not None:
+        # 注意：initializer 抛异常会让 Pool 无限重建 worker，这里只回报、不抛出
+        error = ""
+        try:
+            warm_worker_backend()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        try:
+            ready_queue.put((os.getpid(), not error, error))
+        except Exception:
+            pass
+
+
+def warm_worker_backend() -> None:
+    """加载当前选择的人脸识别后端及其模型（forkserver 模板/worker 就绪握手使用）。"""
+    from . import face_recognizer as fr_module
+
+    backend = fr_module._get_face_backend_singleton()
+    if backend is None:
+        if fr_module._FACE_BACKEND_INIT_ERROR is not None:
+            raise fr_module._FACE_BACKEND_INIT_ERROR
+        raise ModuleNotFoundError("人脸识别后端依赖未就绪")
+    get_app = getattr(backend, "_get_app", None)
+    if callable(get_app):
+        # InsightFace：模型在首次使用时才加载，这里提前触发
+        get_app()
+
+
+def _publish_shared_refs(known_encodings: List[Any], known_names: List[str]):
+    """把预处理后的参考矩阵写入共享内存，返回 (SharedMemory, SharedRefsHandle)。
+
+    参考编码为空或维度不一致（无法合成单个矩阵）时返回 (None, None)，调用方回退为 initargs 传递。
+    """
+    from multiprocessing import shared_memory
+
+    import numpy as np
+
+    from .face_recognizer import _get_backend_distance_metric, _get_selected_face_backend_engine
+
+    metric = _get_backend_distance_metric(_get_selected_face_backend_engine())
+    matrix = KnownFaceMatcher(known_encodings, known_names, metric=metric).packed_matrix()
+    if matrix is None or matrix.shape[0] != len(known_names):
+        return None, None
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(matrix.nbytes)))
+    try:
+        view = np.ndarray(matrix.shape, dtype=matrix.dtype, buffer=shm.buf)
+        view[...] = matrix
+        del view
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+    handle = SharedRefsHandle(
+        shm_name=shm.name,
+        shape=(int(matrix.shape[0]), int(matrix.shape[1])),
+        dtype=str(matrix.dtype),
+        metric=metric,
+    )
+    return shm, handle
+
+
+def _release_shared_refs(shm) -> None:
+    """主进程：进程池退出（含异常）后释放共享内存段。"""
+    if shm is None:
+        return
+    try:
+        shm.close()
+    except Exception:
+        pass
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.debug("释放共享参考矩阵失败: %s", e)
+
+
+def _attach_shared_refs(handle: SharedRefsHandle, known_names: List[str]) -> None:
+    """子进程：挂载共享参考矩阵（只读视图，不复制）并据此构建匹配器。"""
+    global _G_KNOWN_ENCODINGS, _G_MATCHER, _G_SHARED_REFS
+    from multiprocessing import shared_memory
+    from multiprocessing.util import Finalize
+
+    import numpy as np
+
+    shm = shared_memory.SharedMemory(name=handle.shm_name)
+    matrix = np.ndarray(handle.shape, dtype=np.dtype(handle.dtype), buffer=shm.buf)
+    matrix.flags.writeable = False
+    _G_SHARED_REFS = shm
+    _G_KNOWN_ENCODINGS = matrix
+    _G_MATCHER = KnownFaceMatcher.from_packed(matrix, known_names, metric=handle.metric)
+    # 子进程退出前先丢弃视图再 close，避免 “exported pointers exist” 噪声
+    Finalize(None, _detach_shared_refs, exitpriority=10)
+
+
+def _detach_shared_refs() -> None:
+    global _G_KNOWN_ENCODINGS, _G_MATCHER, _G_SHARED_REFS
+    shm = _G_SHARED_REFS
+    _G_KNOWN_ENCODINGS = []
+    _G_MATCHER = None
+    _G_SHARED_REFS = None
+    if shm is not None:
+        try:
+            shm.close()
+        except Exception:
+            pass
+
+
+def _get_worker_matcher() -> KnownFaceMatcher:
+    """子进程内的矩阵匹配器：只在已知编码变化时重建一次。"""
+    global _G_MATCHER
+    matcher = _G_MATCHER
+    if (
+        matcher is None
+        or matcher.known_encodings is not _G_KNOWN_ENCODINGS
+        or matcher.known_names is not _G_KNOWN_NAMES
+    ):
+        from .face_recognizer import _get_backend_distance_metric, _get_selected_face_backend_engine
+
+        metric = _get_backend_distance_metric(_get_selected_face_backend_engine())
+        matcher = KnownFaceMatcher(_G_KNOWN_ENCODINGS, _G_KNOWN_NAMES, metric=metric)
+        _G_MATCHER = matcher
+    return matcher
+
+
+def _decode_for_recognition(image_path: str, data: Optional[bytes] = None) -> Tuple[Any, float, SpanRecorder]:
+    """识别的解码阶段，返回 (image, scale, spans)；失败时抛出异常。data 为已预读的文件字节（可选）。"""
     # 保险起见：某些平台/路径下警告过滤可能未在 initializer 生效，这里再兜底一次。
     warnings.filterwarnings("ignore", message=r"pkg_resources is deprecated as an API\.")
     from .face_recognizer import face_recognition
 
-    # 结果结构尽量与 FaceRecognizer.recognize_faces(return_details=True) 对齐
+    if face_recognition is None:
+        engine = os.environ.get("SUNDAY_PHOTOS_FACE_BACKEND", "").strip().lower() or "insightface"
+        raise ModuleNotFoundError(f"人脸识别后端依赖未就绪（SUNDAY_PHOTOS_FACE_BACKEND={engine}）")
+
+    # 子进程没有主进程的 Tracer：各步耗时本地记录，随结果带回（TRACE_KEY）
+    spans = SpanRecorder()
+    # 可选解码时缩小（resize_long_edge）；scale 用于把人脸坐标换算回原图
+    with spans.span("decode"):
+        image, scale = face_recognition.load_image_scaled(
+            image_path, resize_long_edge=_G_RESIZE_LONG_EDGE, **({"data": data} if data is not None else {})
+        )
+    return image, scale, spans
+
+
+def _infer_decoded(image_path: str, image: Any, scale: float, spans: SpanRecorder) -> Tuple[str, Dict[str, Any]]:
+    """识别的推理阶段：检测 + 编码 + 匹配；失败时抛出异常。"""
+    from .face_recognizer import face_recognition, _details_from_analysis
+
+    # 检测 + 编码单次推理；过小的人脸在编码前即被过滤
+    with spans.span("detect_embed"):
+        analysis = face_recognition.analyze(image, min_face_size=_G_MIN_FACE_SIZE, scale=scale)
+
+    face_matches = None
+    if analysis.locations and len(_G_KNOWN_ENCODINGS) > 0:
+        with spans.span("match"):
+            face_matches = _get_worker_matcher().match(analysis.encodings, _G_TOLERANCE)
+    details = _details_from_analysis(analysis, face_matches)
+    details[TRACE_KEY] = spans.as_payload()
+    return image_path, details
+
+
+def _recognition_error(image_path: str, error: BaseException) -> Tuple[str, Dict[str, Any]]:
+    if isinstance(error, MemoryError):
+        message = f"处理图片时内存不足: {image_path}"
+    else:
+        logger.error(f"并行识别图片 {image_path} 失败", exc_info=error)
+        message = f"识别图片 {image_path} 中的人脸失败: {str(error)}"
+    return image_path, {
+        "status": "error",
+        "message": message,
+        "recognized_students": [],
+        "total_faces": 0,
+    }
+
+
+def recognize_one(image_path: str, data: Optional[bytes] = None) -> Tuple[str, Dict[str, Any]]:
+    """对子进程中的单张照片执行识别，返回 (path, details_dict)。data 为主进程预读的文件字节（可选）。"""
+    # 结果结构与 FaceRecognizer.recognize_faces(return_details=True) 对齐（同一个构造函数）
+    try:
+        return _infer_decoded(image_path, *_decode_for_recognition(image_path, data))
+    except Exception as e:
+        return _recognition_error(image_path, e)
+
+
+def recognize_buffered(task: Tuple[str, Optional[bytes]]) -> Tuple[str, Dict[str, Any]]:
+    """进程池任务：task 为 (path, 预读字节或 None)。"""
+    return recognize_one(task[0], task[1])
+
+
+def _recognize_prefetched(image_path: str, prefetch: Optional[ReadAheadPrefetcher]) -> Tuple[str, Dict[str, Any]]:
+    # 未开启预读时按旧签名调用（测试/插件可能替换 recognize_one）
+    if prefetch is None:
+        return recognize_one(image_path)
+    return recognize_one(image_path, prefetch.take(image_path))
+
+
+def _infer_staged(image_path: str, decoded: Any, error: Optional[BaseException]) -> Tuple[str, Dict[str, Any]]:
+    """分级执行时的推理任务：decoded/error 来自 decode_ahead。"""
+    if error is not None:
+        return _recognition_error(image_path, error)
     try:
-        if face_recognition is None:
-            engine = os.environ.get("SUNDAY_PHOTOS_FACE_BACKEND", "").strip().lower() or "insightface"
-            raise ModuleNotFoundError(f"人脸识别后端依赖未就绪（SUNDAY_PHOTOS_FACE_BACKEND={engine}）")
-
-        image = face_recognition.load_image_file(image_path)
-        face_locations = face_recognition.face_locations(image)
-
-        if not face_locations:
-            return image_path, {
-                "status": "no_faces_detected",
-                "message": "图片中未检测到人脸",
-                "recognized_students": [],
-                "total_faces": 0,
-            }
-
-        sizeable_locations = []
-        for top, right, bottom, left in face_locations:
-            if (bottom - top) >= _G_MIN_FACE_SIZE and (right - left) >= _G_MIN_FACE_SIZE:
-                sizeable_locations.append((top, right, bottom, left))
-
-        if not sizeable_locations:
-            return image_path, {
-                "status": "no_faces_detected",
-                "message": "检测到的人脸尺寸过小，无法识别",
-                "recognized_students": [],
-                "total_faces": 0,
-            }
-
-        face_encodings = face_recognition.face_encodings(image, sizeable_locations)
-
-        if not _G_KNOWN_ENCODINGS:
-            total_faces = len(face_encodings)
-            return image_path, {
-                "status": "no_matches_found",
-                "message": "没有找到任何可用的学生面部编码",
-                "recognized_students": [],
-                "total_faces": total_faces,
-                "unknown_faces": total_faces,
-            }
-
-        recognized_students: List[str] = []
-        unknown_faces_count = 0
-        unknown_encodings = []
-
-        known_encodings = _G_KNOWN_ENCODINGS
-        known_names = _G_KNOWN_NAMES
-
-        for face_encoding in face_encodings:
-            matches = face_recognition.compare_faces(known_encodings, face_encoding, tolerance=_G_TOLERANCE)
-            face_distances = face_recognition.face_distance(known_encodings, face_encoding)
-
-            best_match_index = None
-            if len(face_distances) > 0:
-                best_match_index = int(np.argmin(face_distances))
-
-            if best_match_index is not None and matches[best_match_index]:
-                student_name = known_names[best_match_index]
-                if student_name not in recognized_students:
-                    recognized_students.append(student_name)
-            else:
-                unknown_faces_count += 1
-                unknown_encodings.append(face_encoding)
-
-        total_faces = len(face_encodings)
-        status = "success" if recognized_students else "no_matches_found"
-        return image_path, {
-            "status": status,
-            "message": f"检测到{total_faces}张人脸，识别到{len(recognized_students)}名学生",
-            "recognized_students": recognized_students,
-            "total_faces": total_faces,
-            "unknown_faces": unknown_faces_count,
-            "unknown_encodings": unknown_encodings,
-        }
-
-    except MemoryError:
-        return image_path, {
-            "status": "error",
-            "message": f"处理图片时内存不足: {image_path}",
-            "recognized_students": [],
-            "total_faces": 0,
-        }
+        return _infer_decoded(image_path, *decoded)
     except Exception as e:
-        logger.exception(f"并行识别图片 {image_path} 失败")
-        return image_path, {
-            "status": "error",
-            "message": f"识别图片 {image_path} 中的人脸失败: {str(e)}",
-            "recognized_students": [],
-            "total_faces": 0,
-        }
+        return _recognition_error(image_path, e)
+
+
+def _select_worker_bootstrap() -> str:
+    """worker 启动方式：forkserver（预加载模型）或 spawn。
+
+    - SUNDAY_PHOTOS_WORKER_BOOTSTRAP=forkserver|spawn 可强制指定
+    - 默认：Linux 非打包环境用 forkserver；其它平台（macOS fork 安全性、Windows 无 fork）用 spawn
+    """
+    import multiprocessing as mp
+
+    raw = (os.environ.get("SUNDAY_PHOTOS_WORKER_BOOTSTRAP", "") or "").strip().lower()
+    if raw not in ("forkserver", "spawn"):
+        is_frozen = bool(getattr(sys, "frozen", False))
+        raw = "forkserver" if (sys.platform.startswith("linux") and not is_frozen) else "spawn"
+    if raw == "forkserver":
+        try:
+            if "forkserver" not in mp.get_all_start_methods():
+                return "spawn"
+        except Exception:
+            return "spawn"
+    return raw
+
+
+def _worker_ready_timeout() -> float:
+    raw = os.environ.get("SUNDAY_PHOTOS_WORKER_READY_TIMEOUT", "").strip()
+    try:
+        return max(1.0, float(raw)) if raw else 180.0
+    except Exception:
+        return 180.0
+
+
+def _wait_workers_ready(ready_queue: Any, workers: int, timeout: float) -> Tuple[bool, str]:
+    """等待每个 worker 回报就绪；全部成功返回 (True, "")，否则 (False, 原因)。"""
+    deadline = time.monotonic() + timeout
+    ready = 0
+    while ready < workers:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False, f"等待 worker 就绪超时（{ready}/{workers}，{timeout:.0f}s）"
+        try:
+            _pid, ok, error = ready_queue.get(timeout=remaining)
+        except queue.Empty:
+            continue
+        if not ok:
+            return False, f"worker 加载人脸模型失败: {error}"
+        ready += 1
+    return True, ""
+
+
+def _open_forkserver_pool(workers: int, initargs: tuple):
+    """用预加载模型的 forkserver 启动进程池，并完成就绪握手；失败返回 None（调用方回退 spawn）。"""
+    import multiprocessing as mp
+
+    ctx = mp.get_context("forkserver")
+    # 预加载模块与本模块同包（src.core / core 两种导入方式都适用）
+    ctx.set_forkserver_preload([f"{__package__}.worker_preload"])
+    ready_queue = ctx.Queue()
+    started = time.monotonic()
+    pool = ctx.Pool(processes=int(workers), initializer=init_worker, initargs=initargs + (ready_queue,))
+    try:
+        ok, reason = _wait_workers_ready(ready_queue, int(workers), _worker_ready_timeout())
+    except BaseException:
+        pool.terminate()
+        pool.join()
+        raise
+    if not ok:
+        logger.warning("forkserver 预热失败，回退 spawn 启动: %s", reason)
+        pool.terminate()
+        pool.join()
+        return None
+    logger.info("并行 worker 已就绪（forkserver，%s 个，用时 %.1fs）", int(workers), time.monotonic() - started)
+    return pool
+
+
+def _open_process_pool(workers: int, initargs: tuple):
+    """按 worker 启动方式创建进程池；forkserver 不可用/预热失败时回退为 spawn。"""
+    import multiprocessing as mp
+
+    if _select_worker_bootstrap() == "forkserver":
+        try:
+            pool = _open_forkserver_pool(workers, initargs)
+            if pool is not None:
+                return pool
+        except Exception as e:
+            logger.warning("forkserver 启动失败，回退 spawn 启动: %s", e)
+
+    ctx = mp.get_context("spawn")
+    return ctx.Pool(processes=int(workers), initializer=init_worker, initargs=initargs)
+
+
+def _recognize_staged_threads(
+    photo_paths: List[str],
+    infer_workers: int,
+    max_in_flight: int,
+    stages: Dict[str, Any],
+    prefetch: Optional[ReadAheadPrefetcher] = None,
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """线程策略的分级执行：decode_ahead 提前解码（有预读时从预读缓冲取字节），infer_workers 个推理线程消费。"""
+    queue_depth = int(stages.get("queue_depth", 0) or 0)
+    if max_in_flight and max_in_flight > 0:
+        # 有界内存模式：已解码待推理的照片也计入上限
+        queue_depth = min(queue_depth, int(max_in_flight)) if queue_depth > 0 else int(max_in_flight)
+    def _decode(image_path: str) -> Tuple[Any, float, SpanRecorder]:
+        data = prefetch.take(image_path) if prefetch is not None else None
+        return _decode_for_recognition(image_path, data)
+
+    frames = staged_executor.decode_ahead(
+        photo_paths,
+        _decode,
+        infer_workers=infer_workers,
+        decode_workers=int(stages.get("decode_workers", 0) or 0),
+        queue_depth=queue_depth,
+    )
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=infer_workers, thread_name_prefix="infer") as ex:
+            pending = set()
+            for path, decoded, error in frames:
+                pending.add(ex.submit(_infer_staged, path, decoded, error))
+                # 推理中的照片不超过推理线程数，其余的留在有界队列里（背压传回解码线程）
+                if len(pending) >= infer_workers:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for fut in done:
+                        yield fut.result()
+            for fut in concurrent.futures.as_completed(pending):
+                yield fut.result()
+    finally:
+        frames.close()
 
 
 def parallel_recognize(
@@ -180,18 +464,33 @@ def parallel_recognize(
     min_face_size: int,
     workers: int,
     chunk_size: int,
+    resize_long_edge: int = 0,
+    max_in_flight: int = 0,
+    decode_ahead: Optional[Dict[str, Any]] = None,
+    prefetch: Optional[ReadAheadPrefetcher] = None,
 ) -> Iterator[Tuple[str, Dict[str, Any]]]:
-    """并行识别入口。返回一个迭代器，逐个产出 (path, details)。"""
+    """并行识别入口。返回一个迭代器，逐个产出 (path, details)。
+
+    max_in_flight > 0（有界内存模式）时，已派发但还没被调用方取走的照片不超过这个数：
+    线程池按滑动窗口提交，进程池在调用方取走结果后才继续派发，结果不会在内存中堆积。
+
+    decode_ahead（{"decode_workers", "queue_depth"}，见 config.DEFAULT_DECODE_AHEAD）给出时，
+    线程策略改为分级执行：解码线程提前解码进有界队列，推理线程只做检测 + 编码 + 匹配。
+    进程池不受影响（各进程本身已让解码与推理在多核上重叠）。
+
+    prefetch（见 prefetch.ReadAheadPrefetcher，按 photo_paths 的顺序预读）给出时，各策略都从预读缓冲取字节解码：
+    线程由解码方 take，进程池由主进程的派发线程 take 后把 (path, bytes) 交给子进程，子进程不再各自读文件。
+    """
 
     # 强制禁用：便于排障
     if _truthy_env("SUNDAY_PHOTOS_NO_PARALLEL", default="0"):
         for p in photo_paths:
-            yield recognize_one(p)
+            yield _recognize_prefetched(p, prefetch)
         return
 
     if workers <= 1 or len(photo_paths) <= 1:
         for p in photo_paths:
-            yield recognize_one(p)
+            yield _recognize_prefetched(p, prefetch)
         return
 
     # Strategy selection.
@@ -213,38 +512,100 @@ def parallel_recognize(
 
     if strategy == "threads":
         # Initialize globals once in the main process. recognize_one reads these.
-        init_worker(known_encodings, known_names, float(tolerance), int(min_face_size))
+        init_worker(known_encodings, known_names, float(tolerance), int(min_face_size), int(resize_long_edge))
 
         # threads: keep chunksize semantics simple; we still yield as soon as futures complete.
         max_workers = int(max(2, workers))
+        if decode_ahead:
+            yield from _recognize_staged_threads(photo_paths, max_workers, max_in_flight, decode_ahead, prefetch)
+            return
+        window = max(int(max_in_flight), max_workers) if max_in_flight and max_in_flight > 0 else len(photo_paths)
+        remaining = iter(photo_paths)
         with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as ex:
-            futures = {ex.submit(recognize_one, p): p for p in photo_paths}
-            for fut in concurrent.futures.as_completed(futures):
-                p = futures[fut]
-                try:
-                    yield fut.result()
-                except Exception as e:
-                    logger.exception("并行识别线程任务失败: %s", p)
-                    yield p, {
-                        "status": "error",
-                        "message": f"并行识别线程任务失败: {str(e)}",
-                        "recognized_students": [],
-                        "total_faces": 0,
-                    }
+            futures = {}
+
+            def _fill() -> None:
+                while len(futures) < window:
+                    p = next(remaining, None)
+                    if p is None:
+                        return
+                    futures[ex.submit(_recognize_prefetched, p, prefetch)] = p
+
+            _fill()
+            while futures:
+                # 一次性提交全部照片时直接 as_completed；有窗口时每完成一批就补足窗口
+                if window >= len(photo_paths):
+                    done = concurrent.futures.as_completed(list(futures))
+                else:
+                    done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for fut in done:
+                    p = futures.pop(fut)  # 取走后不再持有结果
+                    try:
+                        yield fut.result()
+                    except Exception as e:
+                        logger.exception("并行识别线程任务失败: %s", p)
+                        yield p, {
+                            "status": "error",
+                            "message": f"并行识别线程任务失败: {str(e)}",
+                            "recognized_students": [],
+                            "total_faces": 0,
+                        }
+                _fill()
         return
 
-    import multiprocessing as mp
-
     # 进度条“卡住”的常见原因：Pool.imap_unordered 的 chunksize 偏大时，结果会按批次回传。
     # 为了让控制台进度条更丝滑（老师能持续看到在运行），这里对实际 chunksize 做上限。
     # 说明：chunksize 越小，调度开销越高；但通常 1~2 能显著改善“长时间不动”。
     effective_chunksize = int(max(1, min(int(chunk_size), 2)))
 
-    ctx = mp.get_context("spawn")
-    with ctx.Pool(
-        processes=int(workers),
-        initializer=init_worker,
-        initargs=(known_encodings, known_names, float(tolerance), int(min_face_size)),
-    ) as pool:
-        for item in pool.imap_unordered(recognize_one, photo_paths, chunksize=effective_chunksize):
-            yield item
+    # 参考矩阵只发布一次到共享内存；失败时回退为逐进程 pickle（行为与旧版一致）
+    shm = None
+    shared_refs = None
+    try:
+        shm, shared_refs = _publish_shared_refs(known_encodings, known_names)
+    except Exception as e:
+        logger.debug("共享参考矩阵不可用，回退为 initargs 传递: %s", e)
+    worker_encodings = [] if shared_refs is not None else known_encodings
+
+    # 有界派发：Pool 的派发线程每取一张照片先占一个名额，调用方每取走一个结果归还一个
+    # （名额不少于一个批次的照片数，否则凑不满批次会一直等下去）
+    gate = None
+    if max_in_flight and max_in_flight > 0:
+        gate = threading.Semaphore(max(int(max_in_flight), effective_chunksize))
+    stop_feeding = threading.Event()
+
+    def _gated(paths):
+        for p in paths:
+            while not gate.acquire(timeout=0.1):
+                if stop_feeding.is_set():
+                    return
+            yield p
+
+    try:
+        with _open_process_pool(
+            int(workers),
+            (
+                worker_encodings,
+                list(known_names),
+                float(tolerance),
+                int(min_face_size),
+                int(resize_long_edge),
+                shared_refs,
+            ),
+        ) as pool:
+            tasks = _gated(photo_paths) if gate is not None else photo_paths
+            worker_fn = recognize_one
+            if prefetch is not None:
+                # 派发线程按顺序取预读字节（占到名额之后才取），子进程直接从内存解码
+                tasks = ((p, prefetch.take(p)) for p in tasks)
+                worker_fn = recognize_buffered
+            try:
+                for item in pool.imap_unordered(worker_fn, tasks, chunksize=effective_chunksize):
+                    if gate is not None:
+                        gate.release()
+                    yield item
+            finally:
+                # 先放行派发线程，再让 Pool 退出（terminate 会等待派发线程结束）
+                stop_feeding.set()
+    finally:
+        _release_shared_refs(shm)
@@ -0,0 +1,314 @@
+"""照片元数据索引（PhotoMeta）：每张照片的日期、大小、mtime、EXIF 方向与像素尺寸。
+
+用途：
+- 扫描阶段为本次要处理的照片建立一次，识别与整理阶段直接查表，
+  不再为同一张照片反复调用 get_photo_date（目录名不是日期时每次都要用 PIL 打开读 EXIF）；
+- 持久化在增量快照旁边，size/mtime 未变的照片下次运行直接复用，不再重读 EXIF。
+
+读取方式：
+- JPEG：按段（marker）跳读到 APP1(Exif) 与 SOFn，只解析 TIFF 头中的 Orientation 与
+  DateTimeOriginal，不解码像素，一般只读文件开头的几十 KB；
+- 其他格式：交给 PIL 惰性打开（同样只读文件头，不解码像素）。
+
+日期口径与 get_photo_date 一致：目录名 > EXIF DateTimeOriginal > 文件 mtime。
+像素尺寸为文件中存储的尺寸（未按 EXIF 方向旋转），display_size 给出转正后的尺寸。
+
+存储：output/.state/photo_meta.json
+{
+    version: int,
+    photos: {
+        "<相对 class_photos 的路径>": {date, size, mtime, orientation, width, height},
+        ...
+    }
+}
+索引损坏或读取失败时按空索引处理（只是需要重新读文件头），不影响正确性。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import struct
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Mapping, Optional, Tuple
+
+from .config import PHOTO_META_FILENAME, STATE_DIR_NAME
+from .utils.date_parser import _get_date_from_directory
+
+logger = logging.getLogger(__name__)
+
+PHOTO_META_VERSION = 1
+
+_TAG_ORIENTATION = 0x0112
+_TAG_EXIF_IFD = 0x8769
+_TAG_DATETIME_ORIGINAL = 0x9003
+# SOF0..SOF15，除去 DHT(C4)、JPG(C8)、DAC(CC)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    """从文件头读到的信息；读不到的字段保持默认值。"""
+
+    width: int = 0
+    height: int = 0
+    orientation: int = 1
+    exif_date: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class PhotoMeta:
+    date: str
+    size: int
+    mtime: int
+    orientation: int = 1
+    width: int = 0
+    height: int = 0
+
+    @property
+    def display_size(self) -> Tuple[int, int]:
+        """按 EXIF 方向转正后的 (宽, 高)：方向 5~8 需要交换宽高。"""
+        if self.orientation in (5, 6, 7, 8):
+            return self.height, self.width
+        return self.width, self.height
+
+
+def photo_meta_path(output_dir: Path) -> Path:
+    return Path(output_dir) / STATE_DIR_NAME / PHOTO_META_FILENAME
+
+
+def _exif_date(value: bytes) -> Optional[str]:
+    try:
+        text = value.split(b"\x00", 1)[0].decode("ascii").strip()
+        return datetime.strptime(text, "%Y:%m:%d %H:%M:%S").strftime("%Y-%m-%d")
+    except (UnicodeDecodeError, ValueError):
+        return None
+
+
+def _parse_exif(tiff: bytes) -> Tuple[int, Optional[str]]:
+    """解析 TIFF 结构的 EXIF 数据，返回 (orientation, DateTimeOriginal 日期)。"""
+    endian = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if endian is None or len(tiff) < 8:
+        return 1, None
+
+    def _ifd(offset: int) -> Dict[int, Tuple[int, int, bytes]]:
+        entries: Dict[int, Tuple[int, int, bytes]] = {}
+        if offset + 2 > len(tiff):
+            return entries
+        (count,) = struct.unpack_from(endian + "H", tiff, offset)
+        for i in range(count):
+            pos = offset + 2 + 12 * i
+            if pos + 12 > len(tiff):
+                break
+            tag, typ, n = struct.unpack_from(endian + "HHI", tiff, pos)
+            entries[tag] = (typ, n, tiff[pos + 8 : pos + 12])
+        return entries
+
+    (ifd0_offset,) = struct.unpack_from(endian + "I", tiff, 4)
+    ifd0 = _ifd(ifd0_offset)
+
+    orientation = 1
+    if _TAG_ORIENTATION in ifd0:
+        typ, _n, raw = ifd0[_TAG_ORIENTATION]
+        if typ == 3:  # SHORT
+            value = struct.unpack_from(endian + "H", raw)[0]
+            orientation = value if 1 <= value <= 8 else 1
+
+    exif_date = None
+    if _TAG_EXIF_IFD in ifd0:
+        (exif_offset,) = struct.unpack_from(endian + "I", ifd0[_TAG_EXIF_IFD][2])
+        exif_ifd = _ifd(exif_offset)
+        if _TAG_DATETIME_ORIGINAL in exif_ifd:
+            typ, n, raw = exif_ifd[_TAG_DATETIME_ORIGINAL]
+            if typ == 2:  # ASCII，20 字节，存放在偏移处
+                if n <= 4:
+                    exif_date = _exif_date(raw[:n])
+                else:
+                    (value_offset,) = struct.unpack_from(endian + "I", raw)
+                    exif_date = _exif_date(tiff[value_offset : value_offset + n])
+    return orientation, exif_date
+
+
+def _read_jpeg_header(f: BinaryIO) -> Optional[ImageHeader]:
+    """按段跳读 JPEG：遇到 SOFn 即返回；到达图像数据（SOS）仍无 SOF 则返回 None。"""
+    orientation, exif_date = 1, None
+    exif_seen = False
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if byte != b"\xff":
+            return None
+        marker = f.read(1)
+        while marker == b"\xff":  # 填充字节
+            marker = f.read(1)
+        if not marker:
+            return None
+        code = marker[0]
+        if code == 0x01 or 0xD0 <= code <= 0xD8:  # 无长度的独立标记
+            continue
+        if code in (0xD9, 0xDA):
+            return None
+        length_bytes = f.read(2)
+        if len(length_bytes) < 2:
+            return None
+        (length,) = struct.unpack(">H", length_bytes)
+        if length < 2:
+            return None
+        if code == 0xE1 and not exif_seen:
+            data = f.read(length - 2)
+            if data.startswith(b"Exif\x00\x00"):
+                exif_seen = True
+                try:
+                    orientation, exif_date = _parse_exif(data[6:])
+                except struct.error:
+                    pass
+        elif code in _JPEG_SOF_MARKERS:
+            data = f.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            return ImageHeader(width=width, height=height, orientation=orientation, exif_date=exif_date)
+        else:
+            f.seek(length - 2, os.SEEK_CUR)
+
+
+def _read_header_with_pil(path: str) -> ImageHeader:
+    try:
+        from PIL import Image
+
+        with Image.open(path) as im:
+            width, height = im.size
+            exif = im.getexif()
+            orientation = int(exif.get(_TAG_ORIENTATION, 1) or 1)
+            raw_date = exif.get_ifd(_TAG_EXIF_IFD).get(_TAG_DATETIME_ORIGINAL)
+        exif_date = _exif_date(raw_date.encode("ascii", "ignore")) if isinstance(raw_date, str) else None
+        return ImageHeader(
+            width=int(width),
+            height=int(height),
+            orientation=orientation if 1 <= orientation <= 8 else 1,
+            exif_date=exif_date,
+        )
+    except Exception:
+        return ImageHeader()
+
+
+def read_image_header(path: str | Path) -> ImageHeader:
+    """只读文件头获取尺寸、EXIF 方向与拍摄日期（不解码像素）；读取失败返回空 ImageHeader。"""
+    path = str(path)
+    try:
+        with open(path, "rb") as f:
+            if f.read(2) == b"\xff\xd8":
+                header = _read_jpeg_header(f)
+                if header is not None:
+                    return header
+    except OSError:
+        return ImageHeader()
+    return _read_header_with_pil(path)
+
+
+def read_photo_meta(path: str | Path, size: Optional[int] = None, mtime: Optional[int] = None) -> PhotoMeta:
+    """读取一张照片的 PhotoMeta；size/mtime 可由调用方（扫描结果）直接提供，省去一次 stat。"""
+    path = str(path)
+    if size is None or mtime is None:
+        st = os.stat(path)
+        size, mtime = int(st.st_size), int(st.st_mtime)
+    header = read_image_header(path)
+    date = _get_date_from_directory(path) or header.exif_date or datetime.fromtimestamp(mtime).strftime("%Y-%m-%d")
+    return PhotoMeta(
+        date=date,
+        size=int(size),
+        mtime=int(mtime),
+        orientation=header.orientation,
+        width=header.width,
+        height=header.height,
+    )
+
+
+class PhotoMetaIndex:
+    """相对 class_photos 的路径 -> PhotoMeta（构造时从磁盘加载，save() 原子写回）。"""
+
+    def __init__(self, output_dir: Path, photos_dir: Path) -> None:
+        self.path = photo_meta_path(output_dir)
+        self.photos_dir = Path(photos_dir)
+        self._entries: Dict[str, PhotoMeta] = self._load()
+        self._dirty = False
+
+    def _load(self) -> Dict[str, PhotoMeta]:
+        if not self.path.exists():
+            return {}
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if not isinstance(data, dict) or data.get("version") != PHOTO_META_VERSION:
+                return {}
+            return {rel: PhotoMeta(**entry) for rel, entry in (data.get("photos") or {}).items()}
+        except Exception as e:
+            logger.warning(f"照片元数据索引损坏，将重新读取文件头: {e}")
+            return {}
+
+    def save(self) -> None:
+        """有变化时原子保存（tmp -> rename）。"""
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            payload = {
+                "version": PHOTO_META_VERSION,
+                "photos": {rel: asdict(meta) for rel, meta in sorted(self._entries.items())},
+            }
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"保存照片元数据索引失败（下次运行将重新读取文件头）: {e}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _rel(self, photo_path: str | Path) -> Optional[str]:
+        try:
+            return Path(photo_path).relative_to(self.photos_dir).as_posix()
+        except ValueError:
+            return None
+
+    def get(self, photo_path: str | Path) -> Optional[PhotoMeta]:
+        rel = self._rel(photo_path)
+        return self._entries.get(rel) if rel is not None else None
+
+    def refresh(self, photo_paths: Iterable[str], file_stats: Optional[Mapping[str, tuple]] = None) -> int:
+        """确保这些照片都有最新的 PhotoMeta，返回实际读取文件头的张数。
+
+        file_stats：相对路径 -> (size, mtime)（来自扫描快照）；size/mtime 与索引一致的照片直接复用。
+        """
+        file_stats = file_stats or {}
+        read = 0
+        for photo_path in photo_paths:
+            rel = self._rel(photo_path)
+            if rel is None:
+                continue
+            size, mtime = file_stats.get(rel, (None, None))
+            current = self._entries.get(rel)
+            if current is not None and size is not None and (current.size, current.mtime) == (size, mtime):
+                continue
+            try:
+                meta = read_photo_meta(photo_path, size, mtime)
+            except OSError:
+                continue
+            if meta != current:
+                self._entries[rel] = meta
+                self._dirty = True
+            read += 1
+        return read
+
+    def retain(self, rel_paths: Iterable[str]) -> int:
+        """只保留这些照片的记录（输入端已删除的照片随之清除），返回清除的条数。"""
+        keep = set(rel_paths)
+        stale = [rel for rel in self._entries if rel not in keep]
+        for rel in stale:
+            del self._entries[rel]
+        if stale:
+            self._dirty = True
+        return len(stale)
@@ -7,30 +7,37 @@ import logging
 import shutil
 import threading
 import time
+from contextlib import closing, contextmanager
 from pathlib import Path
 from datetime import datetime
 from tqdm import tqdm
 from typing import Dict, List
 
 from .utils.logger import COLORS
-from .utils.fs import ensure_resolved_under, UnsafePathError
+from .utils.fs import ensure_resolved_under, format_bytes, UnsafePathError
+from .utils.tracing import TRACE_KEY, get_tracer, prune_trace_files, start_tracing, stop_tracing, trace_span
 from .utils.date_parser import get_photo_date, parse_date_from_text
-from .config import DEFAULT_CONFIG, UNKNOWN_PHOTOS_DIR, NO_FACE_PHOTOS_DIR, ERROR_PHOTOS_DIR
+from .config import DEFAULT_BOUNDED_MEMORY, DEFAULT_CONFIG, DEFAULT_CONTENT_CACHE_KEYS, DEFAULT_DECODE_AHEAD, DEFAULT_PREFETCH, DEFAULT_STREAM_SORT, STATE_DIR_NAME, UNKNOWN_PHOTOS_DIR, NO_FACE_PHOTOS_DIR, ERROR_PHOTOS_DIR, TRACE_KEEP_FILES
 from .incremental_state import save_snapshot
+from .output_manifest import KIND_ERROR, KIND_NO_FACE, KIND_RECOGNIZED, KIND_UNKNOWN, OutputManifest
 from .recognition_cache import (
     CacheKey,
+    ContentHash,
+    RecognitionCacheStore,
+    bytes_content_hash,
     compute_params_fingerprint,
+    full_content_hash,
     invalidate_date_cache,
-    load_date_cache,
-    normalize_cache_for_fingerprint,
-    lookup_result,
-    store_result,
-    prune_entries,
-    save_date_cache_atomic,
+    quick_content_hash,
 )
 from .parallel_recognizer import parallel_recognize
-from .clustering import UnknownClustering
+from .prefetch import ReadAheadPrefetcher, locality_order
+from .staged_executor import decode_ahead
+from .clustering import KnnGraphClustering, UnknownClustering
+from .embedding_spill import UnknownEmbeddingSpill
+from .unknown_registry import UnknownPersonRegistry, assign_unknown_persons, forget_unknown_person_dates
 from .reporter import Reporter
+from .run_journal import PHASE_SORT, GracefulInterrupt, clear_run_journal
 from .scanner import Scanner
 
 logger = logging.getLogger(__name__)
@@ -49,6 +56,76 @@ def _teacher_mode_enabled() -> bool:
         return False
 
 
+@contextmanager
+def _checkpoint_on_interrupt(cache_store, journal, done):
+    """识别中途中断（Ctrl-C/出错）时：先提交已写入的缓存条目并记下进度，再把异常抛给调用方。
+
+    下次运行已完成的照片直接命中缓存；未完成的日期由运行日志标记为整日期重建（见 run_journal）。
+    """
+    try:
+        yield
+    except BaseException:
+        cache_store.close()
+        if journal is not None:
+            journal.progress(done(), force=True)
+        logger.warning(f"识别被中断：已完成的 {done()} 张照片结果已保存，下次运行将从中断处继续")
+        raise
+
+
+def _supports_staged_recognition(face_recognizer) -> bool:
+    """识别器是否提供分开的解码/推理阶段；实例上单独替换了 recognize_faces 时仍走 recognize_faces。"""
+    return (
+        callable(getattr(type(face_recognizer), 'load_for_recognition', None))
+        and callable(getattr(type(face_recognizer), 'recognize_loaded', None))
+        and 'recognize_faces' not in getattr(face_recognizer, '__dict__', {})
+    )
+
+
+@contextmanager
+def _closing_on_error(resource):
+    """出错/中断时关闭 resource（如未知人脸特征暂存文件）；正常结束时保持打开，交给调用方。"""
+    try:
+        yield
+    except BaseException:
+        close = getattr(resource, 'close', None)
+        if close is not None:
+            close()
+        raise
+
+
+def _group_identical_photos(paths, sizes, contents):
+    """把字节完全相同的照片分组：每组只保留第一张去识别，其余记为它的重复。
+
+    先按 (size, quick) 粗分，只有碰撞的组才计算全文件哈希确认。
+    返回 (去重后的路径列表, {代表路径: [重复路径...]})。
+    """
+    by_quick = {}
+    for p in paths:
+        content = contents.get(p)
+        if content is not None:
+            by_quick.setdefault((sizes[p], content.quick), []).append(p)
+
+    duplicates = {}
+    for group in by_quick.values():
+        if len(group) < 2:
+            continue
+        by_full = {}
+        for p in group:
+            content = contents[p]
+            try:
+                if not content.full:
+                    content.full = full_content_hash(p)
+            except OSError:
+                continue
+            by_full.setdefault(content.full, []).append(p)
+        for same in by_full.values():
+            if len(same) > 1:
+                duplicates[same[0]] = same[1:]
+
+    skipped = {p for dups in duplicates.values() for p in dups}
+    return [p for p in paths if p not in skipped], duplicates
+
+
 def _ansi_enabled() -> bool:
     try:
         if os.environ.get("NO_COLOR") is not None:
@@ -92,6 +169,7 @@ class Pipeline:
             'students_detected': set()
         }
         self.last_run_report = None
+        self._pending_unknown_registry = None  # 本次聚类更新过、待输出整理完成后保存的登记表
 
     def _reset_stats(self):
         self.stats = {
@@ -107,9 +185,29 @@ class Pipeline:
         }
 
     def _cleanup_output_for_dates(self, dates):
+        """删除这些日期的全部输出。
+
+        清单记录过的日期按输出清单逐个删除文件（只涉及该日期的输出，O(变更)）；
+        清单中没有记录的日期（旧版本生成的输出）回退为遍历各顶层目录删除 <top>/<date>。
+        """
         if not dates:
             return
 
+        manifest = OutputManifest(self.output_dir)
+        covered = [date for date in dates if manifest.has_date(date)]
+        if covered:
+            removed = manifest.remove_dates(covered)
+            manifest.save()
+            logger.debug(f"按输出清单清理 {len(covered)} 个日期，删除 {removed} 个输出文件")
+        # 上次运行中断时正在整理的日期：可能留有清单之外的半成品副本，再按目录清理一遍
+        resumed = getattr(self.scanner.incremental_plan, 'resumed_dates', None) or set()
+        legacy = [date for date in dates if date not in covered or date in resumed]
+        if legacy:
+            self._cleanup_output_dirs_for_dates(legacy)
+
+    def _cleanup_output_dirs_for_dates(self, dates):
+        """按目录清理（无清单记录时的兜底）：删除每个顶层目录（及 Unknown_Person_*）下的日期目录。"""
+
         def _safe_delete_dir(path: Path) -> None:
             try:
                 ensure_resolved_under(self.output_dir, path)
@@ -166,6 +264,41 @@ class Pipeline:
                     if date_dir.exists() and date_dir.is_dir():
                         _safe_delete_dir(date_dir)
 
+    def _sync_partial_dates(self, plan) -> List[str]:
+        """文件级增量：只删除“修改/删除的源照片”派生出的旧输出，其余输出原样保留。
+
+        启用未知人脸聚类时，同日期里之前落在 unknown 的照片也一并撤下并返回，
+        由调用方加入本次工作清单（识别走缓存），让聚类仍覆盖整个日期。
+        返回：需要额外加入工作清单的照片（绝对路径）。
+        """
+        file_changes = getattr(plan, 'file_changes', None) or {}
+        if not file_changes:
+            return []
+
+        try:
+            recluster = bool(self.config_loader.get_unknown_face_clustering().get('enabled'))
+        except Exception:
+            recluster = False
+
+        manifest = OutputManifest(self.output_dir)
+        stale = set()
+        extra = []
+        for date, changes in sorted(file_changes.items()):
+            stale.update(changes.stale)
+            if not recluster:
+                continue
+            pending = set(changes.to_process) | set(changes.stale)
+            for source in manifest.sources_for_date(date):
+                if source not in pending and (manifest.entry(source) or {}).get('kind') == KIND_UNKNOWN:
+                    stale.add(source)
+                    extra.append(source)
+
+        removed = manifest.remove_outputs(sorted(stale))
+        manifest.save()
+        if removed:
+            logger.info(f"✓ 文件级增量：已移除 {removed} 个过期输出副本，其余输出保持不变")
+        return [str(self.photos_dir.joinpath(*source.split('/'))) for source in extra]
+
     def _extract_date_and_rel(self, photo_path: str) -> tuple[str, str]:
         p = Path(photo_path)
         try:
@@ -178,9 +311,11 @@ class Pipeline:
             normalized = parse_date_from_text(parts[0] or "")
             if normalized:
                 return normalized, rel
-        return get_photo_date(photo_path), rel
+        meta = self.scanner.photo_meta.get(photo_path) if self.scanner.photo_meta else None
+        return (meta.date if meta else get_photo_date(photo_path)), rel
 
-    def process_photos(self, photo_files):
+    def process_photos(self, photo_files, sort_session=None):
+        """识别全部照片并分类；给出 sort_session（见 open_sort_session）时每得到一张照片的分类就交给它开始复制。"""
         self.reporter.log_rule()
         self.reporter.log_info("STEP", "3/4 人脸识别（检测 → 匹配 → 分类）")
 
@@ -188,50 +323,91 @@ class Pipeline:
         unknown_photos = []
         no_face_photos = []
         error_photos = []
-        unknown_encodings_map = {}
+        # 有界内存模式：在途识别数、待重新匹配的批次不超过 window；unknown 特征暂存到磁盘
+        bounded = self.bounded_memory_config()
+        window = bounded['window'] if bounded['enabled'] else 0
+        if window:
+            unknown_encodings_map = UnknownEmbeddingSpill(Path(self.output_dir) / STATE_DIR_NAME)
+            logger.info(f"✓ 有界内存模式：在途识别不超过 {window} 张，未知人脸特征暂存到磁盘")
+        else:
+            unknown_encodings_map = {}
 
         def _apply_result(photo_path: str, result: dict) -> None:
             recognized_students = result.get('recognized_students') or []
             status = result.get('status')
             
             if 'unknown_encodings' in result and result['unknown_encodings']:
-                unknown_encodings_map[photo_path] = result['unknown_encodings']
+                if not window:
+                    unknown_encodings_map[photo_path] = result['unknown_encodings']
+                elif status == 'no_matches_found':
+                    # 只有 unknown 照片参与聚类，其余照片的特征不必暂存
+                    unknown_encodings_map.add(photo_path, result['unknown_encodings'])
 
             if status == 'success':
                 recognition_results[photo_path] = recognized_students
+                kind = KIND_RECOGNIZED
                 self.stats['recognized_photos'] += 1
                 self.stats['students_detected'].update(recognized_students)
                 logger.debug(f"识别到: {os.path.basename(photo_path)} -> {', '.join(recognized_students)}")
             elif status == 'no_faces_detected':
                 no_face_photos.append(photo_path)
+                kind = KIND_NO_FACE
                 self.stats['no_face_photos'] += 1
                 logger.debug(f"无人脸: {os.path.basename(photo_path)}")
             elif status == 'no_matches_found':
                 unknown_photos.append(photo_path)
+                kind = KIND_UNKNOWN
                 self.stats['unknown_photos'] += 1
                 logger.debug(f"未识别到已知学生: {os.path.basename(photo_path)}")
             else:
                 error_photos.append(photo_path)
+                kind = KIND_ERROR
                 self.stats['error_photos'] += 1
                 msg = result.get('message', '')
                 logger.error(f"识别出错: {os.path.basename(photo_path)} - {msg}")
 
             self.stats['processed_photos'] += 1
+            if sort_session is not None:
+                sort_session.add(photo_path, kind, recognized_students)
 
         face_recognizer = self.container.get_face_recognizer()
         tolerance = float(getattr(face_recognizer, 'tolerance', DEFAULT_CONFIG['tolerance']))
         min_face_size = int(getattr(face_recognizer, 'min_face_size', DEFAULT_CONFIG['min_face_size']))
+        resize_long_edge = int(getattr(face_recognizer, 'resize_long_edge', DEFAULT_CONFIG['resize_long_edge']) or 0)
+        # resize_long_edge 仅在开启（非 0）时计入指纹：未开启时指纹与旧版本一致，升级不会使缓存失效
+        resize_params = {'resize_long_edge': resize_long_edge} if resize_long_edge else {}
+        # 检测层只随后端/模型/检测参数失效；tolerance 或参考照变化只需用缓存的 embedding 重新匹配
+        detection_fingerprint = compute_params_fingerprint(
+            {
+                'backend': str(getattr(face_recognizer, '_backend_engine', '')),
+                'model': str(getattr(face_recognizer, '_backend_model', '')),
+                'min_face_size': min_face_size,
+                **resize_params,
+            }
+        )
         params_fingerprint = compute_params_fingerprint(
             {
                 'tolerance': tolerance,
                 'min_face_size': min_face_size,
+                **resize_params,
                 'reference_fingerprint': str(getattr(face_recognizer, 'reference_fingerprint', '')),
             }
         )
-        date_to_cache = {}
+        can_rematch = callable(getattr(type(face_recognizer), 'recognize_cached_faces', None))
+        cache_store = RecognitionCacheStore(self.output_dir)
+        journal = getattr(self.scanner, 'run_journal', None)
+        interrupt = GracefulInterrupt()
+        use_content_keys = self.content_cache_keys_enabled()
+        photo_to_content = {}
+        duplicates = {}
+        content_hit_count = 0
         keep_rel_paths_by_date = {}
+        pruned_dates = set()
+        plan = self.scanner.incremental_plan
+        file_changes = getattr(plan, 'file_changes', None) or {}
         photo_to_key = {}
         to_recognize = []
+        to_rematch = []
         cache_hit_count = 0
 
         # Progress bar setup (teacher-friendly, stronger "sense of progress")
@@ -264,7 +440,9 @@ class Pipeline:
             smoothing=0.05,
             bar_format=bar_format_warm,
             leave=not _teacher_mode_enabled(),
-        ) as pbar:
+        ) as pbar, _checkpoint_on_interrupt(cache_store, journal, lambda: pbar.n), interrupt, _closing_on_error(
+            unknown_encodings_map
+        ):
             # Heartbeat: refresh postfix periodically if we haven't advanced.
             last_progress_at = time.time()
             stop_heartbeat = threading.Event()
@@ -291,23 +469,124 @@ class Pipeline:
             except Exception:
                 pass
             
-            # ... (Progress bar helpers omitted for brevity, can be copied if needed or simplified) ...
-            # For now, using simple updates.
-            
-            # 1) Cache lookup
+            def _needs_full_hash(photo_path):
+                content = photo_to_content.get(photo_path)
+                return content is not None and not content.full
+
+            def _hash_read_bytes(photo_path, data):
+                """照片整文件已读入内存（预读线程/解码线程）时顺带算全文件哈希，写缓存时不必再读一遍。"""
+                content = photo_to_content.get(photo_path)
+                if content is not None and not content.full:
+                    content.full = bytes_content_hash(data)
+
+            def _content_for_store(photo_path):
+                content = photo_to_content.get(photo_path)
+                if content is not None and not content.full:
+                    # 识别时没拿到整文件字节（未开启预读、预读未命中的并行识别等）：按路径补读
+                    try:
+                        content.full = full_content_hash(photo_path)
+                    except OSError:
+                        return None
+                return content
+
+            recorded = set()
+
+            def _record(photo_path, result):
+                """应用并缓存一张照片的识别结果；字节相同的重复照片共用这次结果。"""
+                nonlocal last_progress_at
+                recorded.add(photo_path)
+                # 识别端（子进程/线程）记录的 decode/detect_embed/match 耗时：合并进本次追踪，不进缓存
+                trace = result.pop(TRACE_KEY, None)
+                tracer = get_tracer()
+                if trace and tracer is not None:
+                    tracer.add_remote(trace, photo=os.path.basename(photo_path))
+                for path in [photo_path] + duplicates.get(photo_path, []):
+                    path_result = result if path == photo_path else dict(result)
+                    _apply_result(path, path_result)
+                    key = photo_to_key.get(path)
+                    if key is not None:
+                        with trace_span("cache_save", cat="photo"):
+                            cache_store.store_result(key, path_result, _content_for_store(path))
+                    pbar.update(1)
+                last_progress_at = time.time()
+                if pbar.n > 0:
+                    pbar.bar_format = bar_format_full
+                if journal is not None:
+                    journal.progress(pbar.n)
+                # Ctrl-C：这张照片的结果已写入缓存，在这里停下
+                interrupt.check()
+
+            def _prune_date(date):
+                """剪枝某日期的缓存（只保留本次仍存在的照片），并释放该日期的路径集合。"""
+                keep_rel_paths = keep_rel_paths_by_date.pop(date, set())
+                if date in pruned_dates:
+                    return  # 有界模式下日期在工作列表中重复出现：路径集合不完整，不再剪枝
+                if date in file_changes:
+                    # 文件级增量只处理了日期中的一部分照片：按当前快照的完整照片集合剪枝
+                    keep_rel_paths = keep_rel_paths | plan.source_paths(date)
+                cache_store.prune_date(date, keep_rel_paths)
+                pruned_dates.add(date)
+
+            def _rematch(batch):
+                """检测层命中：只重新匹配（tolerance/参考照变化时），不解码、不检测。"""
+                try:
+                    with trace_span("rematch_cached", count=len(batch)):
+                        rematched = face_recognizer.recognize_cached_faces([d for _, d in batch])
+                except Exception as e:
+                    logger.warning(f"缓存人脸特征重新匹配失败，改为重新识别: {e}")
+                    to_recognize.extend(p for p, _ in batch)
+                    return 0
+                for (photo_path, _), result in zip(batch, rematched):
+                    _record(photo_path, result)
+                return len(rematched)
+
+            rematch_count = 0
+            current_date = None
+
+            # 1) Cache lookup（路径键 → 检测层 → 内容指纹）
             for photo_path in photo_files:
+                interrupt.check()
                 try:
                     date, rel_path = self._extract_date_and_rel(photo_path)
                     st = os.stat(photo_path)
                     key = CacheKey(date=date, rel_path=rel_path, size=int(st.st_size), mtime=int(st.st_mtime))
 
-                    if date not in date_to_cache:
-                        raw_cache = load_date_cache(self.output_dir, date)
-                        date_to_cache[date] = normalize_cache_for_fingerprint(raw_cache, date, params_fingerprint)
+                    if window and date != current_date:
+                        # 有界模式：工作列表按日期推进，上一个日期查完即剪枝并释放
+                        if current_date is not None:
+                            _prune_date(current_date)
+                            cache_store.commit()
+                        current_date = date
+                    if date not in keep_rel_paths_by_date:
+                        cache_store.prepare_date(date, params_fingerprint, detection_fingerprint)
                         keep_rel_paths_by_date[date] = set()
                     keep_rel_paths_by_date[date].add(rel_path)
 
-                    cached = lookup_result(date_to_cache[date], key)
+                    with trace_span("cache_lookup", cat="photo"):
+                        cached = cache_store.lookup_result(key)
+                        detection = None
+                        if cached is None and can_rematch:
+                            detection = cache_store.lookup_detection(key)
+                    if cached is None and detection is None and use_content_keys:
+                        # 改名/移动/重新拷贝：按内容找字节相同的已有条目
+                        try:
+                            content = ContentHash(quick_content_hash(photo_path, key.size))
+                        except OSError:
+                            content = None
+                        if content is not None:
+                            photo_to_content[photo_path] = content
+                            if cache_store.adopt_by_content(
+                                key,
+                                content,
+                                lambda p=photo_path: full_content_hash(p),
+                                params_fingerprint,
+                                detection_fingerprint,
+                            ):
+                                content_hit_count += 1
+                                cached = cache_store.lookup_result(key)
+                                if cached is None and can_rematch:
+                                    detection = cache_store.lookup_detection(key)
+
                     if cached is not None:
                         cache_hit_count += 1
                         _apply_result(photo_path, cached)
@@ -315,7 +594,10 @@ class Pipeline:
                         last_progress_at = time.time()
                         if pbar.n > 0: pbar.bar_format = bar_format_full
                     else:
-                        to_recognize.append(photo_path)
+                        if detection is not None:
+                            to_rematch.append((photo_path, detection))
+                        else:
+                            to_recognize.append(photo_path)
                         photo_to_key[photo_path] = key
 
                     # Update postfix periodically to avoid overhead.
@@ -329,11 +611,37 @@ class Pipeline:
                 except Exception as e:
                     logger.exception(f"处理照片 {photo_path} 时发生异常")
                     error_photos.append(photo_path)
+                    if sort_session is not None:
+                        sort_session.add(photo_path, KIND_ERROR)
                     error_count += 1
                     self.stats['processed_photos'] += 1
                     pbar.update(1)
                     last_progress_at = time.time()
 
+                if window and len(to_rematch) >= window:
+                    # 有界模式：检测记录（含 embedding）攒满一批就重新匹配并释放
+                    rematch_count += _rematch(to_rematch)
+                    to_rematch = []
+
+            # 1b) 检测层命中：只重新匹配（tolerance/参考照变化时），不解码、不检测
+            if to_rematch:
+                rematch_count += _rematch(to_rematch)
+                to_rematch = []
+            if rematch_count:
+                logger.info(f"✓ 复用已缓存的人脸特征重新匹配: {rematch_count} 张（无需重新检测）")
+
+            if content_hit_count:
+                logger.info(f"✓ 按内容指纹复用缓存（改名/移动/重新拷贝）: {content_hit_count} 张")
+
+            # 同一批里字节完全相同的照片只识别一次
+            if use_content_keys and len(to_recognize) > 1:
+                to_recognize, duplicates = _group_identical_photos(
+                    to_recognize, {p: photo_to_key[p].size for p in to_recognize}, photo_to_content
+                )
+                if duplicates:
+                    dup_count = sum(len(v) for v in duplicates.values())
+                    logger.info(f"✓ 发现内容完全相同的照片 {dup_count} 张，只识别一次")
+
             # 2) Recognition
             if to_recognize:
                 logger.info(f"✓ 识别缓存命中: {cache_hit_count} 张；待识别: {len(to_recognize)} 张")
@@ -371,8 +679,69 @@ class Pipeline:
                     # 保守：判断失败不应影响主流程
                     pass
                 
+                stages = self.decode_ahead_config()
+                prefetch_cfg = self.prefetch_config()
+                staged_supported = _supports_staged_recognition(face_recognizer)
+                if prefetch_cfg is not None:
+                    # 预读按目录顺序读取，识别也按这个顺序派发
+                    to_recognize = locality_order(to_recognize)
+
+                # 内容指纹的全文件哈希在照片字节已在内存时顺带计算（预读线程、解码线程）
+                on_read = _hash_read_bytes if photo_to_content else None
+
+                def _recognize_in_process(paths):
+                    """主进程内逐张识别；开启 decode_ahead 时解码在线程中提前进行，这里只做推理；开启 prefetch 时从预读缓冲取字节解码。"""
+                    if not staged_supported or (stages is None and prefetch_cfg is None and on_read is None):
+                        for photo_path in paths:
+                            _record(photo_path, face_recognizer.recognize_faces(photo_path, return_details=True))
+                        return
+                    prefetcher = self.open_prefetcher(paths, prefetch_cfg, on_read)
+
+                    def _load(photo_path):
+                        data = prefetcher.take(photo_path) if prefetcher is not None else None
+                        if data is None and on_read is not None and _needs_full_hash(photo_path):
+                            # 还需要全文件哈希：整文件读入一次，哈希与解码共用（读取失败交给解码阶段报错）
+                            try:
+                                data = Path(photo_path).read_bytes()
+                            except OSError:
+                                data = None
+                            else:
+                                _hash_read_bytes(photo_path, data)
+                        return face_recognizer.load_for_recognition(photo_path, data)
+
+                    def _decoded_frames():
+                        # 未开启 decode_ahead：同一线程内先解码再推理（仍从预读缓冲取字节）
+                        for photo_path in paths:
+                            try:
+                                yield photo_path, _load(photo_path), None
+                            except Exception as e:
+                                yield photo_path, None, e
+
+                    if stages is None:
+                        frames = _decoded_frames()
+                    else:
+                        frames = decode_ahead(
+                            paths,
+                            _load,
+                            infer_workers=1,
+                            decode_workers=stages['decode_workers'],
+                            queue_depth=stages['queue_depth'],
+                        )
+                    try:
+                        with closing(frames):
+                            for photo_path, decoded, error in frames:
+                                if error is not None:
+                                    result = face_recognizer.recognition_error(photo_path, error, return_details=True)
+                                else:
+                                    result = face_recognizer.recognize_loaded(photo_path, *decoded, return_details=True)
+                                del decoded
+                                _record(photo_path, result)
+                    finally:
+                        self.close_prefetcher(prefetcher)
+
                 if can_parallel:
                     logger.info("🚀 启用并行识别")
+                    prefetcher = self.open_prefetcher(to_recognize, prefetch_cfg, on_read)
                     try:
                         for photo_path, result in self._parallel_recognize(
                             to_recognize,
@@ -380,43 +749,32 @@ class Pipeline:
                             known_names=getattr(face_recognizer, 'known_student_names', []),
                             tolerance=tolerance,
                             min_face_size=min_face_size,
+                            resize_long_edge=resize_long_edge,
                             workers=workers,
                             chunk_size=chunk_size,
+                            **({'max_in_flight': window} if window else {}),
+                            **({'decode_ahead': stages} if stages else {}),
+                            **({'prefetch': prefetcher} if prefetcher is not None else {}),
                         ):
-                            _apply_result(photo_path, result)
-                            key = photo_to_key.get(photo_path)
-                            if key is not None:
-                                store_result(date_to_cache[key.date], key, result)
-                            pbar.update(1)
-                            last_progress_at = time.time()
-                            if pbar.n > 0: pbar.bar_format = bar_format_full
+                            _record(photo_path, result)
                     except Exception as e:
+                        self.close_prefetcher(prefetcher)
+                        prefetcher = None
                         logger.warning(f"并行识别失败，回退串行: {e}")
                         try:
                             pbar.set_postfix_str(_c("回退串行（仍在运行）", "33"))
                         except Exception:
                             pass
-                        for photo_path in to_recognize:
-                            result = face_recognizer.recognize_faces(photo_path, return_details=True)
-                            _apply_result(photo_path, result)
-                            key = photo_to_key.get(photo_path)
-                            if key is not None:
-                                store_result(date_to_cache[key.date], key, result)
-                            pbar.update(1)
-                            last_progress_at = time.time()
+                        # 只回退尚未得到结果的照片：已记录的照片再次加入整理会话会被计为复制失败
+                        _recognize_in_process([p for p in to_recognize if p not in recorded])
+                    finally:
+                        self.close_prefetcher(prefetcher)
                 else:
                     try:
                         pbar.set_postfix_str(_c("串行识别（仍在运行）", "36"))
                     except Exception:
                         pass
-                    for photo_path in to_recognize:
-                        result = face_recognizer.recognize_faces(photo_path, return_details=True)
-                        _apply_result(photo_path, result)
-                        key = photo_to_key.get(photo_path)
-                        if key is not None:
-                            store_result(date_to_cache[key.date], key, result)
-                        pbar.update(1)
-                        last_progress_at = time.time()
+                    _recognize_in_process(to_recognize)
             else:
                 logger.info(f"✓ 识别缓存命中: {cache_hit_count} 张；待识别: 0 张")
 
@@ -440,14 +798,15 @@ class Pipeline:
         except Exception:
             pass
 
-        # 3) Save cache
-        for date, cache in date_to_cache.items():
-            try:
-                prune_entries(cache, keep_rel_paths_by_date.get(date, set()))
-                save_date_cache_atomic(self.output_dir, date, cache)
-            except Exception as e:
-                logger.debug(f"保存日期 {date} 的识别缓存失败: {e}")
-                continue
+        # 3) Save cache（条目已逐条写入；这里只剪枝并提交）
+        with trace_span("cache_commit"):
+            seen_dates = set(keep_rel_paths_by_date) | pruned_dates
+            for date in list(keep_rel_paths_by_date):
+                _prune_date(date)
+            for date in file_changes:
+                if date not in seen_dates:
+                    cache_store.prune_date(date, plan.source_paths(date))
+            cache_store.close()
 
         self.reporter.log_info("STAT", f"识别到学生的照片: {self.stats['recognized_photos']} 张")
         self.reporter.log_info("STAT", f"无人脸照片: {self.stats['no_face_photos']} 张")
@@ -457,21 +816,206 @@ class Pipeline:
 
         return recognition_results, unknown_photos, no_face_photos, error_photos, unknown_encodings_map
 
-    def organize_output(self, recognition_results, unknown_photos, no_face_photos=None, error_photos=None, unknown_clusters=None):
-        self.reporter.log_rule()
-        self.reporter.log_info("STEP", "4/4 输出整理（复制到 output/ + 生成报告）")
+    def begin_trace(self):
+        """按配置开启本次运行的性能追踪（见 utils/tracing），返回 Tracer；未启用时返回 None。"""
+        getter = getattr(self.config_loader, 'get_trace_enabled', None)
+        try:
+            enabled = bool(getter()) if callable(getter) else False
+        except Exception:
+            enabled = False
+        return start_tracing() if enabled else None
+
+    def finish_trace(self, tracer):
+        """停止追踪：写出 logs/trace_<时间>.json（Chrome trace / Perfetto），各阶段耗时统计写入 stats。"""
+        if tracer is None or get_tracer() is not tracer:
+            return
+        stop_tracing()
+        self.stats['stage_timings'] = tracer.summary()
+        try:
+            path = tracer.write_chrome_trace(Path(self.log_dir) / f"trace_{datetime.now():%Y%m%d_%H%M%S}.json")
+            prune_trace_files(self.log_dir, TRACE_KEEP_FILES)
+            self.stats['trace_file'] = str(path)
+        except OSError as e:
+            logger.warning(f"写出性能追踪文件失败: {e}")
+
+    @staticmethod
+    def make_unknown_clusterer(uc):
+        """按 unknown_face_clustering 配置创建聚类引擎：greedy 用 UnknownClustering，其余 linkage 用 KnnGraphClustering。"""
+        cluster_kwargs = dict(
+            tolerance=float(uc.get('threshold', 0.45)),
+            min_cluster_size=int(uc.get('min_cluster_size', 2)),
+        )
+        algorithm = uc.get('algorithm', 'greedy')
+        if algorithm == 'greedy':
+            return UnknownClustering(**cluster_kwargs)
+        return KnnGraphClustering(linkage=algorithm, k=int(uc.get('knn_k', 10)), **cluster_kwargs)
+
+    def cluster_unknown_photos(self, uc, unknown_photos, unknown_encodings_map, photo_files):
+        """按 unknown_face_clustering 配置对本次的未知照片聚类（run 与 SimplePhotoOrganizer.run 共用）。"""
+        unknown_set = set(unknown_photos)
+        unknown_faces = {p: e for p, e in unknown_encodings_map.items() if p in unknown_set}
+        return self.cluster_unknown_faces(
+            self.make_unknown_clusterer(uc),
+            unknown_faces,
+            photo_files,
+            persistent=bool(uc.get('persistent', True)),
+            tolerance=float(uc.get('threshold', 0.45)),
+        )
 
+    def cluster_unknown_faces(self, clustering, unknown_faces, photo_files, persistent=True, tolerance=0.45):
+        """对本次的未知人脸聚类，返回 {Unknown_Person_X: [photo_paths]}。
+
+        persistent 时先与未知人物登记表比较：能归入已登记人物的沿用原编号，
+        其余人脸再交给 clustering 聚类并登记为新人物（见 unknown_registry）；
+        登记表在输出整理完成后由 commit_unknown_registry() 保存。
+        clustering 不支持按人脸输出（没有 get_face_clusters）时退回本次独立聚类。
+        """
+        with trace_span("cluster", faces=sum(len(e) for e in unknown_faces.values())):
+            return self._cluster_unknown_faces(clustering, unknown_faces, photo_files, persistent, tolerance)
+
+    def _cluster_unknown_faces(self, clustering, unknown_faces, photo_files, persistent, tolerance):
+        if persistent and hasattr(clustering, 'get_face_clusters'):
+            def date_of(path):
+                return self._extract_date_and_rel(str(path))[0]
+
+            registry = UnknownPersonRegistry(self.output_dir)
+            clusters = assign_unknown_persons(
+                registry,
+                clustering,
+                unknown_faces,
+                date_of,
+                {date_of(p) for p in photo_files},
+                tolerance,
+            )
+            self._pending_unknown_registry = registry
+            return clusters
+        for path, encodings in unknown_faces.items():
+            clustering.add_faces(path, encodings)
+        return clustering.get_results()
+
+    def commit_unknown_registry(self):
+        """输出整理完成后保存本次聚类更新的未知人物登记表（与快照/运行日志同一时机提交）。"""
+        registry, self._pending_unknown_registry = self._pending_unknown_registry, None
+        if registry is not None:
+            registry.save()
+
+    def discard_unknown_registry(self):
+        """运行失败/中断：丢弃未保存的登记表改动，下次重新处理这些日期时沿用磁盘上的编号。"""
+        self._pending_unknown_registry = None
+
+    def bounded_memory_config(self):
+        """有界内存模式配置（bounded_memory）；config_loader 不提供时按默认值（关闭）。"""
+        config = dict(DEFAULT_BOUNDED_MEMORY)
+        getter = getattr(self.config_loader, 'get_bounded_memory', None)
+        try:
+            if callable(getter):
+                config.update(getter())
+            config['enabled'] = config['enabled'] is True
+            config['window'] = max(1, int(config['window']))
+        except Exception:
+            config = dict(DEFAULT_BOUNDED_MEMORY)
+        return config
+
+    def decode_ahead_config(self):
+        """解码/推理分级执行配置（decode_ahead）；关闭时返回 None。"""
+        config = dict(DEFAULT_DECODE_AHEAD)
+        getter = getattr(self.config_loader, 'get_decode_ahead', None)
+        try:
+            if callable(getter):
+                config.update(getter())
+            config['decode_workers'] = max(0, int(config['decode_workers']))
+            config['queue_depth'] = max(0, int(config['queue_depth']))
+        except Exception:
+            config = dict(DEFAULT_DECODE_AHEAD)
+        if config['enabled'] is not True:
+            return None
+        return config
+
+    def prefetch_config(self):
+        """照片字节预读配置（prefetch）；关闭时返回 None。"""
+        config = dict(DEFAULT_PREFETCH)
+        getter = getattr(self.config_loader, 'get_prefetch', None)
+        try:
+            if callable(getter):
+                config.update(getter())
+            config['budget_mb'] = max(1, int(config['budget_mb']))
+            config['readers'] = max(1, int(config['readers']))
+        except Exception:
+            config = dict(DEFAULT_PREFETCH)
+        if config['enabled'] is not True:
+            return None
+        return config
+
+    def open_prefetcher(self, paths, config, on_read=None):
+        """按 paths 的顺序开始预读照片字节；config 为 None（未开启）时返回 None。on_read 见 ReadAheadPrefetcher。"""
+        if config is None or not paths:
+            return None
+        return ReadAheadPrefetcher(
+            paths, budget_bytes=config['budget_mb'] * 1024 * 1024, readers=config['readers'], on_read=on_read
+        )
+
+    def close_prefetcher(self, prefetcher):
+        """停止预读，命中/未命中计数累加到 stats['prefetch']（写入运行报告）。"""
+        if prefetcher is None:
+            return
+        prefetcher.close()
+        totals = self.stats.setdefault('prefetch', {'hits': 0, 'misses': 0, 'bytes': 0})
+        for key, value in prefetcher.stats().items():
+            totals[key] = totals.get(key, 0) + value
+
+    def content_cache_keys_enabled(self):
+        """识别缓存是否按内容指纹做二级查找与同批去重（content_cache_keys）。"""
+        getter = getattr(self.config_loader, 'get_content_cache_keys', None)
+        return bool(getter()) if callable(getter) else DEFAULT_CONTENT_CACHE_KEYS
+
+    def open_sort_session(self):
+        """边识别边整理（stream_sort）：返回交给 process_photos/organize_output 的整理会话。
+
+        未知照片要等聚类结果才能确定目录，开启聚类时留到 organize_output 再规划。
+        stream_sort 关闭或整理器不支持会话时返回 None（识别完成后一次性整理）。
+        """
+        getter = getattr(self.config_loader, 'get_stream_sort', None)
+        enabled = getter() if callable(getter) else DEFAULT_STREAM_SORT
         file_organizer = self.container.get_file_organizer()
-        stats = file_organizer.organize_photos(
+        if not enabled or not hasattr(file_organizer, 'start_session'):
+            return None
+        try:
+            defer_unknown = bool(self.config_loader.get_unknown_face_clustering().get('enabled'))
+        except Exception:
+            defer_unknown = False
+        return file_organizer.start_session(
             self.photos_dir,
-            recognition_results,
-            unknown_photos,
-            unknown_clusters,
-            no_face_photos=no_face_photos,
-            error_photos=error_photos,
+            photo_meta=self.scanner.photo_meta,
+            stream=True,
+            defer_unknown=defer_unknown,
         )
 
+    def organize_output(self, recognition_results, unknown_photos, no_face_photos=None, error_photos=None, unknown_clusters=None, sort_session=None):
+        self.reporter.log_rule()
+        self.reporter.log_info("STEP", "4/4 输出整理（复制到 output/ + 生成报告）")
+        journal = getattr(self.scanner, 'run_journal', None)
+        if journal is not None:
+            journal.set_phase(PHASE_SORT)
+
+        file_organizer = self.container.get_file_organizer()
+        if sort_session is not None:
+            # 照片已在识别阶段逐张加入并开始复制，这里只补上等待聚类的未知照片并收尾
+            stats = sort_session.finish(unknown_clusters)
+        else:
+            stats = file_organizer.organize_photos(
+                self.photos_dir,
+                recognition_results,
+                unknown_photos,
+                unknown_clusters,
+                no_face_photos=no_face_photos,
+                error_photos=error_photos,
+                photo_meta=self.scanner.photo_meta,
+            )
+
         report_file = file_organizer.create_summary_report(stats)
+        if stats.get('bytes_saved'):
+            methods = "，".join(f"{m} {n}" for m, n in sorted(stats.get('output_methods', {}).items()))
+            self.reporter.log_info("STAT", f"落盘方式: {methods}；节省空间 {format_bytes(stats['bytes_saved'])}")
         self.reporter.log_info("OK", "照片整理完成")
         if report_file:
             self.reporter.log_info("OK", f"整理报告已生成: {report_file}")
@@ -483,39 +1027,54 @@ class Pipeline:
         self._reset_stats()
         self.last_run_report = None
         self.stats['start_time'] = datetime.now()
+        tracer = self.begin_trace()
+        sort_session = None
+        unknown_encodings_map = None
 
         try:
             # 1. Initialize (assumed done by caller or container)
             
             # 2. Scan
             if photo_files is None:
-                photo_files = self.scanner.scan()
-            
-            self.stats['total_photos'] = len(photo_files)
+                with trace_span("scan"):
+                    photo_files = self.scanner.scan()
             
             plan = self.scanner.incremental_plan
             changed_dates = getattr(plan, 'changed_dates', set()) if plan else set()
             deleted_dates = getattr(plan, 'deleted_dates', set()) if plan else set()
+            file_changes = getattr(plan, 'file_changes', None) or {}
 
-            self._cleanup_output_for_dates(sorted(changed_dates | deleted_dates))
+            # 按文件增量的日期只删过期副本；其余变化日期整日期重建
+            with trace_span("sync_outputs"):
+                self._cleanup_output_for_dates(sorted((changed_dates - set(file_changes)) | deleted_dates))
+                photo_files = list(photo_files) + self._sync_partial_dates(plan)
+
+            self.stats['total_photos'] = len(photo_files)
 
             for date in sorted(deleted_dates):
                 invalidate_date_cache(self.output_dir, date)
+            forget_unknown_person_dates(self.output_dir, deleted_dates)
 
             if not photo_files:
-                if deleted_dates:
+                if deleted_dates or file_changes:
                     logger.info("✓ 本次无新增/变更照片，仅执行了删除同步")
                     if plan:
                         save_snapshot(self.output_dir, plan.snapshot)
                 else:
                     logger.info("✓ 本次无需处理：没有新增/变更/删除的日期文件夹")
+                    clear_run_journal(self.output_dir)
 
                 self.stats['end_time'] = datetime.now()
+                self.finish_trace(tracer)
                 self.reporter.print_final_statistics(self.stats, self.output_dir)
                 return True
 
-            # 3. Process
-            recognition_results, unknown_photos, no_face_photos, error_photos, unknown_encodings_map = self.process_photos(photo_files)
+            # 3. Process（stream_sort 开启时边识别边复制）
+            sort_session = self.open_sort_session()
+            with trace_span("recognize"):
+                recognition_results, unknown_photos, no_face_photos, error_photos, unknown_encodings_map = self.process_photos(
+                    photo_files, sort_session=sort_session
+                )
 
             # 3b. Clustering
             unknown_clusters = None
@@ -523,25 +1082,22 @@ class Pipeline:
                 uc = self.config_loader.get_unknown_face_clustering()
                 if uc.get('enabled'):
                     logger.info("正在对未知人脸进行聚类分析...")
-                    clustering = UnknownClustering(
-                        tolerance=float(uc.get('threshold', 0.45)),
-                        min_cluster_size=int(uc.get('min_cluster_size', 2)),
-                    )
-                    for path, encodings in unknown_encodings_map.items():
-                        if path in unknown_photos:
-                            clustering.add_faces(path, encodings)
-
-                    unknown_clusters = clustering.get_results()
+                    unknown_clusters = self.cluster_unknown_photos(uc, unknown_photos, unknown_encodings_map, photo_files)
                     if unknown_clusters:
                         logger.info(f"✓ 发现 {len(unknown_clusters)} 组相似的未知人脸")
 
             # 4. Organize
-            organize_stats = self.organize_output(recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters)
+            with trace_span("sort"):
+                organize_stats = self.organize_output(
+                    recognition_results, unknown_photos, no_face_photos, error_photos, unknown_clusters, sort_session=sort_session
+                )
 
+            self.commit_unknown_registry()
             if plan:
                 save_snapshot(self.output_dir, plan.snapshot)
 
             self.stats['end_time'] = datetime.now()
+            self.finish_trace(tracer)
             self.last_run_report = self.reporter.build_run_report(self.stats, organize_stats)
             self.reporter.print_final_statistics(self.stats, self.output_dir)
 
@@ -553,3 +1109,10 @@ class Pipeline:
         finally:
             if not self.stats.get('end_time'):
                 self.stats['end_time'] = datetime.now()
+            self.discard_unknown_registry()
+            if sort_session is not None:
+                sort_session.abort()  # 识别/聚类中途失败或中断：回滚已复制的副本（整理完成后不做任何事）
+            if hasattr(unknown_encodings_map, 'close'):
+                unknown_encodings_map.close()  # 有界内存模式：删除未知人脸特征暂存文件
+            if tracer is not None and get_tracer() is tracer:
+                stop_tracing()
@@ -0,0 +1,154 @@
+"""照片字节预读（read-ahead，见 config.DEFAULT_PREFETCH）。
+
+问题：课堂照片放在 NAS / SMB 共享 / U 盘上时，每张照片的打开/读取延迟远大于解码，
+识别方（串行识别、解码线程、并行 worker）各自按路径读文件，大部分时间都在等 I/O。
+
+做法：ReadAheadPrefetcher 按识别顺序（locality_order：同一目录的照片连在一起）用几个读取线程
+提前把后续照片整文件读进内存，识别方用 take(path) 取走字节直接解码：
+- 已读入未取走的字节 + 正在读的文件大小不超过 budget_bytes（单个文件超过预算时允许单独读）；
+- take 时已读好或正在读 → 命中（正在读的等它读完）；读取线程还没轮到 → 未命中，
+  该文件不再预读，调用方自己按路径读取；读取失败同样算未命中，由解码阶段按原来的方式报错；
+- 命中/未命中/预读字节数见 stats()，写入运行报告（pipeline_stats['prefetch']）；
+- on_read(path, data)：读取线程读完一张照片后在该线程中回调（如顺带计算全文件内容哈希），
+  回调完成后字节才交给识别方。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def locality_order(paths: Iterable[str]) -> List[str]:
+    """按目录聚拢照片：同一目录的照片连续读取，目录内保持原有顺序（扫描时已按文件名排序）。"""
+    return sorted(paths, key=lambda p: os.path.dirname(os.fspath(p)))
+
+
+class ReadAheadPrefetcher:
+    """按给定顺序预读照片字节，受字节预算约束；用完需 close()（也可用作上下文管理器）。"""
+
+    def __init__(
+        self,
+        paths: Iterable[str],
+        *,
+        budget_bytes: int,
+        readers: int = 4,
+        on_read: Optional[Callable[[str, bytes], None]] = None,
+    ) -> None:
+        self._order = list(paths)
+        self._on_read = on_read
+        self._budget = max(1, int(budget_bytes))
+        self._cond = threading.Condition()
+        self._next = 0
+        self._claimed = 0
+        self._reserve_turn = 0  # 预算按认领顺序预留：只有认领序号等于它的读取线程可以预留
+        self._ready: Dict[str, bytes] = {}
+        self._reading = set()
+        self._skipped = set()
+        self._used = 0  # 已读入未取走 + 正在读（按文件大小预留）的字节数
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.bytes_read = 0
+        self._threads = [
+            threading.Thread(target=self._reader, name=f"prefetch-{i}", daemon=True)
+            for i in range(max(1, int(readers)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def __enter__(self) -> "ReadAheadPrefetcher":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _claim(self) -> Tuple[Optional[str], int]:
+        # 调用方持有 _cond；返回 (path, 认领序号)
+        while not self._closed and self._next < len(self._order):
+            path = self._order[self._next]
+            self._next += 1
+            if path in self._skipped:
+                continue
+            self._claimed += 1
+            return path, self._claimed - 1
+        return None, -1
+
+    def _reader(self) -> None:
+        while True:
+            with self._cond:
+                path, turn = self._claim()
+            if path is None:
+                return
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            with self._cond:
+                # 按认领顺序预留预算（否则后面的照片占满预算，识别方马上要的那张反而读不到）；
+                # 预算用满时等识别方取走；识别方已经按路径自己读了（skipped）就不再预读
+                while not self._closed and (
+                    turn > self._reserve_turn
+                    or (path not in self._skipped and self._used > 0 and self._used + size > self._budget)
+                ):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                self._reserve_turn = turn + 1
+                self._cond.notify_all()
+                if path in self._skipped:
+                    continue
+                self._used += size
+                self._reading.add(path)
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+            except OSError as e:
+                logger.debug("预读失败，交给解码阶段按路径读取: %s (%s)", path, e)
+                data = None
+            if data is not None and self._on_read is not None:
+                try:
+                    self._on_read(path, data)
+                except Exception as e:
+                    logger.debug("预读回调失败: %s (%s)", path, e)
+            with self._cond:
+                self._reading.discard(path)
+                if data is None or self._closed:
+                    self._used -= size
+                else:
+                    self._ready[path] = data
+                    self._used += len(data) - size
+                    self.bytes_read += len(data)
+                self._cond.notify_all()
+
+    def take(self, path: str) -> Optional[bytes]:
+        """取走 path 的字节（命中）；还没预读到或读取失败时返回 None（未命中），调用方按路径读取。"""
+        with self._cond:
+            while path in self._reading:
+                self._cond.wait()
+            data = self._ready.pop(path, None)
+            if data is None:
+                self.misses += 1
+                self._skipped.add(path)
+            else:
+                self.hits += 1
+                self._used -= len(data)
+            self._cond.notify_all()
+            return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._cond:
+            return {"hits": self.hits, "misses": self.misses, "bytes": self.bytes_read}
+
+    def close(self) -> None:
+        """停止读取线程并释放未取走的字节。"""
+        with self._cond:
+            self._closed = True
+            self._ready.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=1.0)
@@ -2,13 +2,24 @@
 
 设计目标：
 - 对老师无感：缓存保存在 output/.state 下，用户无需理解或操作。
+- 读写按条目进行：SQLite（WAL）单文件 recognition_cache.sqlite3，(date, rel_path) 为主键，
+  查询走索引、写入逐条 upsert，不再每次整日期解析/重写 JSON；向量以 float32 BLOB 存储。
 - 与增量处理对齐：以日期文件夹（YYYY-MM-DD）为最小失效/重建单元。
 - 稳健：缓存损坏/读写失败时自动回退为不命中，不影响主流程。
 
 缓存策略：
 - key：相对路径(rel_path) + size + mtime
-- value：FaceRecognizer.recognize_faces(return_details=True) 兼容的结果 dict
-- params_fingerprint：识别参数指纹变化时自动整体失效（避免复用旧结果）
+- 二级索引：内容指纹（size + 首尾块哈希，命中后再用全文件哈希确认）；改名/移动/重新拷贝
+  （mtime 变化）但字节相同的照片按内容复用已有条目
+- value 分两层：
+  - detection：人脸级检测记录（bbox/det_score/embedding），只取决于图片与检测参数
+  - result：FaceRecognizer.recognize_faces(return_details=True) 兼容的结果 dict（匹配层）
+- detection_fingerprint：后端/模型/检测参数指纹，变化时整体失效
+- params_fingerprint：识别参数指纹（含 tolerance/参考照），变化时只丢弃匹配层；
+  检测层仍可用，由调用方用缓存的 embedding 重新匹配，无需重新解码与检测
+
+旧格式：recognition_cache_by_date/<date>.json（整日期一个 JSON，只有匹配层）。RecognitionCacheStore
+首次访问某日期时自动迁移并删除该 JSON；旧格式只读不写。
 """
 
 from __future__ import annotations
@@ -16,17 +27,27 @@ from __future__ import annotations
 import hashlib
 import json
 import logging
+import sqlite3
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
 
 from .utils.fs import UnsafePathError, ensure_resolved_under
 
 logger = logging.getLogger(__name__)
 
-CACHE_VERSION = 1
 STATE_DIR_NAME = ".state"
 CACHE_DIR_NAME = "recognition_cache_by_date"
+CACHE_DB_NAME = "recognition_cache.sqlite3"
+DB_SCHEMA_VERSION = 2
+# 内容指纹读取的首/尾块大小
+CONTENT_HASH_BLOCK = 64 * 1024
+# 逐条写入时每累计这么多条、或距上次提交超过这么多秒提交一次（进程被强杀时最多丢失这些条目的缓存）
+STORE_COMMIT_EVERY = 256
+STORE_COMMIT_SECONDS = 10.0
 
 
 @dataclass(frozen=True)
@@ -37,6 +58,40 @@ class CacheKey:
     mtime: int
 
 
+@dataclass
+class ContentHash:
+    """照片内容指纹：quick 用于索引（size + 首尾块），full 为全文件哈希（按需计算，用于确认）。"""
+
+    quick: str
+    full: str = ""
+
+
+def quick_content_hash(path: str | Path, size: int) -> str:
+    """size + 首尾各 CONTENT_HASH_BLOCK 字节的哈希（只读两小块，适合对每个未命中文件计算）。"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(int(size)).encode("ascii"))
+    with open(path, "rb") as f:
+        h.update(f.read(CONTENT_HASH_BLOCK))
+        if size > 2 * CONTENT_HASH_BLOCK:
+            f.seek(-CONTENT_HASH_BLOCK, 2)
+        h.update(f.read(CONTENT_HASH_BLOCK))
+    return h.hexdigest()
+
+
+def full_content_hash(path: str | Path) -> str:
+    """全文件哈希（确认 quick 命中确实是同一内容）。"""
+    h = hashlib.blake2b(digest_size=32)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def bytes_content_hash(data: bytes) -> str:
+    """已读入内存的整文件字节的全文件哈希（与 full_content_hash 结果相同，不再读文件）。"""
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
+
+
 def cache_root(output_dir: Path) -> Path:
     return Path(output_dir) / STATE_DIR_NAME / CACHE_DIR_NAME
 
@@ -45,6 +100,10 @@ def date_cache_path(output_dir: Path, date: str) -> Path:
     return cache_root(output_dir) / f"{date}.json"
 
 
+def cache_db_path(output_dir: Path) -> Path:
+    return Path(output_dir) / STATE_DIR_NAME / CACHE_DB_NAME
+
+
 def compute_params_fingerprint(params: Dict[str, Any]) -> str:
     """计算识别参数指纹（用于缓存失效）。
 
@@ -54,72 +113,18 @@ def compute_params_fingerprint(params: Dict[str, Any]) -> str:
     return "sha256:" + hashlib.sha256(payload).hexdigest()
 
 
-def _empty_cache(date: str, params_fingerprint: str) -> Dict[str, Any]:
-    return {
-        "version": CACHE_VERSION,
-        "date": date,
-        "params_fingerprint": params_fingerprint,
-        "entries": {},
-    }
-
-
-def load_date_cache(output_dir: Path, date: str) -> Dict[str, Any]:
-    """加载某日期缓存。
-
-    失败/不存在：返回空结构（不抛异常）。
-    """
-    path = date_cache_path(output_dir, date)
-    if not path.exists():
-        return {
-            "version": CACHE_VERSION,
-            "date": date,
-            "params_fingerprint": "",
-            "entries": {},
-        }
+def _load_legacy_json(path: Path) -> Optional[Dict[str, Any]]:
+    """读取旧格式的日期缓存 JSON（仅供迁移）；读取失败或文件损坏返回 None。"""
     try:
         data = json.loads(path.read_text(encoding="utf-8"))
-        if not isinstance(data, dict):
-            return {
-                "version": CACHE_VERSION,
-                "date": date,
-                "params_fingerprint": "",
-                "entries": {},
-            }
-        data.setdefault("entries", {})
-        return data
-    except (OSError, IOError) as e:
-        # 文件读取错误（静默回退空缓存）
-        logger.debug(f"缓存文件读取失败 {date}: {e}")
-        return {
-            "version": CACHE_VERSION,
-            "date": date,
-            "params_fingerprint": "",
-            "entries": {},
-        }
-    except (json.JSONDecodeError, ValueError) as e:
-        # JSON 解析错误（缓存文件损坏）
-        logger.warning(f"缓存文件损坏 {date}: {e}，已清空")
-        return {
-            "version": CACHE_VERSION,
-            "date": date,
-            "params_fingerprint": "",
-            "entries": {},
-        }
-
-
-def save_date_cache_atomic(output_dir: Path, date: str, cache: Dict[str, Any]) -> None:
-    """原子保存日期缓存（tmp -> rename）。"""
-    root = cache_root(output_dir)
-    root.mkdir(parents=True, exist_ok=True)
-    path = date_cache_path(output_dir, date)
-    tmp = path.with_suffix(path.suffix + ".tmp")
-    payload = json.dumps(cache, ensure_ascii=False, indent=2)
-    tmp.write_text(payload, encoding="utf-8")
-    tmp.replace(path)
+    except (OSError, ValueError) as e:
+        logger.warning(f"旧识别缓存文件无法读取，已丢弃 {path.name}: {e}")
+        return None
+    return data if isinstance(data, dict) else None
 
 
 def invalidate_date_cache(output_dir: Path, date: str) -> None:
-    """删除某日期缓存文件（用于 deleted_dates 同步）。"""
+    """删除某日期缓存（用于 deleted_dates 同步）：旧 JSON 文件与数据库中的条目。"""
     path = date_cache_path(output_dir, date)
     try:
         ensure_resolved_under(output_dir, path)
@@ -127,60 +132,19 @@ def invalidate_date_cache(output_dir: Path, date: str) -> None:
             path.unlink()
     except Exception:
         # 缓存删除失败不应阻断主流程
-        return
-
-
-def normalize_cache_for_fingerprint(cache: Dict[str, Any], date: str, params_fingerprint: str) -> Dict[str, Any]:
-    """若参数指纹不一致，则返回“同日期的空缓存结构”。"""
-    if cache.get("params_fingerprint") != params_fingerprint:
-        return _empty_cache(date=date, params_fingerprint=params_fingerprint)
-    # 保障字段存在
-    cache.setdefault("version", CACHE_VERSION)
-    cache.setdefault("date", date)
-    cache.setdefault("params_fingerprint", params_fingerprint)
-    cache.setdefault("entries", {})
-    return cache
-
-
-def lookup_result(cache: Dict[str, Any], key: CacheKey) -> Optional[Dict[str, Any]]:
-    """命中返回 result dict，否则返回 None。"""
-    entries = cache.get("entries")
-    if not isinstance(entries, dict):
-        return None
-    item = entries.get(key.rel_path)
-    if not isinstance(item, dict):
-        return None
-    try:
-        if int(item.get("size", -1)) != int(key.size):
-            return None
-        if int(item.get("mtime", -1)) != int(key.mtime):
-            return None
-    except Exception:
-        return None
-    result = item.get("result")
-    return result if isinstance(result, dict) else None
-
-
-def store_result(cache: Dict[str, Any], key: CacheKey, result: Dict[str, Any]) -> None:
-    # 识别结果里可能含 numpy.ndarray（例如 unknown_encodings），直接 json 序列化会失败。
-    # 缓存层做一次“可序列化净化”，保证缓存可用且不影响主流程的内存结果。
-    safe_result = _sanitize_for_json(result)
-    entries = cache.setdefault("entries", {})
-    if not isinstance(entries, dict):
-        # 不尝试修复异常结构，直接覆盖
-        cache["entries"] = {}
-        entries = cache["entries"]
-    entries[key.rel_path] = {
-        "size": int(key.size),
-        "mtime": int(key.mtime),
-        "result": safe_result,
-    }
+        pass
+    if cache_db_path(output_dir).exists():
+        store = RecognitionCacheStore(output_dir)
+        try:
+            store.invalidate_date(date)
+        finally:
+            store.close()
 
 
 def _sanitize_for_json(value: Any, *, _depth: int = 0) -> Any:
     """把 value 转为可 JSON 序列化的结构。
 
-    目标：尽量保留信息（包括 unknown_encodings），同时避免引入 numpy 依赖。
+    目标：尽量保留信息（包括 unknown_encodings），同时不依赖 numpy 类型判断。
     """
 
     # 防御：避免极端嵌套导致递归爆栈
@@ -215,12 +179,435 @@ def _sanitize_for_json(value: Any, *, _depth: int = 0) -> Any:
     return str(value)
 
 
-def prune_entries(cache: Dict[str, Any], keep_rel_paths: set[str]) -> None:
-    """删除不再存在的条目，避免缓存无限增长。"""
-    entries = cache.get("entries")
-    if not isinstance(entries, dict):
-        cache["entries"] = {}
-        return
-    for rel in list(entries.keys()):
-        if rel not in keep_rel_paths:
-            entries.pop(rel, None)
+_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS dates (
+    date TEXT PRIMARY KEY,
+    detection_fingerprint TEXT NOT NULL,
+    params_fingerprint TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    date TEXT NOT NULL,
+    rel_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime INTEGER NOT NULL,
+    result TEXT,
+    unknown_encodings BLOB,
+    unknown_dim INTEGER NOT NULL DEFAULT 0,
+    detection TEXT,
+    embeddings BLOB,
+    embedding_dim INTEGER NOT NULL DEFAULT 0,
+    quick_hash TEXT,
+    full_hash TEXT,
+    PRIMARY KEY (date, rel_path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_entries_content ON entries (quick_hash, size);
+"""
+
+_ENTRY_COLUMNS = (
+    "date, rel_path, size, mtime, result, unknown_encodings, unknown_dim,"
+    " detection, embeddings, embedding_dim, quick_hash, full_hash"
+)
+
+
+def _pack_vectors(vectors: Any) -> tuple[Optional[bytes], int]:
+    """把等长向量打包为 float32 (n×dim) 字节；为空返回 (None, 0)，长度不一致抛 ValueError。"""
+    if vectors is None or len(vectors) == 0:
+        return None, 0
+    mat = np.stack([np.asarray(v, dtype="<f4").ravel() for v in vectors])
+    return mat.tobytes(), int(mat.shape[1])
+
+
+def _unpack_vectors(blob: Optional[bytes], dim: int) -> list:
+    if not blob or int(dim) <= 0:
+        return []
+    mat = np.frombuffer(blob, dtype="<f4").reshape(-1, int(dim)).astype(np.float32)
+    return list(mat)
+
+
+def _is_corrupt_db_error(e: Exception) -> bool:
+    msg = str(e).lower()
+    return "not a database" in msg or "malformed" in msg
+
+
+class RecognitionCacheStore:
+    """SQLite 识别缓存（output/.state/recognition_cache.sqlite3）。
+
+    - 每个日期先 prepare_date()：迁移旧 JSON，并按指纹清空或只丢弃匹配层
+    - lookup_result/lookup_detection/store_result 按 (date, rel_path) 逐条读写
+    - 任何数据库错误都只记录日志：读返回不命中、写直接跳过；数据库文件损坏时删除重建
+    - 连接只在创建它的线程中使用
+    """
+
+    def __init__(self, output_dir: Path) -> None:
+        self.output_dir = Path(output_dir)
+        self.path = cache_db_path(output_dir)
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disabled = False
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def __enter__(self) -> "RecognitionCacheStore":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def _open(self) -> sqlite3.Connection:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(self.path), timeout=10)
+        try:
+            # 不支持 WAL 的文件系统上 SQLite 会保持原日志模式，不影响使用
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version == 1:
+                # v1 -> v2：只新增内容指纹列，已有条目保留（没有指纹的条目不参与内容查找）
+                conn.executescript(
+                    "ALTER TABLE entries ADD COLUMN quick_hash TEXT; ALTER TABLE entries ADD COLUMN full_hash TEXT;"
+                )
+            elif version != DB_SCHEMA_VERSION:
+                conn.executescript("DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS dates;")
+            conn.execute(f"PRAGMA user_version={DB_SCHEMA_VERSION}")
+            conn.executescript(_SCHEMA_SQL)
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def _connection(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            self._conn = self._open()
+        except sqlite3.DatabaseError as e:
+            if not _is_corrupt_db_error(e):
+                logger.warning(f"识别缓存数据库不可用，本次不使用缓存: {e}")
+                self._disabled = True
+                return None
+            logger.warning(f"识别缓存数据库损坏，已重建: {e}")
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    Path(str(self.path) + suffix).unlink()
+                except OSError:
+                    pass
+            try:
+                self._conn = self._open()
+            except (sqlite3.Error, OSError) as e2:
+                logger.warning(f"识别缓存数据库不可用，本次不使用缓存: {e2}")
+                self._disabled = True
+        except OSError as e:
+            logger.warning(f"识别缓存数据库不可用，本次不使用缓存: {e}")
+            self._disabled = True
+        return self._conn
+
+    def prepare_date(self, date: str, params_fingerprint: str, detection_fingerprint: str) -> None:
+        """按指纹校正某日期的缓存：检测指纹不一致清空该日期，仅参数指纹不一致只清匹配层。"""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            row = conn.execute(
+                "SELECT detection_fingerprint, params_fingerprint FROM dates WHERE date=?", (date,)
+            ).fetchone()
+            if row is None:
+                row = self._migrate_legacy_json(conn, date)
+                if row is not None and not row[0]:
+                    # v1 JSON 缓存没有检测指纹（只存了识别结果）：视为兼容，由 params_fingerprint 决定去留
+                    row = (detection_fingerprint, row[1])
+            if row is None or row[0] != detection_fingerprint:
+                conn.execute("DELETE FROM entries WHERE date=?", (date,))
+            elif row[1] != params_fingerprint:
+                conn.execute(
+                    "UPDATE entries SET result=NULL, unknown_encodings=NULL, unknown_dim=0 WHERE date=?", (date,)
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO dates(date, detection_fingerprint, params_fingerprint) VALUES (?, ?, ?)",
+                (date, detection_fingerprint, params_fingerprint),
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"准备日期 {date} 的识别缓存失败: {e}")
+
+    def _migrate_legacy_json(self, conn: sqlite3.Connection, date: str) -> Optional[tuple[str, str]]:
+        """把旧的 <date>.json 导入数据库并删除；无旧文件返回 None。"""
+        path = date_cache_path(self.output_dir, date)
+        try:
+            ensure_resolved_under(self.output_dir, path)
+            if not path.exists():
+                return None
+        except (UnsafePathError, OSError):
+            return None
+
+        data = _load_legacy_json(path) or {}
+        entries = data.get("entries")
+        migrated = 0
+        if isinstance(entries, dict):
+            for rel_path, item in entries.items():
+                if not isinstance(item, dict):
+                    continue
+                try:
+                    key = CacheKey(date=date, rel_path=str(rel_path), size=int(item["size"]), mtime=int(item["mtime"]))
+                except (KeyError, TypeError, ValueError):
+                    continue
+                result = item.get("result")
+                if not isinstance(result, dict):
+                    continue
+                self._write_entry(conn, key, result, None)
+                migrated += 1
+        logger.debug(f"已迁移旧识别缓存 {path.name}: {migrated} 条")
+        try:
+            path.unlink()
+            path.parent.rmdir()  # 目录空了顺手删掉；非空会失败，忽略
+        except OSError:
+            pass
+        if not data:
+            return None
+        return str(data.get("detection_fingerprint", "")), str(data.get("params_fingerprint", ""))
+
+    def _fetch(self, key: CacheKey, columns: str) -> Optional[tuple]:
+        conn = self._connection()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                f"SELECT size, mtime, {columns} FROM entries WHERE date=? AND rel_path=?",
+                (key.date, key.rel_path),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"读取识别缓存失败 {key.rel_path}: {e}")
+            return None
+        if row is None or int(row[0]) != int(key.size) or int(row[1]) != int(key.mtime):
+            return None
+        return row[2:]
+
+    def lookup_result(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """命中返回 result dict（unknown_encodings 为 float32 ndarray），否则返回 None。"""
+        row = self._fetch(key, "result, unknown_encodings, unknown_dim")
+        if row is None or row[0] is None:
+            return None
+        try:
+            result = json.loads(row[0])
+            if not isinstance(result, dict):
+                return None
+            if row[1] is not None:
+                result["unknown_encodings"] = _unpack_vectors(row[1], row[2])
+        except (ValueError, TypeError) as e:
+            logger.debug(f"识别缓存条目损坏，忽略 {key.rel_path}: {e}")
+            return None
+        return result
+
+    def lookup_detection(self, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """命中返回人脸级检测记录（embedding 为 float32 ndarray），否则返回 None。"""
+        row = self._fetch(key, "detection, embeddings, embedding_dim")
+        if row is None or row[0] is None:
+            return None
+        try:
+            meta = json.loads(row[0])
+            embeddings = _unpack_vectors(row[1], row[2])
+            faces = [
+                {"location": list(face["location"]), "det_score": face.get("det_score"), "embedding": emb}
+                for face, emb in zip(meta["faces"], embeddings)
+            ]
+            if len(faces) != len(meta["faces"]):
+                return None
+            return {"detected_count": int(meta["detected_count"]), "faces": faces}
+        except (ValueError, TypeError, KeyError) as e:
+            logger.debug(f"人脸检测缓存条目损坏，忽略 {key.rel_path}: {e}")
+            return None
+
+    def store_result(self, key: CacheKey, result: Dict[str, Any], content: Optional[ContentHash] = None) -> None:
+        """写入（覆盖）一条结果。
+
+        result 不带 detection、或未提供 content（需含 full）时，沿用同一文件已有的检测层/内容指纹。
+        """
+        conn = self._connection()
+        if conn is None:
+            return
+        result = dict(result)
+        detection = result.pop("detection", None)
+        try:
+            self._write_entry(conn, key, result, detection if isinstance(detection, dict) else None, content)
+            self._pending += 1
+            if self._pending >= STORE_COMMIT_EVERY or time.monotonic() - self._last_commit >= STORE_COMMIT_SECONDS:
+                self.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"写入识别缓存失败 {key.rel_path}: {e}")
+
+    def _write_entry(
+        self,
+        conn: sqlite3.Connection,
+        key: CacheKey,
+        result: Optional[Dict[str, Any]],
+        detection: Optional[Dict[str, Any]],
+        content: Optional[ContentHash] = None,
+    ) -> None:
+        result_json = None
+        unknown_blob, unknown_dim = None, 0
+        if result is not None:
+            result = dict(result)
+            try:
+                unknown_blob, unknown_dim = _pack_vectors(result.get("unknown_encodings"))
+                if unknown_blob is not None:
+                    result.pop("unknown_encodings", None)
+            except (ValueError, TypeError):
+                pass  # 长度不一致等异常结构：留在 JSON 里（经 _sanitize_for_json 转换）
+            result_json = json.dumps(_sanitize_for_json(result), ensure_ascii=False, separators=(",", ":"))
+
+        det_json, emb_blob, emb_dim = None, None, 0
+        if detection is not None:
+            try:
+                faces = detection.get("faces") or []
+                emb_blob, emb_dim = _pack_vectors([face["embedding"] for face in faces])
+                meta = {
+                    "detected_count": int(detection.get("detected_count", len(faces))),
+                    "faces": [
+                        {
+                            "location": [int(v) for v in face["location"]],
+                            "det_score": None if face.get("det_score") is None else float(face["det_score"]),
+                        }
+                        for face in faces
+                    ],
+                }
+                det_json = json.dumps(meta, separators=(",", ":"))
+            except (ValueError, TypeError, KeyError) as e:
+                logger.debug(f"人脸检测记录无法写入缓存: {e}")
+                det_json, emb_blob, emb_dim = None, None, 0
+        quick_hash, full_hash = (content.quick, content.full) if content is not None and content.full else (None, None)
+        if det_json is None or quick_hash is None:
+            row = conn.execute(
+                "SELECT size, mtime, detection, embeddings, embedding_dim, quick_hash, full_hash"
+                " FROM entries WHERE date=? AND rel_path=?",
+                (key.date, key.rel_path),
+            ).fetchone()
+            if row is not None and int(row[0]) == int(key.size) and int(row[1]) == int(key.mtime):
+                if det_json is None:
+                    det_json, emb_blob, emb_dim = row[2], row[3], int(row[4])
+                if quick_hash is None:
+                    quick_hash, full_hash = row[5], row[6]
+
+        self._insert_row(
+            conn,
+            (
+                key.date,
+                key.rel_path,
+                int(key.size),
+                int(key.mtime),
+                result_json,
+                unknown_blob,
+                unknown_dim,
+                det_json,
+                emb_blob,
+                emb_dim,
+                quick_hash,
+                full_hash,
+            ),
+        )
+
+    @staticmethod
+    def _insert_row(conn: sqlite3.Connection, row: tuple) -> None:
+        conn.execute(f"INSERT OR REPLACE INTO entries ({_ENTRY_COLUMNS}) VALUES ({', '.join('?' * 12)})", row)
+
+    def adopt_by_content(
+        self,
+        key: CacheKey,
+        content: ContentHash,
+        full_hash: Callable[[], str],
+        params_fingerprint: str,
+        detection_fingerprint: str,
+    ) -> bool:
+        """按内容指纹查找字节相同的已有条目，复制到 key 下（改名/移动/重新拷贝后复用）。
+
+        - 只考虑检测指纹与当前一致的日期；匹配层仅在参数指纹也一致时复制，否则只复制检测层
+        - quick 命中后调用 full_hash() 计算全文件哈希确认，避免首尾块相同的不同照片被误用
+        - 返回是否复制成功；之后用 lookup_result/lookup_detection 按 key 查询即可
+        """
+        conn = self._connection()
+        if conn is None:
+            return False
+        try:
+            candidates = conn.execute(
+                "SELECT e.date, e.rel_path, e.size, e.mtime, e.result, e.unknown_encodings, e.unknown_dim,"
+                " e.detection, e.embeddings, e.embedding_dim, e.quick_hash, e.full_hash,"
+                " (e.result IS NOT NULL AND d.params_fingerprint = ?) AS params_ok"
+                " FROM entries e JOIN dates d ON d.date = e.date"
+                " WHERE e.quick_hash = ? AND e.size = ? AND e.full_hash IS NOT NULL"
+                " AND d.detection_fingerprint = ?"
+                " AND ((e.result IS NOT NULL AND d.params_fingerprint = ?) OR e.detection IS NOT NULL)"
+                " ORDER BY params_ok DESC LIMIT 8",
+                (params_fingerprint, content.quick, int(key.size), detection_fingerprint, params_fingerprint),
+            ).fetchall()
+            if not candidates:
+                return False
+            if not content.full:
+                content.full = full_hash()
+            for row in candidates:
+                if row[11] != content.full:
+                    continue
+                params_ok = bool(row[12])
+                self._insert_row(
+                    conn,
+                    (
+                        key.date,
+                        key.rel_path,
+                        int(key.size),
+                        int(key.mtime),
+                        row[4] if params_ok else None,
+                        row[5] if params_ok else None,
+                        int(row[6]) if params_ok else 0,
+                        row[7],
+                        row[8],
+                        int(row[9]),
+                        content.quick,
+                        content.full,
+                    ),
+                )
+                self._pending += 1
+                return True
+        except (sqlite3.Error, OSError) as e:
+            logger.debug(f"按内容查找识别缓存失败 {key.rel_path}: {e}")
+        return False
+
+    def prune_date(self, date: str, keep_rel_paths: set[str]) -> None:
+        """删除该日期下不再存在的条目，避免缓存无限增长。"""
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            existing = [r[0] for r in conn.execute("SELECT rel_path FROM entries WHERE date=?", (date,))]
+            stale = [(date, rel) for rel in existing if rel not in keep_rel_paths]
+            if stale:
+                conn.executemany("DELETE FROM entries WHERE date=? AND rel_path=?", stale)
+        except sqlite3.Error as e:
+            logger.debug(f"清理日期 {date} 的识别缓存失败: {e}")
+
+    def invalidate_date(self, date: str) -> None:
+        conn = self._connection()
+        if conn is None:
+            return
+        try:
+            conn.execute("DELETE FROM entries WHERE date=?", (date,))
+            conn.execute("DELETE FROM dates WHERE date=?", (date,))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"删除日期 {date} 的识别缓存失败: {e}")
+
+    def commit(self) -> None:
+        if self._conn is None:
+            return
+        try:
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"提交识别缓存失败: {e}")
+        self._pending = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        if self._conn is None:
+            return
+        self.commit()
+        try:
+            self._conn.close()
+        except sqlite3.Error:
+            pass
+        self._conn = None
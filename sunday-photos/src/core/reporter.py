@@ -5,6 +5,9 @@ import sys
 import os
 import logging
 
+from .utils.fs import format_bytes
+from .utils.tracing import format_summary_table
+
 logger = logging.getLogger(__name__)
 
 class Reporter:
@@ -72,4 +75,19 @@ class Reporter:
             self.logger.info(self._hud_line("STAT", "识别到的学生: 暂无"))
 
         self.logger.info(self._hud_line("PATH", f"输出目录: {os.path.abspath(output_dir)}"))
+
+        prefetch = stats.get('prefetch')
+        if prefetch:
+            self.logger.info(self._hud_line(
+                "IO",
+                f"预读命中 {prefetch.get('hits', 0)} 张 / 未命中 {prefetch.get('misses', 0)} 张（预读 {format_bytes(prefetch.get('bytes', 0))}）",
+            ))
+
+        timings = stats.get('stage_timings')
+        if timings:
+            self.logger.info(self._hud_rule())
+            for line in format_summary_table(timings):
+                self.logger.info(self._hud_line("PERF", line))
+            if stats.get('trace_file'):
+                self.logger.info(self._hud_line("PERF", f"追踪文件（chrome://tracing / ui.perfetto.dev 打开）: {stats['trace_file']}"))
         self.logger.info(self._hud_rule())
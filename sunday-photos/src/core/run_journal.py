@@ -0,0 +1,184 @@
+"""运行日志（run journal）：让被中断的运行可以接着做。
+
+问题：3000 张照片识别到 90% 时合上笔记本、按了 Ctrl-C 或 worker 内存不足，
+增量快照只在运行成功结束时保存，整理输出也只在识别全部完成后才进行。
+
+做法：
+- 识别结果逐条写入识别缓存（SQLite），每 STORE_COMMIT_EVERY 条或每 STORE_COMMIT_SECONDS 秒提交一次
+  （见 recognition_cache），中断时再提交一次；下次运行已完成的照片直接命中缓存，只识别剩下的；
+- 开始处理前写入运行日志（本次要处理的日期、阶段、进度），运行成功结束（快照保存）后删除；
+- 下次运行发现残留的运行日志，说明上次没有正常结束：这些日期可能只清理/整理了一半
+  （输出清单只在整理成功后写入），一律按整日期重建（按目录清理后重新整理，识别走缓存）；
+- 识别阶段第一次 Ctrl-C 只请求停止：处理完手头的照片、提交缓存后再中断；第二次立即中断。
+
+存储：output/.state/run_journal.json
+{
+    version: int,
+    started_at: "ISO 时间",
+    pid: int,
+    phase: "recognize" | "sort",
+    dates: ["YYYY-MM-DD", ...],
+    total: int,     # 本次要处理的照片数
+    done: int       # 已完成（已写入缓存）的照片数，仅用于提示
+}
+运行日志损坏或读取失败时按“上次正常结束”处理。
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Set
+
+from .config import RUN_JOURNAL_FILENAME, STATE_DIR_NAME
+
+logger = logging.getLogger(__name__)
+
+RUN_JOURNAL_VERSION = 1
+# 进度最多每隔这么多秒写一次（只用于提示，不影响续跑的正确性）
+JOURNAL_PROGRESS_SECONDS = 10.0
+
+PHASE_RECOGNIZE = "recognize"
+PHASE_SORT = "sort"
+_PHASE_LABELS = {PHASE_RECOGNIZE: "识别", PHASE_SORT: "整理输出"}
+
+
+def run_journal_path(output_dir: Path) -> Path:
+    return Path(output_dir) / STATE_DIR_NAME / RUN_JOURNAL_FILENAME
+
+
+class RunJournal:
+    """本次运行的日志；构造时读出上次残留的日志（previous），begin() 后开始记录本次运行。"""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.path = run_journal_path(output_dir)
+        self.previous: Optional[Dict[str, Any]] = self._load()
+        self._data: Optional[Dict[str, Any]] = None
+        self._last_progress_write = 0.0
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self.path.exists():
+            return None
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if not isinstance(data, dict) or data.get("version") != RUN_JOURNAL_VERSION:
+                return None
+            data["dates"] = [str(d) for d in data.get("dates") or []]
+            return data
+        except Exception as e:
+            logger.warning(f"运行日志损坏，已忽略: {e}")
+            return None
+
+    def interrupted_dates(self) -> Set[str]:
+        """上次未正常结束的运行正在处理的日期（没有残留日志时为空）。"""
+        return set(self.previous["dates"]) if self.previous else set()
+
+    def describe_previous(self) -> str:
+        """上次中断的简短描述，例如“2026-01-04 09:30 在识别阶段中断（已完成 2700/3000 张）”。"""
+        prev = self.previous or {}
+        started = str(prev.get("started_at", ""))[:16].replace("T", " ")
+        phase = _PHASE_LABELS.get(prev.get("phase"), "处理")
+        return f"{started} 在{phase}阶段中断（已完成 {int(prev.get('done', 0))}/{int(prev.get('total', 0))} 张）"
+
+    def _write(self) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._data, ensure_ascii=False, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+        except OSError as e:
+            logger.warning(f"写入运行日志失败（中断后将无法定位未完成的日期）: {e}")
+
+    def begin(self, dates: Iterable[str], total: int) -> None:
+        """记录本次要处理的日期；没有要处理的日期时不写日志。"""
+        dates = sorted(set(dates))
+        if not dates:
+            self._data = None
+            self.clear()
+            return
+        self._data = {
+            "version": RUN_JOURNAL_VERSION,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "pid": os.getpid(),
+            "phase": PHASE_RECOGNIZE,
+            "dates": dates,
+            "total": int(total),
+            "done": 0,
+        }
+        self._write()
+        self._last_progress_write = time.monotonic()
+
+    def set_phase(self, phase: str) -> None:
+        if self._data is not None and self._data.get("phase") != phase:
+            self._data["phase"] = phase
+            self._write()
+
+    def progress(self, done: int, force: bool = False) -> None:
+        """更新已完成张数（限频写入）。"""
+        if self._data is None:
+            return
+        self._data["done"] = int(done)
+        now = time.monotonic()
+        if force or now - self._last_progress_write >= JOURNAL_PROGRESS_SECONDS:
+            self._last_progress_write = now
+            self._write()
+
+    def clear(self) -> None:
+        _remove(self.path)
+
+
+def _remove(path: Path) -> None:
+    try:
+        path.unlink()
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除运行日志失败: {e}")
+
+
+def clear_run_journal(output_dir: Path) -> None:
+    """运行成功结束（增量快照已保存）后调用：删除运行日志。"""
+    _remove(run_journal_path(output_dir))
+
+
+class GracefulInterrupt:
+    """识别期间的 Ctrl-C（SIGINT）处理。
+
+    第一次 Ctrl-C 只设置 requested，由调用方在处理完手头照片、提交缓存后调用 check() 中断；
+    第二次立即抛出 KeyboardInterrupt。只能在主线程安装，其他线程中使用时保持默认行为。
+    """
+
+    def __init__(self) -> None:
+        self.requested = False
+        self._previous = None
+        self._installed = False
+
+    def __enter__(self) -> "GracefulInterrupt":
+        if threading.current_thread() is threading.main_thread():
+            try:
+                self._previous = signal.signal(signal.SIGINT, self._handle)
+                self._installed = True
+            except (ValueError, OSError):
+                self._installed = False
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self._installed:
+            signal.signal(signal.SIGINT, self._previous if self._previous is not None else signal.default_int_handler)
+            self._installed = False
+
+    def _handle(self, signum, frame) -> None:
+        if self.requested:
+            raise KeyboardInterrupt
+        self.requested = True
+        logger.warning("收到中断请求：正在保存已完成的识别结果，下次运行将从这里继续（再按一次 Ctrl-C 立即退出）")
+
+    def check(self) -> None:
+        if self.requested:
+            raise KeyboardInterrupt
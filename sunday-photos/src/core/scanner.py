@@ -1,23 +1,25 @@
 """
 Input directory scanner.
 """
-import os
 import shutil
-import re
 import logging
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Optional
 
-from .utils.fs import (
-    is_supported_nonempty_image_path,
-    is_ignored_fs_entry,
-)
-from .utils.date_parser import get_photo_date, parse_date_from_text
+from .utils.fs import UniqueNameAllocator, is_supported_nonempty_image_path
+from .utils.date_parser import get_photo_date
+from .utils.tracing import trace_span
 from .incremental_state import (
-    build_class_photos_snapshot,
+    ClassPhotosScan,
     compute_incremental_plan,
     load_snapshot,
+    scan_class_photos,
+    snapshot_files,
 )
+from .output_manifest import OutputManifest
+from .photo_meta import PhotoMetaIndex
+from .run_journal import RunJournal
 
 logger = logging.getLogger(__name__)
 
@@ -27,35 +29,23 @@ class Scanner:
         self.output_dir = output_dir
         self.reporter = reporter
         self.incremental_plan = None
-
-    def organize_input_by_date(self):
-        """将上课照片根目录下的照片按日期移动到对应子目录"""
+        # 可选：外部（如启动器的照片检查）预先做好的 ClassPhotosScan，scan() 会消费一次
+        self.prescan: Optional[ClassPhotosScan] = None
+        # 本次扫描建立的照片元数据索引（日期/大小/mtime/方向/尺寸），识别与整理阶段查表复用
+        self.photo_meta: Optional[PhotoMetaIndex] = None
+        # 本次运行的运行日志（中断后续跑用，见 run_journal）
+        self.run_journal: Optional[RunJournal] = None
+
+    def organize_input_by_date(self) -> int:
+        """将上课照片根目录下的照片按日期移动到对应子目录，返回移动的照片数。"""
         self.reporter.log_info("STEP", "2a/4 归档输入照片（按日期整理）")
         photo_root = Path(self.photos_dir)
         if not photo_root.exists():
             logger.warning(f"输入目录不存在: {photo_root}")
-            return
-
-        def _unique_target_path(dest_dir: Path, src_name: str) -> tuple[Path, bool]:
-            """生成不会覆盖的目标路径。
-
-            返回：(target_path, renamed)
-            - renamed=True 表示发生同名冲突，已自动改名
-            """
-            candidate = dest_dir / src_name
-            if not candidate.exists():
-                return candidate, False
-            base = candidate.stem
-            ext = candidate.suffix
-            for i in range(1, 1000):
-                alt = dest_dir / f"{base}_{i:03d}{ext}"
-                if not alt.exists():
-                    return alt, True
-            # 极端情况下仍冲突：使用时间戳兜底
-            import time
-
-            alt = dest_dir / f"{base}_{int(time.time())}{ext}"
-            return alt, True
+            return 0
+
+        # 每个日期目录只列一次，同名照片（多台手机的 IMG_0001.jpg）按序号改名，不再逐个 exists() 试探
+        allocator = UniqueNameAllocator()
 
         moved_count = 0
         renamed_count = 0
@@ -68,10 +58,10 @@ class Scanner:
                 date_dir = photo_root / photo_date
                 date_dir.mkdir(exist_ok=True)
 
-                target_path, renamed = _unique_target_path(date_dir, file.name)
+                target_path = allocator.allocate(date_dir, file.name)
                 shutil.move(str(file), str(target_path))
                 moved_count += 1
-                if renamed:
+                if target_path.name != file.name:
                     renamed_count += 1
                     logger.warning(f"检测到同名照片，已自动改名并归档: {file.name} -> {target_path.name}")
             except Exception as e:
@@ -87,10 +77,17 @@ class Scanner:
             self.reporter.log_info("OK" if failed_count == 0 else "WARN", msg)
         else:
             self.reporter.log_info("OK", "输入照片已按日期整理，无需移动")
+        return moved_count
 
     def scan(self) -> List[str]:
         """扫描输入目录，返回“本次需要处理”的课堂照片列表。"""
-        self.organize_input_by_date()
+        # 启动器检查阶段已做过的扫描可直接复用；但若根目录有照片需要归档（目录树会变化），
+        # 或扫描的不是当前输入目录，则丢弃并重新扫描。
+        prescan, self.prescan = self.prescan, None
+        if prescan is not None and (prescan.root_photos or Path(prescan.root) != Path(self.photos_dir)):
+            prescan = None
+        if self.organize_input_by_date():
+            prescan = None
         self.reporter.log_rule()
         self.reporter.log_info("STEP", f"2/4 扫描输入目录: {self.photos_dir}")
 
@@ -98,10 +95,40 @@ class Scanner:
             logger.error(f"输入目录不存在: {self.photos_dir}")
             return []
 
-        previous = load_snapshot(self.output_dir)
-        current = build_class_photos_snapshot(self.photos_dir)
-        plan = compute_incremental_plan(previous, current)
+        # 单次遍历：快照与本次工作清单来自同一次扫描
+        if prescan is not None:
+            scan = prescan
+        else:
+            with trace_span("scan_tree"):
+                scan = scan_class_photos(self.photos_dir)
+        with trace_span("snapshot_diff"):
+            previous = load_snapshot(self.output_dir)
+            plan = compute_incremental_plan(previous, scan.snapshot)
+            if plan.file_changes:
+                # 只有输出清单记录过的日期才能按文件增量维护；旧版本生成的输出仍整日期重建
+                manifest = OutputManifest(self.output_dir)
+                plan = replace(
+                    plan,
+                    file_changes={d: c for d, c in plan.file_changes.items() if manifest.has_date(d)},
+                )
+            # 上次运行没有正常结束：它正在处理的日期输出可能只整理了一半，整日期重建（识别走缓存）
+            journal = RunJournal(self.output_dir)
+            resumed = journal.interrupted_dates() & set(scan.snapshot.get("dates", {}))
+            if resumed:
+                plan = replace(
+                    plan,
+                    changed_dates=set(plan.changed_dates) | resumed,
+                    file_changes={d: c for d, c in plan.file_changes.items() if d not in resumed},
+                    resumed_dates=resumed,
+                )
         self.incremental_plan = plan
+        self.run_journal = journal
+
+        if resumed:
+            self.reporter.log_info(
+                "PLAN",
+                f"上次运行 {journal.describe_previous()}：{', '.join(sorted(resumed))} 将整日期重新整理，已完成的识别直接复用缓存",
+            )
 
         if previous is None:
             self.reporter.log_info("INFO", "未找到增量快照（首次运行），将处理全部日期文件夹")
@@ -113,54 +140,40 @@ class Scanner:
         if plan.changed_dates:
             changed_line = ", ".join(sorted(plan.changed_dates))
             self.reporter.log_info("PLAN", f"检测到变更日期，将仅处理: {changed_line}")
+            for date, changes in sorted(plan.file_changes.items()):
+                self.reporter.log_info(
+                    "PLAN",
+                    f"{date} 按文件增量：新增 {len(changes.added)} / 修改 {len(changes.modified)} / 删除 {len(changes.removed)}",
+                )
         else:
             self.reporter.log_info("PLAN", "未检测到新增或变更的日期文件夹")
 
-        # 兼容多种“日期文件夹写法”
-        date_to_dirs: Dict[str, List[Path]] = {}
-        try:
-            for child in self.photos_dir.iterdir():
-                if is_ignored_fs_entry(child):
-                    continue
-                if not child.is_dir():
-                    continue
-                normalized = parse_date_from_text(child.name)
-                if not normalized:
-                    continue
-                date_to_dirs.setdefault(normalized, []).append(child)
-
-            # 第二轮：识别嵌套 YYYY/MM/DD 结构
-            for year_dir in self.photos_dir.iterdir():
-                if is_ignored_fs_entry(year_dir) or (not year_dir.is_dir()):
-                    continue
-                if not re.fullmatch(r"\d{4}", year_dir.name or ""):
-                    continue
-                for month_dir in year_dir.iterdir():
-                    if is_ignored_fs_entry(month_dir) or (not month_dir.is_dir()):
-                        continue
-                    if not re.fullmatch(r"\d{1,2}", month_dir.name or ""):
-                        continue
-                    for day_dir in month_dir.iterdir():
-                        if is_ignored_fs_entry(day_dir) or (not day_dir.is_dir()):
-                            continue
-                        if not re.fullmatch(r"\d{1,2}", day_dir.name or ""):
-                            continue
-
-                        normalized = parse_date_from_text(f"{year_dir.name}/{month_dir.name}/{day_dir.name}")
-                        if not normalized:
-                            continue
-                        date_to_dirs.setdefault(normalized, []).append(day_dir)
-        except Exception:
-            date_to_dirs = {}
-
-        photo_files = []
+        photo_files: List[str] = []
         for date in sorted(plan.changed_dates):
-            for date_dir in sorted(date_to_dirs.get(date, []), key=lambda p: p.name):
-                for root, _, files in os.walk(date_dir):
-                    for file in files:
-                        p = Path(root) / file
-                        if is_supported_nonempty_image_path(p):
-                            photo_files.append(str(p))
+            changes = plan.file_changes.get(date)
+            if changes is None:
+                photo_files.extend(scan.files_by_date.get(date, []))
+            else:
+                photo_files.extend(scan.photo_path(source) for source in changes.to_process)
+
+        with trace_span("photo_meta"):
+            self.photo_meta = self._build_photo_meta(scan, photo_files)
+        journal.begin(plan.changed_dates, len(photo_files))
 
         self.reporter.log_info("STAT", f"本次需要处理 {len(photo_files)} 张照片")
         return photo_files
+
+    def _build_photo_meta(self, scan: ClassPhotosScan, photo_files: List[str]) -> Optional[PhotoMetaIndex]:
+        """为本次要处理的照片准备 PhotoMeta：size/mtime 未变的沿用持久化记录，其余只读文件头。"""
+        try:
+            index = PhotoMetaIndex(self.output_dir, scan.root)
+            file_stats = snapshot_files(scan.snapshot)
+            index.retain(file_stats)
+            read = index.refresh(photo_files, file_stats)
+            index.save()
+        except Exception:
+            logger.exception("建立照片元数据索引失败，将按需读取照片日期")
+            return None
+        if read:
+            logger.debug(f"照片元数据：读取文件头 {read} 张，复用 {len(photo_files) - read} 张")
+        return index
@@ -0,0 +1,135 @@
+"""解码/推理分级执行（decode-ahead，见 config.DEFAULT_DECODE_AHEAD）。
+
+问题：识别是“解码 JPEG → 检测 + 编码”串行进行，推理等解码、解码等推理，两段都吃不满。
+解码（PIL/libjpeg）与推理（onnxruntime）都会释放 GIL，可以在线程中重叠。
+
+做法：decode_ahead 用若干解码线程提前解码后续照片，放进有界队列，推理方从队列取用：
+- 队列满时解码线程阻塞（背压），内存中已解码的图片最多 depth + 解码线程数 张；
+- 解码/推理线程数默认按推理并发自动估算（auto_stage_sizes），推理方经常空等队列时
+  （解码是瓶颈）再追加解码线程，直到上限；
+- 解码异常不抛出，随条目交给推理方，由推理方按原来的方式转成错误结果；
+- 生成器关闭（正常结束、出错或中断）时通知解码线程停止，不留后台线程。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterable, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 每取用这么多张检查一次推理方空等队列的比例，超过阈值就追加一个解码线程
+GROW_CHECK_EVERY = 16
+STARVED_FRACTION = 0.2
+
+_DONE = object()
+
+
+def max_decode_workers() -> int:
+    """自动模式下解码线程数的上限：留一半 CPU 给推理。"""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def auto_stage_sizes(infer_workers: int, decode_workers: int = 0, queue_depth: int = 0) -> Tuple[int, int]:
+    """按推理并发估算 (解码线程数, 队列深度)；显式给出（> 0）的值原样使用。
+
+    解码通常比推理快数倍：每 3 路推理配 1 个解码线程；队列深度够每路推理各备一张，外加解码中的。
+    """
+    infer_workers = max(1, int(infer_workers))
+    if decode_workers <= 0:
+        decode_workers = min(infer_workers // 3 + 1, max_decode_workers())
+    if queue_depth <= 0:
+        queue_depth = infer_workers + decode_workers
+    return int(decode_workers), int(queue_depth)
+
+
+def decode_ahead(
+    paths: Iterable[str],
+    decode: Callable[[str], Any],
+    *,
+    infer_workers: int = 1,
+    decode_workers: int = 0,
+    queue_depth: int = 0,
+) -> Iterator[Tuple[str, Any, Optional[BaseException]]]:
+    """在解码线程中提前执行 decode(path)，按完成顺序产出 (path, decoded, error)。
+
+    decode_workers/queue_depth 为 0 时自动估算（auto_stage_sizes），且允许运行中追加解码线程；
+    error 非 None 时 decoded 为 None。
+    """
+    auto = int(decode_workers) <= 0
+    decode_workers, queue_depth = auto_stage_sizes(infer_workers, decode_workers, queue_depth)
+    limit = max(decode_workers, max_decode_workers()) if auto else decode_workers
+
+    source = iter(paths)
+    source_lock = threading.Lock()
+    ready: "queue.Queue[Any]" = queue.Queue(maxsize=queue_depth)
+    stop = threading.Event()
+    threads = []
+
+    def _put(item: Any) -> bool:
+        # 带超时的阻塞 put：队列满时等待（背压），同时能及时响应 stop
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decoder() -> None:
+        while not stop.is_set():
+            with source_lock:
+                path = next(source, _DONE)
+            if path is _DONE:
+                break
+            try:
+                item = (path, decode(path), None)
+            except Exception as e:
+                item = (path, None, e)
+            if not _put(item):
+                return
+        _put(_DONE)
+
+    def _start() -> None:
+        thread = threading.Thread(target=_decoder, name=f"decode-{len(threads)}", daemon=True)
+        threads.append(thread)
+        thread.start()
+
+    for _ in range(decode_workers):
+        _start()
+
+    finished = 0
+    consumed = 0
+    starved = 0.0
+    window_start = time.perf_counter()
+    try:
+        while finished < len(threads):
+            wait_start = time.perf_counter()
+            item = ready.get()
+            starved += time.perf_counter() - wait_start
+            if item is _DONE:
+                finished += 1
+                continue
+            yield item
+            consumed += 1
+            if consumed % GROW_CHECK_EVERY == 0 and len(threads) < limit:
+                elapsed = time.perf_counter() - window_start
+                if elapsed > 0 and starved / elapsed > STARVED_FRACTION:
+                    _start()
+                    logger.debug("推理方等待解码的时间占比 %.0f%%，解码线程增加到 %s", 100 * starved / elapsed, len(threads))
+                starved = 0.0
+                window_start = time.perf_counter()
+    finally:
+        stop.set()
+        # 取空队列，让阻塞在 put 上的解码线程尽快退出
+        while True:
+            try:
+                ready.get_nowait()
+            except queue.Empty:
+                break
+        for thread in threads:
+            thread.join(timeout=1.0)
@@ -0,0 +1,272 @@
+"""未知人物登记表：跨次运行保持稳定的 Unknown_Person_N。
+
+问题：每次运行只对“本次变化日期”的未知人脸聚类，同一位来访家长这周是 Unknown_Person_1、
+下周可能变成 Unknown_Person_3；若要对全部历史重新聚类，又得重新识别所有照片。
+
+做法：
+- 登记表记录每个未知人物的编号与“归一化编码之和 + 人脸数”（按日期分片），
+  与簇内所有人脸的平均余弦距离 = 1 - u·S/n，一次矩阵乘即可把本次所有新人脸与全部已登记人物比较；
+- 距离 < 阈值的人脸直接归入已登记人物（沿用原编号）；剩下的人脸再交给聚类器，
+  新形成的簇（人脸数 >= min_cluster_size）登记为新人物，编号只增不减、不复用；
+- 按日期分片保存贡献：重新处理某日期时整体替换该日期的贡献，日期被删除时一并移除，
+  不会重复累计；某人物的贡献全部移除后即从登记表删除。
+每周运行的开销只与本次新增的人脸数（以及已登记人物数）成正比：各人物的合计（编码之和、人脸数）
+常驻内存，只在其贡献变化时重算。登记表在输出整理完成后才保存（Pipeline.commit_unknown_registry），
+中途失败/中断的运行不会留下没有对应文件夹的新编号。
+
+存储：output/.state/unknown_persons.json
+{
+    version: int,
+    next_id: int,
+    persons: {
+        "<编号>": {"<日期>": [人脸数, "<base64 float64 归一化编码之和>"], ...},
+        ...
+    }
+}
+登记表损坏或读取失败时按空表处理（编号从 1 重新开始），不影响整理本身。
+"""
+
+from __future__ import annotations
+
+import base64
+import json
+import logging
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import STATE_DIR_NAME, UNKNOWN_PERSONS_FILENAME
+
+logger = logging.getLogger(__name__)
+
+UNKNOWN_PERSONS_VERSION = 1
+
+
+def unknown_persons_path(output_dir: Path) -> Path:
+    return Path(output_dir) / STATE_DIR_NAME / UNKNOWN_PERSONS_FILENAME
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    return vector / (np.linalg.norm(vector) + 1e-12)
+
+
+class UnknownPersonRegistry:
+    """未知人物编号 -> {日期: (人脸数, 归一化编码之和)}（构造时从磁盘加载，save() 原子写回）。"""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.path = unknown_persons_path(output_dir)
+        self.next_id = 1
+        self._persons: Dict[int, Dict[str, Tuple[int, np.ndarray]]] = {}
+        # 各人物合计 (人脸数, 编码之和) 与按编号排好的矩阵缓存；贡献变化时按人物重算
+        self._totals: Dict[int, Tuple[int, np.ndarray]] = {}
+        self._matrix: Optional[Tuple[List[int], np.ndarray, np.ndarray]] = None
+        self._load()
+        self._dirty = False
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            if not isinstance(data, dict) or data.get("version") != UNKNOWN_PERSONS_VERSION:
+                return
+            persons: Dict[int, Dict[str, Tuple[int, np.ndarray]]] = {}
+            for pid, by_date in (data.get("persons") or {}).items():
+                persons[int(pid)] = {
+                    date: (int(count), np.frombuffer(base64.b64decode(blob), dtype="<f8").copy())
+                    for date, (count, blob) in by_date.items()
+                }
+            self._persons = persons
+            self.next_id = max([int(data.get("next_id", 1)), *(pid + 1 for pid in persons)])
+            self._refresh_totals(persons)
+        except Exception as e:
+            logger.warning(f"未知人物登记表损坏，将重新编号: {e}")
+            self._persons = {}
+            self._totals = {}
+            self.next_id = 1
+
+    def _refresh_totals(self, pids: Iterable[int]) -> None:
+        """重算这些人物的合计（人物已删除则移除），并使矩阵缓存失效。"""
+        for pid in pids:
+            by_date = self._persons.get(pid)
+            if by_date:
+                self._totals[pid] = (
+                    sum(count for count, _total in by_date.values()),
+                    sum(total for _count, total in by_date.values()),
+                )
+            else:
+                self._totals.pop(pid, None)
+        self._matrix = None
+
+    def save(self) -> None:
+        """有变化时原子保存（tmp -> rename）。"""
+        if not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            payload = {
+                "version": UNKNOWN_PERSONS_VERSION,
+                "next_id": self.next_id,
+                "persons": {
+                    str(pid): {
+                        date: [count, base64.b64encode(total.astype("<f8").tobytes()).decode("ascii")]
+                        for date, (count, total) in sorted(by_date.items())
+                    }
+                    for pid, by_date in sorted(self._persons.items())
+                },
+            }
+            tmp.write_text(json.dumps(payload, ensure_ascii=False, indent=1), encoding="utf-8")
+            tmp.replace(self.path)
+            self._dirty = False
+        except OSError as e:
+            logger.warning(f"保存未知人物登记表失败: {e}")
+
+    def __len__(self) -> int:
+        return len(self._persons)
+
+    @property
+    def dim(self) -> Optional[int]:
+        for _count, total in self._totals.values():
+            return int(total.shape[0])
+        return None
+
+    def member_count(self, pid: int) -> int:
+        return self._totals.get(pid, (0, None))[0]
+
+    def match(self, units: np.ndarray, tolerance: float) -> List[Optional[int]]:
+        """一次矩阵乘把每张人脸（单位向量，每行一张）与所有已登记人物比较。
+
+        返回每张人脸归入的人物编号；平均余弦距离都不小于阈值时为 None。
+        """
+        if not self._totals or units.shape[0] == 0:
+            return [None] * units.shape[0]
+        if self._matrix is None:
+            ids = sorted(self._totals)
+            self._matrix = (
+                ids,
+                np.stack([self._totals[pid][1] for pid in ids]),
+                np.array([self._totals[pid][0] for pid in ids], dtype=np.float64),
+            )
+        ids, sums, counts = self._matrix
+        avg_dist = 1.0 - (units @ sums.T) / counts
+        best = np.argmin(avg_dist, axis=1)
+        ok = avg_dist[np.arange(units.shape[0]), best] < min(1.0, tolerance)
+        return [ids[b] if hit else None for b, hit in zip(best.tolist(), ok.tolist())]
+
+    def new_person(self) -> int:
+        pid = self.next_id
+        self.next_id += 1
+        self._dirty = True
+        return pid
+
+    def replace_dates(self, dates: Iterable[str], contributions: Mapping[str, Mapping[int, Tuple[int, np.ndarray]]]) -> None:
+        """整体替换这些日期的贡献（contributions：日期 -> {人物编号: (人脸数, 编码之和)}）。"""
+        dates = set(dates) | set(contributions)
+        changed = set()
+        for pid, by_date in self._persons.items():
+            for date in dates:
+                if by_date.pop(date, None) is not None:
+                    changed.add(pid)
+        for date, per_person in contributions.items():
+            for pid, (count, total) in per_person.items():
+                if count:
+                    self._persons.setdefault(pid, {})[date] = (int(count), np.asarray(total, dtype=np.float64))
+                    changed.add(pid)
+        for pid in [pid for pid, by_date in self._persons.items() if not by_date]:
+            del self._persons[pid]
+        if changed:
+            self._dirty = True
+            self._refresh_totals(changed)
+
+    def forget_dates(self, dates: Iterable[str]) -> None:
+        self.replace_dates(dates, {})
+
+    def clear(self) -> None:
+        """清空所有人物（next_id 保留，新编号不与旧文件夹重名）。"""
+        if self._persons:
+            self._persons = {}
+            self._totals = {}
+            self._matrix = None
+            self._dirty = True
+
+
+def forget_unknown_person_dates(output_dir: Path, dates: Iterable[str]) -> None:
+    """删除日期时同步移除这些日期在登记表中的贡献（登记表不存在时不做任何事）。"""
+    dates = list(dates)
+    if not dates or not unknown_persons_path(output_dir).exists():
+        return
+    registry = UnknownPersonRegistry(output_dir)
+    registry.forget_dates(dates)
+    registry.save()
+
+
+def assign_unknown_persons(
+    registry: UnknownPersonRegistry,
+    clustering,
+    unknown_faces: Mapping[str, Sequence],
+    date_of: Callable[[str], str],
+    processed_dates: Iterable[str],
+    tolerance: float,
+) -> Dict[str, List[str]]:
+    """先把本次未知人脸归入已登记人物，剩余的交给 clustering 聚类并登记新人物。
+
+    - unknown_faces：{photo_path: [encoding, ...]}（只含 unknown 照片）
+    - clustering：提供 add_faces / get_face_clusters 的聚类器（UnknownClustering/KnnGraphClustering）
+    - processed_dates：本次完整处理过的日期；它们在登记表中的旧贡献整体替换为本次结果
+    只更新内存中的登记表，不保存：调用方在输出整理完成后再 registry.save()。
+    返回：{"Unknown_Person_<编号>": [photo_path, ...]}，与 clustering.get_results() 格式相同。
+    """
+    dim: Optional[int] = None
+    faces: List[Tuple[str, np.ndarray]] = []
+    for path in sorted(unknown_faces):
+        for encoding in unknown_faces[path]:
+            try:
+                vector = np.asarray(encoding, dtype=np.float64).ravel()
+            except Exception:
+                continue
+            if dim is None:
+                dim = vector.shape[0]
+            if vector.shape[0] != dim:
+                logger.debug(f"跳过维度不一致的人脸编码: {vector.shape[0]} != {dim} ({path})")
+                continue
+            faces.append((path, vector))
+
+    if dim is not None and registry.dim not in (None, dim):
+        # 换了识别后端/模型，旧编码不可比：清空登记表（编号继续递增，不与旧文件夹重名）
+        logger.warning(f"人脸编码维度变化（{registry.dim} -> {dim}），未知人物登记表已重置")
+        registry.clear()
+
+    units = np.stack([_unit(v) for _p, v in faces]) if faces else np.zeros((0, dim or 0))
+    matched = registry.match(units, tolerance)
+
+    results: Dict[int, List[str]] = {}
+    contributions: Dict[str, Dict[int, Tuple[int, np.ndarray]]] = {}
+
+    def _add(pid: int, path: str, unit: np.ndarray) -> None:
+        results.setdefault(pid, []).append(path)
+        per_person = contributions.setdefault(date_of(path), {})
+        count, total = per_person.get(pid, (0, 0.0))
+        per_person[pid] = (count + 1, total + unit)
+
+    residue: Dict[str, List[np.ndarray]] = {}
+    for (path, vector), unit, pid in zip(faces, units, matched):
+        if pid is None:
+            residue.setdefault(path, []).append(vector)
+        else:
+            _add(pid, path, unit)
+    reused = len(results)
+
+    # 只有没归入已登记人物的人脸参与本次聚类；新簇登记为新人物
+    for path, vectors in residue.items():
+        clustering.add_faces(path, vectors)
+    for items in clustering.get_face_clusters():
+        pid = registry.new_person()
+        for path, encoding in items:
+            _add(pid, path, _unit(np.asarray(encoding, dtype=np.float64).ravel()))
+
+    registry.replace_dates(processed_dates, contributions)
+    if results:
+        logger.info(f"未知人物：沿用已登记 {reused} 位，新登记 {len(results) - reused} 位（登记表共 {len(registry)} 位）")
+    return {f"Unknown_Person_{pid}": paths for pid, paths in sorted(results.items())}
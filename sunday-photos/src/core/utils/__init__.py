@@ -5,11 +5,27 @@ from .logger import setup_logger, ColoredConsoleHandler, COLORS
 from .date_parser import parse_date_from_text, get_photo_date
 from .fs import (
     is_ignored_fs_entry,
+    is_ignored_fs_name,
     is_supported_image_file,
     is_supported_nonempty_image_path,
+    supported_nonempty_image_stat,
     ensure_directory_exists,
     get_file_extension,
     safe_join_under,
     ensure_resolved_under,
+    place_file,
+    format_bytes,
+    UniqueNameAllocator,
     UnsafePathError,
 )
+from .tracing import (
+    TRACE_KEY,
+    Tracer,
+    SpanRecorder,
+    start_tracing,
+    stop_tracing,
+    get_tracer,
+    trace_span,
+    format_summary_table,
+    prune_trace_files,
+)
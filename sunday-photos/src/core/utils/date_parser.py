@@ -4,13 +4,60 @@ Date parsing utilities.
 import os
 import re
 from datetime import datetime
+from functools import lru_cache
 from datetime import date as _date
 from typing import List, Optional, Pattern
 from pathlib import Path
 
 DATE_DIR_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 
-
+# 正则在模块加载时编译一次（parse_date_from_text 会对每一层父目录名调用，属于热路径）
+_MONTH_MAP = {
+    "jan": 1,
+    "feb": 2,
+    "mar": 3,
+    "apr": 4,
+    "may": 5,
+    "jun": 6,
+    "jul": 7,
+    "aug": 8,
+    "sep": 9,
+    "oct": 10,
+    "nov": 11,
+    "dec": 12,
+}
+_MONTH_TOKEN = (
+    r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|"
+    r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+)
+
+_NUMERIC_DATE_PATTERNS: List[Pattern] = [
+    # 允许常见分隔符：- . _ /
+    re.compile(r"(?P<y>\d{4})[-_./](?P<m>\d{1,2})[-_./](?P<d>\d{1,2})"),
+    re.compile(r"(?P<y>\d{4})年(?P<m>\d{1,2})月(?P<d>\d{1,2})(?:日)?"),
+    re.compile(r"^(?P<y>\d{4})(?P<m>\d{2})(?P<d>\d{2})$"),
+]
+
+_MONTH_NAME_PATTERNS: List[Pattern] = [
+    # Dec 23 2025 / December 23, 2025
+    re.compile(
+        rf"\b(?P<mon>{_MONTH_TOKEN})\b[\s._/-]+(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b[\s,._/-]+(?P<y>\d{{4}})\b",
+        re.IGNORECASE,
+    ),
+    # 23 Dec 2025
+    re.compile(
+        rf"\b(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b[\s._/-]+\b(?P<mon>{_MONTH_TOKEN})\b[\s,._/-]+(?P<y>\d{{4}})\b",
+        re.IGNORECASE,
+    ),
+    # 2025 Dec 23
+    re.compile(
+        rf"\b(?P<y>\d{{4}})\b[\s._/-]+\b(?P<mon>{_MONTH_TOKEN})\b[\s._/-]+(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b",
+        re.IGNORECASE,
+    ),
+]
+
+
+@lru_cache(maxsize=4096)
 def parse_date_from_text(text: str) -> Optional[str]:
     """从文本中解析日期，并返回标准格式 YYYY-MM-DD。
 
@@ -25,38 +72,13 @@ def parse_date_from_text(text: str) -> Optional[str]:
     - 2025 Dec 23
 
     说明：不支持月/日/年（如 12-23-2025）以避免地区歧义。
+    同一批照片的目录名高度重复，结果按文本缓存。
     """
     if not text:
         return None
     s = text.strip()
 
-    month_map = {
-        "jan": 1,
-        "feb": 2,
-        "mar": 3,
-        "apr": 4,
-        "may": 5,
-        "jun": 6,
-        "jul": 7,
-        "aug": 8,
-        "sep": 9,
-        "oct": 10,
-        "nov": 11,
-        "dec": 12,
-    }
-    month_token = (
-        r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|jun(?:e)?|jul(?:y)?|aug(?:ust)?|"
-        r"sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
-    )
-
-    patterns: List[Pattern] = [
-        # 允许常见分隔符：- . _ /
-        re.compile(r"(?P<y>\d{4})[-_./](?P<m>\d{1,2})[-_./](?P<d>\d{1,2})"),
-        re.compile(r"(?P<y>\d{4})年(?P<m>\d{1,2})月(?P<d>\d{1,2})(?:日)?"),
-        re.compile(r"^(?P<y>\d{4})(?P<m>\d{2})(?P<d>\d{2})$"),
-    ]
-
-    for pat in patterns:
+    for pat in _NUMERIC_DATE_PATTERNS:
         m = pat.search(s)
         if not m:
             continue
@@ -69,25 +91,7 @@ def parse_date_from_text(text: str) -> Optional[str]:
         except Exception:
             continue
 
-    month_name_patterns: List[Pattern] = [
-        # Dec 23 2025 / December 23, 2025
-        re.compile(
-            rf"\b(?P<mon>{month_token})\b[\s._/-]+(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b[\s,._/-]+(?P<y>\d{{4}})\b",
-            re.IGNORECASE,
-        ),
-        # 23 Dec 2025
-        re.compile(
-            rf"\b(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b[\s._/-]+\b(?P<mon>{month_token})\b[\s,._/-]+(?P<y>\d{{4}})\b",
-            re.IGNORECASE,
-        ),
-        # 2025 Dec 23
-        re.compile(
-            rf"\b(?P<y>\d{{4}})\b[\s._/-]+\b(?P<mon>{month_token})\b[\s._/-]+(?P<d>\d{{1,2}})(?:st|nd|rd|th)?\b",
-            re.IGNORECASE,
-        ),
-    ]
-
-    for pat in month_name_patterns:
+    for pat in _MONTH_NAME_PATTERNS:
         m = pat.search(s)
         if not m:
             continue
@@ -96,7 +100,7 @@ def parse_date_from_text(text: str) -> Optional[str]:
             d = int(m.group("d"))
             mon_raw = (m.group("mon") or "").strip().lower()
             mon_key = mon_raw[:3]
-            mo = month_map.get(mon_key)
+            mo = _MONTH_MAP.get(mon_key)
             if not mo:
                 continue
             _date(y, mo, d)  # validate
@@ -2,7 +2,11 @@
 File system utilities.
 """
 import os
+import shutil
+import sys
+import threading
 from pathlib import Path
+from typing import Dict, Set, Tuple
 from ..config import SUPPORTED_IMAGE_EXTENSIONS
 
 
@@ -15,7 +19,11 @@ def is_ignored_fs_entry(path: Path) -> bool:
     - macOS zip metadata: __MACOSX/, .DS_Store, Icon\r, ._AppleDouble files
     - Windows Explorer metadata: Thumbs.db, desktop.ini
     """
-    name = path.name
+    return is_ignored_fs_name(path.name)
+
+
+def is_ignored_fs_name(name: str) -> bool:
+    """Same as is_ignored_fs_entry, but takes a bare name (e.g. os.DirEntry.name)."""
     if not name:
         return False
     if name.startswith('.'):
@@ -34,6 +42,16 @@ def is_ignored_fs_entry(path: Path) -> bool:
     return False
 
 
+def format_bytes(num) -> str:
+    """把字节数格式化为便于阅读的 B/KB/MB/GB 文本。"""
+    size = float(num or 0)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
 def ensure_directory_exists(directory: str | Path) -> None:
     """确保目录存在（mkdir -p 语义）。"""
     Path(directory).mkdir(parents=True, exist_ok=True)
@@ -67,6 +85,26 @@ def is_supported_nonempty_image_path(path) -> bool:
         return False
 
 
+def supported_nonempty_image_stat(entry: os.DirEntry):
+    """os.DirEntry 版的 is_supported_nonempty_image_path：合格时返回 stat 结果，否则返回 None。
+
+    说明：先用文件名过滤（无系统调用），再用 DirEntry 自带的类型信息判断是否为文件，
+    最后只 stat 一次；调用方可直接复用返回的 size/mtime，无需再次 stat。
+    """
+    name = entry.name
+    if is_ignored_fs_name(name):
+        return None
+    if os.path.splitext(name)[1].lower() not in SUPPORTED_IMAGE_EXTENSIONS:
+        return None
+    try:
+        if not entry.is_file():
+            return None
+        st = entry.stat()
+    except OSError:
+        return None
+    return st if st.st_size > 0 else None
+
+
 class UnsafePathError(ValueError):
     """路径安全检查失败（试图逃逸出基准目录）。"""
     pass
@@ -125,3 +163,115 @@ def ensure_resolved_under(base_dir: Path, target_path: Path) -> None:
         resolved.relative_to(base)
     except ValueError:
         raise UnsafePathError(f"Resolved path escapes base_dir: {resolved} is outside {base}")
+
+
+# linux/fs.h: FICLONE = _IOW(0x94, 9, int)，Btrfs/XFS/bcachefs 等支持写时复制的文件系统可用
+_FICLONE = 0x40049409
+
+
+def _try_reflink(src: str | Path, dst: str | Path) -> bool:
+    """尝试用 FICLONE 克隆文件（共享数据块、写时复制）；不支持时清理残留并返回 False。"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    try:
+        src_fd = os.open(src, os.O_RDONLY)
+    except OSError:
+        return False
+    try:
+        try:
+            dst_fd = os.open(dst, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except OSError:
+            return False
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, src_fd)
+            cloned = True
+        except OSError:
+            cloned = False
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+    if not cloned:
+        try:
+            os.unlink(dst)
+        except OSError:
+            pass
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def place_file(src: str | Path, dst: str | Path, mode: str = "copy") -> str:
+    """按 mode 把 src 放到 dst（dst 必须尚不存在），返回实际采用的方式。
+
+    返回值为 "copy" / "hardlink" / "reflink" / "symlink"。链接类方式失败
+    （跨设备 EXDEV、文件系统不支持、无权限创建符号链接等）时回退为复制，不会让整理失败。
+    """
+    if mode in ("reflink", "auto") and _try_reflink(src, dst):
+        return "reflink"
+    if mode in ("hardlink", "auto"):
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+    if mode == "symlink":
+        try:
+            os.symlink(os.path.abspath(src), dst)
+            return "symlink"
+        except OSError:
+            pass
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+class UniqueNameAllocator:
+    """按目录分配不会重名的文件名（name.jpg → name_001.jpg → name_002.jpg ...）。
+
+    每个目录第一次分配时用 scandir 列一次，之后已占用的名字保存在内存中：
+    同一目录里大量同名照片（多台手机都有 IMG_0001.jpg）不再逐个 exists() 试探，
+    每个 (目录, 文件名) 记住下一个可用序号，分配为均摊 O(1)。
+    名字按 casefold 比较，避免在 Windows/macOS 等大小写不敏感的文件系统上互相覆盖。
+
+    分配结果只在本对象的生命周期（一次整理）内有效；内部加锁，可供并发复制共用。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._taken: Dict[str, Set[str]] = {}
+        self._next_index: Dict[Tuple[str, str], int] = {}
+
+    @staticmethod
+    def _list_names(directory: Path) -> Set[str]:
+        try:
+            with os.scandir(directory) as it:
+                return {entry.name.casefold() for entry in it}
+        except OSError:
+            return set()
+
+    def allocate(self, directory: str | Path, filename: str) -> Path:
+        """在 directory 中为 filename 分配一个未被占用的路径，并把它登记为已占用。"""
+        directory = Path(directory)
+        dir_key = str(directory)
+        stem, ext = os.path.splitext(filename)
+        with self._lock:
+            taken = self._taken.get(dir_key)
+            if taken is None:
+                taken = self._taken[dir_key] = self._list_names(directory)
+            name = filename
+            if name.casefold() in taken:
+                counter_key = (dir_key, filename.casefold())
+                index = self._next_index.get(counter_key, 1)
+                name = f"{stem}_{index:03d}{ext}"
+                while name.casefold() in taken:
+                    index += 1
+                    name = f"{stem}_{index:03d}{ext}"
+                self._next_index[counter_key] = index + 1
+            taken.add(name.casefold())
+            return directory / name
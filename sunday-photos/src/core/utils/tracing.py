@@ -0,0 +1,207 @@
+"""轻量性能追踪：记录各阶段与单张照片的耗时片段（span），写出 Chrome trace JSON。
+
+用途：不挂 profiler 也能看出“这周为什么慢”——是磁盘（scan/copy）、解码（decode），
+还是模型推理（detect_embed）。
+
+- 主进程：start_tracing() 后，任意位置用 `with trace_span("scan"):` 记录片段；
+  未启用时 trace_span 只是空的上下文管理器，开销可以忽略。
+- 子进程（并行识别）：没有共享的 Tracer，用 SpanRecorder 在本地记录，
+  随识别结果一起带回主进程（结果中的 TRACE_KEY），再由 Tracer.add_remote 合并。
+- 输出：Tracer.write_chrome_trace() 写出 Trace Event Format（ph="X" 完整事件，时间单位微秒），
+  可直接用 chrome://tracing 或 https://ui.perfetto.dev 打开；
+  summary() 给出各片段的次数/合计/p50/p95/max（毫秒），写入运行报告。
+
+时间戳使用 time.time_ns()（跨进程可比），时长使用 perf_counter_ns()（单调、精度高）。
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+# 子进程随识别结果带回的片段（主进程合并后从结果中移除，不进入识别缓存）
+TRACE_KEY = "_trace"
+# 单次运行最多保留的事件数（超出后只计入统计，不再写入 trace 文件），防止超大批量时内存膨胀
+MAX_TRACE_EVENTS = 200_000
+
+_ACTIVE: Optional["Tracer"] = None
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """最近秩（nearest-rank）分位数：样本少时也返回真实出现过的值。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(-(-q * len(sorted_values) // 1)))  # ceil(q*n)
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Tracer:
+    """收集片段；线程安全（SORT 阶段的复制线程、线程池识别都会并发写入）。"""
+
+    def __init__(self, max_events: int = MAX_TRACE_EVENTS) -> None:
+        self.pid = os.getpid()
+        self.max_events = int(max_events)
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._durations: Dict[str, List[float]] = {}
+        self._remote_pids: set = set()
+        self.dropped = 0
+
+    def record(
+        self,
+        name: str,
+        start_us: int,
+        dur_us: int,
+        *,
+        cat: str = "stage",
+        pid: Optional[int] = None,
+        tid: Optional[int] = None,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": int(start_us),
+            "dur": max(0, int(dur_us)),
+            "pid": self.pid if pid is None else int(pid),
+            "tid": threading.get_ident() if tid is None else int(tid),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._durations.setdefault(name, []).append(event["dur"] / 1000.0)
+            if len(self._events) < self.max_events:
+                self._events.append(event)
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def span(self, name: str, cat: str = "stage", **args: Any) -> Iterator[None]:
+        start_us = time.time_ns() // 1000
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, start_us, (time.perf_counter_ns() - t0) // 1000, cat=cat, args=args or None)
+
+    def add_remote(self, trace: Any, **args: Any) -> None:
+        """合并子进程/线程用 SpanRecorder 记录并随结果带回的片段。"""
+        if not isinstance(trace, dict):
+            return
+        pid, tid = trace.get("pid"), trace.get("tid")
+        for item in trace.get("spans") or ():
+            try:
+                name, start_us, dur_us = item
+            except (TypeError, ValueError):
+                continue
+            self.record(str(name), start_us, dur_us, cat="photo", pid=pid, tid=tid, args=args or None)
+        if pid is not None and pid != self.pid:
+            self._remote_pids.add(int(pid))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """各片段名的耗时统计（毫秒）：count/total_ms/p50_ms/p95_ms/max_ms。"""
+        with self._lock:
+            durations = {name: sorted(values) for name, values in self._durations.items()}
+        return {
+            name: {
+                "count": len(values),
+                "total_ms": round(sum(values), 3),
+                "p50_ms": round(_percentile(values, 0.50), 3),
+                "p95_ms": round(_percentile(values, 0.95), 3),
+                "max_ms": round(values[-1], 3),
+            }
+            for name, values in durations.items()
+        }
+
+    def write_chrome_trace(self, path: str | Path) -> Path:
+        """写出 Chrome trace（JSON 对象格式，traceEvents + 进程名元数据）。"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+            remote = sorted(self._remote_pids)
+        meta = [{"name": "process_name", "ph": "M", "pid": self.pid, "tid": 0, "args": {"name": "main"}}]
+        meta += [{"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "worker"}} for pid in remote]
+        payload = {"traceEvents": meta + events, "displayTimeUnit": "ms"}
+        if self.dropped:
+            payload["otherData"] = {"dropped_events": self.dropped}
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        tmp.write_text(json.dumps(payload, ensure_ascii=False), encoding="utf-8")
+        tmp.replace(path)
+        return path
+
+
+class SpanRecorder:
+    """不依赖全局 Tracer 的本地记录器：子进程里记录片段，随结果以 as_payload() 带回主进程。"""
+
+    def __init__(self) -> None:
+        self.spans: List[tuple] = []
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        start_us = time.time_ns() // 1000
+        t0 = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.spans.append((name, start_us, (time.perf_counter_ns() - t0) // 1000))
+
+    def as_payload(self) -> Dict[str, Any]:
+        return {"pid": os.getpid(), "tid": threading.get_ident(), "spans": self.spans}
+
+
+def start_tracing(max_events: int = MAX_TRACE_EVENTS) -> Tracer:
+    global _ACTIVE
+    _ACTIVE = Tracer(max_events=max_events)
+    return _ACTIVE
+
+
+def stop_tracing() -> Optional[Tracer]:
+    global _ACTIVE
+    tracer, _ACTIVE = _ACTIVE, None
+    return tracer
+
+
+def get_tracer() -> Optional[Tracer]:
+    return _ACTIVE
+
+
+@contextmanager
+def trace_span(name: str, cat: str = "stage", **args: Any) -> Iterator[None]:
+    """记录一个片段；未启用追踪时什么也不做。"""
+    tracer = _ACTIVE
+    if tracer is None:
+        yield
+        return
+    with tracer.span(name, cat=cat, **args):
+        yield
+
+
+def format_summary_table(summary: Dict[str, Dict[str, float]]) -> List[str]:
+    """把 summary() 排成等宽文本表格（按合计耗时降序）。"""
+    if not summary:
+        return []
+    rows = sorted(summary.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+    width = max(12, max(len(name) for name, _ in rows))
+    lines = [f"{'stage':<{width}} {'count':>8} {'total(s)':>9} {'p50(ms)':>9} {'p95(ms)':>9} {'max(ms)':>9}"]
+    for name, s in rows:
+        lines.append(
+            f"{name:<{width}} {s['count']:>8} {s['total_ms'] / 1000:>9.2f} {s['p50_ms']:>9.1f} {s['p95_ms']:>9.1f} {s['max_ms']:>9.1f}"
+        )
+    return lines
+
+
+def prune_trace_files(directory: str | Path, keep: int, pattern: str = "trace_*.json") -> None:
+    """只保留最近 keep 个 trace 文件（按文件名中的时间戳排序）。"""
+    files = sorted(Path(directory).glob(pattern))
+    for old in files[: max(0, len(files) - keep)]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
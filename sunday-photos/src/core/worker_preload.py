@@ -0,0 +1,38 @@
+"""forkserver 预加载模块：导入即加载人脸识别后端（仅供并行识别的 forkserver 模板进程使用）。
+
+说明：
+- parallel_recognizer 通过 set_forkserver_preload 让 forkserver 模板进程导入本模块；
+  模板进程在这里一次性导入 insightface/onnxruntime 并创建 ONNX 会话，之后 fork 出的
+  worker 直接继承已加载的模型，不再各自冷启动。
+- 模板进程中的 ONNX 会话限制为单线程（SUNDAY_PHOTOS_ORT_INTRA_THREADS=1）：
+  fork 不会复制线程，带线程池的会话在子进程中可能卡死；多进程并行下单线程推理也更合理。
+- 任何失败都只记录日志，不抛出：worker 会在 init_worker 中按旧方式加载。
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import time
+
+from .parallel_recognizer import warm_worker_backend
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ERROR: Exception | None = None
+PRELOAD_SECONDS: float = 0.0
+
+
+def _preload() -> None:
+    global PRELOAD_ERROR, PRELOAD_SECONDS
+    os.environ.setdefault("SUNDAY_PHOTOS_ORT_INTRA_THREADS", "1")
+    started = time.monotonic()
+    try:
+        warm_worker_backend()
+    except Exception as e:  # pragma: no cover - 依赖/模型缺失时的兜底
+        PRELOAD_ERROR = e
+        logger.warning("forkserver 预加载人脸模型失败，worker 将各自加载: %s", e)
+    PRELOAD_SECONDS = time.monotonic() - started
+
+
+_preload()
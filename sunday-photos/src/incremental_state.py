@@ -5,11 +5,15 @@
 """
 
 from core.incremental_state import (  # noqa: F401
+    ClassPhotosScan,
+    DateFileChanges,
     IncrementalPlan,
     build_class_photos_snapshot,
     compute_incremental_plan,
     iter_date_directories,
     load_snapshot,
     save_snapshot,
+    scan_class_photos,
     snapshot_file_path,
+    snapshot_files,
 )
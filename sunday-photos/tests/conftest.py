@@ -39,6 +39,27 @@ def _install_face_recognition_stub() -> None:
 _install_face_recognition_stub()
 
 
+@pytest.fixture()
+def stub_face_backend(monkeypatch):
+    """把人脸后端换成 dlib 兼容层，底层是上面的 face_recognition stub。
+
+    测试直接 patch stub 上的函数（`face_recognition.face_locations` 等）来控制检测结果；
+    analyze() 由兼容层按两段式接口组合，匹配走真实的 KnownFaceMatcher（欧氏距离）。
+    覆盖 src.core / core / 顶层 shim 三种导入路径下的模块副本。返回 stub 模块。
+    """
+
+    stub = sys.modules["face_recognition"]
+    monkeypatch.setenv("SUNDAY_PHOTOS_FACE_BACKEND", "dlib")
+    for module_name in ("src.core.face_recognizer", "core.face_recognizer"):
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        backend = object.__new__(module._DlibFaceRecognitionCompat)
+        backend._fr = stub
+        monkeypatch.setattr(module, "_FACE_BACKEND_SINGLETON", backend)
+    return stub
+
+
 def create_minimal_test_image(path: Path) -> None:
     """创建一个最小的测试图片文件（非空，可通过 is_supported_nonempty_image_path 检查）。
     
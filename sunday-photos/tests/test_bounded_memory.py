@@ -0,0 +1,118 @@
+import json
+import shutil
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+
+import src.core.parallel_recognizer as parallel_module
+from src.core.embedding_spill import UnknownEmbeddingSpill
+from src.core.main import SimplePhotoOrganizer
+from src.core.recognition_cache import cache_db_path
+from tests.test_e2e_offline_pipeline import FakeServiceContainer
+
+
+def test_spill_behaves_like_mapping_and_cleans_up(tmp_path: Path) -> None:
+    (tmp_path / "unknown_embeddings_stale.f32").write_bytes(b"old")
+    spill = UnknownEmbeddingSpill(tmp_path)
+    assert not (tmp_path / "unknown_embeddings_stale.f32").exists()
+
+    spill.add("a.jpg", [[1.0, 2.0, 3.0], np.array([4.0, 5.0, 6.0])])
+    spill.add("b.jpg", [[7.0, 8.0], [9.0, 9.0, 9.0]])  # 维度不一致的特征跳过
+    spill.add("c.jpg", [])
+    assert sorted(spill) == ["a.jpg", "b.jpg"] and "c.jpg" not in spill
+    assert spill.face_count == 3
+
+    rows = spill["a.jpg"]
+    assert isinstance(rows[0], np.memmap) and rows[0].dtype == np.float32
+    assert [r.tolist() for r in rows] == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+    spill.add("d.jpg", [[0.0, 0.0, 1.0]])  # 读取后仍可追加
+    assert spill["d.jpg"][0].tolist() == [0.0, 0.0, 1.0]
+
+    spill.close()
+    assert not spill.path.exists()
+
+
+def test_thread_strategy_caps_in_flight_photos(monkeypatch) -> None:
+    # 其他用例（run.py --no-parallel）可能遗留该变量，会让 parallel_recognize 直接走串行
+    monkeypatch.delenv("SUNDAY_PHOTOS_NO_PARALLEL", raising=False)
+    monkeypatch.setenv("SUNDAY_PHOTOS_PARALLEL_STRATEGY", "threads")
+    monkeypatch.setattr(parallel_module, "init_worker", lambda *args, **kwargs: None)
+    lock = threading.Lock()
+    started = []
+
+    def _recognize(path):
+        with lock:
+            started.append(path)
+        return path, {"status": "no_faces_detected"}
+
+    monkeypatch.setattr(parallel_module, "recognize_one", _recognize)
+    photos = [f"p{i}.jpg" for i in range(40)]
+    yielded = []
+    for path, _result in parallel_module.parallel_recognize(
+        photos,
+        known_encodings=[],
+        known_names=[],
+        tolerance=0.6,
+        min_face_size=50,
+        workers=2,
+        chunk_size=1,
+        max_in_flight=4,
+    ):
+        yielded.append(path)
+        assert len(started) - len(yielded) < 4
+    assert sorted(yielded) == sorted(photos)
+
+
+def _unknown_faces(photo_path, return_details=True):
+    """全部照片都是 unknown：img_01 与 img_02 各是一位访客（两个日期各出现一次）。"""
+    vector = [1.0, 0.0, 0.0] if Path(photo_path).name == "img_01.jpg" else [0.0, 1.0, 0.0]
+    return {"status": "no_matches_found", "recognized_students": [], "unknown_encodings": [vector]}
+
+
+def _run(ds, monkeypatch) -> SimplePhotoOrganizer:
+    config_path = ds.input_dir.parent / "config.json"
+    config_path.write_text(
+        json.dumps({"parallel_recognition": {"enabled": False}, "unknown_face_clustering": {"enabled": True}}),
+        encoding="utf-8",
+    )
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    monkeypatch.setattr(container.get_face_recognizer(), "recognize_faces", _unknown_faces)
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(ds.input_dir),
+        output_dir=str(ds.output_dir),
+        log_dir=str(ds.log_dir),
+        service_container=container,
+        config_file=str(config_path),
+    )
+    assert organizer.run() is True
+    return organizer
+
+
+def _unknown_layout(output_dir: Path) -> list:
+    root = output_dir / "unknown_photos"
+    return sorted(p.relative_to(root).as_posix() for p in root.rglob("*.jpg"))
+
+
+def test_bounded_run_matches_default_run(offline_generated_dataset, monkeypatch) -> None:
+    ds = offline_generated_dataset
+    _run(ds, monkeypatch)
+    expected = _unknown_layout(ds.output_dir)
+    assert any(rel.startswith("Unknown_Person_") for rel in expected)
+
+    shutil.rmtree(ds.output_dir)
+    monkeypatch.setenv("SUNDAY_PHOTOS_BOUNDED_MEMORY", "1")
+    monkeypatch.setenv("SUNDAY_PHOTOS_MEMORY_WINDOW", "1")
+    spilled = []
+    real_add = UnknownEmbeddingSpill.add
+    monkeypatch.setattr(UnknownEmbeddingSpill, "add", lambda self, path, encodings: spilled.append(path) or real_add(self, path, encodings))
+    _run(ds, monkeypatch)
+
+    assert len(spilled) == 4
+
+    assert _unknown_layout(ds.output_dir) == expected
+    assert not list((ds.output_dir / ".state").glob("unknown_embeddings_*"))
+    # 按日期剪枝后，本次识别的每张照片仍留在缓存中
+    with sqlite3.connect(cache_db_path(ds.output_dir)) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] == 4
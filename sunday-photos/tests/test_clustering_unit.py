@@ -1,6 +1,7 @@
 import numpy as np
 import pytest
-from src.core.clustering import UnknownClustering
+from src.core.clustering import KnnGraphClustering, UnknownClustering
+from src.core.config_loader import ConfigLoader
 
 class TestUnknownClustering:
     def test_initialization(self):
@@ -58,6 +59,35 @@ class TestUnknownClustering:
         # Size is 3 -> should return
         assert len(clusterer.get_results()) == 1
 
+    def test_numbering_matches_original_get_results(self):
+        """过滤不足 min_cluster_size 的簇不改变编号：它们按大小降序总排在最后。"""
+        def original(clusterer):
+            # 最初版本：对全部簇（含单张）按大小降序编号，再跳过不足大小的簇
+            sorted_clusters = sorted(clusterer.clusters.items(), key=lambda x: len(x[1]), reverse=True)
+            return {
+                f"Unknown_Person_{new_id}": [item[0] for item in items]
+                for new_id, (_old_id, items) in enumerate(sorted_clusters, 1)
+                if len(items) >= clusterer.min_cluster_size
+            }
+
+        rng = np.random.default_rng(5)
+        centers = np.eye(8) * 4 + rng.normal(scale=0.1, size=(8, 8))
+        sizes = [1, 3, 1, 2, 4, 1, 2, 3]  # 单张的簇穿插在大簇之前建立
+        for min_cluster_size in (1, 2, 3):
+            clusterer = UnknownClustering(tolerance=0.2, min_cluster_size=min_cluster_size)
+            for person, size in enumerate(sizes):
+                for i in range(size):
+                    clusterer.add_faces(f"p{person}_{i}.jpg", [centers[person] + rng.normal(scale=0.01, size=8)])
+            assert len(clusterer.clusters) == len(sizes)
+            assert clusterer.get_results() == original(clusterer)
+
+        # min_cluster_size=3：按大小 4/3/3 编号 1..3，更早建立的单张/两张簇不占用前面的编号
+        assert {name: paths[0].split("_")[0] for name, paths in clusterer.get_results().items()} == {
+            "Unknown_Person_1": "p4",
+            "Unknown_Person_2": "p1",
+            "Unknown_Person_3": "p7",
+        }
+
     def test_invalid_encoding_handling(self):
         clusterer = UnknownClustering()
         # Should not crash
@@ -73,3 +103,86 @@ class TestUnknownClustering:
         c = np.array([1, 0])
         dist_same = UnknownClustering._cosine_distance(a, c)
         assert abs(dist_same - 0.0) < 1e-6 # Same -> dist 0
+
+    def test_matches_pairwise_average_linkage(self):
+        """增量簇和与逐点平均距离的旧实现给出相同的分组。"""
+        def reference(encodings, tolerance):
+            clusters = []
+            for enc in encodings:
+                best, min_dist = -1, 1.0
+                for i, members in enumerate(clusters):
+                    avg = np.mean([UnknownClustering._cosine_distance(m, enc) for m in members])
+                    if avg < min_dist:
+                        best, min_dist = i, avg
+                if best != -1 and min_dist < tolerance:
+                    clusters[best].append(enc)
+                else:
+                    clusters.append([enc])
+            return [len(c) for c in clusters]
+
+        rng = np.random.default_rng(7)
+        centers = rng.normal(size=(12, 128))
+        encodings = [centers[i % 12] + rng.normal(scale=0.35, size=128) for i in range(300)]
+
+        clusterer = UnknownClustering(tolerance=0.45, min_cluster_size=1)
+        for i, enc in enumerate(encodings):
+            clusterer.add_faces(f"{i}.jpg", [enc])
+
+        assert [len(items) for items in clusterer.clusters.values()] == reference(encodings, 0.45)
+        assert len(clusterer.clusters) > 1
+
+    def test_mismatched_dimension_is_skipped(self):
+        clusterer = UnknownClustering()
+        clusterer.add_faces("a.jpg", [np.ones(4)])
+        clusterer.add_faces("b.jpg", [np.ones(3)])
+        assert sum(len(items) for items in clusterer.clusters.values()) == 1
+
+
+class TestKnnGraphClustering:
+    @staticmethod
+    def _faces(seed=3, people=6, per_person=8):
+        rng = np.random.default_rng(seed)
+        centers = rng.normal(size=(people, 64))
+        return [
+            (f"p{person}_{i}.jpg", centers[person] + rng.normal(scale=0.2, size=64))
+            for person in range(people)
+            for i in range(per_person)
+        ]
+
+    @pytest.mark.parametrize("linkage", ["components", "hac"])
+    def test_results_do_not_depend_on_insertion_order(self, linkage):
+        faces = self._faces()
+        results = []
+        for order in (faces, faces[::-1], faces[1::2] + faces[::2]):
+            clusterer = KnnGraphClustering(tolerance=0.45, linkage=linkage, k=5, block_size=7)
+            for path, enc in order:
+                clusterer.add_faces(path, [enc])
+            results.append(clusterer.get_results())
+
+        assert results[0] == results[1] == results[2]
+        assert len(results[0]) == 6
+        for paths in results[0].values():
+            assert len({p.split("_")[0] for p in paths}) == 1
+
+    def test_hac_does_not_chain_through_intermediate_faces(self):
+        # A 与 B 之间有一串逐步过渡的人脸：连通分量会把它们串成一组，平均链接不会
+        a, b = np.array([1.0, 0.0]), np.array([0.0, 1.0])
+        steps = [a * np.cos(t) + b * np.sin(t) for t in np.linspace(0, np.pi / 2, 12)]
+
+        def run(linkage):
+            clusterer = KnnGraphClustering(tolerance=0.05, min_cluster_size=1, linkage=linkage, k=4)
+            for i, enc in enumerate(steps):
+                clusterer.add_faces(f"{i:02d}.jpg", [enc])
+            return clusterer.get_results()
+
+        assert len(run("components")) == 1
+        assert len(run("hac")) > 1
+
+    def test_config_selects_algorithm(self, tmp_path):
+        cfg = tmp_path / "config.json"
+        cfg.write_text('{"unknown_face_clustering": {"algorithm": "HAC", "knn_k": 0}}', encoding="utf-8")
+        uc = ConfigLoader(str(cfg), base_dir=tmp_path).get_unknown_face_clustering()
+        assert uc["algorithm"] == "hac" and uc["knn_k"] == 1
+
+        cfg.write_text('{"unknown_face_clustering": {"algorithm": "dbscan"}}', encoding="utf-8")
+        assert ConfigLoader(str(cfg), base_dir=tmp_path).get_unknown_face_clustering()["algorithm"] == "greedy"
@@ -193,3 +193,20 @@ def test_config_loader_path_resolution(tmp_path):
     # 相对路径应该基于base_dir解析
     input_dir = cl.get_input_dir()
     assert str(tmp_path / "input") in input_dir or input_dir == "input"
+
+
+def test_config_loader_resize_long_edge(tmp_path, monkeypatch):
+    """测试 resize_long_edge：默认 0，配置生效，环境变量优先，非法值回退"""
+    monkeypatch.delenv("SUNDAY_PHOTOS_RESIZE_LONG_EDGE", raising=False)
+    assert ConfigLoader(config_file=tmp_path / "nonexistent.json", base_dir=tmp_path).get_resize_long_edge() == 0
+
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"resize_long_edge": 1920}))
+    cl = ConfigLoader(config_file=config_file, base_dir=tmp_path)
+    assert cl.get_resize_long_edge() == 1920
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_RESIZE_LONG_EDGE", "2560")
+    assert cl.get_resize_long_edge() == 2560
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_RESIZE_LONG_EDGE", "abc")
+    assert cl.get_resize_long_edge() == 0
@@ -0,0 +1,222 @@
+import socket
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import daemon as daemon_module
+from src.core.daemon import DaemonClient, RecognitionDaemon, read_endpoint
+
+pytestmark = pytest.mark.skipif(not hasattr(socket, "AF_UNIX"), reason="需要 AF_UNIX")
+
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    d = RecognitionDaemon(tmp_path / "daemon")
+    d.start()
+    t = threading.Thread(target=d.serve_forever, daemon=True)
+    t.start()
+    yield d
+    d.stop()
+    t.join(timeout=5)
+
+
+def test_client_ping_run_and_shutdown(running_daemon, monkeypatch, tmp_path):
+    seen = {}
+
+    def _fake_run_job(request, emit):
+        seen.update(request)
+        emit({"event": "log", "level": "INFO", "text": "working"})
+        return True, {"processed_photos": 2, "students_detected": {"Bob", "Alice"}}
+
+    monkeypatch.setattr(running_daemon, "_run_job", _fake_run_job)
+
+    client = DaemonClient.connect(running_daemon.daemon_dir)
+    assert client is not None
+
+    events = []
+    outcome = client.run_job("in", "out", tolerance=0.5, on_event=events.append)
+
+    assert outcome["event"] == "result" and outcome["ok"] is True
+    assert outcome["stats"]["students_detected"] == ["Alice", "Bob"]
+    assert events[0] == {"event": "log", "level": "INFO", "text": "working"}
+    assert seen["input_dir"].endswith("in") and seen["no_parallel"] is False
+    assert seen["tolerance"] == 0.5
+
+    assert client.shutdown() is True
+
+
+def test_ping_answered_while_job_runs_and_jobs_are_serialized(running_daemon, monkeypatch):
+    release = threading.Event()
+    started = threading.Event()
+    running = []
+    overlaps = []
+
+    def _slow_run_job(request, emit):
+        overlaps.append(len(running))
+        running.append(request["input_dir"])
+        started.set()
+        release.wait(timeout=10)
+        running.pop()
+        return True, {}
+
+    monkeypatch.setattr(running_daemon, "_run_job", _slow_run_job)
+    first = threading.Thread(target=lambda: DaemonClient.connect(running_daemon.daemon_dir).run_job("a", "out"))
+    first.start()
+    assert started.wait(timeout=5)
+
+    # 任务运行期间仍能 ping 通：run.py 不会误判为没有守护进程而在进程内并发运行
+    client = DaemonClient.connect(running_daemon.daemon_dir)
+    assert client is not None
+
+    events = []
+    second = {}
+    t = threading.Thread(target=lambda: second.update(client.run_job("b", "out", on_event=events.append)))
+    t.start()
+    deadline = time.monotonic() + 5
+    while not events and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert events and "排队" in events[0]["text"]
+
+    release.set()
+    first.join(timeout=5)
+    t.join(timeout=5)
+    assert second["event"] == "result" and second["ok"] is True
+    assert overlaps == [0, 0]
+    assert running_daemon.jobs_served == 2
+
+
+def test_run_via_daemon_sends_absolute_log_and_classroom_dirs(monkeypatch, tmp_path):
+    from src.cli import run as cli_run
+    from src.core import daemon as core_daemon
+
+    seen = {}
+
+    class _FakeClient:
+        endpoint = SimpleNamespace(pid=1)
+
+        def run_job(self, input_dir, output_dir, **kwargs):
+            seen.update(kwargs)
+            return {"event": "result", "ok": True, "elapsed": 0}
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(core_daemon.DaemonClient, "connect", classmethod(lambda cls, *a, **k: _FakeClient()))
+    args = SimpleNamespace(input_dir="input", output_dir="output", tolerance=0.6, no_parallel=False, classroom_dir="classes")
+
+    assert cli_run._run_via_daemon(args) is True
+    assert seen["log_dir"] == "logs" and seen["classroom_dir"] == "classes"
+
+    # DaemonClient.run_job 把它们解析为客户端工作目录下的绝对路径
+    payloads = []
+    client = DaemonClient(daemon_module.DaemonEndpoint("unix", "unused", "t", 1))
+    monkeypatch.setattr(client, "_request", lambda payload, **kwargs: payloads.append(payload) or [{"event": "result"}])
+    client.run_job("input", "output", log_dir="logs", classroom_dir="classes")
+    assert payloads[0]["log_dir"] == str(tmp_path / "logs")
+    assert payloads[0]["classroom_dir"] == str(tmp_path / "classes")
+
+
+def test_run_via_daemon_returns_outcome_instead_of_exiting(monkeypatch):
+    from src.cli import run as cli_run
+    from src.core import daemon as core_daemon
+
+    class _FailingClient:
+        endpoint = SimpleNamespace(pid=1)
+
+        def run_job(self, input_dir, output_dir, **kwargs):
+            return {"event": "result", "ok": False, "message": "boom"}
+
+    args = SimpleNamespace(input_dir="input", output_dir="output", tolerance=None, no_parallel=False)
+
+    monkeypatch.setattr(core_daemon.DaemonClient, "connect", classmethod(lambda cls, *a, **k: _FailingClient()))
+    assert cli_run._run_via_daemon(args) is False
+
+    # 没有常驻进程：返回 None，由调用方在本进程内运行
+    monkeypatch.setattr(core_daemon.DaemonClient, "connect", classmethod(lambda cls, *a, **k: None))
+    assert cli_run._run_via_daemon(args) is None
+
+
+def test_endpoint_removed_after_stop_and_stale_endpoint_ignored(tmp_path):
+    d = RecognitionDaemon(tmp_path / "daemon")
+    d.start()
+    t = threading.Thread(target=d.serve_forever, daemon=True)
+    t.start()
+    assert read_endpoint(d.daemon_dir) is not None
+    d.stop()
+    t.join(timeout=5)
+
+    assert read_endpoint(d.daemon_dir) is None
+    assert DaemonClient.connect(d.daemon_dir) is None
+
+
+def test_wrong_token_is_rejected(running_daemon):
+    endpoint = read_endpoint(running_daemon.daemon_dir)
+    bad = DaemonClient(daemon_module.DaemonEndpoint("unix", endpoint.address, "bad", endpoint.pid))
+    events = bad._request({"op": "ping"}, timeout=2)
+    assert events[-1]["event"] == "error"
+
+
+def test_second_daemon_refuses_to_start(running_daemon):
+    with pytest.raises(RuntimeError):
+        RecognitionDaemon(running_daemon.daemon_dir).start()
+
+
+def test_run_job_reuses_warm_recognizer(tmp_path, monkeypatch):
+    import src.core.main as core_main
+
+    created = []
+
+    class FakeRecognizer:
+        def __init__(self):
+            self.reloads = 0
+            self.tolerance = 0.6
+
+        def load_student_encodings(self):
+            self.reloads += 1
+
+    class FakeStudentManager:
+        def __init__(self):
+            self.reloads = 0
+
+        def load_students(self):
+            self.reloads += 1
+
+    class FakeOrganizer:
+        def __init__(self, **kwargs):
+            self.student_manager = None
+            self.face_recognizer = None
+            self.stats = {"processed_photos": 1}
+            created.append(self)
+
+        def initialize(self):
+            if self.face_recognizer is None:
+                self.student_manager = FakeStudentManager()
+                self.face_recognizer = FakeRecognizer()
+            return True
+
+        def _get_config_loader(self):
+            return SimpleNamespace(
+                get_tolerance=lambda: 0.6, get_min_face_size=lambda: 40, get_resize_long_edge=lambda: 1600
+            )
+
+        def run(self):
+            return True
+
+    monkeypatch.setattr(core_main, "SimplePhotoOrganizer", FakeOrganizer)
+    d = RecognitionDaemon(tmp_path / "daemon")
+    request = {"input_dir": str(tmp_path / "in"), "output_dir": str(tmp_path / "out"), "tolerance": 0.55}
+
+    assert d._run_job(request, lambda e: None) == (True, {"processed_photos": 1})
+    assert d._run_job(request, lambda e: None) == (True, {"processed_photos": 1})
+
+    first, second = created
+    assert second.face_recognizer is first.face_recognizer
+    assert first.face_recognizer.reloads == 1
+    assert first.student_manager.reloads == 1
+    assert first.face_recognizer.tolerance == 0.55
+    assert first.face_recognizer.resize_long_edge == 1600
+
+    # 下一个任务不指定阈值：复用的识别器应回到配置中的阈值，而不是沿用上一任务的覆盖值
+    assert d._run_job(dict(request, tolerance=None), lambda e: None) == (True, {"processed_photos": 1})
+    assert created[2].face_recognizer is first.face_recognizer
+    assert first.face_recognizer.tolerance == 0.6
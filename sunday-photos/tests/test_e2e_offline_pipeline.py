@@ -4,7 +4,8 @@ from pathlib import Path
 from src.core.config import REPORT_FILE, UNKNOWN_PHOTOS_DIR
 from src.core.file_organizer import FileOrganizer
 from src.core.main import SimplePhotoOrganizer
-from src.core.recognition_cache import date_cache_path
+from src.core.output_manifest import manifest_path
+from src.core.recognition_cache import CacheKey, RecognitionCacheStore
 from src.core.student_manager import StudentManager
 from tests.testdata_builder import write_jpeg
 
@@ -155,15 +156,12 @@ def test_e2e_deleted_date_sync_cleans_output_and_cache(offline_generated_dataset
     # 首次运行，生成输出
     assert organizer.run() is True
 
-    # 手工创建一个日期缓存文件，模拟已存在缓存
+    # 手工写入一条日期缓存，模拟已存在缓存
     deleted_date = "2025-12-21"
-    cache_file = date_cache_path(ds.output_dir, deleted_date)
-    cache_file.parent.mkdir(parents=True, exist_ok=True)
-    cache_file.write_text(
-        json.dumps({"version": 1, "date": deleted_date, "params_fingerprint": "x", "entries": {}}, ensure_ascii=False),
-        encoding="utf-8",
-    )
-    assert cache_file.exists()
+    cache_key = CacheKey(date=deleted_date, rel_path=f"{deleted_date}/marker.jpg", size=1, mtime=2)
+    with RecognitionCacheStore(ds.output_dir) as store:
+        store.prepare_date(deleted_date, "x", "x")
+        store.store_result(cache_key, {"status": "success", "recognized_students": ["Alice"]})
 
     # 预期待删除日期在输出中确实存在
     assert (ds.output_dir / "Alice" / deleted_date).exists()
@@ -187,7 +185,9 @@ def test_e2e_deleted_date_sync_cleans_output_and_cache(offline_generated_dataset
     assert not (ds.output_dir / UNKNOWN_PHOTOS_DIR / deleted_date).exists()
 
     # 缓存删除
-    assert not cache_file.exists()
+    with RecognitionCacheStore(ds.output_dir) as store:
+        store.prepare_date(deleted_date, "x", "x")
+        assert store.lookup_result(cache_key) is None
 
 
 def test_e2e_changed_date_rebuild_cleans_old_outputs_and_ignores_old_cache(offline_generated_dataset):
@@ -219,23 +219,14 @@ def test_e2e_changed_date_rebuild_cleans_old_outputs_and_ignores_old_cache(offli
     write_jpeg(img, text="changed", seed=999)
 
     # 写入一个“会导致错误分类”的旧缓存：如果被命中，Bob/img_01 会被当成 unknown
-    cache_path = date_cache_path(ds.output_dir, changed_date)
     st = img.stat()
-    bad_cache = {
-        "version": 1,
-        "date": changed_date,
-        "params_fingerprint": "will-be-mismatched",
-        "entries": {
-            f"{changed_date}/img_01.jpg": {
-                "size": int(st.st_size),
-                "mtime": int(st.st_mtime),
-                "result": {"status": "no_matches_found", "recognized_students": [], "unknown_encodings": []},
-            }
-        },
-    }
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    cache_path.write_text(json.dumps(bad_cache, ensure_ascii=False, indent=2), encoding="utf-8")
-    assert cache_path.exists()
+    bad_key = CacheKey(date=changed_date, rel_path=f"{changed_date}/img_01.jpg", size=int(st.st_size), mtime=int(st.st_mtime))
+    with RecognitionCacheStore(ds.output_dir) as store:
+        store.prepare_date(changed_date, "will-be-mismatched", "will-be-mismatched")
+        store.store_result(bad_key, {"status": "no_matches_found", "recognized_students": [], "unknown_encodings": []})
+
+    # 模拟旧版本生成的输出（无输出清单）：变化日期整日期重建
+    manifest_path(ds.output_dir).unlink()
 
     # 第二次运行：fingerprint 不同，应忽略上面的缓存并重建输出
     organizer2 = SimplePhotoOrganizer(
@@ -252,3 +243,57 @@ def test_e2e_changed_date_rebuild_cleans_old_outputs_and_ignores_old_cache(offli
 
     # 缓存未被误用：Bob 的照片仍应落在 Bob/2025-12-22，而不是 unknown
     assert (ds.output_dir / "Bob" / changed_date / "img_01.jpg").exists()
+
+
+def test_e2e_file_level_increment_only_touches_changed_photos(offline_generated_dataset):
+    ds = offline_generated_dataset
+
+    config_path = ds.input_dir.parent / "config.json"
+    _write_min_config(config_path)
+
+    def _run():
+        container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+        seen = []
+        original = container._face_recognizer.recognize_faces
+
+        def _recognize(photo_path, return_details=True):
+            seen.append(Path(photo_path).relative_to(ds.class_dir).as_posix())
+            return original(photo_path, return_details=return_details)
+
+        container._face_recognizer.recognize_faces = _recognize
+        organizer = SimplePhotoOrganizer(
+            input_dir=str(ds.input_dir),
+            output_dir=str(ds.output_dir),
+            log_dir=str(ds.log_dir),
+            service_container=container,
+            config_file=str(config_path),
+        )
+        assert organizer.run() is True
+        return sorted(seen)
+
+    _run()
+    kept = ds.output_dir / "Alice" / "2025-12-21" / "img_01.jpg"
+    kept_stat = kept.stat()
+
+    # 2025-12-21：新增一张、删除一张；2025-12-22：修改一张
+    write_jpeg(ds.class_dir / "2025-12-21" / "img_03.jpg", text="late", seed=300)
+    (ds.class_dir / "2025-12-21" / "img_02.jpg").unlink()
+    write_jpeg(ds.class_dir / "2025-12-22" / "img_01.jpg", text="changed", seed=999)
+
+    assert _run() == ["2025-12-21/img_03.jpg", "2025-12-22/img_01.jpg"]
+
+    # 未变化照片的输出原样保留（未被删除重建）
+    assert kept.stat().st_ino == kept_stat.st_ino
+    assert kept.stat().st_mtime_ns == kept_stat.st_mtime_ns
+    # 删除的照片：输出副本被移除；修改的照片：替换而不是追加 _001 副本
+    assert not (ds.output_dir / UNKNOWN_PHOTOS_DIR / "2025-12-21" / "img_02.jpg").exists()
+    assert (ds.output_dir / UNKNOWN_PHOTOS_DIR / "2025-12-21" / "img_03.jpg").exists()
+    assert (ds.output_dir / "Bob" / "2025-12-22" / "img_01.jpg").exists()
+    assert not (ds.output_dir / "Bob" / "2025-12-22" / "img_01_001.jpg").exists()
+    assert (ds.output_dir / UNKNOWN_PHOTOS_DIR / "2025-12-22" / "img_02.jpg").exists()
+
+    # 只删除照片也能同步
+    (ds.class_dir / "2025-12-21" / "img_03.jpg").unlink()
+    assert _run() == []
+    assert not (ds.output_dir / UNKNOWN_PHOTOS_DIR / "2025-12-21" / "img_03.jpg").exists()
+    assert kept.exists()
@@ -121,6 +121,57 @@ def test_e2e_parallel_recognition_fallback_to_serial(offline_generated_dataset,
     assert len(reports) == 1
 
 
+def test_e2e_parallel_failure_midway_only_falls_back_for_remaining_photos(offline_generated_dataset, monkeypatch):
+    from src.core.file_organizer import SortSession
+
+    ds = offline_generated_dataset
+
+    cfg_path = ds.input_dir.parent / "config.json"
+    _write_config(
+        cfg_path,
+        {
+            "parallel_recognition": {"enabled": True, "workers": 2, "chunk_size": 1, "min_photos": 1},
+            "unknown_face_clustering": {"enabled": False},
+        },
+    )
+
+    # 并行识别先交回 1 张照片的结果，随后失败
+    def _fail_after_first(photo_paths, **_kwargs):
+        yield photo_paths[0], {"status": "no_matches_found", "recognized_students": [], "unknown_encodings": []}
+        raise RuntimeError("worker crashed")
+
+    monkeypatch.setattr(core_main, "parallel_recognize", _fail_after_first)
+    # workers 按 CPU 核数封顶：固定核数，单核机器上也走并行分支
+    monkeypatch.setattr("os.cpu_count", lambda: 4)
+
+    added = []
+    original_add = SortSession.add
+
+    def _spy_add(self, photo_path, *args, **kwargs):
+        added.append(str(photo_path))
+        return original_add(self, photo_path, *args, **kwargs)
+
+    monkeypatch.setattr(SortSession, "add", _spy_add)
+
+    sc = SC(ds.input_dir, ds.output_dir, FakeFRForSerialFallback)
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(ds.input_dir),
+        output_dir=str(ds.output_dir),
+        log_dir=str(ds.log_dir),
+        service_container=sc,
+        config_file=str(cfg_path),
+    )
+
+    assert organizer.run() is True
+
+    calls = sc.get_face_recognizer().calls
+    photo_count = organizer.stats["processed_photos"]
+    # 串行回退只识别并行阶段没交回结果的照片；每张照片只进入整理会话一次
+    assert len(calls) == photo_count - 1
+    assert sorted(added) == sorted(set(added)) and len(added) == photo_count
+    assert organizer.last_run_report["organize_stats"]["failed"] == 0
+
+
 def test_e2e_unknown_clustering_enabled_places_cluster_folders(offline_generated_dataset, monkeypatch):
     ds = offline_generated_dataset
 
@@ -148,7 +199,6 @@ def test_e2e_unknown_clustering_enabled_places_cluster_folders(offline_generated
             # 将所有 unknown 聚到一个簇
             return {"Unknown_Person_1": list(self._paths)}
 
-    monkeypatch.setattr(core_main, "UnknownClustering", FakeClustering)
     import src.core.pipeline
     monkeypatch.setattr(src.core.pipeline, "UnknownClustering", FakeClustering)
 
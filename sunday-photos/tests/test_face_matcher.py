@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+
+from src.core.face_matcher import MAX_DISTANCE, KnownFaceMatcher
+
+
+def _cosine(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    return float(1.0 - np.dot(a, b) / ((np.linalg.norm(a) + 1e-12) * (np.linalg.norm(b) + 1e-12)))
+
+
+def test_cosine_distances_match_per_pair_loop():
+    rng = np.random.default_rng(7)
+    known = [rng.normal(size=512) for _ in range(6)]
+    names = ["A", "A", "B", "B", "C", "C"]
+    faces = [rng.normal(size=512) for _ in range(4)]
+
+    matcher = KnownFaceMatcher(known, names)
+    d = matcher.distances(faces)
+
+    assert d.shape == (4, 6)
+    for i, f in enumerate(faces):
+        for j, k in enumerate(known):
+            assert d[i, j] == pytest.approx(_cosine(k, f), abs=1e-5)
+
+
+def test_match_uses_global_min_and_tolerance():
+    known = [np.array([1.0, 0.0]), np.array([0.0, 1.0]), np.array([0.7, 0.7])]
+    names = ["Alice", "Bob", "Bob"]
+    matcher = KnownFaceMatcher(known, names)
+
+    matches = matcher.match([np.array([0.0, 2.0]), np.array([-1.0, 0.0])], tolerance=0.3)
+
+    assert matches[0].name == "Bob"
+    assert matches[0].distance == pytest.approx(0.0, abs=1e-6)
+    assert matches[1].name is None
+
+
+def test_student_distances_reduce_to_per_student_min():
+    known = [np.array([1.0, 0.0]), np.array([0.0, 1.0]), np.array([1.0, 1.0])]
+    names = ["Bob", "Alice", "Bob"]
+    matcher = KnownFaceMatcher(known, names)
+
+    sd = matcher.student_distances([np.array([1.0, 0.1])])
+
+    assert matcher.student_names == ["Alice", "Bob"]
+    full = matcher.distances([np.array([1.0, 0.1])])[0]
+    assert sd[0, 0] == pytest.approx(full[1])
+    assert sd[0, 1] == pytest.approx(min(full[0], full[2]))
+
+
+def test_dimension_mismatch_never_matches():
+    known = [np.ones(128), np.ones(512)]
+    matcher = KnownFaceMatcher(known, ["Old", "New"])
+
+    d = matcher.distances([np.ones(512)])
+    assert d[0, 0] == pytest.approx(MAX_DISTANCE)
+    assert d[0, 1] == pytest.approx(0.0, abs=1e-6)
+    assert matcher.match([np.ones(512)], tolerance=0.6)[0].name == "New"
+    assert matcher.match([np.ones(64)], tolerance=0.6)[0].name is None
+
+
+def test_euclidean_metric_matches_face_recognition_semantics():
+    rng = np.random.default_rng(3)
+    known = [rng.random(128) for _ in range(3)]
+    face = rng.random(128)
+    matcher = KnownFaceMatcher(known, ["A", "B", "C"], metric="euclidean")
+
+    d = matcher.distances([face])[0]
+    expected = np.linalg.norm(np.asarray(known) - face, axis=1)
+    np.testing.assert_allclose(d, expected, rtol=1e-4)
+
+
+def test_empty_matcher_reports_unmatched():
+    matcher = KnownFaceMatcher([], [])
+    assert matcher.distances([np.ones(4)]).shape == (1, 0)
+    assert matcher.match([np.ones(4)], tolerance=0.6)[0].name is None
+    assert matcher.student_distances([np.ones(4)]).shape == (1, 0)
+
+
+def test_from_packed_matches_original_without_copy():
+    rng = np.random.default_rng(11)
+    known = [rng.normal(size=512) for _ in range(5)]
+    names = ["A", "B", "A", "C", "B"]
+    faces = [rng.normal(size=512) for _ in range(3)]
+
+    original = KnownFaceMatcher(known, names)
+    packed = original.packed_matrix()
+    rebuilt = KnownFaceMatcher.from_packed(packed, names)
+
+    assert rebuilt.known_encodings is packed
+    np.testing.assert_allclose(rebuilt.distances(faces), original.distances(faces), rtol=1e-6)
+    assert rebuilt.match(faces, 0.9) == original.match(faces, 0.9)
+
+
+def test_packed_matrix_none_for_mixed_dimensions():
+    matcher = KnownFaceMatcher([np.ones(128), np.ones(512)], ["Old", "New"])
+    assert matcher.packed_matrix() is None
@@ -15,17 +15,18 @@ def _make_fr(monkeypatch, tmp_path):
     return FaceRecognizer(sm)
 
 
-def test_get_recognition_confidence_with_single_encoding(monkeypatch, tmp_path):
+def test_get_recognition_confidence_with_single_encoding(monkeypatch, tmp_path, stub_face_backend):
     fr = _make_fr(monkeypatch, tmp_path)
 
     # Prepare students_encodings with the expected key used in load_student_encodings ("encodings")
     fr.students_encodings = {"Alice": {"name": "Alice", "encodings": [np.zeros(128)]}}
 
-    # Patch face_recognition functions inside the module under test
-    monkeypatch.setattr(fr_module.face_recognition, "load_image_file", lambda p: np.zeros((128, 128, 3)))
-    monkeypatch.setattr(fr_module.face_recognition, "face_locations", lambda img: [(0, 80, 120, 0)])
-    monkeypatch.setattr(fr_module.face_recognition, "face_encodings", lambda img, locs: [np.zeros(128)])
-    monkeypatch.setattr(fr_module.face_recognition, "face_distance", lambda known, enc: np.array([0.1]))
+    # 检测到的人脸与参考编码的欧氏距离为 0.1
+    face = np.zeros(128)
+    face[0] = 0.1
+    monkeypatch.setattr(stub_face_backend, "load_image_file", lambda p: np.zeros((128, 128, 3)))
+    monkeypatch.setattr(stub_face_backend, "face_locations", lambda img: [(0, 80, 120, 0)])
+    monkeypatch.setattr(stub_face_backend, "face_encodings", lambda img, locs: [face])
 
     conf = fr.get_recognition_confidence(str(tmp_path / "fake.jpg"), "Alice")
     # Expect confidence = 1 - min_distance = 0.9
@@ -42,16 +43,16 @@ def test_verify_student_photo_returns_expected(monkeypatch, tmp_path):
     assert fr.verify_student_photo("Alice", "x.jpg") is False
 
 
-def test_update_student_encoding_updates_state(monkeypatch, tmp_path):
+def test_update_student_encoding_updates_state(monkeypatch, tmp_path, stub_face_backend):
     fr = _make_fr(monkeypatch, tmp_path)
 
     # Prepare a student entry
     fr.students_encodings = {"Student15": {"name": "Student15", "encodings": [np.zeros(128)]}}
 
     # Patch face_recognition to return a new encoding for the update
-    monkeypatch.setattr(fr_module.face_recognition, "load_image_file", lambda p: np.zeros((128, 128, 3)))
-    monkeypatch.setattr(fr_module.face_recognition, "face_locations", lambda img: [(0, 80, 120, 0)])
-    monkeypatch.setattr(fr_module.face_recognition, "face_encodings", lambda img, locs: [np.ones(128)])
+    monkeypatch.setattr(stub_face_backend, "load_image_file", lambda p: np.zeros((128, 128, 3)))
+    monkeypatch.setattr(stub_face_backend, "face_locations", lambda img: [(0, 80, 120, 0)])
+    monkeypatch.setattr(stub_face_backend, "face_encodings", lambda img, locs: [np.ones(128)])
 
     # Write a dummy file to satisfy existence check
     new_photo = tmp_path / "new.jpg"
@@ -70,7 +71,7 @@ def test_update_student_encoding_returns_false_for_missing_file(monkeypatch, tmp
     assert result is False
 
 
-def test_update_student_encoding_persists_to_snapshot(monkeypatch, tmp_path):
+def test_update_student_encoding_persists_to_snapshot(monkeypatch, tmp_path, stub_face_backend):
     """验证update_student_encoding会持久化到snapshot和缓存文件"""
     fr = _make_fr(monkeypatch, tmp_path)
 
@@ -78,9 +79,9 @@ def test_update_student_encoding_persists_to_snapshot(monkeypatch, tmp_path):
     fr.students_encodings = {"Student15": {"name": "Student15", "encodings": [np.zeros(128)]}}
 
     # Patch face_recognition
-    monkeypatch.setattr(fr_module.face_recognition, "load_image_file", lambda p: np.zeros((128, 128, 3)))
-    monkeypatch.setattr(fr_module.face_recognition, "face_locations", lambda img: [(0, 80, 120, 0)])
-    monkeypatch.setattr(fr_module.face_recognition, "face_encodings", lambda img, locs: [np.ones(128)])
+    monkeypatch.setattr(stub_face_backend, "load_image_file", lambda p: np.zeros((128, 128, 3)))
+    monkeypatch.setattr(stub_face_backend, "face_locations", lambda img: [(0, 80, 120, 0)])
+    monkeypatch.setattr(stub_face_backend, "face_encodings", lambda img, locs: [np.ones(128)])
 
     # 写入虚拟文件
     new_photo = tmp_path / "new.jpg"
@@ -103,3 +104,132 @@ def test_update_student_encoding_persists_to_snapshot(monkeypatch, tmp_path):
     assert cache_file is not None
     cache_path = fr._ref_cache_dir / cache_file
     assert cache_path.exists()
+
+
+class _FakeDetModel:
+    def __init__(self, bboxes):
+        self._bboxes = np.asarray(bboxes, dtype=np.float32)
+
+    def detect(self, img, max_num=0, metric="default"):
+        kpss = np.zeros((self._bboxes.shape[0], 5, 2), dtype=np.float32)
+        return self._bboxes, kpss
+
+
+class _FakeRecModel:
+    def __init__(self):
+        self.calls = 0
+
+    def get(self, img, face):
+        self.calls += 1
+        face.embedding = np.full(512, float(self.calls), dtype=np.float32)
+        return face.embedding
+
+
+def test_insightface_analyze_filters_small_faces_before_recognition():
+    pytest.importorskip("insightface")
+
+    rec = _FakeRecModel()
+    app = MagicMock()
+    # (x1, y1, x2, y2, score)：第一张 100x100，第二张 20x20（过小）
+    app.det_model = _FakeDetModel([[0, 0, 100, 100, 0.9], [200, 200, 220, 220, 0.8]])
+    app.models = {"detection": app.det_model, "recognition": rec}
+
+    compat = object.__new__(fr_module._InsightFaceCompat)
+    compat._app = app
+
+    result = compat.analyze(np.zeros((300, 300, 3), dtype=np.uint8), min_face_size=50)
+
+    assert result.detected_count == 2
+    assert result.locations == [(0, 100, 100, 0)]
+    assert rec.calls == 1  # 过小人脸不跑识别模型
+    assert len(result.encodings) == 1
+    assert pytest.approx(float(np.linalg.norm(result.encodings[0])), rel=1e-5) == 1.0
+    assert result.det_scores == [pytest.approx(0.9)]
+    app.get.assert_not_called()
+
+
+def test_recognize_faces_uses_single_analyze_call(monkeypatch, tmp_path, stub_face_backend):
+    fr = _make_fr(monkeypatch, tmp_path)
+    fr.students_encodings = {"Alice": {"name": "Alice", "encodings": [np.ones(128)]}}
+    fr._refresh_known_faces()
+
+    calls = []
+
+    def _analyze(image, min_face_size=0, scale=1.0):
+        calls.append(min_face_size)
+        return fr_module.FaceAnalysisResult(
+            locations=[(0, 80, 120, 0)],
+            encodings=[np.ones(128)],
+            det_scores=[0.99],
+            landmarks=[None],
+            detected_count=2,
+        )
+
+    monkeypatch.setattr(stub_face_backend, "load_image_file", lambda p: np.zeros((128, 128, 3)))
+    monkeypatch.setattr(fr_module._FACE_BACKEND_SINGLETON, "analyze", _analyze)
+    # 旧的两段式接口不应再被调用
+    monkeypatch.setattr(stub_face_backend, "face_locations", lambda *a, **k: pytest.fail("face_locations called"))
+
+    result = fr.recognize_faces(str(tmp_path / "fake.jpg"), return_details=True)
+
+    assert calls == [fr.min_face_size]
+    assert result["status"] == "success"
+    assert result["recognized_students"] == ["Alice"]
+    assert result["total_faces"] == 1
+
+
+def test_load_rgb_image_downscales_and_applies_exif_on_small_image(tmp_path):
+    from PIL import Image
+
+    path = tmp_path / "big.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # 需要顺时针旋转 90°
+    Image.new("RGB", (4000, 3000), (200, 100, 50)).save(path, exif=exif.tobytes())
+
+    full, full_scale = fr_module._load_rgb_image(str(path))
+    small, scale = fr_module._load_rgb_image(str(path), resize_long_edge=1000)
+
+    assert full.shape == (4000, 3000, 3)
+    assert full_scale == 1.0
+    assert small.shape == (1000, 750, 3)  # 已按 EXIF 转正
+    assert scale == pytest.approx(4.0)
+
+
+def test_analyze_with_scale_reports_original_coordinates(monkeypatch, stub_face_backend):
+    seen = {}
+
+    def _encodings(img, locs):
+        seen["locs"] = list(locs)
+        return [np.ones(128) for _ in locs]
+
+    # 缩小 4 倍后的坐标：一张 20px（原图 80px），一张 10px（原图 40px）
+    monkeypatch.setattr(stub_face_backend, "face_locations", lambda img: [(0, 20, 20, 0), (30, 40, 40, 30)])
+    monkeypatch.setattr(stub_face_backend, "face_encodings", _encodings)
+
+    result = fr_module.face_recognition.analyze(np.zeros((100, 100, 3)), min_face_size=50, scale=4.0)
+
+    assert result.detected_count == 2
+    assert result.locations == [(0, 80, 80, 0)]
+    assert seen["locs"] == [(0, 20, 20, 0)]  # 编码仍在缩小图坐标上进行
+
+
+def test_recognize_faces_passes_resize_long_edge_and_scale(monkeypatch, tmp_path):
+    fr = _make_fr(monkeypatch, tmp_path)
+    fr.resize_long_edge = 1600
+    calls = {}
+
+    def _load_scaled(path, resize_long_edge=0):
+        calls["resize_long_edge"] = resize_long_edge
+        return np.zeros((100, 100, 3)), 2.5
+
+    def _analyze(image, min_face_size=0, scale=1.0):
+        calls["scale"] = scale
+        return fr_module.FaceAnalysisResult(detected_count=0)
+
+    monkeypatch.setattr(fr_module.face_recognition, "load_image_scaled", _load_scaled)
+    monkeypatch.setattr(fr_module.face_recognition, "analyze", _analyze)
+
+    result = fr.recognize_faces(str(tmp_path / "fake.jpg"), return_details=True)
+
+    assert result["status"] == "no_faces_detected"
+    assert calls == {"resize_long_edge": 1600, "scale": 2.5}
@@ -0,0 +1,184 @@
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src.core import file_organizer as file_organizer_module
+from src.core.file_organizer import FileOrganizer
+from src.core.main import SimplePhotoOrganizer
+from src.core.output_manifest import KIND_RECOGNIZED, KIND_UNKNOWN, OutputManifest
+from tests.test_e2e_offline_pipeline import FakeServiceContainer, _write_min_config
+
+
+def _write(path: Path, data: bytes) -> str:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return str(path)
+
+
+def _layout(root: Path) -> dict:
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in sorted(root.rglob("*.jpg"))}
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_planned_names_are_unique_and_deterministic(tmp_path: Path, workers: int) -> None:
+    day = tmp_path / "class_photos" / "2025-12-21"
+    # 不同手机导出的同名照片落到同一个目标目录
+    photos = [_write(day / f"phone{i}" / "IMG_0001.jpg", f"photo-{i}".encode()) for i in range(5)]
+    out = tmp_path / f"output{workers}"
+    (out / "Alice" / "2025-12-21").mkdir(parents=True)
+    (out / "Alice" / "2025-12-21" / "IMG_0001.jpg").write_bytes(b"existing")
+
+    organizer = FileOrganizer(output_dir=str(out), copy_workers=workers)
+    stats = organizer.organize_photos(tmp_path / "class_photos", {p: ["Alice"] for p in photos}, [])
+
+    assert stats["copied"] == 5 and stats["failed"] == 0 and stats["processed"] == 5
+    assert stats["students"] == {"Alice": 5}
+    layout = _layout(out)
+    assert layout["Alice/2025-12-21/IMG_0001.jpg"] == b"existing"
+    assert [layout[f"Alice/2025-12-21/IMG_0001_{i:03d}.jpg"] for i in range(1, 6)] == [
+        f"photo-{i}".encode() for i in range(5)
+    ]
+
+
+def test_each_target_directory_is_resolved_once(tmp_path: Path, monkeypatch) -> None:
+    day = tmp_path / "class_photos" / "2025-12-21"
+    photos = [_write(day / f"p{i}.jpg", b"x") for i in range(6)]
+    calls = []
+    real = file_organizer_module.safe_join_under
+
+    def _counting(base, *segments):
+        calls.append(segments)
+        return real(base, *segments)
+
+    monkeypatch.setattr(file_organizer_module, "safe_join_under", _counting)
+    organizer = FileOrganizer(output_dir=str(tmp_path / "output"), copy_workers=3)
+    stats = organizer.organize_photos(
+        tmp_path / "class_photos",
+        {p: ["Alice", "Bob"] for p in photos[:4]},
+        photos[4:],
+    )
+
+    assert stats["copied"] == 10
+    assert sorted(calls) == [
+        ("Alice", "2025-12-21"),
+        ("Bob", "2025-12-21"),
+        ("unknown_photos", "2025-12-21"),
+    ]
+
+
+def test_interrupted_parallel_copy_rolls_back_everything(tmp_path: Path, monkeypatch) -> None:
+    day = tmp_path / "class_photos" / "2025-12-21"
+    photos = [_write(day / f"p{i}.jpg", b"x") for i in range(8)]
+    out = tmp_path / "output"
+    real_place = file_organizer_module.place_file
+
+    def _place(src, dst, mode):
+        if Path(src).name == "p5.jpg":
+            raise KeyboardInterrupt
+        return real_place(src, dst, mode)
+
+    monkeypatch.setattr(file_organizer_module, "place_file", _place)
+    organizer = FileOrganizer(output_dir=str(out), copy_workers=4)
+    with pytest.raises(KeyboardInterrupt):
+        organizer.organize_photos(tmp_path / "class_photos", {p: ["Alice"] for p in photos}, [])
+
+    assert _layout(out) == {}
+    assert not (out / "Alice" / "2025-12-21").exists()
+
+
+def test_stream_session_copies_before_finish_and_matches_batch(tmp_path: Path, monkeypatch) -> None:
+    day = tmp_path / "class_photos" / "2025-12-21"
+    photos = [_write(day / f"p{i}.jpg", f"photo-{i}".encode()) for i in range(4)]
+    clusters = {"Unknown_Person_1": photos[2:]}
+
+    batch_out = tmp_path / "batch"
+    batch = FileOrganizer(output_dir=str(batch_out)).organize_photos(
+        tmp_path / "class_photos", {photos[0]: ["Alice", "Bob"], photos[1]: ["Alice"]}, photos[2:], clusters
+    )
+
+    placed = threading.Event()
+    real_place = file_organizer_module.place_file
+
+    def _place(src, dst, mode):
+        result = real_place(src, dst, mode)
+        placed.set()
+        return result
+
+    monkeypatch.setattr(file_organizer_module, "place_file", _place)
+    stream_out = tmp_path / "stream"
+    session = FileOrganizer(output_dir=str(stream_out)).start_session(
+        tmp_path / "class_photos", stream=True, defer_unknown=True
+    )
+    session.add(photos[0], KIND_RECOGNIZED, ["Alice", "Bob"])
+    assert placed.wait(5)  # 复制在 finish() 之前就已开始
+    session.add(photos[2], KIND_UNKNOWN)
+    session.add(photos[1], KIND_RECOGNIZED, ["Alice"])
+    session.add(photos[3], KIND_UNKNOWN)
+    assert session.pending_unknown == 2 and not (stream_out / "unknown_photos").exists()
+    stats = session.finish(clusters)
+
+    assert _layout(stream_out) == _layout(batch_out)
+    for key in ("total", "unique_photos", "copied", "failed", "unknown_total", "students"):
+        assert stats[key] == batch[key]
+    batch_manifest, stream_manifest = OutputManifest(batch_out), OutputManifest(stream_out)
+    assert stream_manifest.sources_for_date("2025-12-21") == batch_manifest.sources_for_date("2025-12-21")
+    for source in batch_manifest.sources_for_date("2025-12-21"):
+        assert stream_manifest.entry(source) == batch_manifest.entry(source)
+
+
+def test_aborted_stream_session_rolls_back(tmp_path: Path) -> None:
+    day = tmp_path / "class_photos" / "2025-12-21"
+    photos = [_write(day / f"p{i}.jpg", b"x") for i in range(3)]
+    out = tmp_path / "output"
+    session = FileOrganizer(output_dir=str(out)).start_session(tmp_path / "class_photos", stream=True)
+    for photo in photos:
+        session.add(photo, KIND_RECOGNIZED, ["Alice"])
+    session.abort()
+
+    assert _layout(out) == {}
+    session.abort()  # 重复调用无副作用
+
+
+def test_run_sorts_while_recognizing(offline_generated_dataset, monkeypatch) -> None:
+    ds = offline_generated_dataset
+    config_path = ds.input_dir.parent / "config.json"
+    _write_min_config(config_path)
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    recognizer = container.get_face_recognizer()
+    recognize = recognizer.recognize_faces
+    seen_outputs = []
+    wait_for_copies = [True]
+
+    def _recognize(photo_path, return_details=True):
+        deadline = time.monotonic() + (5 if wait_for_copies[0] and seen_outputs else 0)
+        count = len(list(Path(ds.output_dir).rglob("*.jpg")))
+        while not count and time.monotonic() < deadline:  # 复制在后台线程中进行，给它一点时间
+            time.sleep(0.01)
+            count = len(list(Path(ds.output_dir).rglob("*.jpg")))
+        seen_outputs.append(count)
+        return recognize(photo_path, return_details)
+
+    monkeypatch.setattr(recognizer, "recognize_faces", _recognize)
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(ds.input_dir),
+        output_dir=str(ds.output_dir),
+        log_dir=str(ds.log_dir),
+        service_container=container,
+        config_file=str(config_path),
+    )
+    assert organizer.run() is True
+
+    # 识别最后一张照片时，前面照片的副本已经落盘
+    assert seen_outputs[0] == 0 and seen_outputs[-1] > 0
+    assert (ds.output_dir / "Alice" / "2025-12-21" / "img_01.jpg").exists()
+
+    # 关闭 stream_sort 时识别完成后才整理
+    monkeypatch.setenv("SUNDAY_PHOTOS_STREAM_SORT", "0")
+    wait_for_copies[0] = False
+    shutil.rmtree(ds.output_dir)
+    seen_outputs.clear()
+    assert organizer.run() is True
+    assert seen_outputs == [0] * len(seen_outputs) and seen_outputs
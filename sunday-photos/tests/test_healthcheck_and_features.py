@@ -36,39 +36,34 @@ def test_reference_cache_paths_follow_log_dir_and_fallback(tmp_path: Path, monke
     assert snap_path2 == tmp_path / "input" / "logs" / "reference_index" / "insightface" / "buffalo_l.json"
 
 
-def test_recognition_cache_store_result_sanitizes_numpy_and_is_json_writable(tmp_path: Path):
-    """Recognition cache must sanitize numpy values so cache can be saved as JSON."""
-
-    from src.core.recognition_cache import (
-        CacheKey,
-        compute_params_fingerprint,
-        load_date_cache,
-        normalize_cache_for_fingerprint,
-        save_date_cache_atomic,
-        store_result,
-    )
+def test_recognition_cache_store_result_sanitizes_numpy(tmp_path: Path):
+    """Recognition cache must accept numpy values in results and read them back as plain data."""
+
+    from src.core.recognition_cache import CacheKey, RecognitionCacheStore, compute_params_fingerprint
 
     output_dir = tmp_path / "output"
     date = "2025-12-27"
 
     params_fp = compute_params_fingerprint({"tolerance": 0.6, "min_face_size": 50})
-    cache = normalize_cache_for_fingerprint(load_date_cache(output_dir, date), date, params_fp)
-
     key = CacheKey(date=date, rel_path="IMG_001.jpg", size=123, mtime=456)
     result = {
         "status": "success",
         "recognized_students": ["Alice"],
+        "total_faces": np.int64(1),
         "unknown_encodings": [np.asarray([1.0, 2.0, 3.0], dtype=np.float32)],
     }
 
-    store_result(cache, key, result)
-    save_date_cache_atomic(output_dir, date, cache)
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, params_fp, params_fp)
+        store.store_result(key, result)
+
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, params_fp, params_fp)
+        loaded = store.lookup_result(key)
 
-    # Should be valid JSON and contain a list instead of numpy ndarray
-    p = output_dir / ".state" / "recognition_cache_by_date" / f"{date}.json"
-    data = json.loads(p.read_text(encoding="utf-8"))
-    stored = data["entries"]["IMG_001.jpg"]["result"]["unknown_encodings"][0]
-    assert stored == [1.0, 2.0, 3.0]
+    assert loaded["total_faces"] == 1
+    assert json.dumps(loaded["total_faces"]) == "1"
+    np.testing.assert_array_equal(loaded["unknown_encodings"][0], [1.0, 2.0, 3.0])
 
 
 def test_parallel_recognizer_caps_chunksize_and_respects_env_disable(monkeypatch):
@@ -206,36 +201,29 @@ def test_params_fingerprint_changes_with_reference_fingerprint_and_is_order_stab
 
 
 def test_date_cache_roundtrip_and_invalidate_on_fingerprint_mismatch(tmp_path: Path):
-    """Small integration test: save cache -> load -> fingerprint mismatch resets entries."""
-
-    from src.core.recognition_cache import (
-        CacheKey,
-        compute_params_fingerprint,
-        load_date_cache,
-        lookup_result,
-        normalize_cache_for_fingerprint,
-        save_date_cache_atomic,
-        store_result,
-    )
+    """Small integration test: save cache -> reopen -> fingerprint mismatch resets entries."""
+
+    from src.core.recognition_cache import CacheKey, RecognitionCacheStore, compute_params_fingerprint
 
     output_dir = tmp_path / "output"
     date = "2025-12-27"
 
     fp1 = compute_params_fingerprint({"tolerance": 0.6, "min_face_size": 50, "reference_fingerprint": "r1"})
-    cache = normalize_cache_for_fingerprint(load_date_cache(output_dir, date), date, fp1)
+    det_fp = compute_params_fingerprint({"min_face_size": 50})
 
     key = CacheKey(date=date, rel_path="A.jpg", size=1, mtime=2)
-    store_result(cache, key, {"status": "success", "recognized_students": ["Alice"], "total_faces": 1})
-    save_date_cache_atomic(output_dir, date, cache)
-
-    loaded = load_date_cache(output_dir, date)
-    assert lookup_result(loaded, key) is not None
-
-    # Now simulate params change (e.g., reference_fingerprint changed) -> entries should reset.
-    fp2 = compute_params_fingerprint({"tolerance": 0.6, "min_face_size": 50, "reference_fingerprint": "r2"})
-    normalized = normalize_cache_for_fingerprint(loaded, date, fp2)
-    assert normalized.get("params_fingerprint") == fp2
-    assert normalized.get("entries") == {}
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, fp1, det_fp)
+        store.store_result(key, {"status": "success", "recognized_students": ["Alice"], "total_faces": 1})
+
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, fp1, det_fp)
+        assert store.lookup_result(key) is not None
+
+        # Now simulate params change (e.g., reference_fingerprint changed) -> entries should reset.
+        fp2 = compute_params_fingerprint({"tolerance": 0.6, "min_face_size": 50, "reference_fingerprint": "r2"})
+        store.prepare_date(date, fp2, det_fp)
+        assert store.lookup_result(key) is None
 
 
 def test_invalidate_date_cache_rejects_path_traversal(tmp_path: Path):
@@ -53,3 +53,32 @@ def test_snapshot_ignores_zero_byte_images(tmp_path: Path):
     snap = build_class_photos_snapshot(tmp_path / "input" / "class_photos")
     files = snap["dates"]["2025-12-21"]["files"]
     assert files == []
+
+
+def test_incremental_plan_reports_file_level_changes(tmp_path: Path):
+    class_dir = tmp_path / "input" / "class_photos"
+    write_jpeg(class_dir / "2025-12-21" / "a.jpg", text="A", seed=1)
+    write_jpeg(class_dir / "2025-12-21" / "b.jpg", text="B", seed=2)
+    write_jpeg(class_dir / "2025.12.22" / "c.jpg", text="C", seed=3)
+
+    prev = build_class_photos_snapshot(class_dir)
+
+    write_jpeg(class_dir / "2025-12-21" / "new.jpg", text="N", seed=4)
+    (class_dir / "2025-12-21" / "b.jpg").unlink()
+    c = class_dir / "2025.12.22" / "c.jpg"
+    bumped = int(c.stat().st_mtime) + 10
+    os.utime(c, (bumped, bumped))
+    write_jpeg(class_dir / "2025-12-23" / "d.jpg", text="D", seed=5)
+
+    plan = compute_incremental_plan(prev, build_class_photos_snapshot(class_dir))
+
+    assert plan.changed_dates == {"2025-12-21", "2025-12-22", "2025-12-23"}
+    # 新日期没有文件级差异：整日期处理
+    assert set(plan.file_changes) == {"2025-12-21", "2025-12-22"}
+    day21 = plan.file_changes["2025-12-21"]
+    assert day21.added == ("2025-12-21/new.jpg",)
+    assert day21.removed == ("2025-12-21/b.jpg",)
+    assert day21.modified == ()
+    assert plan.file_changes["2025-12-22"].modified == ("2025.12.22/c.jpg",)
+    assert plan.source_paths("2025-12-21") == {"2025-12-21/a.jpg", "2025-12-21/new.jpg"}
+    assert plan.source_paths("2025-12-22") == {"2025.12.22/c.jpg"}
@@ -5,7 +5,9 @@
 
 说明：
 - 本文件主要验证“识别器/组织器”的业务逻辑分支是否正确，而非验证真实模型精度。
-- 对 face_recognition 的耗时/不稳定部分全部用 mock 替代，确保测试稳定可复现。
+- 对 face_recognition 的耗时/不稳定部分全部用 mock 替代，确保测试稳定可复现：
+  人脸后端为以 face_recognition stub 为底的 dlib 兼容层（conftest.stub_face_backend），
+  检测/编码 patch stub 上的函数，匹配走真实的 KnownFaceMatcher（欧氏距离）。
 """
 
 import os
@@ -16,6 +18,7 @@ import tempfile
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 import numpy as np
+import pytest
 
 # 添加 src 目录到路径
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -26,6 +29,7 @@ from core.file_organizer import FileOrganizer
 from core.student_manager import StudentManager
 from core.config import UNKNOWN_PHOTOS_DIR
 
+@pytest.mark.usefixtures("stub_face_backend")
 class TestLogicScenarios(unittest.TestCase):
     def setUp(self):
         # 创建临时目录结构
@@ -55,9 +59,9 @@ class TestLogicScenarios(unittest.TestCase):
     def tearDown(self):
         shutil.rmtree(self.test_dir)
 
-    @patch('core.face_recognizer.face_recognition.load_image_file')
-    @patch('core.face_recognizer.face_recognition.face_locations')
-    @patch('core.face_recognizer.face_recognition.face_encodings')
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
+    @patch('face_recognition.face_encodings')
     def test_multiple_reference_photos(self, mock_encodings, mock_locations, mock_load_image):
         """测试场景1: 学生有多张参考照片"""
         print("\n🧪 测试场景1: 多张参考照片逻辑")
@@ -97,12 +101,10 @@ class TestLogicScenarios(unittest.TestCase):
         np.testing.assert_array_equal(recognizer.students_encodings['ZhangSan']['encodings'][0], self.encoding_zhang)
         print("✅ 成功处理多张参考照片，自动跳过无效照片")
 
-    @patch('core.face_recognizer.face_recognition.load_image_file')
-    @patch('core.face_recognizer.face_recognition.face_locations')
-    @patch('core.face_recognizer.face_recognition.face_encodings')
-    @patch('core.face_recognizer.face_recognition.face_distance')
-    @patch('core.face_recognizer.face_recognition.compare_faces')
-    def test_group_photo_recognition(self, mock_compare, mock_distance, mock_encodings, mock_locations, mock_load_image):
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
+    @patch('face_recognition.face_encodings')
+    def test_group_photo_recognition(self, mock_encodings, mock_locations, mock_load_image):
         """测试场景2: 多人合照识别"""
         print("\n🧪 测试场景2: 多人合照识别")
         
@@ -131,25 +133,7 @@ class TestLogicScenarios(unittest.TestCase):
         face2 = self.encoding_li
         mock_encodings.return_value = [face1, face2]
         
-        # 模拟比较结果
-        # 第一次循环：face1 (ZhangSan)
-        # compare_faces([Zhang, Li], face1) -> [True, False]
-        # face_distance([Zhang, Li], face1) -> [0.01, 0.8]
-        
-        # 第二次循环：face2 (LiSi)
-        # compare_faces([Zhang, Li], face2) -> [False, True]
-        # face_distance([Zhang, Li], face2) -> [0.8, 0.01]
-        
-        mock_compare.side_effect = [
-            [True, False],
-            [False, True]
-        ]
-        
-        mock_distance.side_effect = [
-            np.array([0.01, 0.8]), 
-            np.array([0.8, 0.01])
-        ]
-        
+        # 两张脸分别与 ZhangSan / LiSi 的参考编码完全一致（距离 0），与另一人相距甚远
         # 执行识别
         results = recognizer.recognize_faces(photo_path)
         
@@ -195,12 +179,10 @@ class TestLogicScenarios(unittest.TestCase):
         self.assertTrue(lisi_file.exists(), "LiSi 的照片未创建")
         print("✅ 文件正确归档到对应的学生和日期目录")
 
-    @patch('core.face_recognizer.face_recognition.load_image_file')
-    @patch('core.face_recognizer.face_recognition.face_locations')
-    @patch('core.face_recognizer.face_recognition.face_encodings')
-    @patch('core.face_recognizer.face_recognition.face_distance')
-    @patch('core.face_recognizer.face_recognition.compare_faces')
-    def test_tolerance_boundary(self, mock_compare, mock_distance, mock_encodings, mock_locations, mock_load_image):
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
+    @patch('face_recognition.face_encodings')
+    def test_tolerance_boundary(self, mock_encodings, mock_locations, mock_load_image):
         """测试场景4: 阈值边界测试"""
         print("\n🧪 测试场景4: 阈值边界测试")
         
@@ -215,18 +197,18 @@ class TestLogicScenarios(unittest.TestCase):
         
         # 模拟检测到一个人脸 (尺寸 > 50)
         mock_locations.return_value = [(10, 100, 100, 10)]
-        mock_encodings.return_value = [self.encoding_zhang] # 编码本身不重要，结果由 mock 决定
+        # 沿单位方向偏移参考编码，得到欧氏距离恰为 0.59 / 0.61 的人脸
+        direction = np.zeros(128)
+        direction[0] = 1.0
         
         # Case 1: 距离 0.59 (应该匹配)
-        mock_distance.return_value = np.array([0.59])
-        mock_compare.return_value = [True]
+        mock_encodings.return_value = [self.encoding_zhang + 0.59 * direction]
         
         results1 = recognizer.recognize_faces(photo_path)
         self.assertIn('ZhangSan', results1, "0.59 应该小于 0.6 从而匹配")
         
         # Case 2: 距离 0.61 (应该不匹配)
-        mock_distance.return_value = np.array([0.61])
-        mock_compare.return_value = [False]
+        mock_encodings.return_value = [self.encoding_zhang + 0.61 * direction]
         
         results2 = recognizer.recognize_faces(photo_path)
         self.assertEqual(results2, [], "0.61 应该大于 0.6 从而不匹配")
@@ -0,0 +1,53 @@
+import threading
+from pathlib import Path
+
+from src.core.utils import fs as fs_module
+from src.core.utils.fs import UniqueNameAllocator
+
+
+def test_allocator_lists_each_directory_once(tmp_path: Path, monkeypatch) -> None:
+    (tmp_path / "IMG_0001.jpg").write_bytes(b"x")
+    (tmp_path / "IMG_0001_001.jpg").write_bytes(b"x")
+    listed = []
+    real_scandir = fs_module.os.scandir
+
+    def _scandir(path):
+        listed.append(str(path))
+        return real_scandir(path)
+
+    monkeypatch.setattr(fs_module.os, "scandir", _scandir)
+    allocator = UniqueNameAllocator()
+
+    names = [allocator.allocate(tmp_path, "IMG_0001.jpg").name for _ in range(4)]
+
+    assert names == ["IMG_0001_002.jpg", "IMG_0001_003.jpg", "IMG_0001_004.jpg", "IMG_0001_005.jpg"]
+    assert allocator.allocate(tmp_path, "other.jpg").name == "other.jpg"
+    assert listed == [str(tmp_path)]
+
+
+def test_allocator_treats_names_case_insensitively(tmp_path: Path) -> None:
+    (tmp_path / "img_0001.jpg").write_bytes(b"x")
+    allocator = UniqueNameAllocator()
+
+    assert allocator.allocate(tmp_path, "IMG_0001.JPG").name == "IMG_0001_001.JPG"
+    assert allocator.allocate(tmp_path / "missing", "a.jpg") == tmp_path / "missing" / "a.jpg"
+
+
+def test_allocator_is_thread_safe(tmp_path: Path) -> None:
+    allocator = UniqueNameAllocator()
+    results = []
+    lock = threading.Lock()
+
+    def _worker() -> None:
+        local = [allocator.allocate(tmp_path, "IMG_0001.jpg") for _ in range(50)]
+        with lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=_worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(results) == 400
+    assert len(set(results)) == 400
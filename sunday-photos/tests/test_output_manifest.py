@@ -0,0 +1,192 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from src.cli import run as cli_run
+from src.core.file_organizer import FileOrganizer
+from src.core.incremental_state import DateFileChanges
+from src.core.output_manifest import (
+    KIND_RECOGNIZED,
+    KIND_UNKNOWN,
+    OutputManifest,
+    manifest_path,
+)
+from src.core.pipeline import Pipeline
+from src.core.recognition_cache import quick_content_hash
+
+
+def _touch(path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x")
+    return path
+
+
+def test_remove_outputs_deletes_copies_and_empty_date_dirs(tmp_path: Path) -> None:
+    out = tmp_path / "output"
+    a1 = _touch(out / "Alice" / "2025-12-21" / "a.jpg")
+    b1 = _touch(out / "Bob" / "2025-12-21" / "a.jpg")
+    other = _touch(out / "Bob" / "2025-12-21" / "b.jpg")
+
+    manifest = OutputManifest(out)
+    manifest.record("2025-12-21/a.jpg", "2025-12-21", KIND_RECOGNIZED, [a1, b1])
+    manifest.record("2025-12-21/b.jpg", "2025-12-21", KIND_RECOGNIZED, [other])
+    manifest.save()
+
+    reloaded = OutputManifest(out)
+    assert reloaded.sources_for_date("2025-12-21") == ["2025-12-21/a.jpg", "2025-12-21/b.jpg"]
+    assert reloaded.remove_outputs(["2025-12-21/a.jpg"]) == 2
+
+    assert not a1.exists() and not b1.exists()
+    assert not (out / "Alice" / "2025-12-21").exists()
+    assert other.exists()
+    assert reloaded.entry("2025-12-21/a.jpg") is None
+
+
+def test_remove_outputs_skips_paths_outside_output(tmp_path: Path) -> None:
+    out = tmp_path / "output"
+    outside = _touch(tmp_path / "keep.jpg")
+    manifest = OutputManifest(out)
+    manifest._sources["x.jpg"] = {"date": "2025-12-21", "kind": KIND_UNKNOWN, "outputs": ["../keep.jpg"]}
+
+    assert manifest.remove_outputs(["x.jpg"]) == 0
+    assert outside.exists()
+
+
+def test_corrupt_manifest_is_treated_as_empty(tmp_path: Path) -> None:
+    out = tmp_path / "output"
+    path = manifest_path(out)
+    path.parent.mkdir(parents=True)
+    path.write_text("{not json", encoding="utf-8")
+
+    manifest = OutputManifest(out)
+    assert len(manifest) == 0
+    assert not manifest.has_date("2025-12-21")
+
+
+def test_partial_sync_requeues_unknown_siblings_when_clustering(tmp_path: Path) -> None:
+    input_dir = tmp_path / "input"
+    out = tmp_path / "output"
+    day = "2025-12-21"
+    known = _touch(out / "Alice" / day / "a.jpg")
+    unknown = _touch(out / "unknown_photos" / day / "u.jpg")
+    stale = _touch(out / "unknown_photos" / day / "gone.jpg")
+
+    manifest = OutputManifest(out)
+    manifest.record(f"{day}/a.jpg", day, KIND_RECOGNIZED, [known])
+    manifest.record(f"{day}/u.jpg", day, KIND_UNKNOWN, [unknown])
+    manifest.record(f"{day}/gone.jpg", day, KIND_UNKNOWN, [stale])
+    manifest.save()
+
+    clustering = {"enabled": True}
+    loader = SimpleNamespace(get_unknown_face_clustering=lambda: clustering)
+    pipeline = Pipeline(None, input_dir, out, tmp_path / "logs", loader)
+    plan = SimpleNamespace(file_changes={day: DateFileChanges(added=(f"{day}/new.jpg",), removed=(f"{day}/gone.jpg",))})
+
+    extra = pipeline._sync_partial_dates(plan)
+
+    assert extra == [str(input_dir / "class_photos" / day / "u.jpg")]
+    assert known.exists()
+    assert not unknown.exists() and not stale.exists()
+    assert OutputManifest(out).sources_for_date(day) == [f"{day}/a.jpg"]
+
+    # 未启用聚类：只删除过期副本
+    clustering["enabled"] = False
+    kept = _touch(out / "unknown_photos" / day / "k.jpg")
+    manifest = OutputManifest(out)
+    manifest.record(f"{day}/k.jpg", day, KIND_UNKNOWN, [kept])
+    manifest.save()
+    assert pipeline._sync_partial_dates(plan) == []
+    assert kept.exists()
+
+
+def test_file_organizer_records_size_and_hash(tmp_path: Path) -> None:
+    photos = tmp_path / "class_photos"
+    src = photos / "2025-12-21" / "a.jpg"
+    src.parent.mkdir(parents=True)
+    src.write_bytes(b"photo-bytes")
+    out = tmp_path / "output"
+
+    FileOrganizer(output_dir=str(out)).organize_photos(photos, {str(src): ["Alice", "Bob"]}, [])
+
+    entry = OutputManifest(out).entry("2025-12-21/a.jpg")
+    assert entry["kind"] == KIND_RECOGNIZED
+    assert entry["size"] == len(b"photo-bytes")
+    assert entry["hash"] == quick_content_hash(src, entry["size"])
+    assert sorted(entry["outputs"]) == ["Alice/2025-12-21/a.jpg", "Bob/2025-12-21/a.jpg"]
+
+
+def test_check_reports_and_repairs_in_one_pass(tmp_path: Path) -> None:
+    photos = tmp_path / "class_photos"
+    a = photos / "2025-12-21" / "a.jpg"
+    b = photos / "2025-12-21" / "b.jpg"
+    a.parent.mkdir(parents=True)
+    a.write_bytes(b"aaaa")
+    b.write_bytes(b"bbbb")
+    out = tmp_path / "output"
+    FileOrganizer(output_dir=str(out)).organize_photos(photos, {str(a): ["Alice"], str(b): ["Bob"]}, [])
+
+    (out / "Alice" / "2025-12-21" / "a.jpg").write_bytes(b"truncated-or-corrupt")
+    (out / "Bob" / "2025-12-21" / "b.jpg").unlink()
+    _touch(out / "Carol" / "2025-12-21" / "stray.jpg")
+    _touch(out / "Carol" / "notes.txt")  # 不在日期目录内：不算清单外输出
+
+    result = OutputManifest(out).check()
+    assert result.checked == 2
+    assert result.missing == ["Bob/2025-12-21/b.jpg"]
+    assert result.mismatched == ["Alice/2025-12-21/a.jpg"]
+    assert result.orphans == ["Carol/2025-12-21/stray.jpg"]
+    assert not result.ok
+
+    repaired = OutputManifest(out).check(photos_dir=photos, repair=True)
+    assert repaired.repaired == 3
+    assert (out / "Alice" / "2025-12-21" / "a.jpg").read_bytes() == b"aaaa"
+    assert not (out / "Carol" / "2025-12-21").exists()
+    assert (out / "Carol" / "notes.txt").exists()
+    assert OutputManifest(out).check().ok
+
+
+def test_cleanup_for_dates_is_driven_by_manifest(tmp_path: Path) -> None:
+    out = tmp_path / "output"
+    day = "2025-12-21"
+    copy = _touch(out / "Alice" / day / "a.jpg")
+    cluster_copy = _touch(out / "unknown_photos" / "Unknown_Person_1" / day / "u.jpg")
+    other_day = _touch(out / "Alice" / "2025-12-22" / "b.jpg")
+    legacy = _touch(out / "Bob" / "2025-12-23" / "old.jpg")
+
+    manifest = OutputManifest(out)
+    manifest.record(f"{day}/a.jpg", day, KIND_RECOGNIZED, [copy])
+    manifest.record(f"{day}/u.jpg", day, KIND_UNKNOWN, [cluster_copy])
+    manifest.record("2025-12-22/b.jpg", "2025-12-22", KIND_RECOGNIZED, [other_day])
+    manifest.save()
+
+    loader = SimpleNamespace(get_unknown_face_clustering=lambda: {"enabled": False})
+    pipeline = Pipeline(None, tmp_path / "input", out, tmp_path / "logs", loader)
+    pipeline._cleanup_output_for_dates([day, "2025-12-23"])
+
+    assert not copy.exists() and not cluster_copy.exists()
+    assert not (out / "Alice" / day).exists()
+    assert other_day.exists()
+    # 清单中没有记录的日期：回退为按目录清理
+    assert not legacy.exists()
+    assert OutputManifest(out).sources_for_date(day) == []
+    assert OutputManifest(out).has_date("2025-12-22")
+
+
+def test_cli_check_output_exit_code(tmp_path: Path, monkeypatch) -> None:
+    out = tmp_path / "output"
+    manifest = OutputManifest(out)
+    manifest.record("2025-12-21/a.jpg", "2025-12-21", KIND_RECOGNIZED, [out / "Alice" / "2025-12-21" / "a.jpg"])
+    manifest.save()
+
+    argv = ["prog", "--check-output", "--input-dir", str(tmp_path / "input"), "--output-dir", str(out)]
+    monkeypatch.setattr(sys, "argv", argv)
+    with pytest.raises(SystemExit) as exc:
+        cli_run.main()
+    assert exc.value.code == 1
+
+    monkeypatch.setattr(sys, "argv", argv + ["--repair"])
+    cli_run.main()
+    monkeypatch.setattr(sys, "argv", argv)
+    cli_run.main()
@@ -0,0 +1,112 @@
+import errno
+import os
+from pathlib import Path
+
+from src.core import config_loader as config_loader_module
+from src.core.config_loader import ConfigLoader
+from src.core.file_organizer import FileOrganizer
+from src.core.output_manifest import OutputManifest, delete_output_files
+from src.core.utils import fs as fs_module
+from src.core.utils.fs import place_file
+
+
+def _source(tmp_path: Path, data: bytes = b"group-photo-bytes") -> tuple[Path, Path]:
+    photos = tmp_path / "class_photos"
+    src = photos / "2025-12-21" / "group.jpg"
+    src.parent.mkdir(parents=True)
+    src.write_bytes(data)
+    return photos, src
+
+
+def test_hardlink_mode_shares_data_and_reports_bytes_saved(tmp_path: Path) -> None:
+    photos, src = _source(tmp_path)
+    out = tmp_path / "output"
+
+    organizer = FileOrganizer(output_dir=str(out), output_mode="hardlink")
+    stats = organizer.organize_photos(photos, {str(src): ["Alice", "Bob"]}, [])
+
+    alice = out / "Alice" / "2025-12-21" / "group.jpg"
+    assert os.path.samefile(alice, src)
+    assert stats["output_methods"] == {"hardlink": 2}
+    assert stats["bytes_saved"] == 2 * src.stat().st_size
+    report = organizer.create_summary_report(stats)
+    assert "节省空间" in Path(report).read_text(encoding="utf-8")
+
+    assert OutputManifest(out).check().ok
+    assert OutputManifest(out).remove_outputs(["2025-12-21/group.jpg"]) == 2
+    assert src.read_bytes() == b"group-photo-bytes"
+
+
+def test_symlink_outputs_are_checked_and_removed_without_touching_source(tmp_path: Path) -> None:
+    photos, src = _source(tmp_path)
+    out = tmp_path / "output"
+
+    FileOrganizer(output_dir=str(out), output_mode="symlink").organize_photos(photos, {str(src): ["Alice"]}, [])
+    link = out / "Alice" / "2025-12-21" / "group.jpg"
+    assert link.is_symlink()
+    assert OutputManifest(out).check().ok
+
+    # 源照片被移走：失效链接视为不符；修复时源已不可用，只删除链接
+    moved = src.with_name("moved.jpg")
+    src.rename(moved)
+    result = OutputManifest(out).check(photos_dir=photos, repair=True)
+    assert result.mismatched == ["Alice/2025-12-21/group.jpg"]
+    assert not link.is_symlink()
+    assert moved.exists()
+
+    # 回滚/清理：只删除链接本身
+    moved.rename(src)
+    stray = out / "Bob" / "2025-12-21" / "group.jpg"
+    stray.parent.mkdir(parents=True)
+    stray.symlink_to(src)
+    assert delete_output_files(out, [stray]) == 1
+    assert src.read_bytes() == b"group-photo-bytes"
+
+
+def test_repair_replaces_link_instead_of_writing_through_it(tmp_path: Path) -> None:
+    photos, src = _source(tmp_path)
+    out = tmp_path / "output"
+    FileOrganizer(output_dir=str(out), output_mode="symlink").organize_photos(photos, {str(src): ["Alice"]}, [])
+
+    manifest = OutputManifest(out)
+    assert manifest._recopy_from_source("2025-12-21/group.jpg", "Alice/2025-12-21/group.jpg", photos)
+
+    link = out / "Alice" / "2025-12-21" / "group.jpg"
+    assert not link.is_symlink() and link.read_bytes() == src.read_bytes()
+    assert src.read_bytes() == b"group-photo-bytes"
+
+
+def test_auto_falls_back_to_copy_across_devices(tmp_path: Path, monkeypatch) -> None:
+    _, src = _source(tmp_path)
+
+    def _exdev(*_args, **_kwargs):
+        raise OSError(errno.EXDEV, "Invalid cross-device link")
+
+    monkeypatch.setattr(fs_module, "_try_reflink", lambda *_a: False)
+    monkeypatch.setattr(fs_module.os, "link", _exdev)
+
+    dst = tmp_path / "out.jpg"
+    assert place_file(src, dst, "auto") == "copy"
+    assert dst.read_bytes() == src.read_bytes() and not os.path.samefile(dst, src)
+    assert place_file(src, tmp_path / "out2.jpg", "hardlink") == "copy"
+
+
+def test_get_output_mode_env_override_and_invalid_value(tmp_path: Path, monkeypatch) -> None:
+    cfg_file = tmp_path / "config.json"
+    cfg_file.write_text('{"output_mode": "Hardlink"}', encoding="utf-8")
+    loader = ConfigLoader(str(cfg_file), base_dir=tmp_path)
+
+    monkeypatch.delenv("SUNDAY_PHOTOS_OUTPUT_MODE", raising=False)
+    assert loader.get_output_mode() == "hardlink"
+    monkeypatch.setenv("SUNDAY_PHOTOS_OUTPUT_MODE", "auto")
+    assert loader.get_output_mode() == "auto"
+    monkeypatch.setenv("SUNDAY_PHOTOS_OUTPUT_MODE", "teleport")
+    assert loader.get_output_mode() == config_loader_module.DEFAULT_OUTPUT_MODE
+
+
+def test_copy_mode_is_unchanged(tmp_path: Path) -> None:
+    photos, src = _source(tmp_path)
+    out = tmp_path / "output"
+    stats = FileOrganizer(output_dir=str(out)).organize_photos(photos, {str(src): ["Alice"]}, [])
+    assert stats["output_methods"] == {"copy": 1} and stats["bytes_saved"] == 0
+    assert not os.path.samefile(out / "Alice" / "2025-12-21" / "group.jpg", src)
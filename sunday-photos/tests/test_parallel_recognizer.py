@@ -95,3 +95,120 @@ def test_core_process_photos_parallel_fallback_to_serial(tmp_path, monkeypatch,
 
     organizer.process_photos([str(p1), str(p2)])
     assert mock_recognizer.recognize_faces.call_count == 2
+
+
+def test_shared_refs_publish_attach_and_release(monkeypatch):
+    """参考矩阵经共享内存发布后，子进程侧挂载得到的匹配结果与直接构建一致。"""
+
+    np = pytest.importorskip("numpy")
+    from multiprocessing import shared_memory
+
+    from src.core import parallel_recognizer as pr
+    from src.core.face_matcher import KnownFaceMatcher
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_FACE_BACKEND", "insightface")
+    rng = np.random.default_rng(5)
+    known = [rng.normal(size=512) for _ in range(4)]
+    names = ["张三", "李四", "张三", "王五"]
+
+    shm, handle = pr._publish_shared_refs(known, names)
+    try:
+        assert handle.shape == (4, 512)
+        # 模拟子进程：只拿到空编码列表 + 共享内存描述
+        pr.init_worker([], names, 0.6, 50, 0, handle)
+        matcher = pr._get_worker_matcher()
+        assert not pr._G_KNOWN_ENCODINGS.flags.writeable
+
+        faces = [known[1], rng.normal(size=512)]
+        expected = KnownFaceMatcher(known, names).match(faces, 0.6)
+        assert matcher.match(faces, 0.6) == expected
+        assert matcher.match(faces, 0.6)[0].name == "李四"
+    finally:
+        pr._detach_shared_refs()
+        pr._release_shared_refs(shm)
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=handle.shm_name)
+
+
+def test_shared_refs_fall_back_for_mixed_dimensions():
+    np = pytest.importorskip("numpy")
+    from src.core import parallel_recognizer as pr
+
+    shm, handle = pr._publish_shared_refs([np.ones(128), np.ones(512)], ["A", "B"])
+    assert shm is None and handle is None
+
+
+def test_init_worker_reports_readiness(monkeypatch):
+    """就绪握手：init_worker 预热后回报 (pid, ok, error)，预热失败时只回报不抛出。"""
+
+    import queue
+
+    from src.core import parallel_recognizer as pr
+
+    ready = queue.Queue()
+    monkeypatch.setattr(pr, "warm_worker_backend", lambda: None)
+    pr.init_worker([], [], 0.6, 50, 0, None, ready)
+    pid, ok, error = ready.get_nowait()
+    assert pid == os.getpid() and ok is True and error == ""
+
+    def _fail():
+        raise ModuleNotFoundError("no model")
+
+    monkeypatch.setattr(pr, "warm_worker_backend", _fail)
+    pr.init_worker([], [], 0.6, 50, 0, None, ready)
+    _pid, ok, error = ready.get_nowait()
+    assert ok is False and "no model" in error
+
+
+def test_wait_workers_ready_handles_failure_and_timeout():
+    import queue
+
+    from src.core import parallel_recognizer as pr
+
+    q = queue.Queue()
+    q.put((1, True, ""))
+    q.put((2, True, ""))
+    assert pr._wait_workers_ready(q, 2, timeout=1) == (True, "")
+
+    q.put((3, True, ""))
+    q.put((4, False, "boom"))
+    ok, reason = pr._wait_workers_ready(q, 2, timeout=1)
+    assert ok is False and "boom" in reason
+
+    ok, reason = pr._wait_workers_ready(q, 1, timeout=1)
+    assert ok is False and "超时" in reason
+
+
+def test_process_pool_falls_back_to_spawn_when_forkserver_not_ready(monkeypatch):
+    from src.core import parallel_recognizer as pr
+    import multiprocessing
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_WORKER_BOOTSTRAP", "forkserver")
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn", "fork", "forkserver"])
+    monkeypatch.setattr(pr, "_open_forkserver_pool", lambda workers, initargs: None)
+
+    seen = {}
+
+    class FakeCtx:
+        def Pool(self, **kwargs):
+            seen.update(kwargs)
+            return "spawn-pool"
+
+    def fake_get_context(method):
+        seen["method"] = method
+        return FakeCtx()
+
+    monkeypatch.setattr(multiprocessing, "get_context", fake_get_context)
+
+    assert pr._open_process_pool(3, ("args",)) == "spawn-pool"
+    assert seen["method"] == "spawn"
+    assert seen["processes"] == 3
+    assert seen["initargs"] == ("args",)
+
+
+def test_worker_bootstrap_env_override(monkeypatch):
+    from src.core import parallel_recognizer as pr
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_WORKER_BOOTSTRAP", "spawn")
+    assert pr._select_worker_bootstrap() == "spawn"
@@ -9,6 +9,7 @@
 """
 
 import os
+import numpy as np
 import pytest
 from pathlib import Path
 from typing import List, Tuple, Any
@@ -98,23 +99,19 @@ class TestWorkerInitialization:
         assert pr._G_MIN_FACE_SIZE == 60
 
 
+@pytest.mark.usefixtures("stub_face_backend")
 class TestRecognizeOne:
-    """测试单张照片识别"""
+    """测试单张照片识别（人脸后端为 conftest.stub_face_backend，检测/编码 patch stub 上的函数）"""
     
-    @patch('src.core.face_recognizer.face_recognition.load_image_file')
-    @patch('src.core.face_recognizer.face_recognition.face_locations')
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
     def test_recognize_one_no_faces(self, mock_locations, mock_load):
         """无人脸照片应该返回正确状态"""
-        import src.core.parallel_recognizer as pr
-        
-        # 设置全局变量
-        pr._G_KNOWN_ENCODINGS = [[0.1, 0.2]]
-        pr._G_KNOWN_NAMES = ["张三"]
-        pr._G_TOLERANCE = 0.6
-        pr._G_MIN_FACE_SIZE = 50
+        # 设置全局变量（同时重建 worker 内的匹配器）
+        init_worker([[0.1, 0.2]], ["张三"], 0.6, 50)
         
         # Mock 返回无人脸
-        mock_load.return_value = MagicMock()
+        mock_load.return_value = np.zeros((200, 200, 3), dtype=np.uint8)
         mock_locations.return_value = []
         
         path, result = recognize_one("/fake/path.jpg")
@@ -124,18 +121,13 @@ class TestRecognizeOne:
         assert result["total_faces"] == 0
         assert result["recognized_students"] == []
     
-    @patch('src.core.face_recognizer.face_recognition.load_image_file')
-    @patch('src.core.face_recognizer.face_recognition.face_locations')
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
     def test_recognize_one_faces_too_small(self, mock_locations, mock_load):
         """人脸过小应该被过滤"""
-        import src.core.parallel_recognizer as pr
+        init_worker([[0.1, 0.2]], ["张三"], 0.6, 100)  # 设置较大的最小尺寸
         
-        pr._G_KNOWN_ENCODINGS = [[0.1, 0.2]]
-        pr._G_KNOWN_NAMES = ["张三"]
-        pr._G_TOLERANCE = 0.6
-        pr._G_MIN_FACE_SIZE = 100  # 设置较大的最小尺寸
-        
-        mock_load.return_value = MagicMock()
+        mock_load.return_value = np.zeros((200, 200, 3), dtype=np.uint8)
         # 返回一个小人脸 (top=0, right=40, bottom=40, left=0) -> 40x40 < 100
         mock_locations.return_value = [(0, 40, 40, 0)]
         
@@ -144,26 +136,16 @@ class TestRecognizeOne:
         assert result["status"] == "no_faces_detected"
         assert "尺寸过小" in result["message"]
     
-    @patch('src.core.face_recognizer.face_recognition.load_image_file')
-    @patch('src.core.face_recognizer.face_recognition.face_locations')
-    @patch('src.core.face_recognizer.face_recognition.face_encodings')
-    @patch('src.core.face_recognizer.face_recognition.compare_faces')
-    @patch('src.core.face_recognizer.face_recognition.face_distance')
-    def test_recognize_one_with_match(self, mock_dist, mock_cmp, mock_enc, mock_locs, mock_load):
+    @patch('face_recognition.load_image_file')
+    @patch('face_recognition.face_locations')
+    @patch('face_recognition.face_encodings')
+    def test_recognize_one_with_match(self, mock_enc, mock_locs, mock_load):
         """成功识别应该返回学生名字"""
-        import numpy as np
-        import src.core.parallel_recognizer as pr
-        
-        pr._G_KNOWN_ENCODINGS = [[0.1, 0.2]]
-        pr._G_KNOWN_NAMES = ["张三"]
-        pr._G_TOLERANCE = 0.6
-        pr._G_MIN_FACE_SIZE = 50
+        init_worker([[0.1, 0.2]], ["张三"], 0.6, 50)
         
-        mock_load.return_value = MagicMock()
+        mock_load.return_value = np.zeros((200, 200, 3), dtype=np.uint8)
         mock_locs.return_value = [(0, 100, 100, 0)]  # 100x100 大于50
-        mock_enc.return_value = [np.array([0.15, 0.25])]  # 一个编码
-        mock_cmp.return_value = [True]  # 匹配成功
-        mock_dist.return_value = np.array([0.3])  # 距离小于tolerance
+        mock_enc.return_value = [np.array([0.15, 0.25])]  # 与参考编码距离约 0.07，小于 tolerance
         
         path, result = recognize_one("/fake/path.jpg")
         
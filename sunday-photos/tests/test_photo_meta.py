@@ -0,0 +1,99 @@
+import os
+from pathlib import Path
+
+from PIL import Image
+
+from src.core import photo_meta as photo_meta_module
+from src.core import file_organizer as file_organizer_module
+from src.core.file_organizer import FileOrganizer
+from src.core.incremental_state import save_snapshot
+from src.core.photo_meta import PhotoMeta, PhotoMetaIndex, photo_meta_path, read_image_header
+from src.core.scanner import Scanner
+
+
+class _DummyReporter:
+    def log_info(self, level: str, message: str) -> None:
+        pass
+
+    def log_rule(self) -> None:
+        pass
+
+
+def _save_with_exif(path: Path, fmt: str = "JPEG", size=(40, 20)) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif.get_ifd(0x8769)[0x9003] = "2024:05:06 07:08:09"
+    Image.new("RGB", size, (200, 100, 50)).save(path, fmt, exif=exif.tobytes())
+    return path
+
+
+def test_header_reader_matches_pil_without_decoding(tmp_path: Path) -> None:
+    jpeg = _save_with_exif(tmp_path / "a.jpg")
+    png = _save_with_exif(tmp_path / "b.png", "PNG")
+    plain = tmp_path / "c.jpg"
+    Image.new("RGB", (8, 6)).save(plain, "JPEG")
+
+    for path in (jpeg, png):
+        header = read_image_header(path)
+        assert (header.width, header.height, header.orientation, header.exif_date) == (40, 20, 6, "2024-05-06")
+
+    header = read_image_header(plain)
+    assert (header.width, header.height, header.orientation, header.exif_date) == (8, 6, 1, None)
+    assert read_image_header(tmp_path / "missing.jpg").width == 0
+
+    meta = photo_meta_module.read_photo_meta(jpeg)
+    assert meta.date == "2024-05-06"
+    assert meta.display_size == (20, 40)
+
+
+def test_date_directory_wins_over_exif(tmp_path: Path) -> None:
+    photo = _save_with_exif(tmp_path / "2025-12-21" / "a.jpg")
+    assert photo_meta_module.read_photo_meta(photo).date == "2025-12-21"
+
+
+def test_index_reuses_unchanged_entries_across_runs(tmp_path: Path, monkeypatch) -> None:
+    class_dir = tmp_path / "class_photos"
+    output_dir = tmp_path / "output"
+    a = _save_with_exif(class_dir / "2025-12-21" / "a.jpg")
+    _save_with_exif(class_dir / "2025-12-21" / "b.jpg")
+
+    scanner = Scanner(photos_dir=class_dir, output_dir=output_dir, reporter=_DummyReporter())
+    scanner.scan()
+    assert photo_meta_path(output_dir).exists()
+    assert scanner.photo_meta.get(str(a)).orientation == 6
+    save_snapshot(output_dir, scanner.incremental_plan.snapshot)
+
+    reads = []
+    real = photo_meta_module.read_photo_meta
+    monkeypatch.setattr(photo_meta_module, "read_photo_meta", lambda p, *a: reads.append(p) or real(p, *a))
+
+    # 新增一张照片并修改 a：日期整体变化，只有 a 与 c 需要重新读文件头
+    _save_with_exif(class_dir / "2025-12-21" / "c.jpg")
+    _save_with_exif(a, size=(60, 30))
+    os.utime(a, (1, 1))
+    (class_dir / "2025-12-21" / "b.jpg").unlink()
+    scanner.scan()
+
+    assert sorted(Path(p).name for p in reads) == ["a.jpg", "c.jpg"]
+    reloaded = PhotoMetaIndex(output_dir, class_dir)
+    assert len(reloaded) == 2
+    assert reloaded.get(str(a)).width == 60
+
+
+def test_file_organizer_uses_photo_meta_date(tmp_path: Path, monkeypatch) -> None:
+    class_dir = tmp_path / "class_photos"
+    photo = class_dir / "misc" / "a.jpg"
+    photo.parent.mkdir(parents=True)
+    photo.write_bytes(b"x")
+
+    def _fail(_path):
+        raise AssertionError("不应再读取照片日期")
+
+    monkeypatch.setattr(file_organizer_module, "get_photo_date", _fail)
+    meta = {str(photo): PhotoMeta(date="2024-05-06", size=1, mtime=0)}
+    out = tmp_path / "output"
+    stats = FileOrganizer(output_dir=str(out)).organize_photos(class_dir, {str(photo): ["Alice"]}, [], photo_meta=meta)
+
+    assert stats["copied"] == 1
+    assert (out / "Alice" / "2024-05-06" / "a.jpg").exists()
@@ -0,0 +1,100 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from src.core.config_loader import ConfigLoader
+from src.core.prefetch import ReadAheadPrefetcher, locality_order
+
+
+def _photos(tmp_path: Path, count: int, size: int = 100) -> list:
+    paths = []
+    for i in range(count):
+        p = tmp_path / f"d{i % 2}" / f"img_{i:02d}.jpg"
+        p.parent.mkdir(exist_ok=True)
+        p.write_bytes(bytes([i]) * size)
+        paths.append(str(p))
+    return paths
+
+
+def test_locality_order_groups_directories_and_keeps_file_order() -> None:
+    paths = ["b/2.jpg", "a/1.jpg", "b/1.jpg", "a/3.jpg", "a/2.jpg"]
+    assert locality_order(paths) == ["a/1.jpg", "a/3.jpg", "a/2.jpg", "b/2.jpg", "b/1.jpg"]
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_prefetcher_serves_bytes_and_counts_hits(tmp_path: Path) -> None:
+    paths = _photos(tmp_path, 6)
+    with ReadAheadPrefetcher(paths, budget_bytes=10_000, readers=2) as prefetcher:
+        _wait_until(lambda: prefetcher.stats()["bytes"] == 600)
+        for i, p in enumerate(paths):
+            assert prefetcher.take(p) == bytes([i]) * 100
+        assert prefetcher.take(str(tmp_path / "missing.jpg")) is None
+        assert prefetcher.stats() == {"hits": 6, "misses": 1, "bytes": 600}
+
+
+def test_prefetcher_respects_byte_budget(tmp_path: Path) -> None:
+    paths = _photos(tmp_path, 20)
+    with ReadAheadPrefetcher(paths, budget_bytes=300, readers=3) as prefetcher:
+        for p in paths:
+            _wait_until(lambda: p in prefetcher._ready or p in prefetcher._reading)
+            with prefetcher._cond:
+                assert sum(len(b) for b in prefetcher._ready.values()) <= 300
+            assert prefetcher.take(p) is not None
+        assert prefetcher.stats()["hits"] == 20
+
+
+def test_prefetcher_skips_files_taken_before_they_were_read(tmp_path: Path) -> None:
+    paths = _photos(tmp_path, 4)
+    # 预算只够一张：读完第 1 张后读取线程停在第 2 张，第 3 张还没轮到
+    with ReadAheadPrefetcher(paths, budget_bytes=100, readers=1) as prefetcher:
+        _wait_until(lambda: paths[0] in prefetcher._ready)
+        assert prefetcher.take(paths[2]) is None  # 未命中：调用方按路径自己读，之后不再预读
+        assert prefetcher.take(paths[0]) is not None
+        _wait_until(lambda: paths[1] in prefetcher._ready)
+        assert prefetcher.take(paths[1]) is not None
+        _wait_until(lambda: paths[3] in prefetcher._ready)
+        assert prefetcher.take(paths[3]) is not None
+        assert prefetcher.stats() == {"hits": 3, "misses": 1, "bytes": 300}
+
+
+def test_prefetcher_close_stops_readers(tmp_path: Path) -> None:
+    paths = _photos(tmp_path, 50)
+    prefetcher = ReadAheadPrefetcher(paths, budget_bytes=200, readers=2)
+    prefetcher.take(paths[0])
+    prefetcher.close()
+    assert not [t for t in threading.enumerate() if t.name.startswith("prefetch-")]
+
+
+@pytest.mark.parametrize(
+    "env, expected",
+    [
+        ({}, {"enabled": True, "budget_mb": 64, "readers": 4}),
+        ({"SUNDAY_PHOTOS_PREFETCH": "0"}, {"enabled": False, "budget_mb": 64, "readers": 4}),
+        ({"SUNDAY_PHOTOS_PREFETCH_MB": "256", "SUNDAY_PHOTOS_PREFETCH_READERS": "oops"}, {"enabled": True, "budget_mb": 256, "readers": 4}),
+    ],
+)
+def test_config_loader_prefetch(tmp_path, monkeypatch, env, expected) -> None:
+    for name in ("SUNDAY_PHOTOS_PREFETCH", "SUNDAY_PHOTOS_PREFETCH_MB", "SUNDAY_PHOTOS_PREFETCH_READERS"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    loader = ConfigLoader(str(tmp_path / "config.json"))
+    assert loader.get_prefetch() == expected
+
+
+def test_prefetcher_on_read_runs_before_bytes_are_served(tmp_path: Path) -> None:
+    paths = _photos(tmp_path, 3)
+    seen = {}
+    with ReadAheadPrefetcher(paths, budget_bytes=10_000, readers=2, on_read=lambda p, data: seen.update({p: len(data)})) as prefetcher:
+        _wait_until(lambda: all(p in prefetcher._ready or p in prefetcher._reading for p in paths))
+        for p in paths:
+            assert prefetcher.take(p) is not None
+            assert seen[p] == 100
@@ -14,10 +14,10 @@ sys.path.insert(0, str(PROJECT_ROOT))
 @pytest.mark.parametrize("organizer_import", ["src.core.main", "core.main"])
 def test_unknown_face_clustering_disabled_does_not_run(tmp_path, monkeypatch, organizer_import: str):
     if organizer_import == "src.core.main":
-        import src.core.main as organizer_module
+        import src.core.pipeline as pipeline_module
         from src.core.main import SimplePhotoOrganizer
     else:
-        import core.main as organizer_module
+        import core.pipeline as pipeline_module
         from core.main import SimplePhotoOrganizer
 
     organizer = SimplePhotoOrganizer(input_dir=str(tmp_path / "input"), output_dir=str(tmp_path / "output"), log_dir=str(tmp_path / "logs"))
@@ -69,7 +69,7 @@ def test_unknown_face_clustering_disabled_does_not_run(tmp_path, monkeypatch, or
     organizer._config_loader = _Cfg()
     # 如果错误地触发 UnknownClustering，这里会直接失败
     monkeypatch.setattr(
-        organizer_module,
+        pipeline_module,
         "UnknownClustering",
         lambda *args, **kwargs: (_ for _ in ()).throw(AssertionError("UnknownClustering should not be instantiated")),
     )
@@ -89,10 +89,10 @@ def test_unknown_face_clustering_disabled_does_not_run(tmp_path, monkeypatch, or
 @pytest.mark.parametrize("organizer_import", ["src.core.main", "core.main"])
 def test_unknown_face_clustering_enabled_passes_threshold_and_min_cluster_size(tmp_path, monkeypatch, organizer_import: str):
     if organizer_import == "src.core.main":
-        import src.core.main as organizer_module
+        import src.core.pipeline as pipeline_module
         from src.core.main import SimplePhotoOrganizer
     else:
-        import core.main as organizer_module
+        import core.pipeline as pipeline_module
         from core.main import SimplePhotoOrganizer
 
     organizer = SimplePhotoOrganizer(input_dir=str(tmp_path / "input"), output_dir=str(tmp_path / "output"), log_dir=str(tmp_path / "logs"))
@@ -154,7 +154,7 @@ def test_unknown_face_clustering_enabled_passes_threshold_and_min_cluster_size(t
         def get_results(self):
             return {"Unknown_Person_1": ["u1.jpg"]}
 
-    monkeypatch.setattr(organizer_module, "UnknownClustering", FakeClustering)
+    monkeypatch.setattr(pipeline_module, "UnknownClustering", FakeClustering)
 
     captured = {}
 
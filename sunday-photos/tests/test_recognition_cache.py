@@ -56,14 +56,14 @@ def test_recognition_cache_hits_second_run(tmp_path: Path, monkeypatch, organize
 
 @pytest.mark.parametrize("organizer_import", ["src.core.main", "main"])
 def test_deleted_dates_invalidate_cache(tmp_path: Path, organizer_import: str):
-    """deleted_dates 应触发日期缓存文件删除。"""
+    """deleted_dates 应触发日期缓存条目删除。"""
 
     if organizer_import == "src.core.main":
         from src.core.main import SimplePhotoOrganizer
-        from src.core.recognition_cache import date_cache_path, save_date_cache_atomic
+        from src.core.recognition_cache import CacheKey, RecognitionCacheStore
     else:
         from main import SimplePhotoOrganizer
-        from core.recognition_cache import date_cache_path, save_date_cache_atomic
+        from core.recognition_cache import CacheKey, RecognitionCacheStore
 
     input_dir = tmp_path / "input"
     output_dir = tmp_path / "output"
@@ -71,11 +71,12 @@ def test_deleted_dates_invalidate_cache(tmp_path: Path, organizer_import: str):
 
     organizer = SimplePhotoOrganizer(input_dir=str(input_dir), output_dir=str(output_dir), log_dir=str(log_dir))
 
-    # 预先造一个缓存文件
+    # 预先造一条缓存
     date = "2024-12-21"
-    save_date_cache_atomic(output_dir, date, {"version": 1, "date": date, "params_fingerprint": "x", "entries": {}})
-    cache_file = date_cache_path(output_dir, date)
-    assert cache_file.exists()
+    key = CacheKey(date=date, rel_path=f"{date}/a.jpg", size=1, mtime=2)
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, "x", "x")
+        store.store_result(key, {"status": "success", "recognized_students": ["Alice"]})
 
     # 构造一个“仅删除同步”的增量计划，并让 scan_input_directory 不做真实扫描
     class _Plan:
@@ -91,7 +92,9 @@ def test_deleted_dates_invalidate_cache(tmp_path: Path, organizer_import: str):
 
     ok = organizer.run()
     assert ok is True
-    assert not cache_file.exists()
+    with RecognitionCacheStore(output_dir) as store:
+        store.prepare_date(date, "x", "x")
+        assert store.lookup_result(key) is None
 
 
 @pytest.mark.parametrize("organizer_import", ["src.core.main", "main"])
@@ -146,10 +149,10 @@ def test_recognition_cache_prunes_removed_files(tmp_path: Path, organizer_import
 
     if organizer_import == "src.core.main":
         from src.core.main import SimplePhotoOrganizer
-        from src.core.recognition_cache import date_cache_path
+        from src.core.recognition_cache import cache_db_path
     else:
         from main import SimplePhotoOrganizer
-        from core.recognition_cache import date_cache_path
+        from core.recognition_cache import cache_db_path
 
     input_dir = tmp_path / "input"
     class_dir = input_dir / "class_photos"
@@ -182,12 +185,296 @@ def test_recognition_cache_prunes_removed_files(tmp_path: Path, organizer_import
     organizer.face_recognizer = mock_recognizer
 
     organizer.process_photos([str(p1), str(p2)])
-    cache_file = date_cache_path(output_dir, date)
-    assert cache_file.exists()
+    db_file = cache_db_path(output_dir)
+    assert db_file.exists()
 
     # 只保留 p1：第二轮会保存缓存并剪枝掉 b.jpg
     organizer.process_photos([str(p1)])
-    data = __import__("json").loads(cache_file.read_text(encoding="utf-8"))
-    entries = data.get("entries") or {}
+    import sqlite3
+
+    conn = sqlite3.connect(str(db_file))
+    try:
+        entries = {r[0] for r in conn.execute("SELECT rel_path FROM entries WHERE date=?", (date,))}
+    finally:
+        conn.close()
     assert "2024-12-21/a.jpg" in entries
     assert "2024-12-21/b.jpg" not in entries
+
+
+def _detection(*embeddings):
+    import numpy as np
+
+    faces = [
+        {"location": [10, 60, 60, 10], "det_score": 0.9, "embedding": np.asarray(e, dtype=np.float32)}
+        for e in embeddings
+    ]
+    return {"detected_count": len(faces), "faces": faces}
+
+
+def test_recognize_cached_faces_rematches_without_detection():
+    import numpy as np
+    from src.core.face_recognizer import FaceRecognizer
+
+    fr = FaceRecognizer.__new__(FaceRecognizer)
+    fr._backend_engine = "insightface"
+    fr.known_encodings = [np.array([1.0, 0.0]), np.array([0.0, 1.0])]
+    fr.known_student_names = ["Alice", "Bob"]
+    fr.tolerance = 0.3
+
+    results = fr.recognize_cached_faces(
+        [
+            _detection([1.0, 0.05], [-1.0, 0.0]),
+            {"detected_count": 0, "faces": []},
+            _detection([0.05, 1.0]),
+        ]
+    )
+
+    assert results[0]["status"] == "success"
+    assert results[0]["recognized_students"] == ["Alice"]
+    assert results[0]["unknown_faces"] == 1 and len(results[0]["unknown_encodings"]) == 1
+    assert results[1]["status"] == "no_faces_detected"
+    assert results[2]["recognized_students"] == ["Bob"]
+
+    fr.tolerance = 0.0001
+    assert fr.recognize_cached_faces([_detection([1.0, 0.05])])[0]["status"] == "no_matches_found"
+
+
+@pytest.mark.parametrize("organizer_import", ["src.core.main", "main"])
+def test_tolerance_change_rematches_cached_faces(tmp_path: Path, organizer_import: str):
+    """tolerance 变化时应复用缓存的人脸特征重新匹配，而不是重新检测。"""
+
+    if organizer_import == "src.core.main":
+        from src.core.main import SimplePhotoOrganizer
+    else:
+        from main import SimplePhotoOrganizer
+
+    input_dir = tmp_path / "input"
+    date_dir = input_dir / "class_photos" / "2024-12-21"
+    date_dir.mkdir(parents=True, exist_ok=True)
+    p1 = date_dir / "a.jpg"
+    p1.write_bytes(b"not-empty-1")
+
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(input_dir), output_dir=str(tmp_path / "output"), log_dir=str(tmp_path / "logs")
+    )
+    organizer._organize_input_by_date = lambda: None
+
+    class _Recognizer:
+        tolerance = 0.6
+        min_face_size = 50
+        known_encodings = []
+        known_student_names = []
+        reference_fingerprint = "ref-1"
+
+        def __init__(self):
+            self.detect_calls = 0
+            self.rematched = []
+
+        def recognize_faces(self, image_path, return_details=False):
+            self.detect_calls += 1
+            return {
+                "status": "no_matches_found",
+                "message": "",
+                "recognized_students": [],
+                "total_faces": 1,
+                "unknown_faces": 1,
+                "detection": _detection([0.6, 0.8]),
+            }
+
+        def recognize_cached_faces(self, detections):
+            self.rematched.extend(detections)
+            return [{"status": "success", "message": "", "recognized_students": ["Alice"], "total_faces": 1}]
+
+    recognizer = _Recognizer()
+    organizer.face_recognizer = recognizer
+
+    organizer.process_photos([str(p1)])
+    assert recognizer.detect_calls == 1
+
+    recognizer.tolerance = 0.7
+    results, *_ = organizer.process_photos([str(p1)])
+    assert recognizer.detect_calls == 1
+    assert len(recognizer.rematched) == 1
+    assert results == {str(p1): ["Alice"]}
+
+    # 参考照变化同样只重新匹配
+    recognizer.reference_fingerprint = "ref-2"
+    organizer.process_photos([str(p1)])
+    assert recognizer.detect_calls == 1
+    assert len(recognizer.rematched) == 2
+
+
+def test_params_fingerprint_ignores_resize_long_edge_when_disabled(tmp_path: Path):
+    """resize_long_edge=0（未开启）时指纹与旧版本一致，升级后已有缓存继续有效。"""
+
+    import sqlite3
+
+    from src.core.main import SimplePhotoOrganizer
+    from src.core.recognition_cache import cache_db_path, compute_params_fingerprint
+
+    input_dir = tmp_path / "input"
+    date_dir = input_dir / "class_photos" / "2024-12-21"
+    date_dir.mkdir(parents=True, exist_ok=True)
+    p1 = date_dir / "a.jpg"
+    p1.write_bytes(b"not-empty-1")
+    output_dir = tmp_path / "output"
+
+    organizer = SimplePhotoOrganizer(input_dir=str(input_dir), output_dir=str(output_dir), log_dir=str(tmp_path / "logs"))
+    organizer._organize_input_by_date = lambda: None
+    recognizer = MagicMock()
+    recognizer.tolerance = 0.6
+    recognizer.min_face_size = 50
+    recognizer.resize_long_edge = 0
+    recognizer.reference_fingerprint = "ref-1"
+    recognizer.known_encodings = []
+    recognizer.known_student_names = []
+    recognizer.recognize_faces.return_value = {"status": "no_faces_detected", "recognized_students": []}
+    organizer.face_recognizer = recognizer
+
+    def _stored_fingerprint():
+        with sqlite3.connect(cache_db_path(output_dir)) as conn:
+            return conn.execute("SELECT params_fingerprint FROM dates WHERE date=?", ("2024-12-21",)).fetchone()[0]
+
+    organizer.process_photos([str(p1)])
+    assert _stored_fingerprint() == compute_params_fingerprint(
+        {"tolerance": 0.6, "min_face_size": 50, "reference_fingerprint": "ref-1"}
+    )
+
+    recognizer.resize_long_edge = 1600
+    organizer.process_photos([str(p1)])
+    assert _stored_fingerprint() == compute_params_fingerprint(
+        {"tolerance": 0.6, "min_face_size": 50, "resize_long_edge": 1600, "reference_fingerprint": "ref-1"}
+    )
+
+
+@pytest.mark.parametrize("organizer_import", ["src.core.main", "main"])
+def test_content_keys_survive_rename_and_dedupe_identical_photos(tmp_path: Path, organizer_import: str):
+    """同批重复照片只识别一次；改名/换文件夹后按内容指纹命中缓存。"""
+
+    if organizer_import == "src.core.main":
+        from src.core.main import SimplePhotoOrganizer
+    else:
+        from main import SimplePhotoOrganizer
+
+    input_dir = tmp_path / "input"
+    class_dir = input_dir / "class_photos"
+    day = class_dir / "2024-12-21"
+    day.mkdir(parents=True, exist_ok=True)
+    p1 = day / "a.jpg"
+    p2 = day / "a_copy.jpg"
+    p3 = day / "b.jpg"
+    p1.write_bytes(b"same-bytes")
+    p2.write_bytes(b"same-bytes")
+    p3.write_bytes(b"other-bytes")
+
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(input_dir), output_dir=str(tmp_path / "output"), log_dir=str(tmp_path / "logs")
+    )
+    organizer._organize_input_by_date = lambda: None
+
+    calls = []
+    mock_recognizer = MagicMock()
+    mock_recognizer.tolerance = 0.6
+    mock_recognizer.known_encodings = []
+    mock_recognizer.known_student_names = []
+
+    def _recognize(path, return_details=False):
+        calls.append(Path(path).name)
+        return {"status": "success", "message": "", "recognized_students": [Path(path).stem], "total_faces": 1}
+
+    mock_recognizer.recognize_faces.side_effect = _recognize
+    organizer.face_recognizer = mock_recognizer
+
+    results, *_ = organizer.process_photos([str(p1), str(p2), str(p3)])
+    assert sorted(calls) == ["a.jpg", "b.jpg"]
+    assert results[str(p2)] == ["a"]
+
+    # 文件夹改名（2024.12.21 → 同一日期）+ 文件改名
+    renamed_dir = class_dir / "2024.12.21"
+    day.rename(renamed_dir)
+    (renamed_dir / "b.jpg").rename(renamed_dir / "b_renamed.jpg")
+    calls.clear()
+    results, *_ = organizer.process_photos([str(p) for p in sorted(renamed_dir.iterdir())])
+    assert calls == []
+    assert results[str(renamed_dir / "b_renamed.jpg")] == ["b"]
+
+
+class _StagedRecognizer:
+    """分开解码/推理阶段的识别器：记录每张照片解码时是否拿到了已读入内存的字节。"""
+
+    tolerance = 0.6
+    min_face_size = 50
+    resize_long_edge = 0
+    reference_fingerprint = "ref-1"
+    known_encodings = []
+    known_student_names = []
+
+    def __init__(self):
+        self.loaded = []
+
+    def load_for_recognition(self, image_path, data=None):
+        self.loaded.append((Path(image_path).name, data is not None))
+        return (data if data is not None else Path(image_path).read_bytes()), 1.0
+
+    def recognize_loaded(self, image_path, image, scale, return_details=False):
+        return {"status": "success", "message": "", "recognized_students": [Path(image_path).stem], "total_faces": 1}
+
+    def recognition_error(self, image_path, error, return_details=False):
+        return {"status": "error", "message": str(error), "recognized_students": []}
+
+
+@pytest.mark.parametrize("prefetch", ["1", "0"])
+def test_content_full_hash_reuses_bytes_read_for_recognition(tmp_path: Path, monkeypatch, prefetch: str):
+    """全文件哈希在识别读入照片字节时顺带计算（预读线程或解码线程），写缓存时不再按路径读一遍。"""
+
+    import src.core.pipeline as pipeline_module
+    from src.core.main import SimplePhotoOrganizer
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_PREFETCH", prefetch)
+    monkeypatch.setenv("SUNDAY_PHOTOS_NO_PARALLEL", "1")
+    reread = []
+    full_content_hash = pipeline_module.full_content_hash
+    monkeypatch.setattr(
+        pipeline_module, "full_content_hash", lambda path: reread.append(Path(path).name) or full_content_hash(path)
+    )
+
+    input_dir = tmp_path / "input"
+    day = input_dir / "class_photos" / "2024-12-21"
+    day.mkdir(parents=True, exist_ok=True)
+    (day / "a.jpg").write_bytes(b"bytes-a" * 100)
+    (day / "b.jpg").write_bytes(b"bytes-b" * 100)
+
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(input_dir), output_dir=str(tmp_path / "output"), log_dir=str(tmp_path / "logs")
+    )
+    organizer._organize_input_by_date = lambda: None
+    recognizer = _StagedRecognizer()
+    organizer.face_recognizer = recognizer
+
+    organizer.process_photos([str(day / "a.jpg"), str(day / "b.jpg")])
+    assert reread == []
+    assert sorted(recognizer.loaded) == [("a.jpg", True), ("b.jpg", True)]
+
+    # 写入的全文件哈希可用于确认内容命中：改名后不再识别（查找时为确认候选计算新路径的哈希）
+    (day / "a.jpg").rename(day / "a_renamed.jpg")
+    recognizer.loaded.clear()
+    results, *_ = organizer.process_photos([str(day / "a_renamed.jpg"), str(day / "b.jpg")])
+    assert recognizer.loaded == []
+    assert reread == ["a_renamed.jpg"]
+    assert results[str(day / "a_renamed.jpg")] == ["a"]
+
+
+def test_content_cache_keys_switch(tmp_path: Path, monkeypatch):
+    import json
+
+    from src.core.config_loader import ConfigLoader
+
+    monkeypatch.delenv("SUNDAY_PHOTOS_CONTENT_CACHE_KEYS", raising=False)
+    cfg = tmp_path / "config.json"
+    assert ConfigLoader(str(cfg)).get_content_cache_keys() is True
+
+    cfg.write_text(json.dumps({"content_cache_keys": False}), encoding="utf-8")
+    assert ConfigLoader(str(cfg)).get_content_cache_keys() is False
+
+    monkeypatch.setenv("SUNDAY_PHOTOS_CONTENT_CACHE_KEYS", "1")
+    assert ConfigLoader(str(cfg)).get_content_cache_keys() is True
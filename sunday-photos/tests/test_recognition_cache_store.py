@@ -0,0 +1,160 @@
+import json
+
+import numpy as np
+
+from src.core.recognition_cache import (
+    CacheKey,
+    RecognitionCacheStore,
+    cache_db_path,
+    date_cache_path,
+    invalidate_date_cache,
+)
+
+DATE = "2024-12-21"
+
+
+def _key(name="a.jpg", size=10, mtime=20):
+    return CacheKey(date=DATE, rel_path=f"{DATE}/{name}", size=size, mtime=mtime)
+
+
+def _detection(*embeddings):
+    faces = [
+        {"location": [1, 40, 40, 1], "det_score": 0.8, "embedding": np.asarray(e, dtype=np.float32)}
+        for e in embeddings
+    ]
+    return {"detected_count": len(faces), "faces": faces}
+
+
+def test_store_roundtrip_packs_vectors(tmp_path):
+    unknown = np.array([0.0, 1.0, 0.5], dtype=np.float32)
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        store.store_result(
+            _key(),
+            {
+                "status": "no_matches_found",
+                "recognized_students": [],
+                "unknown_encodings": [unknown],
+                "detection": _detection([1.0, 0.0, 0.0], unknown),
+            },
+        )
+
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        result = store.lookup_result(_key())
+        detection = store.lookup_detection(_key())
+        assert store.lookup_result(_key(size=11)) is None
+
+    assert result["status"] == "no_matches_found"
+    np.testing.assert_array_equal(result["unknown_encodings"][0], unknown)
+    assert detection["detected_count"] == 2
+    assert [f["location"] for f in detection["faces"]] == [[1, 40, 40, 1], [1, 40, 40, 1]]
+    np.testing.assert_array_equal(detection["faces"][1]["embedding"], unknown)
+
+
+def test_fingerprint_changes_drop_layers(tmp_path):
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        store.store_result(_key(), {"status": "success", "recognized_students": ["A"], "detection": _detection([1.0, 0.0])})
+
+        store.prepare_date(DATE, "p2", "d1")
+        assert store.lookup_result(_key()) is None
+        assert store.lookup_detection(_key()) is not None
+
+        # 重新匹配的结果不带 detection：检测层应保留
+        store.store_result(_key(), {"status": "success", "recognized_students": ["B"]})
+        assert store.lookup_result(_key())["recognized_students"] == ["B"]
+        assert store.lookup_detection(_key()) is not None
+
+        store.prepare_date(DATE, "p2", "d2")
+        assert store.lookup_detection(_key()) is None
+
+
+def test_legacy_json_is_migrated_and_removed(tmp_path):
+    """旧版本写出的 v1 JSON（无 detection_fingerprint/detection）迁移后仍按 params_fingerprint 命中。"""
+    legacy = date_cache_path(tmp_path, DATE)
+    legacy.parent.mkdir(parents=True)
+    v1 = {
+        "version": 1,
+        "date": DATE,
+        "params_fingerprint": "p1",
+        "entries": {_key().rel_path: {"size": 10, "mtime": 20, "result": {"status": "success", "recognized_students": ["A"]}}},
+    }
+    legacy.write_text(json.dumps(v1, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        assert store.lookup_result(_key())["recognized_students"] == ["A"]
+        assert store.lookup_detection(_key()) is None  # v1 没有检测层
+    assert not legacy.exists()
+
+    # 之后按正常指纹规则失效
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p2", "d1")
+        assert store.lookup_result(_key()) is None
+
+
+def test_corrupt_database_is_rebuilt(tmp_path):
+    db = cache_db_path(tmp_path)
+    db.parent.mkdir(parents=True)
+    db.write_bytes(b"definitely not sqlite" * 100)
+
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        store.store_result(_key(), {"status": "no_faces_detected", "recognized_students": []})
+        assert store.lookup_result(_key())["status"] == "no_faces_detected"
+
+
+def test_invalidate_date_cache_removes_rows(tmp_path):
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        store.store_result(_key(), {"status": "success", "recognized_students": ["A"]})
+
+    invalidate_date_cache(tmp_path, DATE)
+
+    with RecognitionCacheStore(tmp_path) as store:
+        store.prepare_date(DATE, "p1", "d1")
+        assert store.lookup_result(_key()) is None
+
+
+def _content_for(path):
+    from src.core.recognition_cache import ContentHash, full_content_hash, quick_content_hash
+
+    return ContentHash(quick_content_hash(path, path.stat().st_size), full_content_hash(path))
+
+
+def test_adopt_by_content_confirms_with_full_hash(tmp_path):
+    from src.core.recognition_cache import CONTENT_HASH_BLOCK, ContentHash, full_content_hash, quick_content_hash
+
+    block = CONTENT_HASH_BLOCK
+    original = tmp_path / "a.jpg"
+    original.write_bytes(b"H" * block + b"middle-1" + b"T" * block)
+    renamed = tmp_path / "renamed.jpg"
+    renamed.write_bytes(original.read_bytes())
+    lookalike = tmp_path / "lookalike.jpg"
+    lookalike.write_bytes(b"H" * block + b"middle-2" + b"T" * block)
+    size = original.stat().st_size
+
+    def _adopt(store, path, name, params="p1"):
+        content = ContentHash(quick_content_hash(path, size))
+        return store.adopt_by_content(_key(name, size=size, mtime=99), content, lambda: full_content_hash(path), params, "d1")
+
+    with RecognitionCacheStore(tmp_path / "out") as store:
+        store.prepare_date(DATE, "p1", "d1")
+        store.store_result(
+            _key("a.jpg", size=size),
+            {"status": "success", "recognized_students": ["A"], "detection": _detection([1.0, 0.0])},
+            _content_for(original),
+        )
+
+        assert quick_content_hash(lookalike, size) == quick_content_hash(original, size)
+        assert _adopt(store, lookalike, "lookalike.jpg") is False
+
+        assert _adopt(store, renamed, "renamed.jpg") is True
+        assert store.lookup_result(_key("renamed.jpg", size=size, mtime=99))["recognized_students"] == ["A"]
+
+        # 参数指纹不同：只复用检测层
+        store.prepare_date(DATE, "p2", "d1")
+        assert _adopt(store, renamed, "copy2.jpg", params="p2") is True
+        assert store.lookup_result(_key("copy2.jpg", size=size, mtime=99)) is None
+        assert store.lookup_detection(_key("copy2.jpg", size=size, mtime=99)) is not None
@@ -0,0 +1,97 @@
+import json
+import os
+import signal
+from pathlib import Path
+
+import pytest
+
+from src.core.main import SimplePhotoOrganizer
+from src.core.run_journal import GracefulInterrupt, RunJournal, run_journal_path
+from tests.test_e2e_offline_pipeline import FakeServiceContainer, _write_min_config
+
+
+def _organizer(ds, container) -> SimplePhotoOrganizer:
+    config_path = ds.input_dir.parent / "config.json"
+    _write_min_config(config_path)
+    return SimplePhotoOrganizer(
+        input_dir=str(ds.input_dir),
+        output_dir=str(ds.output_dir),
+        log_dir=str(ds.log_dir),
+        service_container=container,
+        config_file=str(config_path),
+    )
+
+
+def _count_calls(container, calls, interrupt_on=None):
+    recognizer = container.get_face_recognizer()
+    recognize = recognizer.recognize_faces
+
+    def _recognize(photo_path, return_details=True):
+        rel = Path(photo_path).relative_to(Path(photo_path).parents[1]).as_posix()
+        if rel == interrupt_on:
+            raise KeyboardInterrupt
+        calls.append(rel)
+        return recognize(photo_path, return_details)
+
+    recognizer.recognize_faces = _recognize
+
+
+def test_interrupted_run_resumes_only_unfinished_photos(offline_generated_dataset) -> None:
+    ds = offline_generated_dataset
+
+    calls = []
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    _count_calls(container, calls, interrupt_on="2025-12-22/img_01.jpg")
+    with pytest.raises(KeyboardInterrupt):
+        _organizer(ds, container).run()
+
+    assert calls == ["2025-12-21/img_01.jpg", "2025-12-21/img_02.jpg"]
+    journal = json.loads(run_journal_path(ds.output_dir).read_text(encoding="utf-8"))
+    assert journal["dates"] == ["2025-12-21", "2025-12-22"]
+    assert (journal["phase"], journal["done"], journal["total"]) == ("recognize", 2, 4)
+
+    # 再次运行：已完成的照片直接命中缓存，只识别剩下的
+    calls.clear()
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    _count_calls(container, calls)
+    assert _organizer(ds, container).run() is True
+    assert calls == ["2025-12-22/img_01.jpg", "2025-12-22/img_02.jpg"]
+    assert (ds.output_dir / "Alice" / "2025-12-21" / "img_01.jpg").exists()
+    assert (ds.output_dir / "Bob" / "2025-12-22" / "img_01.jpg").exists()
+    assert not run_journal_path(ds.output_dir).exists()
+
+
+def test_dates_interrupted_while_sorting_are_rebuilt(offline_generated_dataset) -> None:
+    ds = offline_generated_dataset
+    assert _organizer(ds, FakeServiceContainer(ds.input_dir, ds.output_dir)).run() is True
+
+    # 模拟上次运行在整理输出时被杀：清单之外留下了半成品副本，快照没来得及保存
+    stray = ds.output_dir / "Alice" / "2025-12-21" / "img_01_1.jpg"
+    stray.write_bytes(b"partial")
+    journal = RunJournal(ds.output_dir)
+    journal.begin(["2025-12-21"], total=2)
+    journal.set_phase("sort")
+
+    calls = []
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    _count_calls(container, calls)
+    organizer = _organizer(ds, container)
+    assert organizer.run() is True
+
+    assert calls == []  # 识别全部命中缓存
+    assert organizer._incremental_plan.resumed_dates == {"2025-12-21"}
+    assert not stray.exists()
+    assert sorted(p.name for p in (ds.output_dir / "Alice" / "2025-12-21").iterdir()) == ["img_01.jpg"]
+    assert not run_journal_path(ds.output_dir).exists()
+
+
+@pytest.mark.skipif(not hasattr(signal, "SIGINT") or os.name == "nt", reason="需要向自身发送 SIGINT")
+def test_first_ctrl_c_requests_stop_second_interrupts() -> None:
+    with GracefulInterrupt() as interrupt:
+        os.kill(os.getpid(), signal.SIGINT)
+        assert interrupt.requested
+        with pytest.raises(KeyboardInterrupt):
+            os.kill(os.getpid(), signal.SIGINT)
+    with pytest.raises(KeyboardInterrupt):
+        interrupt.check()
+    assert signal.getsignal(signal.SIGINT) is signal.default_int_handler
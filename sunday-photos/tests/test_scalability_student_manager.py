@@ -9,6 +9,8 @@
     - FaceRecognizer 能在 mock 的 face_recognition 接口下稳定完成匹配流程
 - 由于底层识别函数被完整 mock，本测试不需要真实可解码的图片文件；
     只需要“文件存在且非空”以通过上层的输入校验。
+- 人脸后端为以 face_recognition stub 为底的 dlib 兼容层（conftest.stub_face_backend），
+    匹配走真实的 KnownFaceMatcher：每位同学的参考编码各不相同，课堂照片里的人脸与 Student01 一致。
 """
 import os
 import sys
@@ -19,6 +21,7 @@ from pathlib import Path
 from unittest.mock import patch
 
 import numpy as np
+import pytest
 
 # 确保可以导入src模块
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -43,6 +46,7 @@ def _create_dummy_photos(base_dir: Path, student_count: int = 30) -> None:
     (class_photos / "group.jpg").write_bytes(b"fake-class-photo")
 
 
+@pytest.mark.usefixtures("stub_face_backend")
 class StudentManagerScalabilityTests(unittest.TestCase):
     def setUp(self):
         self.temp_dir = Path(tempfile.mkdtemp(prefix="scalability_input_"))
@@ -52,31 +56,28 @@ class StudentManagerScalabilityTests(unittest.TestCase):
         if self.temp_dir.exists():
             shutil.rmtree(self.temp_dir)
 
-    def _mock_recognition_defaults(self, mock_load, mock_locs, mock_enc, mock_cmp, mock_dist):
-        mock_load.return_value = np.zeros((128, 128, 3))
-        mock_locs.return_value = [(0, 80, 120, 0)]  # 满足MIN_FACE_SIZE
-        mock_enc.return_value = [np.zeros((128,))]
-
-        def _fake_compare_faces(known_encodings, face_encoding, tolerance):
-            # 标记第一位同学匹配，其他为False，确保匹配路径可控
-            return [True] + [False] * (len(known_encodings) - 1)
+    def _mock_recognition_defaults(self, mock_load, mock_locs, mock_enc):
+        def _fake_load_image_file(path):
+            # 参考照 StudentNN/ref.jpg -> 像素值 NN；课堂照片 -> 1（即 Student01）
+            folder = Path(path).parent.name
+            index = int(folder[len("Student"):]) if folder.startswith("Student") else 1
+            return np.full((128, 128, 3), index, dtype=np.uint8)
 
-        def _fake_face_distance(known_encodings, face_encoding):
-            if not known_encodings:
-                return np.array([])
-            # 递增距离保证argmin为第一个同学
-            return np.linspace(0.1, 1.0, num=len(known_encodings))
+        def _fake_face_encodings(image, locations):
+            # 编码只取决于像素值：同学之间相距 ≥ 1.0，远大于 tolerance
+            encoding = np.zeros((128,))
+            encoding[0] = float(image[0, 0, 0])
+            return [encoding for _ in locations]
 
-        mock_cmp.side_effect = _fake_compare_faces
-        mock_dist.side_effect = _fake_face_distance
+        mock_load.side_effect = _fake_load_image_file
+        mock_locs.return_value = [(0, 80, 120, 0)]  # 满足MIN_FACE_SIZE
+        mock_enc.side_effect = _fake_face_encodings
 
-    @patch("face_recognizer.face_recognition.face_distance")
-    @patch("face_recognizer.face_recognition.compare_faces")
-    @patch("face_recognizer.face_recognition.face_encodings")
-    @patch("face_recognizer.face_recognition.face_locations")
-    @patch("face_recognizer.face_recognition.load_image_file")
-    def test_student_manager_handles_30_students(self, mock_load, mock_locs, mock_enc, mock_cmp, mock_dist):
-        self._mock_recognition_defaults(mock_load, mock_locs, mock_enc, mock_cmp, mock_dist)
+    @patch("face_recognition.face_encodings")
+    @patch("face_recognition.face_locations")
+    @patch("face_recognition.load_image_file")
+    def test_student_manager_handles_30_students(self, mock_load, mock_locs, mock_enc):
+        self._mock_recognition_defaults(mock_load, mock_locs, mock_enc)
 
         manager = StudentManager(input_dir=self.temp_dir)
         self.assertEqual(len(manager.get_student_names()), 30)
@@ -92,13 +93,11 @@ class StudentManagerScalabilityTests(unittest.TestCase):
         self.assertGreaterEqual(result.get("total_faces", 0), 1)
         self.assertIn("Student01", result.get("recognized_students", []))
 
-    @patch("face_recognizer.face_recognition.face_distance")
-    @patch("face_recognizer.face_recognition.compare_faces")
-    @patch("face_recognizer.face_recognition.face_encodings")
-    @patch("face_recognizer.face_recognition.face_locations")
-    @patch("face_recognizer.face_recognition.load_image_file")
-    def test_update_student_encoding_with_mock(self, mock_load, mock_locs, mock_enc, mock_cmp, mock_dist):
-        self._mock_recognition_defaults(mock_load, mock_locs, mock_enc, mock_cmp, mock_dist)
+    @patch("face_recognition.face_encodings")
+    @patch("face_recognition.face_locations")
+    @patch("face_recognition.load_image_file")
+    def test_update_student_encoding_with_mock(self, mock_load, mock_locs, mock_enc):
+        self._mock_recognition_defaults(mock_load, mock_locs, mock_enc)
 
         manager = StudentManager(input_dir=self.temp_dir)
         recognizer = FaceRecognizer(manager)
@@ -0,0 +1,89 @@
+from pathlib import Path
+
+from src.core.incremental_state import (
+    build_class_photos_snapshot,
+    save_snapshot,
+    scan_class_photos,
+)
+from src.core.scanner import Scanner
+
+
+class _DummyReporter:
+    def __init__(self) -> None:
+        self.messages: list[tuple[str, str]] = []
+
+    def log_info(self, level: str, message: str) -> None:
+        self.messages.append((level, message))
+
+    def log_rule(self) -> None:
+        pass
+
+
+def _write(path: Path, data: bytes = b"x") -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return path
+
+
+def test_scan_builds_snapshot_and_work_list_in_one_pass(tmp_path: Path) -> None:
+    class_dir = tmp_path / "class_photos"
+    _write(class_dir / "2025-12-21" / "a.jpg")
+    _write(class_dir / "2025-12-21" / "sub" / "b.png")
+    _write(class_dir / "2025-12-21" / "empty.jpg", b"")
+    _write(class_dir / "2025-12-21" / "._a.jpg")
+    _write(class_dir / "2025-12-21" / "notes.txt")
+    _write(class_dir / "2025.12.22" / "c.jpg")
+    _write(class_dir / "2025" / "12" / "23" / "d.jpg")
+    _write(class_dir / "misc" / "ignored.jpg")
+    _write(class_dir / "loose.jpg")
+
+    scan = scan_class_photos(class_dir)
+    dates = scan.snapshot["dates"]
+
+    assert sorted(dates) == ["2025-12-21", "2025-12-22", "2025-12-23"]
+    assert [e["path"] for e in dates["2025-12-21"]["files"]] == ["a.jpg", "sub/b.png"]
+    assert [e["path"] for e in dates["2025-12-22"]["files"]] == ["2025.12.22/c.jpg"]
+    assert dates["2025-12-23"]["source_dirs"] == ["2025/12/23"]
+    assert [e["path"] for e in dates["2025-12-23"]["files"]] == ["2025/12/23/d.jpg"]
+    assert dates["2025-12-21"]["files"][0]["size"] == 1
+
+    assert scan.files_by_date["2025-12-21"] == [
+        str(class_dir / "2025-12-21" / "a.jpg"),
+        str(class_dir / "2025-12-21" / "sub" / "b.png"),
+    ]
+    assert scan.root_photos == [str(class_dir / "loose.jpg")]
+    assert scan.photo_count == 5
+
+    rebuilt = build_class_photos_snapshot(class_dir)
+    assert rebuilt["dates"] == dates
+
+
+def test_scanner_returns_only_changed_dates_and_reuses_prescan(tmp_path: Path) -> None:
+    class_dir = tmp_path / "class_photos"
+    output_dir = tmp_path / "output"
+    _write(class_dir / "2025-12-21" / "a.jpg")
+    _write(class_dir / "2025-12-22" / "b.jpg")
+
+    scanner = Scanner(photos_dir=class_dir, output_dir=output_dir, reporter=_DummyReporter())
+    assert sorted(scanner.scan()) == sorted(
+        [str(class_dir / "2025-12-21" / "a.jpg"), str(class_dir / "2025-12-22" / "b.jpg")]
+    )
+    save_snapshot(output_dir, scanner.incremental_plan.snapshot)
+
+    _write(class_dir / "2025-12-22" / "c.jpg")
+    prescan = scan_class_photos(class_dir)
+    scanner.prescan = prescan
+    assert scanner.scan() == [str(class_dir / "2025-12-22" / "b.jpg"), str(class_dir / "2025-12-22" / "c.jpg")]
+    assert scanner.incremental_plan.snapshot is prescan.snapshot
+    assert scanner.prescan is None
+
+
+def test_scanner_discards_prescan_when_root_photos_are_archived(tmp_path: Path, monkeypatch) -> None:
+    class_dir = tmp_path / "class_photos"
+    _write(class_dir / "loose.jpg")
+    monkeypatch.setattr("src.core.scanner.get_photo_date", lambda _p: "2025-12-27")
+
+    scanner = Scanner(photos_dir=class_dir, output_dir=tmp_path / "output", reporter=_DummyReporter())
+    scanner.prescan = scan_class_photos(class_dir)
+
+    assert scanner.scan() == [str(class_dir / "2025-12-27" / "loose.jpg")]
@@ -0,0 +1,113 @@
+import threading
+import time
+
+import pytest
+
+import src.core.parallel_recognizer as parallel_module
+from src.core import staged_executor
+from src.core.config_loader import ConfigLoader
+from src.core.staged_executor import auto_stage_sizes, decode_ahead
+
+
+def test_auto_stage_sizes_derives_from_infer_workers(monkeypatch) -> None:
+    monkeypatch.setattr(staged_executor.os, "cpu_count", lambda: 8)
+    assert auto_stage_sizes(1) == (1, 2)
+    assert auto_stage_sizes(6) == (3, 9)
+    assert auto_stage_sizes(30) == (4, 34)  # 解码线程不超过 CPU 核数的一半
+    assert auto_stage_sizes(6, decode_workers=2, queue_depth=3) == (2, 3)
+
+
+def test_decode_ahead_yields_every_path_and_passes_errors() -> None:
+    def _decode(path):
+        if path == "bad.jpg":
+            raise OSError("truncated")
+        return path.upper()
+
+    paths = ["a.jpg", "bad.jpg", "b.jpg", "c.jpg"]
+    out = {path: (decoded, error) for path, decoded, error in decode_ahead(paths, _decode, decode_workers=2)}
+    assert sorted(out) == sorted(paths)
+    assert out["a.jpg"] == ("A.JPG", None)
+    decoded, error = out["bad.jpg"]
+    assert decoded is None and isinstance(error, OSError)
+
+
+def test_decode_ahead_applies_backpressure() -> None:
+    lock = threading.Lock()
+    decoded = []
+
+    def _decode(path):
+        with lock:
+            decoded.append(path)
+        return path
+
+    frames = decode_ahead([f"p{i}.jpg" for i in range(50)], _decode, decode_workers=2, queue_depth=3)
+    consumed = 0
+    for _item in frames:
+        consumed += 1
+        time.sleep(0.02)  # 推理比解码慢：解码线程应停在队列满处
+        with lock:
+            # 已解码未取走的 ≤ 队列深度 + 每个解码线程手上的一张（+ 本轮刚产出的一张）
+            assert len(decoded) - consumed <= 3 + 2 + 1
+    assert consumed == 50
+
+
+def test_decode_ahead_stops_decoders_when_closed() -> None:
+    frames = decode_ahead((f"p{i}.jpg" for i in range(1000)), lambda p: p, decode_workers=2, queue_depth=2)
+    next(frames)
+    frames.close()
+    assert not [t for t in threading.enumerate() if t.name.startswith("decode-")]
+
+
+def test_thread_strategy_runs_decode_and_infer_in_separate_stages(monkeypatch) -> None:
+    # 其他用例（run.py --no-parallel）可能遗留该变量，会让 parallel_recognize 直接走串行
+    monkeypatch.delenv("SUNDAY_PHOTOS_NO_PARALLEL", raising=False)
+    monkeypatch.setenv("SUNDAY_PHOTOS_PARALLEL_STRATEGY", "threads")
+    monkeypatch.setattr(parallel_module, "init_worker", lambda *args, **kwargs: None)
+    threads = {"decode": set(), "infer": set()}
+
+    def _decode(path, data=None):
+        threads["decode"].add(threading.current_thread().name)
+        if path == "bad.jpg":
+            raise OSError("truncated")
+        return path, 1.0, parallel_module.SpanRecorder()
+
+    def _infer(path, image, scale, spans):
+        threads["infer"].add(threading.current_thread().name)
+        return path, {"status": "no_faces_detected", "recognized_students": [], "total_faces": 0}
+
+    monkeypatch.setattr(parallel_module, "_decode_for_recognition", _decode)
+    monkeypatch.setattr(parallel_module, "_infer_decoded", _infer)
+    photos = [f"p{i}.jpg" for i in range(20)] + ["bad.jpg"]
+    results = dict(
+        parallel_module.parallel_recognize(
+            photos,
+            known_encodings=[],
+            known_names=[],
+            tolerance=0.6,
+            min_face_size=50,
+            workers=2,
+            chunk_size=1,
+            decode_ahead={"decode_workers": 1, "queue_depth": 2},
+        )
+    )
+    assert sorted(results) == sorted(photos)
+    assert results["bad.jpg"]["status"] == "error"
+    assert threads["decode"] == {"decode-0"}
+    assert threads["infer"] and all(name.startswith("infer") for name in threads["infer"])
+
+
+@pytest.mark.parametrize(
+    "env, expected",
+    [
+        ({}, {"enabled": True, "decode_workers": 0, "queue_depth": 0}),
+        ({"SUNDAY_PHOTOS_DECODE_AHEAD": "0"}, {"enabled": False, "decode_workers": 0, "queue_depth": 0}),
+        ({"SUNDAY_PHOTOS_DECODE_WORKERS": "3", "SUNDAY_PHOTOS_DECODE_QUEUE": "oops"}, {"enabled": True, "decode_workers": 3, "queue_depth": 0}),
+    ],
+)
+def test_config_loader_decode_ahead(tmp_path, monkeypatch, env, expected) -> None:
+    for name in ("SUNDAY_PHOTOS_DECODE_AHEAD", "SUNDAY_PHOTOS_DECODE_WORKERS", "SUNDAY_PHOTOS_DECODE_QUEUE"):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    loader = ConfigLoader(str(tmp_path / "config.json"))
+    assert loader.get_decode_ahead() == expected
@@ -0,0 +1,100 @@
+import json
+from pathlib import Path
+
+from src.core.main import SimplePhotoOrganizer
+from src.core.utils import tracing
+from src.core.utils.tracing import TRACE_KEY, SpanRecorder, Tracer, format_summary_table, prune_trace_files, trace_span
+from tests.test_e2e_offline_pipeline import FakeServiceContainer
+
+
+def test_summary_percentiles_and_chrome_trace_format(tmp_path: Path) -> None:
+    tracer = Tracer()
+    for ms in range(1, 21):
+        tracer.record("decode", 1_000 * ms, 1_000 * ms, cat="photo")
+    tracer.record("scan", 0, 5_000)
+
+    summary = tracer.summary()
+    assert summary["decode"] == {"count": 20, "total_ms": 210.0, "p50_ms": 10.0, "p95_ms": 19.0, "max_ms": 20.0}
+    assert summary["scan"]["p95_ms"] == 5.0
+    assert format_summary_table(summary)[1].startswith("decode")
+
+    # 子进程记录的片段随结果带回，合并后归到 worker 进程
+    recorder = SpanRecorder()
+    with recorder.span("detect_embed"):
+        pass
+    payload = dict(recorder.as_payload(), pid=tracer.pid + 1)
+    tracer.add_remote(payload, photo="a.jpg")
+    tracer.add_remote(None)
+
+    data = json.loads(tracer.write_chrome_trace(tmp_path / "trace.json").read_text(encoding="utf-8"))
+    events = data["traceEvents"]
+    assert {e["args"]["name"] for e in events if e["ph"] == "M"} == {"main", "worker"}
+    remote = [e for e in events if e["name"] == "detect_embed"]
+    assert remote[0]["pid"] == tracer.pid + 1 and remote[0]["args"] == {"photo": "a.jpg"}
+    assert all({"ts", "dur", "pid", "tid"} <= e.keys() for e in events if e["ph"] == "X")
+
+
+def test_trace_span_is_noop_when_inactive_and_caps_events() -> None:
+    assert tracing.get_tracer() is None
+    with trace_span("scan"):
+        pass
+
+    tracer = tracing.start_tracing(max_events=2)
+    try:
+        for _ in range(3):
+            with trace_span("copy", cat="photo"):
+                pass
+    finally:
+        tracing.stop_tracing()
+    assert tracer.summary()["copy"]["count"] == 3
+    assert tracer.dropped == 1
+
+
+def test_prune_keeps_most_recent(tmp_path: Path) -> None:
+    for stamp in ("20250101_000000", "20250102_000000", "20250103_000000"):
+        (tmp_path / f"trace_{stamp}.json").write_text("{}", encoding="utf-8")
+    prune_trace_files(tmp_path, 2)
+    assert sorted(p.name for p in tmp_path.glob("trace_*.json")) == ["trace_20250102_000000.json", "trace_20250103_000000.json"]
+
+
+def test_run_writes_trace_and_stage_timings(offline_generated_dataset, monkeypatch) -> None:
+    ds = offline_generated_dataset
+    monkeypatch.setenv("SUNDAY_PHOTOS_TRACE", "1")
+    config_path = ds.input_dir.parent / "config.json"
+    config_path.write_text(
+        json.dumps({"parallel_recognition": {"enabled": False}, "unknown_face_clustering": {"enabled": False}}),
+        encoding="utf-8",
+    )
+
+    container = FakeServiceContainer(ds.input_dir, ds.output_dir)
+    recognize = container.get_face_recognizer().recognize_faces
+
+    def _with_trace(photo_path, return_details=True):
+        result = dict(recognize(photo_path, return_details))
+        recorder = SpanRecorder()
+        with recorder.span("decode"):
+            pass
+        result[TRACE_KEY] = recorder.as_payload()
+        return result
+
+    monkeypatch.setattr(container.get_face_recognizer(), "recognize_faces", _with_trace)
+    organizer = SimplePhotoOrganizer(
+        input_dir=str(ds.input_dir),
+        output_dir=str(ds.output_dir),
+        log_dir=str(ds.log_dir),
+        service_container=container,
+        config_file=str(config_path),
+    )
+    assert organizer.run() is True
+    assert tracing.get_tracer() is None
+
+    timings = organizer.last_run_report["pipeline_stats"]["stage_timings"]
+    assert {"scan", "recognize", "sort", "decode", "copy"} <= set(timings)
+    trace_files = list(Path(ds.log_dir).glob("trace_*.json"))
+    assert len(trace_files) == 1
+    names = {e["name"] for e in json.loads(trace_files[0].read_text(encoding="utf-8"))["traceEvents"]}
+    assert {"scan", "decode", "copy"} <= names
+
+    # 识别缓存中不应留下追踪数据
+    cached = [p for p in Path(ds.output_dir, ".state").rglob("*") if p.is_file()]
+    assert not any(TRACE_KEY.encode() in p.read_bytes() for p in cached)
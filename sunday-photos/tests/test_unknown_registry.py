@@ -0,0 +1,173 @@
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.core.clustering import KnnGraphClustering, UnknownClustering
+from src.core.pipeline import Pipeline
+from src.core.unknown_registry import UnknownPersonRegistry, forget_unknown_person_dates, unknown_persons_path
+
+_RNG = np.random.default_rng(11)
+_PEOPLE = {name: _RNG.normal(size=32) for name in ("dad", "mum", "guest")}
+
+
+def _face(name: str) -> np.ndarray:
+    return _PEOPLE[name] + _RNG.normal(scale=0.05, size=32)
+
+
+class _RecordingClustering(UnknownClustering):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.added = []
+
+    def add_faces(self, path, encodings):
+        self.added.append(Path(path).name)
+        super().add_faces(path, encodings)
+
+
+def _pipeline(tmp_path: Path) -> Pipeline:
+    loader = SimpleNamespace(get_unknown_face_clustering=lambda: {"enabled": True})
+    return Pipeline(None, tmp_path / "input", tmp_path / "output", tmp_path / "logs", loader)
+
+
+def _cluster(pipeline: Pipeline, engine, photos: dict) -> dict:
+    """聚类并像整理完成时一样提交登记表。"""
+    clusters = pipeline.cluster_unknown_faces(engine, photos, list(photos))
+    pipeline.commit_unknown_registry()
+    return clusters
+
+
+def _photos(tmp_path: Path, date: str, faces: dict) -> dict:
+    day = tmp_path / "input" / "class_photos" / date
+    return {str(day / name): [_face(person)] for name, person in faces.items()}
+
+
+def test_unknown_person_ids_are_stable_across_runs(tmp_path: Path) -> None:
+    pipeline = _pipeline(tmp_path)
+
+    week1 = _photos(tmp_path, "2025-12-21", {"a.jpg": "dad", "b.jpg": "dad", "c.jpg": "dad", "d.jpg": "mum", "e.jpg": "mum"})
+    clusters = _cluster(pipeline, UnknownClustering(), week1)
+    assert {name: sorted(Path(p).name for p in paths) for name, paths in clusters.items()} == {
+        "Unknown_Person_1": ["a.jpg", "b.jpg", "c.jpg"],
+        "Unknown_Person_2": ["d.jpg", "e.jpg"],
+    }
+
+    # 下一周：mum 只出现一次也沿用原编号；只有没匹配上的 guest 交给聚类器，登记为新人物
+    week2 = _photos(tmp_path, "2025-12-28", {"m.jpg": "mum", "g1.jpg": "guest", "g2.jpg": "guest"})
+    engine = _RecordingClustering()
+    clusters = _cluster(pipeline, engine, week2)
+    assert sorted(engine.added) == ["g1.jpg", "g2.jpg"]
+    assert {name: sorted(Path(p).name for p in paths) for name, paths in clusters.items()} == {
+        "Unknown_Person_2": ["m.jpg"],
+        "Unknown_Person_3": ["g1.jpg", "g2.jpg"],
+    }
+
+    # 重新处理同一日期：替换该日期的贡献，不重复累计
+    _cluster(pipeline, KnnGraphClustering(linkage="hac"), week2)
+    registry = UnknownPersonRegistry(tmp_path / "output")
+    assert [registry.member_count(pid) for pid in (1, 2, 3)] == [3, 3, 2]
+
+    # 删除第一周：dad 的贡献全部移除即注销，编号不会被复用
+    forget_unknown_person_dates(tmp_path / "output", ["2025-12-21"])
+    registry = UnknownPersonRegistry(tmp_path / "output")
+    assert len(registry) == 2 and registry.member_count(2) == 1
+    week3 = _photos(tmp_path, "2026-01-04", {"x.jpg": "dad", "y.jpg": "dad"})
+    assert list(_cluster(pipeline, UnknownClustering(), week3)) == ["Unknown_Person_4"]
+
+
+def test_first_run_ids_match_independent_clustering(tmp_path: Path) -> None:
+    """空登记表时编号与独立聚类（UnknownClustering.get_results）一致，单张的簇不登记、不占编号。"""
+    week1 = _photos(
+        tmp_path,
+        "2025-12-21",
+        {"a.jpg": "guest", "b.jpg": "mum", "c.jpg": "dad", "d.jpg": "mum", "e.jpg": "dad", "f.jpg": "dad"},
+    )
+    independent = UnknownClustering()
+    for path, encodings in week1.items():
+        independent.add_faces(path, encodings)
+
+    clusters = _cluster(_pipeline(tmp_path), UnknownClustering(), week1)
+    assert clusters == independent.get_results()
+    assert sorted(clusters) == ["Unknown_Person_1", "Unknown_Person_2"]
+    assert UnknownPersonRegistry(tmp_path / "output").next_id == 3
+
+
+def test_registry_resets_on_dimension_change_and_corruption(tmp_path: Path) -> None:
+    pipeline = _pipeline(tmp_path)
+    week1 = _photos(tmp_path, "2025-12-21", {"a.jpg": "dad", "b.jpg": "dad"})
+    _cluster(pipeline, UnknownClustering(), week1)
+
+    day = tmp_path / "input" / "class_photos" / "2025-12-28"
+    other_model = {str(day / f"{i}.jpg"): [np.ones(8)] for i in range(2)}
+    assert list(_cluster(pipeline, UnknownClustering(), other_model)) == ["Unknown_Person_2"]
+    assert UnknownPersonRegistry(tmp_path / "output").dim == 8
+
+    unknown_persons_path(tmp_path / "output").write_text("{broken", encoding="utf-8")
+    assert len(UnknownPersonRegistry(tmp_path / "output")) == 0
+
+
+def test_registry_is_saved_only_after_sorting_completes(tmp_path: Path) -> None:
+    pipeline = _pipeline(tmp_path)
+    week1 = _photos(tmp_path, "2025-12-21", {"a.jpg": "dad", "b.jpg": "dad"})
+    assert list(pipeline.cluster_unknown_faces(UnknownClustering(), week1, list(week1))) == ["Unknown_Person_1"]
+
+    # 整理中途失败：不保存，重跑时仍从 1 开始编号
+    pipeline.discard_unknown_registry()
+    pipeline.commit_unknown_registry()
+    assert not unknown_persons_path(tmp_path / "output").exists()
+    assert list(_cluster(pipeline, UnknownClustering(), week1)) == ["Unknown_Person_1"]
+    assert UnknownPersonRegistry(tmp_path / "output").next_id == 2
+
+
+def test_match_uses_cached_totals_that_follow_replaced_dates(tmp_path: Path) -> None:
+    registry = UnknownPersonRegistry(tmp_path)
+    dad, mum = _PEOPLE["dad"] / np.linalg.norm(_PEOPLE["dad"]), _PEOPLE["mum"] / np.linalg.norm(_PEOPLE["mum"])
+    pid = registry.new_person()
+    registry.replace_dates(["2025-12-21"], {"2025-12-21": {pid: (2, 2 * dad)}})
+    assert registry.match(np.stack([dad, mum]), 0.3) == [pid, None]
+    assert registry.member_count(pid) == 2
+
+    # 同一人物换了贡献后缓存随之更新
+    registry.replace_dates(["2025-12-21"], {"2025-12-21": {pid: (1, mum)}})
+    assert registry.match(np.stack([dad, mum]), 0.3) == [None, pid]
+    assert registry.member_count(pid) == 1
+
+    registry.forget_dates(["2025-12-21"])
+    assert len(registry) == 0 and registry.match(np.stack([mum]), 0.3) == [None]
+
+
+def test_failed_sort_leaves_registry_unsaved(tmp_path: Path, monkeypatch) -> None:
+    pipeline = _pipeline(tmp_path)
+    week1 = _photos(tmp_path, "2025-12-21", {"a.jpg": "dad", "b.jpg": "dad"})
+    monkeypatch.setattr(pipeline, "open_sort_session", lambda: None)
+    monkeypatch.setattr(pipeline, "process_photos", lambda photos, sort_session=None: ({}, list(week1), [], [], week1))
+
+    def _boom(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(pipeline, "organize_output", _boom)
+    assert pipeline.run(list(week1)) is False
+    assert not unknown_persons_path(tmp_path / "output").exists()
+
+    monkeypatch.setattr(pipeline, "organize_output", lambda *args, **kwargs: {})
+    assert pipeline.run(list(week1)) is True
+    assert UnknownPersonRegistry(tmp_path / "output").member_count(1) == 2
+
+
+def test_make_unknown_clusterer_follows_algorithm_config() -> None:
+    greedy = Pipeline.make_unknown_clusterer({"threshold": 0.33, "min_cluster_size": 3})
+    assert type(greedy) is UnknownClustering
+    assert (greedy.tolerance, greedy.min_cluster_size) == (0.33, 3)
+
+    knn = Pipeline.make_unknown_clusterer({"algorithm": "hac", "knn_k": 7})
+    assert isinstance(knn, KnnGraphClustering)
+    assert (knn.linkage, knn.k) == ("hac", 7)
+
+
+def test_cluster_unknown_photos_only_clusters_unknown_photos(tmp_path: Path) -> None:
+    week1 = _photos(tmp_path, "2024-01-07", {"a.jpg": "guest", "b.jpg": "guest", "c.jpg": "dad"})
+    unknown_photos = [p for p in week1 if not p.endswith("c.jpg")]
+
+    clusters = _pipeline(tmp_path).cluster_unknown_photos({"enabled": True}, unknown_photos, week1, list(week1))
+
+    assert {k: sorted(Path(p).name for p in v) for k, v in clusters.items()} == {"Unknown_Person_1": ["a.jpg", "b.jpg"]}
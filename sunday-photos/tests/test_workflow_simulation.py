@@ -207,7 +207,8 @@ def test_full_lifecycle_workflow(lifecycle_env, monkeypatch):
     assert state_data_3 != state_data_1
     
     # --- Step 4: Corruption Resilience ---
-    create_dummy_photo(day2 / "corrupt_image.jpg")
+    # 内容须与其他照片不同：字节相同的照片会按内容指纹复用已有识别结果
+    create_dummy_photo(day2 / "corrupt_image.jpg", content="corrupt bytes")
     
     # Run 4
     sm = StudentManager(str(input_dir))